@@ -6,11 +6,12 @@ from datetime import datetime, timedelta
 from django.db.models import Q
 from django.core.cache import cache
 from django.utils import timezone
-from moviles.models import Movil, MovilStatus, MovilGeocode
+from moviles.models import Movil, MovilStatus
 from zonas.models import Zona
+from gps import geo_http
+from agenteIA.flota import FotoFlota
 from django.contrib.auth.models import User
 import re
-import requests
 from math import radians, cos, sin, asin, sqrt
 import unicodedata
 
@@ -21,7 +22,21 @@ class EjecutorAcciones:
     """
     
     def __init__(self):
-        pass
+        # Móviles activos con status y geocode: una query en el primer uso
+        # y el resto de la consulta se sirve desde memoria
+        self.flota = FotoFlota()
+    
+    def _buscar_movil(self, nombre: str, exacto: bool = False) -> Optional[Movil]:
+        """
+        Buscar un móvil por patente, alias, código o gps_id.
+
+        Resuelve el nombre contra la foto de la flota de esta consulta
+        (clave normalizada exacta y después las reglas de
+        Q(patente__icontains) | Q(alias__icontains) | Q(codigo__icontains)
+        con .first()); los inactivos se buscan en device_registry y se cargan
+        por clave primaria.
+        """
+        return self.flota.buscar(nombre, exacto=exacto)
     
     def _reemplazar_numeros_texto(self, texto: str) -> str:
         """
@@ -351,15 +366,11 @@ class EjecutorAcciones:
         
         # Buscar móvil por patente, alias o código
         try:
-            movil = Movil.objects.filter(
-                Q(patente__icontains=movil_nombre) |
-                Q(alias__icontains=movil_nombre) |
-                Q(codigo__icontains=movil_nombre)
-            ).only('id', 'patente', 'alias', 'codigo', 'gps_id', 'activo').first()
+            movil = self._buscar_movil(movil_nombre)
             
             if not movil:
                 # Debug: mostrar todos los móviles disponibles para diagnóstico
-                todos_moviles = Movil.objects.filter(activo=True).only('patente', 'alias', 'codigo')[:10]
+                todos_moviles = self.flota.moviles()[:10]
                 print(f"⚠️ No se encontró móvil '{movil_nombre}'")
                 print(f"📋 Móviles disponibles: {[(m.patente, m.alias, m.codigo) for m in todos_moviles]}")
                 
@@ -375,10 +386,9 @@ class EjecutorAcciones:
             if 'movil' not in variables or not variables.get('movil') or variables.get('movil').lower() in ['donde', 'que', 'el', 'la', 'los', 'las', 'de', 'del', 'en', 'con']:
                 variables['movil'] = movil_nombre
             
-            # Obtener status y geocodificación con select_related optimizado
-            # Obtener status y geocodificación - optimizado con only
-            status = MovilStatus.objects.filter(movil=movil).only('ultimo_lat', 'ultimo_lon', 'ultima_velocidad_kmh', 'fecha_gps', 'ignicion', 'bateria_pct', 'calidad_senal', 'satelites').first()
-            geocode = MovilGeocode.objects.filter(movil=movil).only('direccion_formateada', 'localidad', 'provincia').first()
+            # Status y geocodificación ya vienen en la foto de la flota
+            status = self.flota.status(movil)
+            geocode = self.flota.geocode(movil)
             
             if not status or not status.ultimo_lat:
                 movil_nombre = movil.alias or movil.patente
@@ -650,11 +660,7 @@ class EjecutorAcciones:
         
         # Buscar móvil
         try:
-            movil = Movil.objects.filter(
-                Q(patente__icontains=movil_nombre) |
-                Q(alias__icontains=movil_nombre) |
-                Q(codigo__icontains=movil_nombre)
-            ).first()
+            movil = self._buscar_movil(movil_nombre)
             
             if not movil:
                 return {
@@ -671,6 +677,12 @@ class EjecutorAcciones:
             minutos_atras = self._parsear_tiempo_relativo(texto_completo)
             print(f"📅 Consultando registros de hace {minutos_atras} minutos")
             
+            # Días anteriores: el resumen diario ya tiene los totales, sin recorrer posiciones
+            if minutos_atras >= 24 * 60:
+                respuesta = self._recorrido_diario(movil, minutos_atras)
+                if respuesta:
+                    return respuesta
+            
             # Calcular el rango de búsqueda (±10% del tiempo)
             margen = max(minutos_atras // 10, 60)  # Mínimo 60 minutos de margen
             desde = datetime.now() - timedelta(minutes=minutos_atras + margen)
@@ -753,6 +765,33 @@ class EjecutorAcciones:
                 'audio': "No pude consultar el recorrido. Intentá nuevamente."
             }
     
+    def _recorrido_diario(self, movil: Movil, minutos_atras: int) -> Optional[Dict[str, str]]:
+        """Respuesta de _obtener_recorrido desde RecorridoDiario (None si ese día no está resumido)"""
+        from gps.models import RecorridoDiario
+        from gps.rollups import dia_local
+        
+        fecha = dia_local(timezone.now() - timedelta(minutes=minutos_atras))
+        resumen = RecorridoDiario.objects.filter(movil=movil, fecha=fecha).first()
+        if resumen is None:
+            return None
+        
+        movil_nombre = movil.alias or movil.patente
+        periodo_texto, periodo_audio = self._formatear_periodo(minutos_atras)
+        horas_movimiento = resumen.minutos_movimiento / 60
+        
+        texto = f"📊 *Recorrido de {movil_nombre} ({periodo_texto}, {fecha.strftime('%d/%m')})*\n\n"
+        texto += f"📍 Posiciones: {resumen.puntos}\n"
+        texto += f"🚗 Distancia: {resumen.distancia_km:.2f} km\n"
+        texto += f"⚡ Velocidad máx: {resumen.velocidad_maxima:.0f} km/h\n"
+        texto += f"📈 Velocidad promedio: {resumen.velocidad_promedio:.0f} km/h\n"
+        texto += f"⏱️ En movimiento: {horas_movimiento:.1f} h ({resumen.detenciones} detenciones)"
+        
+        audio = f"{movil_nombre} {periodo_audio} recorrió {resumen.distancia_km:.1f} kilómetros "
+        audio += f"en {horas_movimiento:.1f} horas de movimiento. "
+        audio += f"Velocidad máxima {resumen.velocidad_maxima:.0f} kilómetros por hora."
+        
+        return {"texto": texto, "audio": audio}
+    
     def _obtener_estado(self, variables: Dict[str, str]) -> str:
         """Obtiene el estado general de un móvil"""
         return self._obtener_posicion_actual(variables)
@@ -836,11 +875,7 @@ class EjecutorAcciones:
                     'audio': "Decime qué móvil necesitas consultar."
                 }
             
-            movil = Movil.objects.filter(
-                Q(patente__icontains=movil_nombre_up) |
-                Q(alias__icontains=movil_nombre_up) |
-                Q(codigo__icontains=movil_nombre_up)
-            ).first()
+            movil = self._buscar_movil(movil_nombre_up)
             if not movil:
                 return {
                     'texto': f"No encontré el móvil '{movil_nombre_up}'.", 
@@ -851,7 +886,7 @@ class EjecutorAcciones:
             if 'movil' not in variables or not variables.get('movil') or variables.get('movil').lower() in ['donde', 'que', 'el', 'la', 'los', 'las', 'de', 'del', 'en', 'con']:
                 variables['movil'] = movil_nombre_up
             
-            status = MovilStatus.objects.filter(movil=movil).only('ultimo_lat', 'ultimo_lon', 'ultima_velocidad_kmh', 'fecha_gps').first()
+            status = self.flota.status(movil)
             if not status or not status.ultimo_lat or not status.ultimo_lon:
                 movil_nombre = movil.alias or movil.patente
                 return {
@@ -998,14 +1033,11 @@ class EjecutorAcciones:
                 geocode_data = cache.get(cache_key_geocode)
                 if geocode_data is None:
                     try:
-                        geocode_resp = requests.get(
-                            "https://nominatim.openstreetmap.org/search",
+                        geocode_data = geo_http.nominatim.get_json(
+                            "/search",
                             params={"q": destino_normalizado, "format": "json", "limit": 1, "countrycodes": "ar"},
                             headers={"User-Agent": "WayGPS-Sofia/1.0"},
-                            timeout=8,
                         )
-                        geocode_resp.raise_for_status()
-                        geocode_data = geocode_resp.json()
                         # Cache por 24 horas para geocodificaciones
                         if geocode_data:
                             cache.set(cache_key_geocode, geocode_data, 86400)
@@ -1042,13 +1074,7 @@ class EjecutorAcciones:
             osrm = cache.get(cache_key_osrm)
             if osrm is None:
                 try:
-                    osrm_url = (
-                        f"http://router.project-osrm.org/route/v1/driving/"
-                        f"{origen_lon},{origen_lat};{destino_lon},{destino_lat}?overview=false&alternatives=false"
-                    )
-                    osrm_resp = requests.get(osrm_url, timeout=3)  # Reducido de 8 a 3 segundos
-                    osrm_resp.raise_for_status()
-                    osrm = osrm_resp.json()
+                    osrm = geo_http.ruta_osrm(origen_lat, origen_lon, destino_lat, destino_lon)
                     # Cache por 1 hora para rutas
                     cache.set(cache_key_osrm, osrm, 3600)
                 except Exception:
@@ -1320,13 +1346,9 @@ class EjecutorAcciones:
             
             # Primero verificar si es un móvil de referencia
             if destino_es_movil and destino_texto:
-                movil_destino_obj = Movil.objects.filter(
-                    Q(patente__iexact=destino_texto) |
-                    Q(alias__iexact=destino_texto) |
-                    Q(codigo__iexact=destino_texto)
-                ).first()
+                movil_destino_obj = self._buscar_movil(destino_texto, exacto=True)
                 if movil_destino_obj:
-                    status_destino = MovilStatus.objects.filter(movil=movil_destino_obj).only('ultimo_lat', 'ultimo_lon').first()
+                    status_destino = self.flota.status(movil_destino_obj)
                     if status_destino and status_destino.ultimo_lat and status_destino.ultimo_lon:
                         destino_lat = float(status_destino.ultimo_lat)
                         destino_lon = float(status_destino.ultimo_lon)
@@ -1342,25 +1364,17 @@ class EjecutorAcciones:
             # Determinar móvil de referencia (origen) independientemente del tipo
             movil_origen_codigo = movil_referencia or (variables.get('movil') or '').strip()
             if movil_origen_codigo:
-                movil_origen_obj = Movil.objects.filter(
-                    Q(patente__iexact=movil_origen_codigo) |
-                    Q(alias__iexact=movil_origen_codigo) |
-                    Q(codigo__iexact=movil_origen_codigo)
-                ).first()
+                movil_origen_obj = self._buscar_movil(movil_origen_codigo, exacto=True)
 
             # IMPORTANTE: NO usar móvil como destino si:
             # - Ya hay destino_texto (puede venir del contexto)
             # - Es CERCANIA sin destino específico (mostrar móviles más cercanos entre sí)
             if movil_referencia and not destino_es_movil and not destino_texto and not consulta_directa_distancia and not tiene_destino_de_variables and not es_cercania_sin_destino_check:
                 # Buscar móvil de referencia
-                movil_ref = Movil.objects.filter(
-                    Q(patente__icontains=movil_referencia.upper()) |
-                    Q(alias__icontains=movil_referencia.upper()) |
-                    Q(codigo__icontains=movil_referencia.upper())
-                ).first()
+                movil_ref = self._buscar_movil(movil_referencia.upper())
                 
                 if movil_ref:
-                    status_ref = MovilStatus.objects.filter(movil=movil_ref).only('ultimo_lat', 'ultimo_lon').first()
+                    status_ref = self.flota.status(movil_ref)
                     if status_ref and status_ref.ultimo_lat and status_ref.ultimo_lon:
                         destino_lat = float(status_ref.ultimo_lat)
                         destino_lon = float(status_ref.ultimo_lon)
@@ -1389,7 +1403,7 @@ class EjecutorAcciones:
                         'audio': "Decime dos vehículos distintos para calcular la distancia."
                     }
 
-                status_origen = MovilStatus.objects.filter(movil=movil_origen_obj).only('ultimo_lat', 'ultimo_lon', 'ultima_velocidad_kmh').first()
+                status_origen = self.flota.status(movil_origen_obj)
                 if not status_origen or not status_origen.ultimo_lat or not status_origen.ultimo_lon:
                     return {
                         'texto': f"El móvil '{movil_origen_obj.alias or movil_origen_obj.patente}' no tiene posición actual para calcular la distancia.",
@@ -1404,13 +1418,7 @@ class EjecutorAcciones:
                 osrm = cache.get(cache_key_osrm)
                 if osrm is None:
                     try:
-                        osrm_url = (
-                            f"http://router.project-osrm.org/route/v1/driving/"
-                            f"{origen_lon},{origen_lat};{destino_lon},{destino_lat}?overview=false&alternatives=false"
-                        )
-                        osrm_resp = requests.get(osrm_url, timeout=3)  # Reducido de 5 a 3 segundos
-                        osrm_resp.raise_for_status()
-                        osrm = osrm_resp.json()
+                        osrm = geo_http.ruta_osrm(origen_lat, origen_lon, destino_lat, destino_lon)
                         cache.set(cache_key_osrm, osrm, 3600)  # 1 hora
                     except Exception:
                         osrm = {}
@@ -1472,13 +1480,9 @@ class EjecutorAcciones:
                         if match:
                             posible_movil_ref = match.group(1).replace(' ', '').upper()
                             # Reintentar como móvil de referencia
-                            movil_ref_temp = Movil.objects.filter(
-                                Q(patente__icontains=posible_movil_ref) |
-                                Q(alias__icontains=posible_movil_ref) |
-                                Q(codigo__icontains=posible_movil_ref)
-                            ).first()
+                            movil_ref_temp = self._buscar_movil(posible_movil_ref)
                             if movil_ref_temp:
-                                status_ref = MovilStatus.objects.filter(movil=movil_ref_temp).first()
+                                status_ref = self.flota.status(movil_ref_temp)
                                 if status_ref and status_ref.ultimo_lat and status_ref.ultimo_lon:
                                     destino_lat = float(status_ref.ultimo_lat)
                                     destino_lon = float(status_ref.ultimo_lon)
@@ -1531,8 +1535,8 @@ class EjecutorAcciones:
                                 # Mostrar los móviles más cercanos entre sí
                                 print("📍 Consulta de CERCANIA sin destino - mostrando móviles más cercanos entre sí")
                                 # Calcular distancias entre todos los móviles
-                                # Optimizar: usar prefetch_related para status (OneToOne)
-                                moviles_activos = Movil.objects.filter(activo=True).prefetch_related('status').only('id', 'patente', 'alias', 'codigo')
+                                # Los activos de la foto de la flota ya traen su status
+                                moviles_activos = self.flota.moviles()
                                 pares_cercanos = []
                                 
                                 moviles_con_posicion = []
@@ -1555,13 +1559,7 @@ class EjecutorAcciones:
                                         osrm = cache.get(cache_key_osrm)
                                         if osrm is None:
                                             try:
-                                                osrm_url = (
-                                                    f"http://router.project-osrm.org/route/v1/driving/"
-                                                    f"{movil1['lon']},{movil1['lat']};{movil2['lon']},{movil2['lat']}?overview=false&alternatives=false"
-                                                )
-                                                osrm_resp = requests.get(osrm_url, timeout=3)  # Reducido de 5 a 3 segundos
-                                                osrm_resp.raise_for_status()
-                                                osrm = osrm_resp.json()
+                                                osrm = geo_http.ruta_osrm(movil1['lat'], movil1['lon'], movil2['lat'], movil2['lon'])
                                                 cache.set(cache_key_osrm, osrm, 3600)  # 1 hora
                                             except Exception:
                                                 osrm = {}
@@ -1661,14 +1659,11 @@ class EjecutorAcciones:
                     
                     # Geocodificar destino con Nominatim
                     try:
-                        geocode_resp = requests.get(
-                            "https://nominatim.openstreetmap.org/search",
+                        geocode_data = geo_http.nominatim.get_json(
+                            "/search",
                             params={"q": destino_normalizado, "format": "json", "limit": 1, "countrycodes": "ar"},
                             headers={"User-Agent": "WayGPS-Sofia/1.0"},
-                            timeout=8,
                         )
-                        geocode_resp.raise_for_status()
-                        geocode_data = geocode_resp.json()
                         if not geocode_data:
                             return {
                                 'texto': f"No pude geocodificar el destino '{destino_texto}'. Probá con un lugar más específico.",
@@ -1687,7 +1682,7 @@ class EjecutorAcciones:
 
             # Caso: distancia directa entre un móvil (origen) y un destino geográfico
             if consulta_directa_distancia and destino_lat and destino_lon and movil_origen_obj:
-                status_origen = MovilStatus.objects.filter(movil=movil_origen_obj).only('ultimo_lat', 'ultimo_lon', 'ultima_velocidad_kmh').first()
+                status_origen = self.flota.status(movil_origen_obj)
                 if not status_origen or not status_origen.ultimo_lat or not status_origen.ultimo_lon:
                     return {
                         'texto': f"El móvil '{movil_origen_obj.alias or movil_origen_obj.patente}' no tiene posición actual para calcular la distancia.",
@@ -1702,13 +1697,7 @@ class EjecutorAcciones:
                 osrm = cache.get(cache_key_osrm)
                 if osrm is None:
                     try:
-                        osrm_url = (
-                            f"http://router.project-osrm.org/route/v1/driving/"
-                            f"{origen_lon},{origen_lat};{destino_lon},{destino_lat}?overview=false&alternatives=false"
-                        )
-                        osrm_resp = requests.get(osrm_url, timeout=3)  # Reducido de 5 a 3 segundos
-                        osrm_resp.raise_for_status()
-                        osrm = osrm_resp.json()
+                        osrm = geo_http.ruta_osrm(origen_lat, origen_lon, destino_lat, destino_lon)
                         cache.set(cache_key_osrm, osrm, 3600)  # 1 hora
                     except Exception:
                         osrm = {}
@@ -1753,7 +1742,7 @@ class EjecutorAcciones:
                 }
             
             # 2) Obtener todos los móviles activos con posición - optimizado
-            moviles_activos = Movil.objects.filter(activo=True).prefetch_related('status').only('id', 'patente', 'alias', 'codigo')
+            moviles_activos = self.flota.moviles()
             resultados_cercania = []
             
             for movil in moviles_activos:
@@ -1775,13 +1764,7 @@ class EjecutorAcciones:
                 osrm = cache.get(cache_key_osrm)
                 if osrm is None:
                     try:
-                        osrm_url = (
-                            f"http://router.project-osrm.org/route/v1/driving/"
-                            f"{origen_lon},{origen_lat};{destino_lon},{destino_lat}?overview=false&alternatives=false"
-                        )
-                        osrm_resp = requests.get(osrm_url, timeout=3)  # Reducido de 5 a 3 segundos
-                        osrm_resp.raise_for_status()
-                        osrm = osrm_resp.json()
+                        osrm = geo_http.ruta_osrm(origen_lat, origen_lon, destino_lat, destino_lon)
                         cache.set(cache_key_osrm, osrm, 3600)  # 1 hora
                     except Exception:
                         osrm = {}
@@ -2584,11 +2567,7 @@ class EjecutorAcciones:
                 }
             
             # Buscar móvil
-            movil = Movil.objects.filter(
-                Q(patente__icontains=movil_nombre) |
-                Q(alias__icontains=movil_nombre) |
-                Q(codigo__icontains=movil_nombre)
-            ).first()
+            movil = self._buscar_movil(movil_nombre)
             
             if not movil:
                 return {
@@ -2734,11 +2713,7 @@ class EjecutorAcciones:
                 }
             
             # Buscar móvil
-            movil = Movil.objects.filter(
-                Q(patente__icontains=movil_nombre) |
-                Q(alias__icontains=movil_nombre) |
-                Q(codigo__icontains=movil_nombre)
-            ).first()
+            movil = self._buscar_movil(movil_nombre)
             
             if not movil:
                 return {
@@ -2885,11 +2860,7 @@ class EjecutorAcciones:
                 }
             
             # Buscar móvil
-            movil = Movil.objects.filter(
-                Q(patente__icontains=movil_nombre) |
-                Q(alias__icontains=movil_nombre) |
-                Q(codigo__icontains=movil_nombre)
-            ).first()
+            movil = self._buscar_movil(movil_nombre)
             
             if not movil:
                 return {
@@ -3007,17 +2978,9 @@ class EjecutorAcciones:
         """
         try:
             # Buscar ambos móviles
-            movil1 = Movil.objects.filter(
-                Q(patente__icontains=movil1_nombre) |
-                Q(alias__icontains=movil1_nombre) |
-                Q(codigo__icontains=movil1_nombre)
-            ).first()
-            
-            movil2 = Movil.objects.filter(
-                Q(patente__icontains=movil2_nombre) |
-                Q(alias__icontains=movil2_nombre) |
-                Q(codigo__icontains=movil2_nombre)
-            ).first()
+            movil1 = self._buscar_movil(movil1_nombre)
+            
+            movil2 = self._buscar_movil(movil2_nombre)
             
             if not movil1:
                 return {
@@ -3032,8 +2995,8 @@ class EjecutorAcciones:
                 }
             
             # Obtener posiciones actuales
-            status1 = MovilStatus.objects.filter(movil=movil1).only('ultimo_lat', 'ultimo_lon', 'ultima_velocidad_kmh').first()
-            status2 = MovilStatus.objects.filter(movil=movil2).only('ultimo_lat', 'ultimo_lon', 'ultima_velocidad_kmh').first()
+            status1 = self.flota.status(movil1)
+            status2 = self.flota.status(movil2)
             
             if not status1 or not status1.ultimo_lat or not status1.ultimo_lon:
                 return {
@@ -3057,13 +3020,7 @@ class EjecutorAcciones:
             osrm = cache.get(cache_key_osrm)
             if osrm is None:
                 try:
-                    osrm_url = (
-                        f"http://router.project-osrm.org/route/v1/driving/"
-                        f"{lon1},{lat1};{lon2},{lat2}?overview=false&alternatives=false"
-                    )
-                    osrm_resp = requests.get(osrm_url, timeout=3)
-                    osrm_resp.raise_for_status()
-                    osrm = osrm_resp.json()
+                    osrm = geo_http.ruta_osrm(lat1, lon1, lat2, lon2)
                     cache.set(cache_key_osrm, osrm, 3600)
                 except Exception:
                     osrm = {}
@@ -3121,11 +3078,7 @@ class EjecutorAcciones:
         """
         try:
             # Buscar móvil
-            movil = Movil.objects.filter(
-                Q(patente__icontains=movil_nombre) |
-                Q(alias__icontains=movil_nombre) |
-                Q(codigo__icontains=movil_nombre)
-            ).first()
+            movil = self._buscar_movil(movil_nombre)
             
             if not movil:
                 return {
@@ -3134,7 +3087,7 @@ class EjecutorAcciones:
                 }
             
             # Obtener posición del móvil
-            status = MovilStatus.objects.filter(movil=movil).only('ultimo_lat', 'ultimo_lon', 'ultima_velocidad_kmh').first()
+            status = self.flota.status(movil)
             if not status or not status.ultimo_lat or not status.ultimo_lon:
                 return {
                     'texto': f"El móvil '{movil.alias or movil.patente}' no tiene posición actual.",
@@ -3160,13 +3113,7 @@ class EjecutorAcciones:
             osrm = cache.get(cache_key_osrm)
             if osrm is None:
                 try:
-                    osrm_url = (
-                        f"http://router.project-osrm.org/route/v1/driving/"
-                        f"{lon_movil},{lat_movil};{lon_zona},{lat_zona}?overview=false&alternatives=false"
-                    )
-                    osrm_resp = requests.get(osrm_url, timeout=3)
-                    osrm_resp.raise_for_status()
-                    osrm = osrm_resp.json()
+                    osrm = geo_http.ruta_osrm(lat_movil, lon_movil, lat_zona, lon_zona)
                     cache.set(cache_key_osrm, osrm, 3600)
                 except Exception:
                     osrm = {}
@@ -3248,13 +3195,7 @@ class EjecutorAcciones:
             osrm = cache.get(cache_key_osrm)
             if osrm is None:
                 try:
-                    osrm_url = (
-                        f"http://router.project-osrm.org/route/v1/driving/"
-                        f"{lon1},{lat1};{lon2},{lat2}?overview=false&alternatives=false"
-                    )
-                    osrm_resp = requests.get(osrm_url, timeout=3)
-                    osrm_resp.raise_for_status()
-                    osrm = osrm_resp.json()
+                    osrm = geo_http.ruta_osrm(lat1, lon1, lat2, lon2)
                     cache.set(cache_key_osrm, osrm, 3600)
                 except Exception:
                     osrm = {}
@@ -3398,11 +3339,7 @@ class EjecutorAcciones:
             
             elif movil_nombre:
                 # Buscar móvil
-                movil = Movil.objects.filter(
-                    Q(patente__icontains=movil_nombre) |
-                    Q(alias__icontains=movil_nombre) |
-                    Q(codigo__icontains=movil_nombre)
-                ).first()
+                movil = self._buscar_movil(movil_nombre)
                 
                 if not movil:
                     return {
@@ -3411,7 +3348,7 @@ class EjecutorAcciones:
                     }
                 
                 # Obtener posición actual
-                status = MovilStatus.objects.filter(movil=movil).only('ultimo_lat', 'ultimo_lon').first()
+                status = self.flota.status(movil)
                 
                 if not status or not status.ultimo_lat or not status.ultimo_lon:
                     return {
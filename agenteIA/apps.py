@@ -6,3 +6,10 @@ class AgenteIAConfig(AppConfig):
     name = 'agenteIA'
     verbose_name = 'Agente IA Sofia'
 
+    def ready(self):
+        # Importar señales cuando la aplicación esté lista
+        import agenteIA.signals  # noqa: F401
+
+        # Precarga opt-in del modelo de embeddings (SOFIA_PRECARGAR_MODELO)
+        from agenteIA.precarga import precargar_si_corresponde
+        precargar_si_corresponde()
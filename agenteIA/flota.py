@@ -0,0 +1,221 @@
+"""
+Foto de la flota para una consulta de Sofía
+===========================================
+
+Una respuesta de Sofía resolvía cada móvil por separado: el nombre contra
+device_registry y después Movil por id, MovilStatus y MovilGeocode con un
+.first() cada uno, y los listados de cercanía volvían a leer todos los
+móviles activos. Una consulta de distancia entre dos móviles o una de
+cercanía con móvil de referencia terminaba en 10 o más queries.
+
+FotoFlota carga los móviles activos con su status y geocodificación en una
+sola query (select_related, sin raw_data/raw_json) la primera vez que se
+necesita y los indexa por patente, alias, código y gps_id normalizados
+(mayúsculas, sin tildes, espacios ni guiones). El resto de la respuesta se
+sirve desde memoria. Vive lo que vive un EjecutorAcciones (uno por
+consulta en views.py): no hay que invalidar nada, la próxima consulta
+arma una foto nueva.
+
+La carga es inyectable (`cargador`, `cargar_por_id`), así que la clase no
+depende de Django al importarse.
+"""
+
+import logging
+import re
+import unicodedata
+from typing import Callable, Dict, Iterable, List, Optional
+
+from gps.device_registry import device_registry
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_INDICE = ('patente', 'alias', 'codigo', 'gps_id')
+
+_RE_SEPARADORES = re.compile(r'[^A-Z0-9]')
+
+
+def normalizar_clave(texto) -> str:
+    """'asn-773', 'ASN 773' y 'Asn773' -> 'ASN773' ('Camión 5' -> 'CAMION5')"""
+    if texto is None:
+        return ''
+    texto = ''.join(
+        c for c in unicodedata.normalize('NFD', str(texto))
+        if unicodedata.category(c) != 'Mn'
+    )
+    return _RE_SEPARADORES.sub('', texto.upper())
+
+
+def _cargar_activos_desde_db() -> List:
+    from moviles.models import Movil
+
+    return list(
+        Movil.objects.filter(activo=True)
+        .select_related('status', 'geocode')
+        .defer('status__raw_data', 'status__raw_json')
+        .order_by('id')
+    )
+
+
+def _cargar_movil_desde_db(movil_id):
+    from moviles.models import Movil
+
+    return (
+        Movil.objects.filter(id=movil_id)
+        .select_related('status', 'geocode')
+        .defer('status__raw_data', 'status__raw_json')
+        .first()
+    )
+
+
+class FotoFlota:
+    """Móviles activos con status y geocode, cargados una vez por consulta"""
+
+    def __init__(self, cargador: Callable[[], Iterable] = None,
+                 cargar_por_id: Callable = None, registro=None):
+        """
+        Args:
+            cargador: Función que devuelve los móviles activos (con .status y
+                .geocode ya resueltos), ordenados por id
+            cargar_por_id: Función que devuelve un móvil (activo o no) por id
+            registro: Registro de móviles para nombres que no están en la
+                foto (default: device_registry)
+        """
+        self.cargador = cargador or _cargar_activos_desde_db
+        self.cargar_por_id = cargar_por_id or _cargar_movil_desde_db
+        self.registro = registro or device_registry
+
+        self._moviles: Optional[List] = None
+        self._por_id: Dict[int, object] = {}
+        self._por_clave: Dict[str, object] = {}
+        self._busquedas: Dict[tuple, object] = {}
+
+        self.stats = {
+            'consultas_db': 0,
+            'hits_indice': 0,
+            'hits_parciales': 0,
+            'fuera_de_foto': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Carga
+    # ------------------------------------------------------------------
+
+    def _asegurar_cargada(self):
+        if self._moviles is not None:
+            return
+        self._moviles = list(self.cargador())
+        self.stats['consultas_db'] += 1
+        for movil in self._moviles:
+            self._indexar(movil)
+        logger.debug(f"🚚 Foto de flota: {len(self._moviles)} móviles activos, {len(self._por_clave)} claves")
+
+    def _indexar(self, movil):
+        self._por_id[movil.id] = movil
+        for campo in CAMPOS_INDICE:
+            clave = normalizar_clave(getattr(movil, campo, None))
+            # Ante claves repetidas gana el de menor id, como el .first() de antes
+            if clave:
+                self._por_clave.setdefault(clave, movil)
+
+    def moviles(self) -> List:
+        """Móviles activos ordenados por id (status y geocode precargados)"""
+        self._asegurar_cargada()
+        return self._moviles
+
+    def por_id(self, movil_id) -> Optional[object]:
+        self._asegurar_cargada()
+        return self._por_id.get(movil_id)
+
+    # ------------------------------------------------------------------
+    # Búsqueda
+    # ------------------------------------------------------------------
+
+    def buscar(self, nombre: str, exacto: bool = False) -> Optional[object]:
+        """
+        Buscar un móvil por patente, alias, código o gps_id.
+
+        Orden: coincidencia exacta de la clave normalizada; después las reglas
+        de siempre sobre patente/alias/código (contiene, o igual sin
+        distinguir mayúsculas si exacto=True) en orden de id; por último el
+        registro completo, que también conoce los móviles inactivos y
+        consulta la base si el nombre no está en memoria (el móvil se carga
+        por id y queda en la foto).
+
+        Args:
+            nombre: Texto tal como lo extrajo el procesador
+            exacto: Sin coincidencias parciales
+
+        Returns:
+            Movil o None
+        """
+        if not nombre:
+            return None
+        clave_busqueda = (nombre, exacto)
+        if clave_busqueda in self._busquedas:
+            return self._busquedas[clave_busqueda]
+
+        self._asegurar_cargada()
+        movil = self._por_clave.get(normalizar_clave(nombre))
+        if movil is not None:
+            self.stats['hits_indice'] += 1
+        else:
+            movil = self._buscar_en_foto(nombre, exacto)
+            if movil is not None:
+                self.stats['hits_parciales'] += 1
+            else:
+                movil = self._buscar_fuera_de_foto(nombre, exacto)
+
+        self._busquedas[clave_busqueda] = movil
+        return movil
+
+    def _buscar_en_foto(self, nombre: str, exacto: bool):
+        buscado = nombre.lower()
+        for movil in self._moviles:
+            for valor in (movil.patente, movil.alias, movil.codigo):
+                if not valor:
+                    continue
+                valor = valor.lower()
+                if (valor == buscado) if exacto else (buscado in valor):
+                    return movil
+        return None
+
+    def _buscar_fuera_de_foto(self, nombre: str, exacto: bool):
+        entrada = self.registro.buscar(nombre, exacto=exacto)
+        if entrada is None:
+            return None
+        if entrada.id in self._por_id:
+            return self._por_id[entrada.id]
+        movil = self.cargar_por_id(entrada.id)
+        self.stats['consultas_db'] += 1
+        if movil is not None:
+            self.stats['fuera_de_foto'] += 1
+            self._indexar(movil)
+        return movil
+
+    # ------------------------------------------------------------------
+    # Datos relacionados
+    # ------------------------------------------------------------------
+
+    def status(self, movil) -> Optional[object]:
+        """MovilStatus del móvil (None si nunca reportó)"""
+        return self._relacionado(movil, 'status')
+
+    def geocode(self, movil) -> Optional[object]:
+        """MovilGeocode del móvil (None si no tiene dirección)"""
+        return self._relacionado(movil, 'geocode')
+
+    def _relacionado(self, movil, campo: str):
+        if movil is None:
+            return None
+        # Si el móvil no vino de la foto, Django resuelve la relación con
+        # una query y la deja cacheada en la instancia
+        movil = self._por_id.get(movil.id, movil)
+        return getattr(movil, campo, None)
+
+    def get_stats(self) -> Dict:
+        """Estadísticas de uso de la foto"""
+        return {
+            **self.stats,
+            'moviles': len(self._moviles or ()),
+            'claves': len(self._por_clave),
+        }
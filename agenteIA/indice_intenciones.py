@@ -0,0 +1,190 @@
+"""
+Índice vectorizado de intenciones de Sofía
+==========================================
+
+ProcesadorConsultas comparaba la consulta contra cada VectorConsulta de a
+uno: convertía el JSON del embedding a np.array, calculaba las dos normas y
+el producto, e imprimía una línea por vector. Con decenas de ejemplos se
+notaba poco; con miles de ejemplos de intenciones, el costo crece lineal
+en Python.
+
+IndiceIntenciones carga los embeddings activos una sola vez en una matriz
+float32 contigua con las filas ya normalizadas (L2), más los thresholds y
+los metadatos en arrays paralelos. Una consulta es un producto
+matriz-vector (similitud coseno de todas las filas a la vez) y
+argpartition para el top-k.
+
+El índice global se reconstruye cuando cambia un VectorConsulta (señales
+post_save/post_delete suben una versión en el cache de Django) y, como
+red de seguridad para otros workers sin cache compartido o cambios por
+.update(), cada INDICE_TTL segundos.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+try:
+    import numpy as np
+    NP_AVAILABLE = True
+except Exception:
+    NP_AVAILABLE = False
+    np = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+INDICE_TTL = getattr(settings, 'SOFIA_INDICE_TTL', 300)
+CLAVE_VERSION = 'agenteIA:indice_intenciones:version'
+
+CAMPOS_VECTOR = ('id', 'texto_original', 'tipo_consulta', 'vector_embedding', 'activo', 'threshold',
+                 'variables', 'categoria')
+
+
+class IndiceIntenciones:
+    """Matriz normalizada de embeddings con búsqueda por producto matriz-vector"""
+
+    def __init__(self, vectores: Sequence):
+        """
+        Args:
+            vectores: VectorConsulta (u objetos con los mismos atributos); se
+                ignoran los inactivos y los que no tienen embedding
+        """
+        self.vectores = [v for v in vectores if v.activo and v.vector_embedding]
+        self.tipos = [v.tipo_consulta for v in self.vectores]
+        self.categorias = [v.categoria for v in self.vectores]
+        # Todos los embeddings deberían medir lo mismo (384 con el modelo
+        # actual); si alguno difiere se recorta o completa con ceros
+        self.dimension = (
+            Counter(len(v.vector_embedding) for v in self.vectores).most_common(1)[0][0]
+            if self.vectores else 0
+        )
+        self.matriz = None
+        self.thresholds = None
+        if NP_AVAILABLE and self.vectores:
+            matriz = np.zeros((len(self.vectores), self.dimension), dtype=np.float32)
+            for fila, vector in enumerate(self.vectores):
+                embedding = vector.vector_embedding[:self.dimension]
+                matriz[fila, :len(embedding)] = embedding
+            normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+            normas[normas == 0] = 1
+            self.matriz = np.ascontiguousarray(matriz / normas, dtype=np.float32)
+            self.thresholds = np.array([v.threshold for v in self.vectores], dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.vectores)
+
+    def similitudes(self, vector_consulta: Sequence[float]):
+        """Similitud coseno (recortada a [0, 1]) de la consulta contra todas las filas"""
+        consulta = np.zeros(self.dimension, dtype=np.float32)
+        recortado = np.asarray(vector_consulta[:self.dimension], dtype=np.float32)
+        consulta[:len(recortado)] = recortado
+        norma = np.linalg.norm(consulta)
+        if norma == 0:
+            return np.zeros(len(self.vectores), dtype=np.float32)
+        return np.clip(self.matriz @ (consulta / norma), 0.0, 1.0)
+
+    def buscar(self, vector_consulta: Sequence[float], k: int = 5):
+        """
+        Mejor vector y top-k con un solo producto matriz-vector.
+
+        Returns:
+            ((vector, similitud) del mayor que supera su propio threshold, o
+            None; lista de (vector, similitud) de los k más parecidos, de
+            mayor a menor)
+        """
+        if not self.vectores:
+            return None, []
+        if not NP_AVAILABLE:
+            return self._mejor_sin_numpy(vector_consulta), []
+
+        similitudes = self.similitudes(vector_consulta)
+        candidatas = np.where(similitudes >= self.thresholds, similitudes, -1.0)
+        fila = int(np.argmax(candidatas))
+        mejor = (self.vectores[fila], float(similitudes[fila])) if candidatas[fila] > 0 else None
+
+        k = min(k, len(similitudes))
+        top = np.argpartition(-similitudes, k - 1)[:k] if k else []
+        top = top[np.argsort(-similitudes[top])] if k else []
+        return mejor, [(self.vectores[i], float(similitudes[i])) for i in top]
+
+    def top_k(self, vector_consulta: Sequence[float], k: int = 5) -> List[Tuple[object, float]]:
+        """Los k vectores más parecidos, de mayor a menor similitud"""
+        return self.buscar(vector_consulta, k)[1]
+
+    def mejor(self, vector_consulta: Sequence[float]) -> Optional[Tuple[object, float]]:
+        """Vector de mayor similitud entre los que superan su propio threshold (o None)"""
+        return self.buscar(vector_consulta, 0)[0]
+
+    def _mejor_sin_numpy(self, vector_consulta):
+        from agenteIA.vectorizador import VectorizadorConsultas
+        calcular = VectorizadorConsultas().calcular_similitud
+        mejor, mejor_similitud = None, 0.0
+        for vector in self.vectores:
+            similitud = calcular(vector_consulta, vector.vector_embedding)
+            if similitud >= vector.threshold and similitud > mejor_similitud:
+                mejor, mejor_similitud = vector, similitud
+        return (mejor, mejor_similitud) if mejor is not None else None
+
+    def get_stats(self) -> Dict:
+        return {
+            'vectores': len(self.vectores),
+            'dimension': self.dimension,
+            'bytes_matriz': int(self.matriz.nbytes) if self.matriz is not None else 0,
+            'tipos': len(set(self.tipos)),
+        }
+
+
+# ---------------------------------------------------------------------------
+# Índice global
+# ---------------------------------------------------------------------------
+
+_lock = threading.Lock()
+_indice: Optional[IndiceIntenciones] = None
+_version = None
+_construido_en = 0.0
+
+
+def _version_actual():
+    try:
+        from django.core.cache import cache
+        return cache.get(CLAVE_VERSION)
+    except Exception:
+        return None
+
+
+def obtener_indice() -> IndiceIntenciones:
+    """Índice de los VectorConsulta activos (se reconstruye si cambiaron o venció el TTL)"""
+    global _indice, _version, _construido_en
+
+    version = _version_actual()
+    if _indice is not None and version == _version and time.monotonic() - _construido_en < INDICE_TTL:
+        return _indice
+
+    with _lock:
+        if _indice is not None and version == _version and time.monotonic() - _construido_en < INDICE_TTL:
+            return _indice
+        from agenteIA.models import VectorConsulta
+
+        inicio = time.monotonic()
+        indice = IndiceIntenciones(list(VectorConsulta.objects.filter(activo=True).only(*CAMPOS_VECTOR)))
+        _indice, _version, _construido_en = indice, version, time.monotonic()
+        logger.info(
+            f"🧠 Índice de intenciones: {len(indice)} vectores de dimensión {indice.dimension} "
+            f"({(_construido_en - inicio) * 1000:.1f} ms)"
+        )
+        return indice
+
+
+def invalidar_indice():
+    """Marca el índice como desactualizado en todos los procesos que comparten el cache"""
+    global _indice
+    _indice = None
+    try:
+        from django.core.cache import cache
+        cache.set(CLAVE_VERSION, time.time_ns(), None)
+    except Exception as e:
+        logger.debug(f"No se pudo publicar la versión del índice de intenciones: {e}")
@@ -0,0 +1,130 @@
+"""
+Comando Django para medir el matcher por palabras clave de Sofía
+Uso: python manage.py benchmark_matcher_sofia [--repeticiones 200] [--desde-bd]
+
+Compara, sobre un corpus de consultas reales, el camino anterior (re.search
+con los patrones como string, dos veces por patrón y normalizando el texto
+en cada intención) contra los patrones compilados: buscar_patron por
+intención y detectar_tipos (una normalización y una pasada por todas las
+intenciones). No toca la base de datos salvo con --desde-bd.
+"""
+
+import re
+import time
+import unicodedata
+
+from django.core.management.base import BaseCommand
+
+from agenteIA.matching_simple import PATRONES, TIPOS, SimpleMatcher
+
+# Consultas tal como las escriben los usuarios (Telegram y chat web)
+CORPUS = [
+    'donde esta el camion 5',
+    'Dónde está el ASN773?',
+    'donde asn 773',
+    'ubicacion del movil OVV799',
+    'posición actual del vehículo AA285TA',
+    'que hizo ayer el camion 3',
+    'recorrido de ayer del movil 12',
+    'historial del camión cinco',
+    'hola sofia',
+    'buenos días',
+    'enviame por whatsapp la ubicación del camion 5',
+    'compartir por wsp la posicion del ASN773',
+    'cuanto tarda el camion 5 a Burzaco',
+    'cuánto tardaría hasta Lomas de Zamora el movil 3',
+    'cuando llega el camion 7 al deposito',
+    'que moviles estan mas cerca de Avellaneda',
+    'cual es el movil mas cercano a la zona norte',
+    'a que distancia esta el camion 5 del camion 8',
+    'donde queda la zona deposito central',
+    'cual es la direccion del almacén',
+    'listado de moviles activos',
+    'quienes estan conectados',
+    'situacion de la flota',
+    'cuantos estan detenidos',
+    'moviles en zona deposito',
+    'quienes estan en el almacen',
+    'que vehiculos estan fuera de la zona',
+    'moviles que no estan en la base',
+    'cuando ingreso el camion 5 a la zona deposito',
+    'a que hora entro el movil 3 a zona planta',
+    'cuando salio de la zona norte el ASN773',
+    'salió el camión 2 de zona base',
+    'paso por la zona deposito el camion 4',
+    'estuvo en el almacen ayer',
+    'ayuda',
+    'que puedes hacer',
+    'mostrar en mapa el camion 5',
+    'abrir google maps del movil 9',
+    'ASN773',
+    'camion 12 ahora',
+]
+
+
+def _detectar_sin_compilar(texto: str):
+    """Cómo se detectaban las intenciones antes: patrones como string, sin compilar"""
+    detectados = []
+    for tipo in TIPOS:
+        texto_normalizado = ''.join(
+            c for c in unicodedata.normalize('NFD', texto)
+            if unicodedata.category(c) != 'Mn'
+        )
+        for patron in PATRONES[tipo]:
+            if re.search(patron, texto, re.IGNORECASE) or re.search(patron, texto_normalizado, re.IGNORECASE):
+                detectados.append(tipo)
+                break
+    return detectados
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo por consulta del matcher de intenciones de Sofía'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=200,
+            help='Pasadas por el corpus por método; se informa la mejor (default: 200)',
+        )
+        parser.add_argument(
+            '--desde-bd',
+            action='store_true',
+            help='Agregar al corpus los textos de los VectorConsulta',
+        )
+
+    def handle(self, *args, **options):
+        corpus = list(CORPUS)
+        if options['desde_bd']:
+            from agenteIA.models import VectorConsulta
+            corpus += [texto.replace('XXX', 'ASN773') for texto in
+                       VectorConsulta.objects.values_list('texto_original', flat=True) if texto]
+
+        matcher = SimpleMatcher()
+        repeticiones = max(1, options['repeticiones'])
+
+        def por_intencion(texto):
+            return [tipo for tipo in TIPOS if matcher.buscar_patron(texto, tipo)]
+
+        metodos = [
+            ('regex sin compilar (antes)', _detectar_sin_compilar),
+            ('compilado, buscar_patron x16', por_intencion),
+            ('compilado, detectar_tipos', matcher.detectar_tipos),
+        ]
+
+        self.stdout.write(f'⏱️ {len(corpus)} consultas x {repeticiones} repeticiones')
+
+        base = None
+        for nombre, funcion in metodos:
+            mejor = min(self._medir(funcion, corpus) for _ in range(repeticiones))
+            microsegundos = mejor / len(corpus) * 1e6
+            base = base or microsegundos
+            self.stdout.write(f'  {nombre:<30} {microsegundos:>8.1f} µs/consulta  ({base / microsegundos:.1f}x)')
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark finalizado'))
+
+    def _medir(self, funcion, corpus) -> float:
+        inicio = time.perf_counter()
+        for texto in corpus:
+            funcion(texto)
+        return time.perf_counter() - inicio
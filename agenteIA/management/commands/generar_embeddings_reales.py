@@ -1,15 +1,11 @@
 """
 Comando para generar embeddings reales usando sentence-transformers
 """
+import time
+
 from django.core.management.base import BaseCommand
 from agenteIA.models import VectorConsulta
-import sys
-
-try:
-    from sentence_transformers import SentenceTransformer
-    ST_AVAILABLE = True
-except ImportError:
-    ST_AVAILABLE = False
+from agenteIA.vectorizador import ST_AVAILABLE, VectorizadorConsultas
 
 
 class Command(BaseCommand):
@@ -23,18 +19,18 @@ class Command(BaseCommand):
         
         self.stdout.write(self.style.SUCCESS('🔄 Generando embeddings reales...'))
         
-        # Cargar modelo
-        try:
-            self.stdout.write('📥 Descargando modelo (esto puede tardar en primera vez)...')
-            modelo = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-            self.stdout.write(self.style.SUCCESS('✅ Modelo cargado'))
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'❌ Error cargando modelo: {e}'))
+        # Cargar modelo (el mismo que usa Sofía para vectorizar las consultas)
+        vectorizador = VectorizadorConsultas()
+        self.stdout.write('📥 Cargando modelo (esto puede tardar en primera vez)...')
+        vectorizador._cargar_modelo()
+        if vectorizador.modelo is None:
+            self.stdout.write(self.style.ERROR('❌ No se pudo cargar el modelo (¿SOFIA_LITE_MODE o sin conexión?)'))
             return
+        self.stdout.write(self.style.SUCCESS('✅ Modelo cargado'))
         
         # Procesar todos los vectores
-        vectores = VectorConsulta.objects.all()
-        total = vectores.count()
+        vectores = list(VectorConsulta.objects.all())
+        total = len(vectores)
         
         if total == 0:
             self.stdout.write(self.style.WARNING('⚠️ No hay vectores para procesar'))
@@ -42,16 +38,14 @@ class Command(BaseCommand):
         
         self.stdout.write(f'📊 Procesando {total} vectores...')
         
-        for i, vector in enumerate(vectores, 1):
+        # Un solo encode por lotes (los textos ya vistos salen del cache de embeddings)
+        inicio = time.monotonic()
+        embeddings = vectorizador.vectorizar_lote([vector.texto_original for vector in vectores])
+        self.stdout.write(f'⚡ Embeddings calculados en {time.monotonic() - inicio:.1f} s')
+        
+        for i, (vector, embedding) in enumerate(zip(vectores, embeddings), 1):
             try:
-                # Generar embedding real
-                embedding = modelo.encode(
-                    vector.texto_original,
-                    convert_to_numpy=True
-                )
-                
-                # Guardar
-                vector.vector_embedding = embedding.tolist()
+                vector.vector_embedding = embedding
                 
                 # Ajustar threshold para embeddings reales
                 # Estos embeddings son mucho mejores, podemos usar un threshold normal
@@ -74,4 +68,3 @@ class Command(BaseCommand):
         
         self.stdout.write(self.style.SUCCESS(f'\n✅ Se generaron embeddings reales para {total} vectores'))
         self.stdout.write(self.style.WARNING('\n⚠️ Ahora Sofia usará IA real para procesar las consultas!'))
-
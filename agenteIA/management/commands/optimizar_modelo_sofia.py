@@ -0,0 +1,113 @@
+"""
+Comando para exportar el modelo de Sofía a ONNX int8 y verificar su paridad con PyTorch
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from agenteIA.modelo_embeddings import (
+    ARCHIVO_ONNX_INT8, MODELO_EMBEDDINGS, ONNX, ONNX_INT8, TORCH, cargar_modelo, comparar_embeddings,
+    ruta_modelo_onnx,
+)
+from agenteIA.precarga import FRASES_CALENTAMIENTO
+
+
+class Command(BaseCommand):
+    help = 'Exporta el modelo de embeddings a ONNX cuantizado (int8) y lo compara contra PyTorch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cuantizacion',
+            choices=['avx2', 'avx512', 'avx512_vnni', 'arm64'],
+            default='avx2',
+            help='Instrucciones del CPU de producción (default: avx2)',
+        )
+        parser.add_argument(
+            '--solo-verificar',
+            action='store_true',
+            help='No exportar, solo comparar el modelo ya exportado',
+        )
+        parser.add_argument(
+            '--umbral',
+            type=float,
+            default=0.98,
+            help='Coseno mínimo aceptable entre los embeddings de ambos backends (default: 0.98)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+        except ImportError:
+            self.stdout.write(self.style.ERROR('❌ Se necesita sentence-transformers >= 3.2 con optimum[onnxruntime]'))
+            self.stdout.write(self.style.WARNING('Instala con: pip install "optimum[onnxruntime]"'))
+            return
+
+        destino = ruta_modelo_onnx()
+        cuantizacion = options['cuantizacion']
+        archivo = None
+
+        if not options['solo_verificar']:
+            self.stdout.write(f'📥 Exportando {MODELO_EMBEDDINGS} a ONNX en {destino}...')
+            try:
+                modelo_onnx = cargar_modelo(ONNX)
+                modelo_onnx.save(destino)
+                export_dynamic_quantized_onnx_model(modelo_onnx, cuantizacion, destino)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'❌ Error exportando el modelo: {e}'))
+                return
+            onnx_dir = os.path.join(destino, 'onnx')
+            archivos = sorted(nombre for nombre in os.listdir(onnx_dir) if cuantizacion in nombre)
+            if not archivos:
+                self.stdout.write(self.style.ERROR(f'❌ No se encontró el modelo cuantizado en {onnx_dir}'))
+                return
+            archivo = f'onnx/{archivos[0]}'
+            tamano = os.path.getsize(os.path.join(destino, archivo)) / 1024 / 1024
+            self.stdout.write(self.style.SUCCESS(f'✅ Modelo cuantizado: {archivo} ({tamano:.0f} MB)'))
+
+        # Paridad: los ejemplos guardados se calcularon con PyTorch
+        textos = self._textos_verificacion()
+        self.stdout.write(f'📊 Comparando {len(textos)} textos con PyTorch...')
+        try:
+            referencia, segundos_torch = self._encode(cargar_modelo(TORCH), textos)
+            candidato, segundos_int8 = self._encode(cargar_modelo(ONNX_INT8, archivo), textos)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'❌ Error cargando los modelos: {e}'))
+            return
+
+        paridad = comparar_embeddings(referencia, candidato)
+        self.stdout.write(f"   coseno mínimo:      {paridad['coseno_min']}")
+        self.stdout.write(f"   coseno promedio:    {paridad['coseno_promedio']}")
+        self.stdout.write(f"   coincidencia top-1: {paridad['coincidencia_top1'] * 100:.1f} %")
+        self.stdout.write(f'   encode PyTorch:     {segundos_torch * 1000 / len(textos):.2f} ms/texto')
+        self.stdout.write(f'   encode ONNX int8:   {segundos_int8 * 1000 / len(textos):.2f} ms/texto')
+
+        if paridad['coseno_min'] < options['umbral']:
+            self.stdout.write(self.style.ERROR(
+                f"❌ El coseno mínimo {paridad['coseno_min']} está por debajo de {options['umbral']}: "
+                f"no conviene usar onnx-int8 con los embeddings actuales"
+            ))
+            return
+
+        self.stdout.write(self.style.SUCCESS('\n✅ Paridad aceptable. Para activarlo:'))
+        self.stdout.write(f'   SOFIA_MODELO_BACKEND={ONNX_INT8}')
+        if archivo and archivo != ARCHIVO_ONNX_INT8:
+            self.stdout.write(f'   SOFIA_MODELO_ONNX_ARCHIVO={archivo}')
+        self.stdout.write(self.style.WARNING(
+            '⚠️ Después correr generar_embeddings_reales para recalcular los ejemplos con el mismo backend'
+        ))
+
+    def _textos_verificacion(self):
+        from agenteIA.models import VectorConsulta
+        from agenteIA.vectorizador import VectorizadorConsultas
+
+        normalizar = VectorizadorConsultas()._normalize_text
+        textos = VectorConsulta.objects.values_list('texto_original', flat=True)
+        textos = list(dict.fromkeys(normalizar(texto) for texto in textos if texto))
+        return textos or list(FRASES_CALENTAMIENTO)
+
+    def _encode(self, modelo, textos):
+        modelo.encode(textos[:8], convert_to_numpy=True)
+        inicio = time.monotonic()
+        embeddings = modelo.encode(textos, batch_size=64, convert_to_numpy=True)
+        return embeddings, time.monotonic() - inicio
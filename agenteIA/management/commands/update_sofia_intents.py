@@ -787,11 +787,11 @@ class Command(BaseCommand):
             },
         ]
 
+        # Calcular todos los vectores en lote
+        vectores = vectorizador.vectorizar_lote([item['texto'] for item in nuevos_intents])
+        
         count = 0
-        for item in nuevos_intents:
-            # Calcular vector
-            vector = vectorizador.vectorizar(item['texto'])
-            
+        for item, vector in zip(nuevos_intents, vectores):
             # Crear o actualizar
             obj, created = VectorConsulta.objects.update_or_create(
                 texto_original=item['texto'],
@@ -32,301 +32,357 @@ def normalizar_texto(texto: str, mayusculas: bool = True) -> str:
     return texto_sin_tilde.upper() if mayusculas else texto_sin_tilde.lower()
 
 
+# Patrones por intención. Se compilan una sola vez al importar el módulo (una
+# alternancia por intención), no en cada consulta.
+PATRONES: Dict[str, List[str]] = {
+    'POSICION': [
+        r'd(ó|o)nde.*est(a|á)',
+        r'd(ó|o)nde.*(se\s+encuentra|queda)',
+        r'ubicaci(o|ó)n',
+        r'posici(o|ó)n',
+        r'd(ó|o)nde.*est(a|á).*ahora',
+        r'localizaci(o|ó)n',
+        r'd(ó|o)nde.*anda',
+        # Sin verbo: "donde asn 773" o similares
+        r'd(ó|o)nde\s+[a-zA-Z]{2,5}\s*\d{2,5}',
+    ],
+    'RECORRIDO': [
+        r'(qu(e|é)|que).*hic(o|ó)',
+        r'd(ó|o)nde.*estuv(o|ó)',
+        r'recorrid(o|ó)',
+        r'historial',
+        r'ayer',
+        r'pasado',
+        r'a\s+que\s+distancia',
+        r'a\s+cu[aá]nt[oa]?\s+tiempo',
+        r'cu[aá]nt[oa]?\s+tiempo\s+est[aá]',
+    ],
+    'SALUDO': [
+        r'hola',
+        r'buenos\s*(d(i|í)as|tardes|noches)',
+        r'buen\s*(d(i|í)a|tarde|noche)',
+        r'hi',
+    ],
+    'COMANDO_WHATSAPP': [
+        r'envi(a|ar).*whatsapp',
+        r'compart(e|ir).*whatsapp',
+        r'mand(a|ar).*whatsapp',
+        r'pas(a|ar).*whatsapp',
+        r'whatsapp.*ubicaci(o|ó)n',
+        r'whatsapp.*posici(o|ó)n',
+        r'por\s+whatsapp',
+        r'por\s+wsp',
+        r'env(i|í)a.*por.*whatsapp',
+    ],
+    'LLEGADA': [
+        r'llega',
+        r'tiempo.*llegada',
+        r'cu(á|a)ndo.*lleg(a|ar)',
+        r'estimaci(o|ó)n',
+        r'cu[aá]nt[oa]?\s+tardar[ií]a?\s+hasta',
+        r'cu[aá]nt[oa]?\s+demorar[ií]a?\s+hasta',
+        r'cu[aá]nt[oa]?\s+tarda\s+hasta',
+        r'cu[aá]nt[oa]?\s+demora\s+hasta',
+        r'cu[aá]nt[oa]?\s+tardar[ií]a?\s+en\s+llegar\s+a',
+        r'cu[aá]nt[oa]?\s+demorar[ií]a?\s+en\s+llegar\s+a',
+        # Patrones específicos para "cuanto tarda a [destino]"
+        r'cu[aá]nt[oa]?\s+tarda\s+a\s+',
+        r'cu[aá]nt[oa]?\s+tardar[ií]a?\s+a\s+',
+        r'cu[aá]nt[oa]?\s+demora\s+a\s+',
+        r'cu[aá]nt[oa]?\s+demorar[ií]a?\s+a\s+',
+        r'cu[aá]nt[oa]?\s+tiempo\s+tarda\s+(?:en\s+)?llegar\s+a\s+',
+        r'cu[aá]nt[oa]?\s+tiempo\s+demora\s+(?:en\s+)?llegar\s+a\s+',
+    ],
+    'UBICACION_ZONA': [
+        r'd(ó|o)nde\s+est(a|á)\s+(?:la\s+)?zona',
+        r'd(ó|o)nde\s+queda\s+(?:la\s+)?zona',
+        r'ubicaci(o|ó)n\s+de\s+(?:la\s+)?zona',
+        r'direcci(o|ó)n\s+de\s+(?:la\s+)?zona',
+        r'domicilio\s+de\s+(?:la\s+)?zona',
+        r'cu(a|á)l\s+es\s+la\s+direcci(o|ó)n\s+de\s+(?:la\s+)?zona',
+        r'cu(a|á)l\s+es\s+el\s+domicilio\s+de\s+(?:la\s+)?zona',
+        r'd(ó|o)nde\s+se\s+encuentra\s+(?:la\s+)?zona',
+        r'd(ó|o)nde\s+se\s+ubica\s+(?:la\s+)?zona',
+        r'd(ó|o)nde\s+(?:est(a|á)|queda|se\s+encuentra|se\s+ubica)\s+(?:el|la)\s+(?:dep(o|ó)sito|almac(e|é)n|zona|base|sede|oficina|planta)',
+        r'ubicaci(o|ó)n\s+(?:del|de\s+la|de)\s+(?:dep(o|ó)sito|almac(e|é)n|zona|base|sede|oficina|planta)',
+        r'direcci(o|ó)n\s+(?:del|de\s+la|de)\s+(?:dep(o|ó)sito|almac(e|é)n|zona|base|sede|oficina|planta)',
+        r'domicilio\s+(?:del|de\s+la|de)\s+(?:dep(o|ó)sito|almac(e|é)n|zona|base|sede|oficina|planta)',
+        r'cu(a|á)l\s+es\s+(?:la\s+)?(?:ubicaci(o|ó)n|direcci(o|ó)n|domicilio)\s+(?:del|de\s+la|de)\s+(?:dep(o|ó)sito|almac(e|é)n|zona|base|sede|oficina|planta)',
+    ],
+    'CERCANIA': [
+        r'cercan[oa]s?',
+        r'cerca\s*(de|del|de la|a)',
+        r'proxim[oa]s?',
+        r'qu[eé]\s+m[oó]vil(es)?\s+est[aá]n?\s+m[aá]s\s+cerca',
+        r'cual(es)?\s+son\s+los?\s+m[oó]viles?\s+m[aá]s\s+cercan[oa]s?',
+        r'a\s+que\s+distancia\s+est[aá]',
+        r'a\s+cu[aá]nt[oa]?\s+tiempo\s+est[aá]',
+        r'cu[aá]nt[oa]?\s+tiempo\s+tarda',
+        r'cu[aá]nt[oa]?\s+tardar[ií]a?\s+en\s+llegar',
+        r'a\s+cu[aá]nto\s+est[aá]\s+de',
+        r'en\s+cu[aá]nto\s+est[aá]\s+(?:de|a)',
+        r'en\s+cu[aá]nto\s+llegar[aá]\s+a',
+        r'cu[aá]nt[oa]?\s+demora\s+en\s+llegar\s+a',
+        r'a\s+qu[eé]\s+distancia\s+est[aá]\s+(?:de|a)',
+        r'cu[aá]nt[oa]?\s+est[aá]\s+el\s+(camion|vehiculo|movil)\s+\w+\s+(?:de|del|de\s+el)\s+(camion|vehiculo|movil)\s+\w+',
+        r'a\s+qu[eé]\s+distancia\s+est[aá]\s+el\s+(camion|vehiculo|movil)\s+\w+\s+(?:de|del|de\s+el)\s+(camion|vehiculo|movil)\s+\w+',
+    ],
+    'LISTADO_ACTIVOS': [
+        r'listado',
+        r'lista\s+de\s+m[oó]viles?\s+activ[oa]s?',
+        r'quienes?\s+est[aá]n?\s+conectad[oa]s?',
+        r'quienes?\s+reportaron',
+        r'm[oó]viles?\s+activ[oa]s?',
+        r'quienes?\s+est[aá]n?\s+activ[oa]s?',
+        r'quienes?\s+est[aá]n?\s+en\s+linea',
+    ],
+    'SITUACION_FLOTA': [
+        r'situaci[oó]n\s+(?:de\s+(?:la\s+)?)?flota',
+        r'situaci[oó]n\s+flota',
+        r'estado\s+(?:de\s+(?:la\s+)?)?flota',
+        r'resumen\s+(?:de\s+)?flota',
+        r'cuantos?\s+est[aá]n?\s+circulando',
+        r'cuantos?\s+est[aá]n?\s+detenid[oa]s?',
+        r'm[oó]viles?\s+detenid[oa]s?',
+        r'm[oó]viles?\s+circulando',
+        r'estado\s+operativo',
+        r'decime\s+los\s+m[oó]viles?\s+detenid[oa]s?',
+        r'decime\s+los\s+m[oó]viles?\s+circulando',
+        r'cuales?\s+son\s+los?\s+m[oó]viles?\s+detenid[oa]s?',
+        r'cuales?\s+son\s+los?\s+m[oó]viles?\s+circulando',
+    ],
+    'MOVILES_EN_ZONA': [
+        r'm[oó]viles?\s+en\s+zona',
+        r'quienes?\s+est[aá]n?\s+en\s+(?:la\s+)?zona',
+        r'quien\s+est[aá]\s+en\s+(?:la\s+)?zona',
+        r'm[oó]viles?\s+dentro\s+de\s+(?:la\s+)?zona',
+        r'quienes?\s+est[aá]n?\s+en\s+el\s+dep[oó]sito',
+        r'quienes?\s+est[aá]n?\s+en\s+el\s+almac[eé]n',
+    ],
+    'MOVILES_FUERA_DE_ZONA': [
+        r'm[oó]viles?\s+fuera\s+de\s+(?:la\s+)?zona',
+        r'm[oó]viles?\s+afuera\s+de\s+(?:la\s+)?zona',
+        r'veh[ií]culos?\s+fuera\s+de\s+(?:la\s+)?zona',
+        r'veh[ií]culos?\s+afuera\s+de\s+(?:la\s+)?zona',
+        r'que\s+(?:m[oó]viles?|veh[ií]culos?)\s+est[aá]n?\s+fuera\s+de',
+        r'que\s+(?:m[oó]viles?|veh[ií]culos?)\s+est[aá]n?\s+afuera\s+de',
+        r'que\s+veh[ií]culo\s+est[aá]n?\s+fuera\s+de',
+        r'que\s+veh[ií]culo\s+est[aá]n?\s+afuera\s+de',
+        r'quienes?\s+est[aá]n?\s+fuera\s+de\s+(?:la\s+)?zona',
+        r'quienes?\s+est[aá]n?\s+afuera\s+de\s+(?:la\s+)?zona',
+        r'm[oó]viles?\s+que\s+no\s+est[aá]n?\s+en\s+(?:la\s+)?zona',
+        r'veh[ií]culos?\s+que\s+no\s+est[aá]n?\s+en\s+(?:la\s+)?zona',
+        r'que\s+(?:m[oó]viles?|veh[ií]culos?)\s+no\s+est[aá]n?\s+en\s+(?:la\s+)?zona',
+        r'quienes?\s+no\s+est[aá]n?\s+en\s+(?:la\s+)?zona',
+        r'm[oó]viles?\s+fuera\s+del\s+dep[oó]sito',
+        r'm[oó]viles?\s+fuera\s+del\s+almac[eé]n',
+        r'cuales?\s+salieron\s+de',
+        r'quienes?\s+salieron\s+de',
+        r'quien\s+salio\s+de',
+        r'quien\s+sali[oó]\s+de',
+    ],
+    'INGRESO_A_ZONA': [
+        r'ingreso\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona\s+\w+',
+        r'ingreso\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
+        r'ingres[oó]\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona\s+\w+',
+        r'ingres[oó]\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
+        r'entr[oó]\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona\s+\w+',
+        r'entr[oó]\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
+        r'entro\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona\s+\w+',
+        r'entro\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
+        r'entrada\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona\s+\w+',
+        r'entrada\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
+        r'cu[aá]ndo\s+ingres[oó]\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
+        r'cu[aá]ndo\s+ingreso\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
+        r'cu[aá]ndo\s+entr[oó]\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
+        r'cu[aá]ndo\s+entrada\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
+        r'a\s+que\s+hora\s+(?:ingres[oó]|ingreso|entr[oó]|entro|entrada)\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
+        r'en\s+que\s+momento\s+(?:ingres[oó]|ingreso|entr[oó]|entro|entrada)\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
+        # Patrones con orden diferente: "entro el movil X a zona Y"
+        r'(?:ingres[oó]|ingreso|entr[oó]|entro|entrada)\s+(?:el\s+)?(?:movil|móvil|vehiculo|vehículo|camion|camión|auto)\s+\w+\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
+        r'a\s+que\s+hora\s+(?:ingres[oó]|ingreso|entr[oó]|entro|entrada)\s+(?:el\s+)?(?:movil|móvil|vehiculo|vehículo|camion|camión|auto)\s+\w+\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
+        r'en\s+que\s+momento\s+(?:ingres[oó]|ingreso|entr[oó]|entro|entrada)\s+(?:el\s+)?(?:movil|móvil|vehiculo|vehículo|camion|camión|auto)\s+\w+\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
+    ],
+    'SALIO_DE_ZONA': [
+        r'sali[oó]\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona\s+\w+',
+        r'sali[oó]\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
+        r'salido\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona\s+\w+',
+        r'salido\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
+        r'salida\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona\s+\w+',
+        r'salida\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
+        r'cu[aá]ndo\s+sali[oó]\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
+        r'cu[aá]ndo\s+salido\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
+        r'cu[aá]ndo\s+salida\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
+        r'cu[aá]ndo\s+se\s+sali[oó]\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
+        r'cu[aá]ndo\s+se\s+salio\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
+        r'a\s+que\s+hora\s+(?:sali[oó]|salido|salida|se\s+sali[oó])\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
+        r'en\s+que\s+momento\s+(?:sali[oó]|salido|salida|se\s+sali[oó])\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
+        # Patrones con orden diferente: "salió el movil X de zona Y"
+        r'sali[oó]\s+(?:el\s+)?(?:movil|móvil|vehiculo|vehículo|camion|camión|auto)\s+\w+\s+de\s+(?:la\s+)?zona',
+        r'cu[aá]ndo\s+sali[oó]\s+(?:el\s+)?(?:movil|móvil|vehiculo|vehículo|camion|camión|auto)\s+\w+\s+de\s+(?:la\s+)?zona',
+        r'a\s+que\s+hora\s+(?:sali[oó]|salido)\s+(?:el\s+)?(?:movil|móvil|vehiculo|vehículo|camion|camión|auto)\s+\w+\s+de\s+(?:la\s+)?zona',
+        r'en\s+que\s+momento\s+(?:sali[oó]|salido)\s+(?:el\s+)?(?:movil|móvil|vehiculo|vehículo|camion|camión|auto)\s+\w+\s+de\s+(?:la\s+)?zona',
+    ],
+    'PASO_POR_ZONA': [
+        r'pas[oó]\s+(?:por|por\s+la)\s+(?:la\s+)?zona\s+\w+',
+        r'pas[oó]\s+(?:por|por\s+la)\s+(?:la\s+)?zona',
+        r'paso\s+(?:por|por\s+la)\s+(?:la\s+)?zona\s+\w+',
+        r'paso\s+(?:por|por\s+la)\s+(?:la\s+)?zona',
+        r'pas[oó]\s+(?:por|por\s+la)\s+(?:el|la)\s+(?:dep[oó]sito|almac[eé]n|zona)',
+        r'cu[aá]ndo\s+pas[oó]\s+(?:por|por\s+la)\s+(?:la\s+)?zona',
+        r'cu[aá]ndo\s+paso\s+(?:por|por\s+la)\s+(?:la\s+)?zona',
+        r'a\s+que\s+hora\s+pas[oó]\s+(?:por|por\s+la)\s+(?:la\s+)?zona',
+        r'en\s+que\s+momento\s+pas[oó]\s+(?:por|por\s+la)\s+(?:la\s+)?zona',
+        r'estuvo\s+(?:en|en\s+la)\s+(?:la\s+)?zona\s+\w+',
+        r'estuvo\s+(?:en|en\s+la)\s+(?:la\s+)?zona',
+        r'estuvo\s+(?:en|en\s+el)\s+(?:dep[oó]sito|almac[eé]n)',
+    ],
+    'AYUDA_GENERAL': [
+        r'ayuda',
+        r'que\s+puedes?\s+hacer',
+        r'que\s+sabes?\s+hacer',
+        r'lista\s+de\s+comandos',
+        r'ayuda\s+con\s+comandos',
+        r'comandos\s+disponibles',
+        r'que\s+comandos\s+hay',
+        r'como\s+te\s+uso',
+        r'que\s+haces',
+    ],
+    'VER_MAPA': [
+        r'mostrar\s+en\s+mapa',
+        r'ver\s+en\s+mapa',
+        r'mostrar\s+en\s+google',
+        r'ver\s+en\s+google',
+        r'abrir\s+mapa',
+        r'abrir\s+google\s+map',
+        r'mapa\s+de',
+    ],
+}
+
+# Orden en que ProcesadorSimple evalúa las intenciones
+TIPOS = [
+    'POSICION', 'RECORRIDO', 'COMANDO_WHATSAPP', 'LLEGADA', 'CERCANIA', 'UBICACION_ZONA', 'SALUDO',
+    'LISTADO_ACTIVOS', 'SITUACION_FLOTA', 'MOVILES_EN_ZONA', 'MOVILES_FUERA_DE_ZONA',
+    'INGRESO_A_ZONA', 'SALIO_DE_ZONA', 'PASO_POR_ZONA', 'AYUDA_GENERAL', 'VER_MAPA',
+]
+
+
+def _compilar_alternancia(patrones: List[str]) -> re.Pattern:
+    """Un solo regex `(?:p1)|(?:p2)|...`: coincide si coincide alguno de los patrones"""
+    return re.compile('|'.join(f'(?:{patron})' for patron in patrones), re.IGNORECASE)
+
+
+PATRONES_COMPILADOS: Dict[str, re.Pattern] = {
+    tipo: _compilar_alternancia(patrones) for tipo, patrones in PATRONES.items()
+}
+
+# Heurísticas de MOVILES_FUERA_DE_ZONA y CERCANIA (sobre el texto normalizado en minúsculas)
+RE_VEHICULOS = re.compile(r'\b(?:veh[ií]culos?|m[oó]viles?)\b', re.IGNORECASE)
+RE_FUERA_DE = re.compile(r'\b(?:fuera|afuera|salieron?|sali[oó])\s+de\b', re.IGNORECASE)
+RE_NO_ESTAN = re.compile(r'\bno\s+est[aá]n?\s+en\b', re.IGNORECASE)
+RE_QUE_VEHICULOS = re.compile(r'\bque\s+(?:veh[ií]culos?|m[oó]viles?)\b', re.IGNORECASE)
+KEYWORDS_CERCANIA = ('cerca', 'distancia', 'cuanto esta', 'cuanto tarda', 'cuanto demora', 'tiempo')
+
+# Palabras auxiliares de ProcesadorSimple (sobre el texto original en minúsculas)
+RE_PALABRA_ZONA = re.compile(r'\b(?:zona|dep(o|ó)sito|almac(e|é)n|base|sede|oficina|planta)\b', re.IGNORECASE)
+RE_PALABRA_WHATSAPP = re.compile(r'\b(?:whatsapp|wsp|wapp|envi[aá]|compart[eí]|mand[aá]|pas[aá])\b', re.IGNORECASE)
+RE_PALABRA_CERCANIA = re.compile(r'\b(?:cerca|cercano|distancia|proximo|próximo)\b', re.IGNORECASE)
+
+PATRONES_MOVIL = [
+    # Patente formato "letras-números-letras" (ej: AA285TA, JGI640)
+    (re.compile(r'\b([A-Z]{2,3})\s*(\d{2,4})\s*([A-Z]{1,3})\b', re.IGNORECASE),
+     lambda m: m.group(1) + m.group(2) + m.group(3)),
+    # Patente formato "letras-números" (ej: ASN773, OVV799)
+    (re.compile(r'\b([A-Z]{2,5}\d{2,4})\b', re.IGNORECASE), lambda m: m.group(1)),
+    (re.compile(r'\b([A-Z]{2,5})\s*(\d{2,4})\b', re.IGNORECASE), lambda m: m.group(1) + m.group(2)),
+    # Patente formato "números-letras-números" (menos común)
+    (re.compile(r'\b(\d{1,3})\s*([A-Z]{2,3})\s*(\d{1,3})\b', re.IGNORECASE),
+     lambda m: m.group(1) + m.group(2) + m.group(3)),
+    # Nombres específicos (CAMION5, MOVIL3, etc.)
+    (re.compile(r'\b(?:CAMION|CAMIÓN|MOVIL|MÓVIL|VEHICULO|VEHÍCULO)\s*(\d{1,4})\b', re.IGNORECASE),
+     lambda m: re.sub(r'\s+', '', m.group(0))),
+    # Patrón genérico (fallback)
+    (re.compile(r'\b([A-Z]+)\s*(\d{1,4})\b', re.IGNORECASE), lambda m: m.group(1) + m.group(2)),
+    (re.compile(r'\b([A-Z]+\d{1,4})\b', re.IGNORECASE), lambda m: m.group(1)),
+]
+
+NUMEROS_MAP = {
+    'CERO': '0', 'UNO': '1', 'UN': '1', 'UNA': '1',
+    'DOS': '2', 'TRES': '3', 'CUATRO': '4', 'CINCO': '5',
+    'SEIS': '6', 'SIETE': '7', 'OCHO': '8', 'NUEVE': '9',
+    'DIEZ': '10', 'ONCE': '11', 'DOCE': '12', 'TRECE': '13',
+    'CATORCE': '14', 'QUINCE': '15', 'DIECISEIS': '16', 'DIECISÉIS': '16',
+    'DIECISIETE': '17', 'DIECIOCHO': '18', 'DIECINUEVE': '19', 'VEINTE': '20',
+}
+RE_NUMEROS = re.compile(r'\b(' + '|'.join(NUMEROS_MAP.keys()) + r')\b')
+
+
+def quitar_tildes(texto: str) -> str:
+    """Quita las marcas diacríticas (NFD), conservando mayúsculas y signos"""
+    return ''.join(
+        c for c in unicodedata.normalize('NFD', texto)
+        if unicodedata.category(c) != 'Mn'
+    )
+
+
 class SimpleMatcher:
     """Matcher simple basado en palabras clave"""
 
     def __init__(self):
-        self.patrones = {
-            'POSICION': [
-                r'd(ó|o)nde.*est(a|á)',
-                r'd(ó|o)nde.*(se\s+encuentra|queda)',
-                r'ubicaci(o|ó)n',
-                r'posici(o|ó)n',
-                r'd(ó|o)nde.*est(a|á).*ahora',
-                r'localizaci(o|ó)n',
-                r'd(ó|o)nde.*anda',
-                # Sin verbo: "donde asn 773" o similares
-                r'd(ó|o)nde\s+[a-zA-Z]{2,5}\s*\d{2,5}',
-            ],
-            'RECORRIDO': [
-                r'(qu(e|é)|que).*hic(o|ó)',
-                r'd(ó|o)nde.*estuv(o|ó)',
-                r'recorrid(o|ó)',
-                r'historial',
-                r'ayer',
-                r'pasado',
-                r'a\s+que\s+distancia',
-                r'a\s+cu[aá]nt[oa]?\s+tiempo',
-                r'cu[aá]nt[oa]?\s+tiempo\s+est[aá]',
-            ],
-            'SALUDO': [
-                r'hola',
-                r'buenos\s*(d(i|í)as|tardes|noches)',
-                r'buen\s*(d(i|í)a|tarde|noche)',
-                r'hi',
-            ],
-            'COMANDO_WHATSAPP': [
-                r'envi(a|ar).*whatsapp',
-                r'compart(e|ir).*whatsapp',
-                r'mand(a|ar).*whatsapp',
-                r'pas(a|ar).*whatsapp',
-                r'whatsapp.*ubicaci(o|ó)n',
-                r'whatsapp.*posici(o|ó)n',
-                r'por\s+whatsapp',
-                r'por\s+wsp',
-                r'env(i|í)a.*por.*whatsapp',
-            ],
-            'LLEGADA': [
-                r'llega',
-                r'tiempo.*llegada',
-                r'cu(á|a)ndo.*lleg(a|ar)',
-                r'estimaci(o|ó)n',
-                r'cu[aá]nt[oa]?\s+tardar[ií]a?\s+hasta',
-                r'cu[aá]nt[oa]?\s+demorar[ií]a?\s+hasta',
-                r'cu[aá]nt[oa]?\s+tarda\s+hasta',
-                r'cu[aá]nt[oa]?\s+demora\s+hasta',
-                r'cu[aá]nt[oa]?\s+tardar[ií]a?\s+en\s+llegar\s+a',
-                r'cu[aá]nt[oa]?\s+demorar[ií]a?\s+en\s+llegar\s+a',
-                # Patrones específicos para "cuanto tarda a [destino]"
-                r'cu[aá]nt[oa]?\s+tarda\s+a\s+',
-                r'cu[aá]nt[oa]?\s+tardar[ií]a?\s+a\s+',
-                r'cu[aá]nt[oa]?\s+demora\s+a\s+',
-                r'cu[aá]nt[oa]?\s+demorar[ií]a?\s+a\s+',
-                r'cu[aá]nt[oa]?\s+tiempo\s+tarda\s+(?:en\s+)?llegar\s+a\s+',
-                r'cu[aá]nt[oa]?\s+tiempo\s+demora\s+(?:en\s+)?llegar\s+a\s+',
-            ],
-            'UBICACION_ZONA': [
-                r'd(ó|o)nde\s+est(a|á)\s+(?:la\s+)?zona',
-                r'd(ó|o)nde\s+queda\s+(?:la\s+)?zona',
-                r'ubicaci(o|ó)n\s+de\s+(?:la\s+)?zona',
-                r'direcci(o|ó)n\s+de\s+(?:la\s+)?zona',
-                r'domicilio\s+de\s+(?:la\s+)?zona',
-                r'cu(a|á)l\s+es\s+la\s+direcci(o|ó)n\s+de\s+(?:la\s+)?zona',
-                r'cu(a|á)l\s+es\s+el\s+domicilio\s+de\s+(?:la\s+)?zona',
-                r'd(ó|o)nde\s+se\s+encuentra\s+(?:la\s+)?zona',
-                r'd(ó|o)nde\s+se\s+ubica\s+(?:la\s+)?zona',
-                r'd(ó|o)nde\s+(?:est(a|á)|queda|se\s+encuentra|se\s+ubica)\s+(?:el|la)\s+(?:dep(o|ó)sito|almac(e|é)n|zona|base|sede|oficina|planta)',
-                r'ubicaci(o|ó)n\s+(?:del|de\s+la|de)\s+(?:dep(o|ó)sito|almac(e|é)n|zona|base|sede|oficina|planta)',
-                r'direcci(o|ó)n\s+(?:del|de\s+la|de)\s+(?:dep(o|ó)sito|almac(e|é)n|zona|base|sede|oficina|planta)',
-                r'domicilio\s+(?:del|de\s+la|de)\s+(?:dep(o|ó)sito|almac(e|é)n|zona|base|sede|oficina|planta)',
-                r'cu(a|á)l\s+es\s+(?:la\s+)?(?:ubicaci(o|ó)n|direcci(o|ó)n|domicilio)\s+(?:del|de\s+la|de)\s+(?:dep(o|ó)sito|almac(e|é)n|zona|base|sede|oficina|planta)',
-            ],
-            'CERCANIA': [
-                r'cercan[oa]s?',
-                r'cerca\s*(de|del|de la|a)',
-                r'proxim[oa]s?',
-                r'qu[eé]\s+m[oó]vil(es)?\s+est[aá]n?\s+m[aá]s\s+cerca',
-                r'cual(es)?\s+son\s+los?\s+m[oó]viles?\s+m[aá]s\s+cercan[oa]s?',
-                r'a\s+que\s+distancia\s+est[aá]',
-                r'a\s+cu[aá]nt[oa]?\s+tiempo\s+est[aá]',
-                r'cu[aá]nt[oa]?\s+tiempo\s+tarda',
-                r'cu[aá]nt[oa]?\s+tardar[ií]a?\s+en\s+llegar',
-                r'a\s+cu[aá]nto\s+est[aá]\s+de',
-                r'en\s+cu[aá]nto\s+est[aá]\s+(?:de|a)',
-                r'en\s+cu[aá]nto\s+llegar[aá]\s+a',
-                r'cu[aá]nt[oa]?\s+demora\s+en\s+llegar\s+a',
-                r'a\s+qu[eé]\s+distancia\s+est[aá]\s+(?:de|a)',
-                r'cu[aá]nt[oa]?\s+est[aá]\s+el\s+(camion|vehiculo|movil)\s+\w+\s+(?:de|del|de\s+el)\s+(camion|vehiculo|movil)\s+\w+',
-                r'a\s+qu[eé]\s+distancia\s+est[aá]\s+el\s+(camion|vehiculo|movil)\s+\w+\s+(?:de|del|de\s+el)\s+(camion|vehiculo|movil)\s+\w+',
-            ],
-            'LISTADO_ACTIVOS': [
-                r'listado',
-                r'lista\s+de\s+m[oó]viles?\s+activ[oa]s?',
-                r'quienes?\s+est[aá]n?\s+conectad[oa]s?',
-                r'quienes?\s+reportaron',
-                r'm[oó]viles?\s+activ[oa]s?',
-                r'quienes?\s+est[aá]n?\s+activ[oa]s?',
-                r'quienes?\s+est[aá]n?\s+en\s+linea',
-            ],
-            'SITUACION_FLOTA': [
-                r'situaci[oó]n\s+(?:de\s+(?:la\s+)?)?flota',
-                r'situaci[oó]n\s+flota',
-                r'estado\s+(?:de\s+(?:la\s+)?)?flota',
-                r'resumen\s+(?:de\s+)?flota',
-                r'cuantos?\s+est[aá]n?\s+circulando',
-                r'cuantos?\s+est[aá]n?\s+detenid[oa]s?',
-                r'm[oó]viles?\s+detenid[oa]s?',
-                r'm[oó]viles?\s+circulando',
-                r'estado\s+operativo',
-                r'decime\s+los\s+m[oó]viles?\s+detenid[oa]s?',
-                r'decime\s+los\s+m[oó]viles?\s+circulando',
-                r'cuales?\s+son\s+los?\s+m[oó]viles?\s+detenid[oa]s?',
-                r'cuales?\s+son\s+los?\s+m[oó]viles?\s+circulando',
-            ],
-            'MOVILES_EN_ZONA': [
-                r'm[oó]viles?\s+en\s+zona',
-                r'quienes?\s+est[aá]n?\s+en\s+(?:la\s+)?zona',
-                r'quien\s+est[aá]\s+en\s+(?:la\s+)?zona',
-                r'm[oó]viles?\s+dentro\s+de\s+(?:la\s+)?zona',
-                r'quienes?\s+est[aá]n?\s+en\s+el\s+dep[oó]sito',
-                r'quienes?\s+est[aá]n?\s+en\s+el\s+almac[eé]n',
-            ],
-            'MOVILES_FUERA_DE_ZONA': [
-                r'm[oó]viles?\s+fuera\s+de\s+(?:la\s+)?zona',
-                r'm[oó]viles?\s+afuera\s+de\s+(?:la\s+)?zona',
-                r'veh[ií]culos?\s+fuera\s+de\s+(?:la\s+)?zona',
-                r'veh[ií]culos?\s+afuera\s+de\s+(?:la\s+)?zona',
-                r'que\s+(?:m[oó]viles?|veh[ií]culos?)\s+est[aá]n?\s+fuera\s+de',
-                r'que\s+(?:m[oó]viles?|veh[ií]culos?)\s+est[aá]n?\s+afuera\s+de',
-                r'que\s+veh[ií]culo\s+est[aá]n?\s+fuera\s+de',
-                r'que\s+veh[ií]culo\s+est[aá]n?\s+afuera\s+de',
-                r'quienes?\s+est[aá]n?\s+fuera\s+de\s+(?:la\s+)?zona',
-                r'quienes?\s+est[aá]n?\s+afuera\s+de\s+(?:la\s+)?zona',
-                r'm[oó]viles?\s+que\s+no\s+est[aá]n?\s+en\s+(?:la\s+)?zona',
-                r'veh[ií]culos?\s+que\s+no\s+est[aá]n?\s+en\s+(?:la\s+)?zona',
-                r'que\s+(?:m[oó]viles?|veh[ií]culos?)\s+no\s+est[aá]n?\s+en\s+(?:la\s+)?zona',
-                r'quienes?\s+no\s+est[aá]n?\s+en\s+(?:la\s+)?zona',
-                r'm[oó]viles?\s+fuera\s+del\s+dep[oó]sito',
-                r'm[oó]viles?\s+fuera\s+del\s+almac[eé]n',
-                r'cuales?\s+salieron\s+de',
-                r'quienes?\s+salieron\s+de',
-                r'quien\s+salio\s+de',
-                r'quien\s+sali[oó]\s+de',
-            ],
-            'INGRESO_A_ZONA': [
-                r'ingreso\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona\s+\w+',
-                r'ingreso\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
-                r'ingres[oó]\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona\s+\w+',
-                r'ingres[oó]\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
-                r'entr[oó]\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona\s+\w+',
-                r'entr[oó]\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
-                r'entro\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona\s+\w+',
-                r'entro\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
-                r'entrada\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona\s+\w+',
-                r'entrada\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
-                r'cu[aá]ndo\s+ingres[oó]\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
-                r'cu[aá]ndo\s+ingreso\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
-                r'cu[aá]ndo\s+entr[oó]\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
-                r'cu[aá]ndo\s+entrada\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
-                r'a\s+que\s+hora\s+(?:ingres[oó]|ingreso|entr[oó]|entro|entrada)\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
-                r'en\s+que\s+momento\s+(?:ingres[oó]|ingreso|entr[oó]|entro|entrada)\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
-                # Patrones con orden diferente: "entro el movil X a zona Y"
-                r'(?:ingres[oó]|ingreso|entr[oó]|entro|entrada)\s+(?:el\s+)?(?:movil|móvil|vehiculo|vehículo|camion|camión|auto)\s+\w+\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
-                r'a\s+que\s+hora\s+(?:ingres[oó]|ingreso|entr[oó]|entro|entrada)\s+(?:el\s+)?(?:movil|móvil|vehiculo|vehículo|camion|camión|auto)\s+\w+\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
-                r'en\s+que\s+momento\s+(?:ingres[oó]|ingreso|entr[oó]|entro|entrada)\s+(?:el\s+)?(?:movil|móvil|vehiculo|vehículo|camion|camión|auto)\s+\w+\s+(?:a|al|a\s+la)\s+(?:la\s+)?zona',
-            ],
-            'SALIO_DE_ZONA': [
-                r'sali[oó]\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona\s+\w+',
-                r'sali[oó]\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
-                r'salido\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona\s+\w+',
-                r'salido\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
-                r'salida\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona\s+\w+',
-                r'salida\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
-                r'cu[aá]ndo\s+sali[oó]\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
-                r'cu[aá]ndo\s+salido\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
-                r'cu[aá]ndo\s+salida\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
-                r'cu[aá]ndo\s+se\s+sali[oó]\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
-                r'cu[aá]ndo\s+se\s+salio\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
-                r'a\s+que\s+hora\s+(?:sali[oó]|salido|salida|se\s+sali[oó])\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
-                r'en\s+que\s+momento\s+(?:sali[oó]|salido|salida|se\s+sali[oó])\s+(?:de|del|de\s+la)\s+(?:la\s+)?zona',
-                # Patrones con orden diferente: "salió el movil X de zona Y"
-                r'sali[oó]\s+(?:el\s+)?(?:movil|móvil|vehiculo|vehículo|camion|camión|auto)\s+\w+\s+de\s+(?:la\s+)?zona',
-                r'cu[aá]ndo\s+sali[oó]\s+(?:el\s+)?(?:movil|móvil|vehiculo|vehículo|camion|camión|auto)\s+\w+\s+de\s+(?:la\s+)?zona',
-                r'a\s+que\s+hora\s+(?:sali[oó]|salido)\s+(?:el\s+)?(?:movil|móvil|vehiculo|vehículo|camion|camión|auto)\s+\w+\s+de\s+(?:la\s+)?zona',
-                r'en\s+que\s+momento\s+(?:sali[oó]|salido)\s+(?:el\s+)?(?:movil|móvil|vehiculo|vehículo|camion|camión|auto)\s+\w+\s+de\s+(?:la\s+)?zona',
-            ],
-            'PASO_POR_ZONA': [
-                r'pas[oó]\s+(?:por|por\s+la)\s+(?:la\s+)?zona\s+\w+',
-                r'pas[oó]\s+(?:por|por\s+la)\s+(?:la\s+)?zona',
-                r'paso\s+(?:por|por\s+la)\s+(?:la\s+)?zona\s+\w+',
-                r'paso\s+(?:por|por\s+la)\s+(?:la\s+)?zona',
-                r'pas[oó]\s+(?:por|por\s+la)\s+(?:el|la)\s+(?:dep[oó]sito|almac[eé]n|zona)',
-                r'cu[aá]ndo\s+pas[oó]\s+(?:por|por\s+la)\s+(?:la\s+)?zona',
-                r'cu[aá]ndo\s+paso\s+(?:por|por\s+la)\s+(?:la\s+)?zona',
-                r'a\s+que\s+hora\s+pas[oó]\s+(?:por|por\s+la)\s+(?:la\s+)?zona',
-                r'en\s+que\s+momento\s+pas[oó]\s+(?:por|por\s+la)\s+(?:la\s+)?zona',
-                r'estuvo\s+(?:en|en\s+la)\s+(?:la\s+)?zona\s+\w+',
-                r'estuvo\s+(?:en|en\s+la)\s+(?:la\s+)?zona',
-                r'estuvo\s+(?:en|en\s+el)\s+(?:dep[oó]sito|almac[eé]n)',
-            ],
-            'AYUDA_GENERAL': [
-                r'ayuda',
-                r'que\s+puedes?\s+hacer',
-                r'que\s+sabes?\s+hacer',
-                r'lista\s+de\s+comandos',
-                r'ayuda\s+con\s+comandos',
-                r'comandos\s+disponibles',
-                r'que\s+comandos\s+hay',
-                r'como\s+te\s+uso',
-                r'que\s+haces',
-            ],
-            'VER_MAPA': [
-                r'mostrar\s+en\s+mapa',
-                r'ver\s+en\s+mapa',
-                r'mostrar\s+en\s+google',
-                r'ver\s+en\s+google',
-                r'abrir\s+mapa',
-                r'abrir\s+google\s+map',
-                r'mapa\s+de',
-            ],
-        }
+        self.patrones = PATRONES
 
-    def buscar_patron(self, texto: str, tipo: str) -> bool:
-        """Verifica si el texto coincide con algún patrón del tipo"""
-        if tipo not in self.patrones:
-            return False
-        texto_normalizado = ''.join(
-            c for c in unicodedata.normalize('NFD', texto)
-            if unicodedata.category(c) != 'Mn'
-        )
+    def _coincide(self, tipo: str, texto: str, texto_normalizado: str) -> bool:
+        """Coincidencia de una intención con el texto ya normalizado (sin tildes)"""
+        patron = PATRONES_COMPILADOS[tipo]
+        # Los patrones aceptan las variantes sin tilde: casi siempre alcanza con el normalizado
+        if patron.search(texto_normalizado) or (texto_normalizado != texto and patron.search(texto)):
+            return True
         texto_lower = texto_normalizado.lower()
-        for patron in self.patrones[tipo]:
-            if re.search(patron, texto, re.IGNORECASE) or re.search(patron, texto_normalizado, re.IGNORECASE):
-                return True
         # Heurísticas adicionales para MOVILES_FUERA_DE_ZONA
         if tipo == 'MOVILES_FUERA_DE_ZONA':
             # Detectar "que vehiculos/moviles" + "fuera/afuera/no estan" sin requerir "zona"
-            tiene_vehiculos = re.search(r'\b(?:veh[ií]culos?|m[oó]viles?)\b', texto_lower, re.IGNORECASE)
-            tiene_fuera = re.search(r'\b(?:fuera|afuera|salieron?|sali[oó])\s+de\b', texto_lower, re.IGNORECASE)
-            tiene_no_estan = re.search(r'\bno\s+est[aá]n?\s+en\b', texto_lower, re.IGNORECASE)
-            tiene_que = re.search(r'\bque\s+(?:veh[ií]culos?|m[oó]viles?)\b', texto_lower, re.IGNORECASE)
+            tiene_fuera = RE_FUERA_DE.search(texto_lower)
             # Si tiene "que vehiculos/moviles" y "fuera/no estan", es MOVILES_FUERA_DE_ZONA
-            if tiene_vehiculos and (tiene_fuera or tiene_no_estan):
+            if RE_VEHICULOS.search(texto_lower) and (tiene_fuera or RE_NO_ESTAN.search(texto_lower)):
                 return True
             # Si tiene "que vehiculos/moviles" y "fuera de" o "afuera de"
-            if tiene_que and tiene_fuera:
+            if tiene_fuera and RE_QUE_VEHICULOS.search(texto_lower):
                 return True
         if tipo == 'CERCANIA':
-            keywords = ['cerca', 'distancia', 'cuanto esta', 'cuanto tarda', 'cuanto demora', 'tiempo']
-            if any(kw in texto_lower for kw in keywords):
+            if any(kw in texto_lower for kw in KEYWORDS_CERCANIA):
                 return True
         return False
 
+    def buscar_patron(self, texto: str, tipo: str) -> bool:
+        """Verifica si el texto coincide con algún patrón del tipo"""
+        if tipo not in PATRONES_COMPILADOS:
+            return False
+        return self._coincide(tipo, texto, quitar_tildes(texto))
+
+    def detectar_tipos(self, texto: str, tipos: Optional[List[str]] = None) -> List[str]:
+        """
+        Todas las intenciones que coinciden con el texto, normalizándolo una sola vez.
+
+        Args:
+            texto: Consulta del usuario
+            tipos: Intenciones a evaluar (default: TIPOS, en ese orden)
+
+        Returns:
+            Tipos que coinciden, en el orden de `tipos`
+        """
+        texto_normalizado = quitar_tildes(texto)
+        return [
+            tipo for tipo in (tipos or TIPOS)
+            if tipo in PATRONES_COMPILADOS and self._coincide(tipo, texto, texto_normalizado)
+        ]
+
     def extraer_movil(self, texto: str, exclude: Optional[List[str]] = None) -> Optional[str]:
         """Extrae el identificador del móvil del texto"""
         exclude = set(exclude or [])
-        patrones_movil = [
-            # Patente formato "letras-números-letras" (ej: AA285TA, JGI640)
-            (r'\b([A-Z]{2,3})\s*(\d{2,4})\s*([A-Z]{1,3})\b', lambda m: m.group(1) + m.group(2) + m.group(3)),
-            # Patente formato "letras-números" (ej: ASN773, OVV799)
-            (r'\b([A-Z]{2,5}\d{2,4})\b', lambda m: m.group(1)),
-            (r'\b([A-Z]{2,5})\s*(\d{2,4})\b', lambda m: m.group(1) + m.group(2)),
-            # Patente formato "números-letras-números" (menos común)
-            (r'\b(\d{1,3})\s*([A-Z]{2,3})\s*(\d{1,3})\b', lambda m: m.group(1) + m.group(2) + m.group(3)),
-            # Nombres específicos (CAMION5, MOVIL3, etc.)
-            (r'\b(?:CAMION|CAMIÓN|MOVIL|MÓVIL|VEHICULO|VEHÍCULO)\s*(\d{1,4})\b', lambda m: re.sub(r'\s+', '', m.group(0))),
-            # Patrón genérico (fallback)
-            (r'\b([A-Z]+)\s*(\d{1,4})\b', lambda m: m.group(1) + m.group(2)),
-            (r'\b([A-Z]+\d{1,4})\b', lambda m: m.group(1)),
-        ]
         texto_normalizado = normalizar_texto(texto, mayusculas=True)
-        numeros_map = {
-            'CERO': '0', 'UNO': '1', 'UN': '1', 'UNA': '1',
-            'DOS': '2', 'TRES': '3', 'CUATRO': '4', 'CINCO': '5',
-            'SEIS': '6', 'SIETE': '7', 'OCHO': '8', 'NUEVE': '9',
-            'DIEZ': '10', 'ONCE': '11', 'DOCE': '12', 'TRECE': '13',
-            'CATORCE': '14', 'QUINCE': '15', 'DIECISEIS': '16', 'DIECISÉIS': '16',
-            'DIECISIETE': '17', 'DIECIOCHO': '18', 'DIECINUEVE': '19', 'VEINTE': '20',
-        }
-        def reemplazar_palabra(match):
-            return numeros_map.get(match.group(0), match.group(0))
-        texto_normalizado = re.sub(
-            r'\b(' + '|'.join(numeros_map.keys()) + r')\b',
-            reemplazar_palabra,
-            texto_normalizado
-        )
-        for patron, extractor in patrones_movil:
-            match = re.search(patron, texto_normalizado, re.IGNORECASE)
+        texto_normalizado = RE_NUMEROS.sub(lambda match: NUMEROS_MAP[match.group(0)], texto_normalizado)
+        for patron, extractor in PATRONES_MOVIL:
+            match = patron.search(texto_normalizado)
             if match:
                 candidato = extractor(match).upper()
                 candidato = re.sub(r'\s+', '', candidato)
@@ -352,24 +408,20 @@ class ProcesadorSimple:
     def procesar_consulta(self, texto: str, vectores_db: List) -> Optional[Dict]:
         """Procesa una consulta usando matching simple"""
         texto_lower = texto.lower()
-        # Detectar tipos posibles
-        tipos_detectados = []
-        for tipo in ['POSICION', 'RECORRIDO', 'COMANDO_WHATSAPP', 'LLEGADA', 'CERCANIA', 'UBICACION_ZONA', 'SALUDO', 
-                     'LISTADO_ACTIVOS', 'SITUACION_FLOTA', 'MOVILES_EN_ZONA', 'MOVILES_FUERA_DE_ZONA', 
-                     'INGRESO_A_ZONA', 'SALIO_DE_ZONA', 'PASO_POR_ZONA', 'AYUDA_GENERAL', 'VER_MAPA']:
-            if self.matcher.buscar_patron(texto, tipo):
-                tipos_detectados.append(tipo)
+        # Detectar tipos posibles (una sola normalización del texto)
+        tipos_detectados = self.matcher.detectar_tipos(texto)
         # Variables auxiliares
-        tiene_palabra_zona = re.search(r'\b(?:zona|dep(o|ó)sito|almac(e|é)n|base|sede|oficina|planta)\b', texto_lower, re.IGNORECASE)
-        tiene_palabra_whatsapp = re.search(r'\b(?:whatsapp|wsp|wapp|envi[aá]|compart[eí]|mand[aá]|pas[aá])\b', texto_lower, re.IGNORECASE)
-        tiene_movil = self.matcher.extraer_movil(texto) is not None
-        tiene_palabra_cercania = re.search(r'\b(?:cerca|cercano|distancia|proximo|próximo)\b', texto_lower, re.IGNORECASE)
+        tiene_palabra_zona = RE_PALABRA_ZONA.search(texto_lower)
+        tiene_palabra_whatsapp = RE_PALABRA_WHATSAPP.search(texto_lower)
+        movil_extraido = self.matcher.extraer_movil(texto)
+        tiene_movil = movil_extraido is not None
+        tiene_palabra_cercania = RE_PALABRA_CERCANIA.search(texto_lower)
         print(f"  Tipos detectados: {tipos_detectados}")
         print(f"  tiene_movil={tiene_movil}, tiene_zona={bool(tiene_palabra_zona)}, tiene_whatsapp={bool(tiene_palabra_whatsapp)}, tiene_cercania={bool(tiene_palabra_cercania)}")
         # Detectar palabras clave de "fuera de zona" sin requerir la palabra "zona" explícita
-        tiene_fuera_afuera = re.search(r'\b(?:fuera|afuera|salieron?|sali[oó])\s+de\b', texto_lower, re.IGNORECASE)
-        tiene_no_estan = re.search(r'\bno\s+est[aá]n?\s+en\b', texto_lower, re.IGNORECASE)
-        tiene_vehiculos_moviles = re.search(r'\b(?:veh[ií]culos?|m[oó]viles?)\b', texto_lower, re.IGNORECASE)
+        tiene_fuera_afuera = RE_FUERA_DE.search(texto_lower)
+        tiene_no_estan = RE_NO_ESTAN.search(texto_lower)
+        tiene_vehiculos_moviles = RE_VEHICULOS.search(texto_lower)
         
         # Priorizar según reglas
         tipo_seleccionado = None
@@ -435,7 +487,6 @@ class ProcesadorSimple:
         # Buscar vector y extraer variables
         if tipo_seleccionado:
             variables: Dict[str, str] = {}
-            movil_extraido = self.matcher.extraer_movil(texto)
             if movil_extraido:
                 variables['movil'] = movil_extraido
                 print(f"  ✅ Móvil extraído: {movil_extraido}")
@@ -475,7 +526,7 @@ class ProcesadorSimple:
                     'variables': variables,
                 }
         # Heurística para móvil solo
-        movil = self.matcher.extraer_movil(texto)
+        movil = movil_extraido
         tokens = texto.strip().split()
         if movil and len(tokens) <= 4:
             for vector_db in vectores_db:
@@ -0,0 +1,140 @@
+"""
+Carga del modelo de embeddings de Sofía
+=======================================
+
+El mismo modelo (paraphrase-multilingual-MiniLM-L12-v2) puede correr con
+tres backends, elegidos con SOFIA_MODELO_BACKEND:
+
+- ``torch`` (default): PyTorch en float32, como hasta ahora.
+- ``onnx``: ONNX Runtime en float32 (mismo resultado, menos overhead por
+  consulta en CPU).
+- ``onnx-int8``: ONNX Runtime con pesos cuantizados a int8 (cuantización
+  dinámica). El archivo de pesos pasa de ~470 MB a ~120 MB por worker y la
+  inferencia en CPU es bastante más rápida; los embeddings cambian un poco,
+  por eso antes de activarlo hay que correr ``manage.py
+  optimizar_modelo_sofia``, que exporta el modelo cuantizado a
+  SOFIA_MODELO_ONNX_RUTA y compara sus embeddings contra los de PyTorch.
+
+Los backends ONNX necesitan ``optimum[onnxruntime]``; si no está instalado
+(o el modelo cuantizado no se puede cargar) se usa PyTorch.
+"""
+
+import logging
+import os
+from typing import Dict, Optional
+
+try:
+    import numpy as np
+    NP_AVAILABLE = True
+except Exception:
+    NP_AVAILABLE = False
+    np = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+MODELO_EMBEDDINGS = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+
+TORCH = 'torch'
+ONNX = 'onnx'
+ONNX_INT8 = 'onnx-int8'
+BACKENDS = (TORCH, ONNX, ONNX_INT8)
+
+# Nombre que le da sentence-transformers al modelo cuantizado para x86 con AVX2
+ARCHIVO_ONNX_INT8 = 'onnx/model_quint8_avx2.onnx'
+
+
+def directorio_modelos() -> str:
+    """Carpeta local de modelos (la misma que usa descargar_modelo)"""
+    return os.path.join(os.getcwd(), '.cache', 'models')
+
+
+def ruta_modelo_onnx() -> str:
+    """Carpeta donde optimizar_modelo_sofia guarda el modelo exportado a ONNX"""
+    from decouple import config
+    ruta_default = os.path.join(directorio_modelos(), MODELO_EMBEDDINGS.split('/')[-1] + '-onnx')
+    return config('SOFIA_MODELO_ONNX_RUTA', default=ruta_default)
+
+
+def backend_configurado() -> str:
+    from decouple import config
+    backend = config('SOFIA_MODELO_BACKEND', default=TORCH).strip().lower()
+    if backend not in BACKENDS:
+        logger.warning(f"⚠️ SOFIA_MODELO_BACKEND={backend!r} no es válido ({', '.join(BACKENDS)}), se usa {TORCH}")
+        return TORCH
+    return backend
+
+
+def cargar_modelo(backend: str = TORCH, archivo_onnx: Optional[str] = None):
+    """
+    Instanciar el SentenceTransformer con el backend pedido.
+
+    Args:
+        backend: Uno de BACKENDS
+        archivo_onnx: Archivo .onnx dentro del modelo (default para onnx-int8:
+            SOFIA_MODELO_ONNX_ARCHIVO o ARCHIVO_ONNX_INT8)
+
+    Returns:
+        SentenceTransformer listo para encode()
+
+    Raises:
+        ValueError: si el backend no existe
+        Exception: los errores de sentence-transformers / optimum al cargar
+    """
+    from decouple import config
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de embeddings desconocido: {backend}")
+
+    cache_dir = directorio_modelos()
+    os.makedirs(cache_dir, exist_ok=True)
+    if backend == TORCH:
+        return SentenceTransformer(MODELO_EMBEDDINGS, cache_folder=cache_dir)
+
+    # Preferir el modelo exportado localmente (no depende de qué archivos publique el Hub)
+    modelo = ruta_modelo_onnx() if os.path.isdir(ruta_modelo_onnx()) else MODELO_EMBEDDINGS
+    model_kwargs = {}
+    if backend == ONNX_INT8:
+        model_kwargs['file_name'] = archivo_onnx or config('SOFIA_MODELO_ONNX_ARCHIVO', default=ARCHIVO_ONNX_INT8)
+    elif archivo_onnx:
+        model_kwargs['file_name'] = archivo_onnx
+    return SentenceTransformer(modelo, cache_folder=cache_dir, backend='onnx', model_kwargs=model_kwargs)
+
+
+def comparar_embeddings(referencia, candidato) -> Dict:
+    """
+    Paridad entre dos juegos de embeddings de los mismos textos.
+
+    Args:
+        referencia: Matriz (textos x dimensión), p. ej. la de PyTorch
+        candidato: Matriz de los mismos textos con otro backend
+
+    Returns:
+        {'textos', 'coseno_min', 'coseno_promedio', 'coincidencia_top1'}:
+        coseno entre el embedding de cada texto con uno y otro backend, y la
+        fracción de textos cuyo embedding candidato sigue estando más cerca
+        de su propia referencia que de la de cualquier otro texto (lo que
+        decide la intención cuando la consulta se vectoriza con un backend y
+        los ejemplos guardados con el otro)
+    """
+    referencia = np.asarray(referencia, dtype=np.float32)
+    candidato = np.asarray(candidato, dtype=np.float32)
+    if referencia.shape != candidato.shape:
+        raise ValueError(f"Dimensiones distintas: {referencia.shape} y {candidato.shape}")
+    if not len(referencia):
+        return {'textos': 0, 'coseno_min': None, 'coseno_promedio': None, 'coincidencia_top1': None}
+
+    def normalizar(matriz):
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        normas[normas == 0] = 1
+        return matriz / normas
+
+    referencia, candidato = normalizar(referencia), normalizar(candidato)
+    cosenos = np.sum(referencia * candidato, axis=1)
+    mas_cercano = np.argmax(candidato @ referencia.T, axis=1)
+    return {
+        'textos': len(referencia),
+        'coseno_min': round(float(cosenos.min()), 5),
+        'coseno_promedio': round(float(cosenos.mean()), 5),
+        'coincidencia_top1': round(float(np.mean(mas_cercano == np.arange(len(referencia)))), 4),
+    }
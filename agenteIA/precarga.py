@@ -0,0 +1,144 @@
+"""
+Precarga y calentamiento del modelo de Sofía
+============================================
+
+El modelo se carga recién en la primera consulta a Sofía
+(VectorizadorConsultas._cargar_modelo): después de cada reinicio el primer
+usuario de cada worker espera la carga de los pesos y la primera
+inferencia. Con SOFIA_PRECARGAR_MODELO=True la carga se hace al arrancar,
+en AgenteIAConfig.ready(), solo si el proceso es un servidor (runserver,
+gunicorn, uwsgi) y no un comando de gestión.
+
+Con gunicorn conviene además ``--preload`` y los hooks de este módulo::
+
+    SOFIA_PRECARGAR_MODELO=True gunicorn wayproject.wsgi:application \\
+        --preload -c python:agenteIA.precarga --workers 3 --timeout 120
+
+Así el master carga los pesos una sola vez antes del fork y los workers
+los comparten copy-on-write en lugar de tener cada uno su copia. El master
+no corre inferencias (los pools de hilos de PyTorch/ONNX Runtime no
+sobreviven bien a un fork): cada worker hace la suya de calentamiento en
+post_fork. Si la config de gunicorn es otro archivo (gunicorn.conf.py con
+``preload_app = True``), tiene que importar los hooks de acá::
+
+    from agenteIA.precarga import pre_fork, post_fork  # noqa: F401
+
+Gunicorn lee la config antes de cargar la app: al importarse desde ahí
+este módulo anota el pid del master, y ready() no calienta en ese proceso
+venga de donde venga el preload (--preload, config, GUNICORN_CMD_ARGS).
+Ojo: con preload el ready() de gps también corre en el master, así que
+los receptores activos arrancan una sola vez ahí.
+"""
+
+import gc
+import logging
+import os
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+FRASES_CALENTAMIENTO = (
+    'donde esta el movil 5',
+    'recorrido de ayer del camion',
+    'hola sofia',
+)
+
+COMANDOS_GESTION = ('migrate', 'makemigrations', 'collectstatic', 'createsuperuser',
+                    'shell', 'test', 'flush', 'dumpdata', 'loaddata', 'check')
+
+
+def _cargado_por_gunicorn() -> bool:
+    """Este módulo se importa como config de gunicorn, antes de cargar la app"""
+    from django.apps import apps
+
+    return 'gunicorn' in sys.modules and not apps.apps_ready
+
+
+# Pid del master de gunicorn (None si el módulo no se cargó como config): si
+# ready() corre en este proceso es porque hubo preload y todavía no hay fork
+_pid_master = os.getpid() if _cargado_por_gunicorn() else None
+
+
+def precargar_modelo() -> bool:
+    """
+    Cargar los pesos del modelo y el cache de embeddings, sin correr inferencias.
+
+    Returns:
+        True si quedó un modelo cargado (False: modo ligero o placeholder)
+    """
+    from agenteIA.vectorizador import VectorizadorConsultas
+
+    inicio = time.monotonic()
+    vectorizador = VectorizadorConsultas()
+    vectorizador._cargar_modelo()
+    vectorizador.cache_embeddings.cargar()
+    logger.info(f"🧠 Modelo de Sofía precargado en {time.monotonic() - inicio:.1f} s "
+                f"({'ok' if vectorizador.modelo is not None else 'sin modelo, placeholder'})")
+    return vectorizador.modelo is not None
+
+
+def calentar_modelo():
+    """Primera inferencia (tokenizer, buffers, kernels) fuera de una consulta de usuario"""
+    from agenteIA.vectorizador import VectorizadorConsultas
+
+    vectorizador = VectorizadorConsultas()
+    vectorizador._cargar_modelo()
+    if vectorizador.modelo is None:
+        return
+    inicio = time.monotonic()
+    try:
+        # Directo al modelo: el cache de embeddings saltearía la inferencia
+        vectorizador.modelo.encode(list(FRASES_CALENTAMIENTO), convert_to_numpy=True)
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo calentar el modelo de Sofía: {e}")
+        return
+    logger.info(f"🔥 Modelo de Sofía calentado en {(time.monotonic() - inicio) * 1000:.0f} ms (pid {os.getpid()})")
+
+
+def _es_servidor() -> bool:
+    argumentos = ' '.join(sys.argv)
+    if any(comando in sys.argv for comando in COMANDOS_GESTION):
+        return False
+    if 'runserver' in sys.argv:
+        # El proceso que vigila cambios del autoreloader no atiende consultas
+        return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+    return 'gunicorn' in argumentos or 'uwsgi' in argumentos
+
+
+def _en_master_gunicorn() -> bool:
+    if _pid_master is not None:
+        return os.getpid() == _pid_master
+    # Sin los hooks no hay pid anotado: solo queda mirar los argumentos
+    argumentos = sys.argv + os.environ.get('GUNICORN_CMD_ARGS', '').split()
+    return '--preload' in argumentos
+
+
+def precargar_si_corresponde():
+    """Llamado desde AgenteIAConfig.ready(): precarga opt-in con SOFIA_PRECARGAR_MODELO"""
+    from decouple import config
+
+    if not config('SOFIA_PRECARGAR_MODELO', default=False, cast=bool) or not _es_servidor():
+        return
+    try:
+        # Con preload esto corre en el master: sin inferencias antes del fork
+        if precargar_modelo() and not _en_master_gunicorn():
+            calentar_modelo()
+    except Exception as e:
+        # Nunca impedir que arranque el servidor: la primera consulta volverá a intentar
+        logger.error(f"❌ Error precargando el modelo de Sofía: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Hooks de gunicorn (-c python:agenteIA.precarga)
+# ---------------------------------------------------------------------------
+
+def pre_fork(server, worker):
+    # Lo cargado en el master queda fuera del GC de los workers: recorrer
+    # esos objetos escribiría en sus páginas y rompería el copy-on-write
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        calentar_modelo()
@@ -0,0 +1,20 @@
+"""
+Señales Django del agente Sofía
+"""
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .indice_intenciones import invalidar_indice
+from .models import VectorConsulta
+
+@receiver(post_save, sender=VectorConsulta)
+@receiver(post_delete, sender=VectorConsulta)
+def invalidar_vectores(sender, instance, **kwargs):
+    """
+    Reconstruir el índice de intenciones (y la lista cacheada de vectores
+    activos de procesar_consulta) cuando se agrega, edita o borra un vector.
+    """
+    invalidar_indice()
+    cache.delete('vectores_activos')
@@ -1,4 +1,291 @@
-from django.test import TestCase
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
 
+from django.test import SimpleTestCase
+
+from gps.device_registry import DeviceRegistry, EntradaMovil
+
+from . import indice_intenciones, precarga
+from .flota import FotoFlota, normalizar_clave
+from .management.commands.benchmark_matcher_sofia import CORPUS, _detectar_sin_compilar
+from .matching_simple import TIPOS, ProcesadorSimple, SimpleMatcher
+from .modelo_embeddings import comparar_embeddings
+from .indice_intenciones import IndiceIntenciones
+from .vectorizador import CacheEmbeddings, VectorizadorConsultas
+
+
+def vector(pk, embedding, threshold=0.5, tipo='POSICION', activo=True):
+    return SimpleNamespace(id=pk, texto_original=f'ejemplo {pk}', tipo_consulta=tipo, categoria='actual',
+                           vector_embedding=embedding, threshold=threshold, activo=activo, variables={})
+
+
+class IndiceIntencionesTest(SimpleTestCase):
+    """Índice vectorizado de intenciones (agenteIA/indice_intenciones.py)"""
+
+    def setUp(self):
+        self.vectores = [
+            vector(1, [1.0, 0.0, 0.0], tipo='POSICION'),
+            vector(2, [0.0, 2.0, 0.0], tipo='RECORRIDO'),
+            vector(3, [1.0, 1.0, 0.0], threshold=0.999, tipo='ESTADO'),
+            vector(4, [0.0, 0.0, 1.0], activo=False),
+            vector(5, [], tipo='SALUDO'),
+        ]
+        self.indice = IndiceIntenciones(self.vectores)
+
+    def test_ignora_inactivos_y_vacios(self):
+        self.assertEqual(len(self.indice), 3)
+        self.assertEqual(self.indice.matriz.shape, (3, 3))
+
+    def test_paridad_con_calcular_similitud(self):
+        consulta = [0.3, 0.9, 0.1]
+        calcular = VectorizadorConsultas().calcular_similitud
+        for (fila, similitud) in zip(self.indice.vectores, self.indice.similitudes(consulta)):
+            self.assertAlmostEqual(float(similitud), calcular(consulta, fila.vector_embedding), places=5)
+
+    def test_mejor_respeta_threshold_propio(self):
+        # El vector 3 es el más parecido pero no llega a su threshold de 0,999
+        encontrado, similitud = self.indice.mejor([0.8, 0.7, 0.0])
+        self.assertEqual(encontrado.id, 1)
+        self.assertGreater(similitud, 0.5)
+        self.assertIsNone(self.indice.mejor([0.0, 0.0, 1.0]))
+
+    def test_top_k_ordenado(self):
+        ids = [v.id for v, _ in self.indice.top_k([0.8, 0.7, 0.0], k=2)]
+        self.assertEqual(ids, [3, 1])
+
+    def test_sin_numpy(self):
+        original = indice_intenciones.NP_AVAILABLE
+        indice_intenciones.NP_AVAILABLE = False
+        try:
+            indice = IndiceIntenciones(self.vectores)
+            self.assertIsNone(indice.matriz)
+            self.assertEqual(indice.mejor([0.8, 0.7, 0.0])[0].id, 1)
+        finally:
+            indice_intenciones.NP_AVAILABLE = original
+
+
+class ModeloFalso:
+    """Modelo de embeddings que cuenta los textos que codifica"""
+
+    def __init__(self):
+        self.codificados = []
+
+    def encode(self, textos, batch_size=32, convert_to_numpy=True):
+        lote = [textos] if isinstance(textos, str) else list(textos)
+        self.codificados.extend(lote)
+        embeddings = np.array([[len(texto), texto.count('a'), 1.0] for texto in lote], dtype=np.float32)
+        return embeddings[0] if isinstance(textos, str) else embeddings
+
+
+class CacheEmbeddingsTest(SimpleTestCase):
+    """Cache de embeddings y vectorización por lote (agenteIA/vectorizador.py)"""
+
+    def test_lru_descarta_el_menos_usado(self):
+        cache = CacheEmbeddings(max_entradas=2)
+        cache.agregar([('a', [1.0]), ('b', [2.0])])
+        cache.obtener('a')
+        cache.agregar([('c', [3.0])])
+        self.assertIsNone(cache.obtener('b'))
+        self.assertEqual(cache.obtener('a').tolist(), [1.0])
+        self.assertEqual(len(cache), 2)
+
+    def test_persistencia_npz(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, 'embeddings', 'modelo.npz')
+            cache = CacheEmbeddings(ruta=ruta, guardar_cada=1000)
+            cache.agregar([('donde esta camion 5', [0.5, 0.25])])
+            self.assertFalse(os.path.exists(ruta))
+            cache.guardar()
+
+            otro = CacheEmbeddings(ruta=ruta)
+            self.assertEqual(otro.obtener('donde esta camion 5').tolist(), [0.5, 0.25])
+
+    def test_lote_no_recodifica_repetidos_ni_cacheados(self):
+        vectorizador = VectorizadorConsultas(cache_embeddings=CacheEmbeddings())
+        vectorizador.modelo = ModeloFalso()
+        unitario = vectorizador.vectorizar('Dónde está el camión 5')
+
+        textos = ['donde esta camion 5', 'Ver recorrido', 'ver   RECORRIDO', 'Estado de la flota']
+        embeddings = vectorizador.vectorizar_lote(textos)
+
+        self.assertEqual(vectorizador.modelo.codificados, ['donde camion 5', 'ver recorrido', 'estado de flota'])
+        self.assertEqual(embeddings[0], unitario)
+        self.assertEqual(embeddings[1], embeddings[2])
+        self.assertEqual(embeddings[3], vectorizador.vectorizar('estado de la flota'))
+        self.assertEqual(len(vectorizador.modelo.codificados), 3)
+
+
+class ModeloEmbeddingsTest(SimpleTestCase):
+    """Paridad entre backends del modelo (agenteIA/modelo_embeddings.py)"""
+
+    def setUp(self):
+        self.referencia = np.eye(4, dtype=np.float32) + 0.1
+
+    def test_mismos_embeddings(self):
+        paridad = comparar_embeddings(self.referencia, self.referencia * 3)
+        self.assertEqual(paridad['textos'], 4)
+        self.assertAlmostEqual(paridad['coseno_min'], 1.0, places=4)
+        self.assertEqual(paridad['coincidencia_top1'], 1.0)
+
+    def test_ruido_de_cuantizacion(self):
+        ruido = np.random.default_rng(0).normal(0, 0.01, self.referencia.shape)
+        paridad = comparar_embeddings(self.referencia, self.referencia + ruido)
+        self.assertGreater(paridad['coseno_min'], 0.99)
+        self.assertLess(paridad['coseno_min'], 1.0)
+        self.assertEqual(paridad['coincidencia_top1'], 1.0)
+
+    def test_embeddings_cruzados(self):
+        # Dos textos intercambiados: cada uno queda más cerca de la referencia del otro
+        candidato = self.referencia[[1, 0, 2, 3]]
+        paridad = comparar_embeddings(self.referencia, candidato)
+        self.assertEqual(paridad['coincidencia_top1'], 0.5)
+        with self.assertRaises(ValueError):
+            comparar_embeddings(self.referencia, self.referencia[:, :3])
+
+
+class SimpleMatcherTest(SimpleTestCase):
+    """Patrones compilados del matcher por palabras clave (agenteIA/matching_simple.py)"""
+
+    def setUp(self):
+        self.matcher = SimpleMatcher()
+
+    def test_detectar_tipos_igual_que_por_intencion(self):
+        for texto in CORPUS:
+            por_intencion = [tipo for tipo in TIPOS if self.matcher.buscar_patron(texto, tipo)]
+            self.assertEqual(self.matcher.detectar_tipos(texto), por_intencion, texto)
+
+    def test_mismos_patrones_que_sin_compilar(self):
+        # Fuera de las heurísticas (FUERA_DE_ZONA, CERCANIA), lo mismo que re.search con los strings
+        for texto in CORPUS + ['DÓNDE ESTÁ EL MÓVIL 5', 'entró el móvil 3 a la zona norte']:
+            sin_heuristicas = [tipo for tipo in self.matcher.detectar_tipos(texto)
+                               if tipo not in ('MOVILES_FUERA_DE_ZONA', 'CERCANIA')]
+            esperado = [tipo for tipo in _detectar_sin_compilar(texto)
+                        if tipo not in ('MOVILES_FUERA_DE_ZONA', 'CERCANIA')]
+            self.assertEqual(sin_heuristicas, esperado, texto)
+
+    def test_procesar_consulta(self):
+        vectores = [SimpleNamespace(tipo_consulta=tipo, activo=True, categoria='actual') for tipo in TIPOS]
+        procesador = ProcesadorSimple()
+        casos = {
+            'Dónde está el camión 5?': ('POSICION', {'movil': 'CAMION5'}),
+            'que vehiculos estan afuera del deposito': ('MOVILES_FUERA_DE_ZONA', {}),
+            'el ASN773 cuanto tarda hasta Burzaco': ('LLEGADA', {'movil': 'ASN773', 'destino': 'burzaco'}),
+            'OVV799': ('POSICION', {'movil': 'OVV799'}),
+        }
+        with contextlib.redirect_stdout(io.StringIO()):
+            resultados = {texto: procesador.procesar_consulta(texto, vectores) for texto in casos}
+        for texto, (tipo, variables) in casos.items():
+            self.assertEqual((resultados[texto]['tipo'], resultados[texto]['variables']), (tipo, variables), texto)
+
+
+def _movil(id, patente=None, alias=None, codigo=None, gps_id=None, activo=True, lat=None):
+    status = SimpleNamespace(ultimo_lat=lat, ultimo_lon=lat) if lat is not None else None
+    return SimpleNamespace(id=id, patente=patente, alias=alias, codigo=codigo, gps_id=gps_id,
+                           activo=activo, status=status, geocode=None)
+
+
+class FotoFlotaTest(SimpleTestCase):
+    """Foto de la flota por consulta de Sofía (agenteIA/flota.py)"""
+
+    def setUp(self):
+        self.moviles = [
+            _movil(1, patente='AB123CD', alias='Camión 15', codigo='C15', gps_id='860001', lat=-34.6),
+            _movil(2, patente='ASN773', alias='Camion 5', codigo='C5'),
+            _movil(3, patente='OVV-799', alias=None, codigo='5'),
+        ]
+        self.inactivo = _movil(9, patente='ZZZ999', alias='Viejo', activo=False, lat=-34.7)
+        todos = self.moviles + [self.inactivo]
+        self.cargas = 0
+
+        def cargador():
+            self.cargas += 1
+            return list(self.moviles)
+
+        registro = DeviceRegistry(loader=lambda gps_id=None: [
+            EntradaMovil(m.id, m.patente, m.alias, m.codigo, m.gps_id, activo=m.activo) for m in todos
+        ], buscador=lambda texto, exacto: None)
+        self.flota = FotoFlota(cargador=cargador, registro=registro,
+                               cargar_por_id=lambda movil_id: next(m for m in todos if m.id == movil_id))
+
+    def test_normalizar_clave(self):
+        self.assertEqual(normalizar_clave('ovv-799'), 'OVV799')
+        self.assertEqual(normalizar_clave(' Camión 5 '), 'CAMION5')
+        self.assertEqual(normalizar_clave(None), '')
+
+    def test_una_sola_carga(self):
+        self.assertIsNone(self.flota.status(None))
+        self.assertEqual(self.cargas, 0)
+        for _ in range(3):
+            self.assertEqual(self.flota.buscar('ASN773').id, 2)
+            self.assertEqual(self.flota.status(self.flota.buscar('C15')).ultimo_lat, -34.6)
+            self.assertEqual(len(self.flota.moviles()), 3)
+        self.assertEqual(self.cargas, 1)
+        self.assertEqual(self.flota.get_stats()['consultas_db'], 1)
+
+    def test_clave_exacta_antes_que_parcial(self):
+        # 'CAMION5' no está contenido en ningún alias, pero es la clave normalizada de 'Camion 5';
+        # '5' contiene al código del móvil 3 aunque 'Camión 15' (id 1) también lo contenga
+        self.assertEqual(self.flota.buscar('CAMION5').id, 2)
+        self.assertEqual(self.flota.buscar('5').id, 3)
+        self.assertEqual(self.flota.buscar('ovv 799').id, 3)
+        self.assertEqual(self.flota.buscar('860001').id, 1)
+
+    def test_reglas_de_icontains(self):
+        self.assertEqual(self.flota.buscar('asn').id, 2)
+        self.assertEqual(self.flota.buscar('OVV-7').id, 3)
+        self.assertIsNone(self.flota.buscar('asn', exacto=True))
+        self.assertIsNone(self.flota.buscar('XYZ'))
+        self.assertIsNone(self.flota.buscar(''))
+
+    def test_inactivo_desde_el_registro(self):
+        movil = self.flota.buscar('viejo')
+        self.assertIs(movil, self.inactivo)
+        self.assertEqual(self.flota.status(movil).ultimo_lat, -34.7)
+        self.assertIs(self.flota.buscar('ZZZ999'), self.inactivo)
+        self.assertEqual(self.flota.get_stats()['consultas_db'], 2)
+        self.assertNotIn(self.inactivo, self.flota.moviles())
+
+
+class PrecargaTest(SimpleTestCase):
+    """Precarga del modelo de Sofía bajo gunicorn (agenteIA/precarga.py)"""
+
+    def precargar(self, pid_master, argv=('gunicorn', 'wayproject.wsgi:application'), cmd_args=''):
+        with contextlib.ExitStack() as pila:
+            pila.enter_context(mock.patch.dict(os.environ, {'SOFIA_PRECARGAR_MODELO': 'True',
+                                                            'GUNICORN_CMD_ARGS': cmd_args}))
+            pila.enter_context(mock.patch.object(precarga, '_pid_master', pid_master))
+            pila.enter_context(mock.patch.object(precarga.sys, 'argv', list(argv)))
+            precargar = pila.enter_context(mock.patch.object(precarga, 'precargar_modelo', return_value=True))
+            calentar = pila.enter_context(mock.patch.object(precarga, 'calentar_modelo'))
+            precarga.precargar_si_corresponde()
+        precargar.assert_called_once()
+        return calentar.called
+
+    def test_master_con_preload_no_calienta(self):
+        # El preload vino de la config: los argumentos no dicen nada
+        self.assertFalse(self.precargar(pid_master=os.getpid()))
+
+    def test_worker_calienta(self):
+        self.assertTrue(self.precargar(pid_master=os.getpid() + 1))
+
+    def test_sin_hooks_mira_los_argumentos(self):
+        self.assertTrue(self.precargar(pid_master=None))
+        self.assertFalse(self.precargar(pid_master=None, cmd_args='--workers 3 --preload'))
+        self.assertFalse(self.precargar(pid_master=None, argv=('gunicorn', '--preload', 'wayproject.wsgi')))
+
+    def test_cargado_como_config(self):
+        from django.apps import apps
+
+        with mock.patch.dict(sys.modules, {'gunicorn': mock.Mock()}):
+            with mock.patch.object(apps, 'apps_ready', False):
+                self.assertTrue(precarga._cargado_por_gunicorn())
+            # Importado desde ready() o un comando: la app ya está cargada
+            with mock.patch.object(apps, 'apps_ready', True):
+                self.assertFalse(precarga._cargado_por_gunicorn())
@@ -1,8 +1,11 @@
 """
 Módulo para vectorización de consultas y comparación de similitud
 """
+import atexit
 import re
-from typing import Dict, List, Optional
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence
 
 # Dependencias opcionales (no deben romper en dev si no están)
 try:
@@ -24,6 +27,129 @@ import os
 # Deshabilitar caché de Hugging Face si no hay internet
 os.environ.setdefault('HF_HOME', '')  # No usar caché de Hugging Face
 
+from agenteIA.modelo_embeddings import MODELO_EMBEDDINGS, TORCH, backend_configurado, cargar_modelo
+
+
+class CacheEmbeddings:
+    """
+    LRU de embeddings del modelo por texto normalizado, persistido en disco.
+
+    Las frases se repiten mucho ("donde esta el camion 5"): un hit evita
+    pasar por el modelo. El contenido se guarda en un .npz (textos +
+    matriz float32) al terminar un lote, cada `guardar_cada` entradas
+    nuevas y al salir del proceso, y se vuelve a leer al arrancar. Solo se
+    cachean embeddings del modelo, nunca placeholders.
+    """
+
+    def __init__(self, ruta: Optional[str] = None, max_entradas: int = 5000, guardar_cada: int = 100):
+        """
+        Args:
+            ruta: Archivo .npz de persistencia (None: solo en memoria)
+            max_entradas: Capacidad del LRU
+            guardar_cada: Entradas nuevas entre escrituras a disco
+        """
+        self.ruta = ruta
+        self.max_entradas = max_entradas
+        self.guardar_cada = guardar_cada
+        self._lru: 'OrderedDict[str, object]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._cargado = False
+        self._nuevas = 0
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def _cargar(self):
+        self._cargado = True
+        if not self.ruta or not NP_AVAILABLE or not os.path.exists(self.ruta):
+            return
+        try:
+            with np.load(self.ruta, allow_pickle=False) as datos:
+                for texto, embedding in zip(datos['textos'], datos['embeddings']):
+                    self._lru[str(texto)] = embedding
+            while len(self._lru) > self.max_entradas:
+                self._lru.popitem(last=False)
+            print(f"✅ {len(self._lru)} embeddings cargados desde {self.ruta}")
+        except Exception as e:
+            print(f"⚠️ No se pudo leer el cache de embeddings {self.ruta}: {e}")
+
+    def cargar(self):
+        """Leer el .npz ahora (si no, se lee en la primera búsqueda)"""
+        with self._lock:
+            if not self._cargado:
+                self._cargar()
+
+    def obtener(self, texto: str):
+        """Embedding cacheado (np.ndarray) o None"""
+        with self._lock:
+            if not self._cargado:
+                self._cargar()
+            embedding = self._lru.get(texto)
+            if embedding is None:
+                self.stats['misses'] += 1
+                return None
+            self._lru.move_to_end(texto)
+            self.stats['hits'] += 1
+            return embedding
+
+    def agregar(self, pares: Iterable[tuple]):
+        """Agregar (texto, embedding) y persistir si se acumularon guardar_cada nuevas"""
+        with self._lock:
+            if not self._cargado:
+                self._cargar()
+            for texto, embedding in pares:
+                self._lru[texto] = np.asarray(embedding, dtype=np.float32)
+                self._lru.move_to_end(texto)
+                self._nuevas += 1
+            while len(self._lru) > self.max_entradas:
+                self._lru.popitem(last=False)
+            pendiente = self._nuevas >= self.guardar_cada
+        if pendiente:
+            self.guardar()
+
+    def guardar(self):
+        """Escribir el .npz (archivo temporal + os.replace, así nunca queda a medias)"""
+        if not self.ruta or not NP_AVAILABLE:
+            return
+        with self._lock:
+            if not self._nuevas or not self._lru:
+                return
+            textos = np.array(list(self._lru.keys()))
+            embeddings = np.stack(list(self._lru.values())).astype(np.float32)
+            self._nuevas = 0
+        try:
+            os.makedirs(os.path.dirname(self.ruta) or '.', exist_ok=True)
+            temporal = f"{self.ruta}.{os.getpid()}.tmp"
+            with open(temporal, 'wb') as archivo:
+                np.savez(archivo, textos=textos, embeddings=embeddings)
+            os.replace(temporal, self.ruta)
+        except Exception as e:
+            print(f"⚠️ No se pudo guardar el cache de embeddings {self.ruta}: {e}")
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    def get_stats(self) -> Dict:
+        consultas = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'entradas': len(self._lru),
+            'hit_ratio': round(self.stats['hits'] / consultas, 4) if consultas else None,
+            'ruta': self.ruta,
+        }
+
+
+def _crear_cache_embeddings() -> CacheEmbeddings:
+    from decouple import config
+    # Cada backend produce embeddings levemente distintos: un archivo por backend
+    backend = backend_configurado()
+    nombre = MODELO_EMBEDDINGS.split('/')[-1] + ('' if backend == TORCH else f'-{backend}')
+    ruta_default = os.path.join(os.getcwd(), '.cache', 'embeddings', nombre + '.npz')
+    cache = CacheEmbeddings(
+        ruta=config('SOFIA_EMBEDDINGS_CACHE_RUTA', default=ruta_default) or None,
+        max_entradas=config('SOFIA_EMBEDDINGS_CACHE_ENTRADAS', default=5000, cast=int),
+    )
+    atexit.register(cache.guardar)
+    return cache
+
 
 class VectorizadorConsultas:
     """
@@ -33,11 +159,22 @@ class VectorizadorConsultas:
     # Variable de clase para almacenar el modelo singleton
     _modelo_cache = None
     _modelo_loaded = False
+    _modelo_lock = threading.Lock()
+    # Cache de embeddings compartido por todas las instancias del proceso
+    _cache_embeddings: Optional[CacheEmbeddings] = None
     
-    def __init__(self):
+    def __init__(self, cache_embeddings: Optional[CacheEmbeddings] = None):
         self.modelo = None
         # Usar lazy loading para evitar problemas de conexión al iniciar
-        pass
+        self._cache_propio = cache_embeddings
+    
+    @property
+    def cache_embeddings(self) -> CacheEmbeddings:
+        if self._cache_propio is not None:
+            return self._cache_propio
+        if VectorizadorConsultas._cache_embeddings is None:
+            VectorizadorConsultas._cache_embeddings = _crear_cache_embeddings()
+        return VectorizadorConsultas._cache_embeddings
     
     def _cargar_modelo(self):
         """
@@ -53,34 +190,30 @@ class VectorizadorConsultas:
         lite_mode = config('SOFIA_LITE_MODE', default=False, cast=bool)
         
         if self.modelo is None and ST_AVAILABLE and not lite_mode:
-            try:
-                # Intentar cargar desde caché local primero si existe
-                import os
-                cache_dir = os.path.join(os.getcwd(), '.cache', 'models')
-                os.makedirs(cache_dir, exist_ok=True)
-                
-                print("🔄 Intentando cargar modelo de vectorización...")
+            # Un solo hilo carga el modelo (precarga en ready() y primera consulta pueden coincidir)
+            with VectorizadorConsultas._modelo_lock:
+                if VectorizadorConsultas._modelo_loaded:
+                    self.modelo = VectorizadorConsultas._modelo_cache
+                    return
+                backend = backend_configurado()
+                print(f"🔄 Intentando cargar modelo de vectorización (backend {backend})...")
                 
-                # Intentar cargar con timeout reducido y sin conexión
                 try:
-                    self.modelo = SentenceTransformer(
-                        'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2',
-                        cache_folder=cache_dir
-                    )
+                    self.modelo = cargar_modelo(backend)
                     print("✅ Modelo de vectorización cargado")
-                    # Guardar en cache de clase
-                    VectorizadorConsultas._modelo_cache = self.modelo
-                    VectorizadorConsultas._modelo_loaded = True
                 except Exception as e:
-                    # Si falla, probar sin caché
-                    print(f"⚠️ Error cargando modelo: {e}")
-                    print(f"⚠️ Usando embeddings placeholder (sin conexión a internet).")
+                    print(f"⚠️ Error cargando modelo con backend {backend}: {e}")
                     self.modelo = None
-                    VectorizadorConsultas._modelo_loaded = True
-            except Exception as e:
-                print(f"⚠️ Error crítico cargando modelo: {e}")
-                print(f"⚠️ Usando embeddings placeholder.")
-                self.modelo = None
+                    if backend != TORCH:
+                        try:
+                            self.modelo = cargar_modelo(TORCH)
+                            print("✅ Modelo de vectorización cargado con PyTorch")
+                        except Exception as e:
+                            print(f"⚠️ Error cargando modelo: {e}")
+                    if self.modelo is None:
+                        print(f"⚠️ Usando embeddings placeholder (sin conexión a internet).")
+                # Guardar en cache de clase
+                VectorizadorConsultas._modelo_cache = self.modelo
                 VectorizadorConsultas._modelo_loaded = True
         else:
             print("⚠️ sentence-transformers no disponible. Usando embeddings placeholder.")
@@ -121,15 +254,64 @@ class VectorizadorConsultas:
             self._cargar_modelo()
         
         if self.modelo:
-            try:
-                embedding = self.modelo.encode(self._normalize_text(texto), convert_to_numpy=True)
+            normalizado = self._normalize_text(texto)
+            embedding = self.cache_embeddings.obtener(normalizado)
+            if embedding is not None:
                 return embedding.tolist()
+            try:
+                embedding = self.modelo.encode(normalizado, convert_to_numpy=True)
             except Exception as e:
                 print(f"⚠️ Error en vectorización: {e}")
                 return self._placeholder_embedding(texto)
+            self.cache_embeddings.agregar([(normalizado, embedding)])
+            return embedding.tolist()
         else:
             return self._placeholder_embedding(self._normalize_text(texto))
     
+    def vectorizar_lote(self, textos: Sequence[str], batch_size: int = 64) -> List[List[float]]:
+        """
+        Vectoriza muchos textos con una sola pasada del modelo por lote.
+        
+        Los textos ya cacheados (o repetidos en la lista) no se vuelven a
+        codificar; los nuevos quedan en el cache y se persisten al terminar.
+        
+        Args:
+            textos: Textos a vectorizar
+            batch_size: Textos por lote de model.encode
+            
+        Returns:
+            Un embedding por texto, en el mismo orden (mismo resultado que vectorizar())
+        """
+        if self.modelo is None:
+            self._cargar_modelo()
+        
+        normalizados = [self._normalize_text(texto) for texto in textos]
+        if not self.modelo:
+            return [self._placeholder_embedding(normalizado) for normalizado in normalizados]
+        
+        encontrados = {}
+        faltantes = []
+        for normalizado in dict.fromkeys(normalizados):
+            embedding = self.cache_embeddings.obtener(normalizado)
+            if embedding is not None:
+                encontrados[normalizado] = embedding
+            else:
+                faltantes.append(normalizado)
+        
+        if faltantes:
+            try:
+                embeddings = self.modelo.encode(faltantes, batch_size=batch_size, convert_to_numpy=True)
+                encontrados.update(zip(faltantes, embeddings))
+                self.cache_embeddings.agregar(zip(faltantes, embeddings))
+                self.cache_embeddings.guardar()
+            except Exception as e:
+                print(f"⚠️ Error en vectorización por lote: {e}")
+        
+        return [
+            encontrados[normalizado].tolist() if normalizado in encontrados else self._placeholder_embedding(texto)
+            for texto, normalizado in zip(textos, normalizados)
+        ]
+    
     def _placeholder_embedding(self, texto: str) -> List[float]:
         """
         Genera un embedding placeholder basado en hash del texto
@@ -213,59 +395,43 @@ class ProcesadorConsultas:
     def __init__(self):
         self.vectorizador = VectorizadorConsultas()
     
-    def procesar_consulta(self, texto: str, vectores_db: List) -> Optional[Dict]:
+    def procesar_consulta(self, texto: str, vectores_db: Optional[List] = None) -> Optional[Dict]:
         """
         Procesa una consulta y encuentra el vector más similar
         
         Args:
             texto: Consulta del usuario
-            vectores_db: Lista de VectoresConsulta de la BD
+            vectores_db: Lista de VectoresConsulta de la BD; sin ella se usa
+                el índice global de intenciones (agenteIA.indice_intenciones),
+                que no reconvierte los embeddings en cada consulta
             
         Returns:
             Diccionario con información del vector más similar o None
         """
-        if not vectores_db:
+        from agenteIA.indice_intenciones import IndiceIntenciones, obtener_indice
+        
+        indice = obtener_indice() if vectores_db is None else IndiceIntenciones(vectores_db)
+        if not len(indice):
             return None
         
         # Vectorizar la consulta del usuario
         vector_consulta = self.vectorizador.vectorizar(texto.lower())
         
-        mejor_match = None
-        mejor_similitud = 0.0
+        encontrado, parecidos = indice.buscar(vector_consulta, k=3)
         
-        # Comparar con cada vector de la BD
-        for vector_db in vectores_db:
-            if not vector_db.activo or not vector_db.vector_embedding:
-                continue
-            
-            # Calcular similitud
-            similitud = self.vectorizador.calcular_similitud(
-                vector_consulta,
-                vector_db.vector_embedding
-            )
-            
-            # Debug: mostrar similitudes
+        # Debug: los 3 más parecidos (no todos los vectores)
+        for vector_db, similitud in parecidos:
             print(f"   💭 '{vector_db.texto_original}': similitud={similitud:.3f}, threshold={vector_db.threshold}")
-            
-            # Verificar si supera el threshold
-            if similitud >= vector_db.threshold and similitud > mejor_similitud:
-                mejor_similitud = similitud
-                mejor_match = {
-                    'vector': vector_db,
-                    'similitud': similitud,
-                    'tipo': vector_db.tipo_consulta,
-                    'categoria': vector_db.categoria
-                }
         
-        if mejor_match:
-            # Extraer variables del texto
-            variables = self.vectorizador.extraer_variables(
-                texto,
-                mejor_match['vector'].variables
-            )
-            mejor_match['variables'] = variables
-            
-            return mejor_match
+        if encontrado is None:
+            return None
         
-        return None
-
+        vector_db, similitud = encontrado
+        return {
+            'vector': vector_db,
+            'similitud': similitud,
+            'tipo': vector_db.tipo_consulta,
+            'categoria': vector_db.categoria,
+            # Extraer variables del texto
+            'variables': self.vectorizador.extraer_variables(texto, vector_db.variables),
+        }
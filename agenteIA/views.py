@@ -504,7 +504,7 @@ def procesar_consulta(request):
         # FALLBACK: Si patrones no funcionan, usar vectorización (más flexible pero menos preciso)
         if not resultado:
             print("🔍 Intentando con vectorización (fallback)...")
-            resultado = procesador.procesar_consulta(mensaje, vectores)
+            resultado = procesador.procesar_consulta(mensaje)
             if resultado:
                 print(f"✅ Match por vectorización: tipo={resultado.get('tipo')}, similitud={resultado.get('similitud', 0):.2f}")
                 # Solo aceptar si la similitud es razonablemente alta (> 0.6)
@@ -0,0 +1,231 @@
+"""
+Codificaciones compactas de recorridos
+======================================
+
+La lista de objetos de vista_mapa repite las claves en cada punto y manda
+fechas ISO como texto. Para clientes que solo dibujan el trazo hay tres
+alternativas, elegidas con ?formato= o con el header Accept:
+
+- columnas  (application/vnd.waygps.columnas+json): un array por campo;
+  las fechas van como t0 (epoch) + deltas en segundos y los id como deltas.
+- polyline  (application/vnd.waygps.polyline+json): igual que columnas pero
+  lat/lon en una sola "encoded polyline" de Google (precisión 1e-5).
+- binario   (application/vnd.waygps.recorrido): buffer little-endian que se
+  lee directo con typed arrays de JS:
+
+      offset  tipo          contenido
+      0       char[4]       'WGT1'
+      4       uint32        n (puntos)
+      8       float64       t0 (epoch, segundos)
+      16      float32[n]    lat
+      16+4n   float32[n]    lon
+      16+8n   uint32[n]     segundos desde t0
+      16+12n  uint16[n]     velocidad (km/h)
+      16+14n  uint16[n]     rumbo
+      16+16n  uint8[n]      ignición (0/1)
+
+  float32 deja ~0,5 m de resolución en lat/lon, de sobra para el mapa.
+
+    new Float32Array(buffer, 16, n)  // latitudes, sin parsear nada
+
+Todas reciben filas (id, fec_gps, lat, lon, velocidad, rumbo, ign_on).
+"""
+
+import json
+import struct
+from typing import Dict, Iterable, List, Optional
+
+# Dependencia opcional: sin numpy el buffer se arma con struct
+try:
+    import numpy as np
+    NP_AVAILABLE = True
+except Exception:
+    NP_AVAILABLE = False
+    np = None  # type: ignore
+
+CAMPOS_COMPACTOS = ('id', 'fec_gps', 'lat', 'lon', 'velocidad', 'rumbo', 'ign_on')
+
+FORMATOS = {
+    'columnas': 'application/vnd.waygps.columnas+json',
+    'polyline': 'application/vnd.waygps.polyline+json',
+    'binario': 'application/vnd.waygps.recorrido',
+}
+_FORMATO_POR_ACCEPT = {content_type: formato for formato, content_type in FORMATOS.items()}
+
+MAGIA_BINARIO = b'WGT1'
+CABECERA_BINARIO = struct.Struct('<4sId')
+PRECISION_POLYLINE = 5
+
+
+def formato_solicitado(request, por_defecto: str = 'objetos') -> str:
+    """
+    Formato pedido por ?formato= o, si no viene, por el header Accept.
+
+    Returns:
+        'objetos' (lista de dicts de siempre), 'columnas', 'polyline' o 'binario'
+    """
+    formato = request.query_params.get('formato')
+    if formato:
+        return formato
+    for tipo in request.META.get('HTTP_ACCEPT', '').split(','):
+        tipo = tipo.split(';')[0].strip()
+        if tipo in _FORMATO_POR_ACCEPT:
+            return _FORMATO_POR_ACCEPT[tipo]
+    return por_defecto
+
+
+def _columnas_base(filas: Iterable[tuple]) -> Dict[str, List]:
+    ids, segundos, lats, lons, velocidades, rumbos, igniciones = [], [], [], [], [], [], []
+    for pk, fec_gps, lat, lon, velocidad, rumbo, ign_on in filas:
+        if lat is None or lon is None or fec_gps is None:
+            continue
+        ids.append(pk)
+        segundos.append(int(fec_gps.timestamp()))
+        lats.append(float(lat))
+        lons.append(float(lon))
+        velocidades.append(velocidad or 0)
+        rumbos.append(rumbo or 0)
+        igniciones.append(1 if ign_on else 0)
+    return {
+        'id': ids, 'segundos': segundos, 'lat': lats, 'lon': lons,
+        'velocidad': velocidades, 'rumbo': rumbos, 'ignicion': igniciones,
+    }
+
+
+def _deltas(valores: List[int]) -> List[int]:
+    return [valores[0]] + [b - a for a, b in zip(valores, valores[1:])] if valores else []
+
+
+def columnas(filas: Iterable[tuple]) -> Dict:
+    """
+    Recorrido en columnas.
+
+    Returns:
+        {'formato': 'columnas', 'n', 't0', 'dt', 'id_delta', 'lat', 'lon',
+        'velocidad', 'rumbo', 'ignicion'}; el segundo i es t0 + sum(dt[:i+1])
+        y dt[0] == 0 (lo mismo para id_delta, que arranca con el primer id)
+    """
+    base = _columnas_base(filas)
+    segundos = base['segundos']
+    t0 = segundos[0] if segundos else None
+    return {
+        'formato': 'columnas',
+        'n': len(segundos),
+        't0': t0,
+        'dt': [0] + _deltas(segundos)[1:] if segundos else [],
+        'id_delta': _deltas(base['id']),
+        'lat': [round(v, 6) for v in base['lat']],
+        'lon': [round(v, 6) for v in base['lon']],
+        'velocidad': base['velocidad'],
+        'rumbo': base['rumbo'],
+        'ignicion': base['ignicion'],
+    }
+
+
+def encode_polyline(lats: Iterable[float], lons: Iterable[float], precision: int = PRECISION_POLYLINE) -> str:
+    """Algoritmo "Encoded Polyline" de Google"""
+    factor = 10 ** precision
+    partes = []
+    lat_anterior = lon_anterior = 0
+    for lat, lon in zip(lats, lons):
+        lat_entero = int(round(lat * factor))
+        lon_entero = int(round(lon * factor))
+        for delta in (lat_entero - lat_anterior, lon_entero - lon_anterior):
+            valor = ~(delta << 1) if delta < 0 else delta << 1
+            while valor >= 0x20:
+                partes.append(chr((0x20 | (valor & 0x1F)) + 63))
+                valor >>= 5
+            partes.append(chr(valor + 63))
+        lat_anterior, lon_anterior = lat_entero, lon_entero
+    return ''.join(partes)
+
+
+def decode_polyline(texto: str, precision: int = PRECISION_POLYLINE) -> List[tuple]:
+    """Inversa de encode_polyline (para tests y clientes Python)"""
+    factor = 10 ** precision
+    puntos, indice, lat, lon = [], 0, 0, 0
+    while indice < len(texto):
+        valores = []
+        for _ in range(2):
+            resultado = desplazamiento = 0
+            while True:
+                byte = ord(texto[indice]) - 63
+                indice += 1
+                resultado |= (byte & 0x1F) << desplazamiento
+                desplazamiento += 5
+                if byte < 0x20:
+                    break
+            valores.append(~(resultado >> 1) if resultado & 1 else resultado >> 1)
+        lat += valores[0]
+        lon += valores[1]
+        puntos.append((lat / factor, lon / factor))
+    return puntos
+
+
+def polyline(filas: Iterable[tuple]) -> Dict:
+    """Como columnas(), con lat/lon reemplazadas por 'polyline'"""
+    datos = columnas(filas)
+    datos['formato'] = 'polyline'
+    datos['precision'] = PRECISION_POLYLINE
+    datos['polyline'] = encode_polyline(datos.pop('lat'), datos.pop('lon'))
+    return datos
+
+
+def binario(filas: Iterable[tuple]) -> bytes:
+    """Buffer para typed arrays (layout en el docstring del módulo)"""
+    base = _columnas_base(filas)
+    n = len(base['segundos'])
+    t0 = base['segundos'][0] if n else 0
+
+    if NP_AVAILABLE:
+        partes = [
+            np.asarray(base['lat'], dtype='<f4').tobytes(),
+            np.asarray(base['lon'], dtype='<f4').tobytes(),
+            (np.asarray(base['segundos'], dtype=np.int64) - t0).astype('<u4').tobytes(),
+            np.clip(np.asarray(base['velocidad'], dtype=np.int64), 0, 0xFFFF).astype('<u2').tobytes(),
+            np.clip(np.asarray(base['rumbo'], dtype=np.int64), 0, 0xFFFF).astype('<u2').tobytes(),
+            np.asarray(base['ignicion'], dtype=np.uint8).tobytes(),
+        ]
+    else:
+        partes = [
+            struct.pack(f'<{n}f', *base['lat']),
+            struct.pack(f'<{n}f', *base['lon']),
+            struct.pack(f'<{n}I', *(s - t0 for s in base['segundos'])),
+            struct.pack(f'<{n}H', *(min(max(v, 0), 0xFFFF) for v in base['velocidad'])),
+            struct.pack(f'<{n}H', *(min(max(v, 0), 0xFFFF) for v in base['rumbo'])),
+            bytes(base['ignicion']),
+        ]
+    return CABECERA_BINARIO.pack(MAGIA_BINARIO, n, float(t0)) + b''.join(partes)
+
+
+def decode_binario(datos: bytes) -> Dict[str, list]:
+    """Inversa de binario() (para tests y clientes Python)"""
+    magia, n, t0 = CABECERA_BINARIO.unpack_from(datos)
+    if magia != MAGIA_BINARIO:
+        raise ValueError('No es un recorrido binario WGT1')
+    offset = CABECERA_BINARIO.size
+    columnas_binarias = {}
+    for nombre, tipo, tamanio in (('lat', 'f', 4), ('lon', 'f', 4), ('dt', 'I', 4),
+                                  ('velocidad', 'H', 2), ('rumbo', 'H', 2), ('ignicion', 'B', 1)):
+        columnas_binarias[nombre] = list(struct.unpack_from(f'<{n}{tipo}', datos, offset))
+        offset += tamanio * n
+    columnas_binarias['t0'] = t0
+    return columnas_binarias
+
+
+def codificar(formato: str, filas: Iterable[tuple]) -> Optional[tuple]:
+    """
+    Args:
+        formato: 'columnas', 'polyline' o 'binario'
+        filas: Filas CAMPOS_COMPACTOS ordenadas por fec_gps
+
+    Returns:
+        (contenido en bytes, content_type), o None si el formato no es compacto
+    """
+    if formato == 'binario':
+        return binario(filas), FORMATOS['binario']
+    if formato == 'columnas':
+        return json.dumps(columnas(filas), separators=(',', ':')).encode(), FORMATOS['columnas']
+    if formato == 'polyline':
+        return json.dumps(polyline(filas), separators=(',', ':')).encode(), FORMATOS['polyline']
+    return None
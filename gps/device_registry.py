@@ -0,0 +1,285 @@
+"""
+Registro en memoria de equipos GPS (gps_id -> móvil)
+====================================================
+
+Evita resolver `Movil.objects.get(gps_id=...)` en cada mensaje recibido.
+El registro se carga completo al iniciar el receptor y luego:
+
+- se refresca entero cada `ttl` segundos (cubre cambios hechos desde otros
+  procesos, p. ej. otro worker de gunicorn)
+- recuerda los gps_id no registrados durante `ttl_negativo` segundos para
+  que un equipo desconocido que reporta seguido no consulte la base cada vez
+- se invalida por señales post_save/post_delete de Movil y Equipo
+  (ver gps/signals.py)
+
+También permite buscar móviles por patente/alias/código (lo usan las
+acciones de Sofia). Si el texto no está en memoria se consulta la base con
+una sola query y el resultado se agrega al registro: un móvil creado o
+renombrado desde otro worker se encuentra sin esperar la recarga. La carga
+y la búsqueda en la base son inyectables (`loader`, `buscador`), así que
+la clase no depende de Django al importarse.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EntradaMovil:
+    """Datos mínimos de un móvil para resolver equipos sin ir a la base"""
+
+    __slots__ = ('id', 'patente', 'alias', 'codigo', 'gps_id', 'empresa_id', 'activo')
+
+    def __init__(self, id, patente=None, alias=None, codigo=None, gps_id=None,
+                 empresa_id=None, activo=True):
+        self.id = id
+        self.patente = patente
+        self.alias = alias
+        self.codigo = codigo
+        self.gps_id = gps_id
+        self.empresa_id = empresa_id
+        self.activo = activo
+
+    def __repr__(self):
+        return f"EntradaMovil(id={self.id}, patente={self.patente!r}, gps_id={self.gps_id!r})"
+
+
+def _cargar_desde_db(gps_id: Optional[str] = None) -> List[EntradaMovil]:
+    """
+    Cargar móviles desde la base (todos, o solo el de un gps_id).
+
+    La empresa se toma del Equipo cuyo IMEI coincide con el gps_id del móvil.
+    """
+    from moviles.models import Movil
+    from gps.models import Equipo
+
+    moviles = Movil.objects.all()
+    equipos = Equipo.objects.exclude(empresa_id__isnull=True)
+    if gps_id is not None:
+        moviles = moviles.filter(gps_id=gps_id)
+        equipos = equipos.filter(imei=gps_id)
+
+    empresas = dict(equipos.values_list('imei', 'empresa_id'))
+    return [
+        EntradaMovil(
+            id=movil_id,
+            patente=patente,
+            alias=alias,
+            codigo=codigo,
+            gps_id=gps,
+            empresa_id=empresas.get(gps),
+            activo=activo,
+        )
+        for movil_id, patente, alias, codigo, gps, activo in moviles.order_by('id').values_list(
+            'id', 'patente', 'alias', 'codigo', 'gps_id', 'activo'
+        )
+    ]
+
+
+def _buscar_en_db(texto: str, exacto: bool = False) -> Optional[EntradaMovil]:
+    """
+    Primer móvil (por id) cuya patente, alias o código coincide, con su
+    empresa, en una sola query: mismas reglas que DeviceRegistry.buscar.
+    """
+    from django.db.models import OuterRef, Q, Subquery
+    from moviles.models import Movil
+    from gps.models import Equipo
+
+    lookup = 'iexact' if exacto else 'icontains'
+    filtro = Q()
+    for campo in ('patente', 'alias', 'codigo'):
+        filtro |= Q(**{f'{campo}__{lookup}': texto})
+    empresa = Equipo.objects.filter(imei=OuterRef('gps_id')).exclude(
+        empresa_id__isnull=True
+    ).values('empresa_id')[:1]
+
+    fila = Movil.objects.filter(filtro).annotate(empresa_equipo=Subquery(empresa)).order_by('id').values_list(
+        'id', 'patente', 'alias', 'codigo', 'gps_id', 'empresa_equipo', 'activo'
+    ).first()
+    if fila is None:
+        return None
+    movil_id, patente, alias, codigo, gps_id, empresa_id, activo = fila
+    return EntradaMovil(id=movil_id, patente=patente, alias=alias, codigo=codigo, gps_id=gps_id,
+                        empresa_id=empresa_id, activo=activo)
+
+
+class DeviceRegistry:
+    """Cache de proceso gps_id -> EntradaMovil con TTL y cache negativa"""
+
+    def __init__(self, ttl: float = 300, ttl_negativo: float = 60,
+                 loader: Callable[..., Iterable[EntradaMovil]] = None,
+                 buscador: Callable[[str, bool], Optional[EntradaMovil]] = None):
+        """
+        Args:
+            ttl: Segundos entre recargas completas
+            ttl_negativo: Segundos que se recuerda un gps_id no registrado
+            loader: Función que devuelve las entradas (acepta gps_id opcional)
+            buscador: Función (texto, exacto) que busca en la base un móvil
+                que no está en memoria
+        """
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self.loader = loader or _cargar_desde_db
+        self.buscador = buscador or _buscar_en_db
+
+        self._lock = threading.RLock()
+        self._entradas: Dict[int, EntradaMovil] = {}
+        # Entradas ordenadas por id para buscar(); None = hay que reordenar
+        self._ordenadas: Optional[List[EntradaMovil]] = []
+        self._por_gps_id: Dict[str, EntradaMovil] = {}
+        self._desconocidos: Dict[str, float] = {}
+        self._cargado_en: Optional[float] = None
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'busquedas_db': 0,
+            'negativos': 0,
+            'recargas': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Carga / invalidación
+    # ------------------------------------------------------------------
+
+    def cargar(self):
+        """Cargar (o recargar) todos los móviles desde la base"""
+        entradas = list(self.loader())
+        with self._lock:
+            self._entradas = {e.id: e for e in entradas}
+            self._ordenadas = sorted(entradas, key=lambda e: e.id)
+            self._por_gps_id = {str(e.gps_id): e for e in entradas if e.gps_id}
+            self._desconocidos.clear()
+            self._cargado_en = time.monotonic()
+            self.stats['recargas'] += 1
+        logger.info(f"📇 Registro de equipos cargado: {len(entradas)} móviles, {len(self._por_gps_id)} con gps_id")
+
+    def _asegurar_vigente(self):
+        if self._cargado_en is None or time.monotonic() - self._cargado_en > self.ttl:
+            with self._lock:
+                # Otro hilo pudo recargar mientras esperábamos el lock
+                if self._cargado_en is None or time.monotonic() - self._cargado_en > self.ttl:
+                    self.cargar()
+
+    def invalidar(self, movil_id: int = None, gps_id: str = None):
+        """
+        Invalidar entradas del registro.
+
+        Sin argumentos fuerza una recarga completa en el próximo acceso.
+
+        Args:
+            movil_id: ID del móvil modificado o eliminado
+            gps_id: gps_id/IMEI afectado (también limpia la cache negativa)
+        """
+        with self._lock:
+            if movil_id is None and gps_id is None:
+                self._cargado_en = None
+                return
+            self._ordenadas = None
+            if movil_id is not None:
+                entrada = self._entradas.pop(movil_id, None)
+                if entrada and entrada.gps_id:
+                    self._por_gps_id.pop(str(entrada.gps_id), None)
+            if gps_id:
+                entrada = self._por_gps_id.pop(str(gps_id), None)
+                if entrada:
+                    self._entradas.pop(entrada.id, None)
+                self._desconocidos.pop(str(gps_id), None)
+
+    def actualizar(self, entrada: EntradaMovil):
+        """Reemplazar (o agregar) la entrada de un móvil"""
+        with self._lock:
+            self.invalidar(movil_id=entrada.id)
+            self._entradas[entrada.id] = entrada
+            self._ordenadas = None
+            if entrada.gps_id:
+                self._por_gps_id[str(entrada.gps_id)] = entrada
+                self._desconocidos.pop(str(entrada.gps_id), None)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def resolver(self, gps_id) -> Optional[EntradaMovil]:
+        """
+        Resolver el móvil asignado a un gps_id.
+
+        Returns:
+            EntradaMovil o None si el equipo no está registrado
+        """
+        if gps_id is None:
+            return None
+        self._asegurar_vigente()
+        clave = str(gps_id).strip()
+
+        entrada = self._por_gps_id.get(clave)
+        if entrada is not None:
+            self.stats['hits'] += 1
+            return entrada
+
+        expira = self._desconocidos.get(clave)
+        if expira is not None and expira > time.monotonic():
+            self.stats['negativos'] += 1
+            return None
+
+        # Puede ser un equipo dado de alta después de la última carga
+        self.stats['misses'] += 1
+        encontradas = list(self.loader(gps_id=clave))
+        if encontradas:
+            self.actualizar(encontradas[0])
+            return encontradas[0]
+
+        with self._lock:
+            self._desconocidos[clave] = time.monotonic() + self.ttl_negativo
+        return None
+
+    def buscar(self, texto: str, exacto: bool = False) -> Optional[EntradaMovil]:
+        """
+        Buscar un móvil por patente, alias o código (sin distinguir mayúsculas).
+
+        Equivale a filter(Q(patente__icontains=...) | Q(alias__icontains=...) |
+        Q(codigo__icontains=...)).order_by('id').first() (o __iexact si
+        exacto=True). Si en memoria no hay coincidencias se consulta la base
+        (puede ser un móvil creado o renombrado en otro proceso).
+        """
+        if not texto:
+            return None
+        self._asegurar_vigente()
+        buscado = texto.lower()
+
+        for entrada in self._entradas_ordenadas():
+            for valor in (entrada.patente, entrada.alias, entrada.codigo):
+                if not valor:
+                    continue
+                valor = valor.lower()
+                if (valor == buscado) if exacto else (buscado in valor):
+                    return entrada
+
+        self.stats['busquedas_db'] += 1
+        entrada = self.buscador(texto, exacto)
+        if entrada is not None:
+            self.actualizar(entrada)
+        return entrada
+
+    def _entradas_ordenadas(self) -> List[EntradaMovil]:
+        ordenadas = self._ordenadas
+        if ordenadas is None:
+            with self._lock:
+                ordenadas = self._ordenadas = sorted(self._entradas.values(), key=lambda e: e.id)
+        return ordenadas
+
+    def get_stats(self) -> Dict:
+        """Estadísticas de uso del registro"""
+        return {
+            **self.stats,
+            'moviles': len(self._entradas),
+            'equipos': len(self._por_gps_id),
+            'desconocidos': len(self._desconocidos),
+        }
+
+
+# Instancia global del registro (compartida por receptores y acciones de Sofia)
+device_registry = DeviceRegistry()
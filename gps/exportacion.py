@@ -0,0 +1,229 @@
+"""
+Exportación de recorridos en streaming
+======================================
+
+exportar_recorrido y exportar_excel armaban listas de dicts con todas las
+posiciones (instancias de modelo completas) y después el JSON o el
+workbook entero en memoria. Acá las posiciones se leen con values_list +
+iterator(chunk_size), así que en memoria hay a lo sumo un chunk de filas:
+
+- JSON / NDJSON / CSV: generadores de texto para StreamingHttpResponse; el
+  primer byte sale con el primer chunk, antes de que termine la consulta.
+- XLSX: openpyxl en modo write-only escribe las filas a un archivo
+  temporal. El xlsx es un zip que se cierra al final, así que la respuesta
+  empieza cuando termina la consulta, pero la memoria queda acotada igual.
+"""
+
+import csv
+import json
+import tempfile
+from datetime import timedelta, timezone
+from typing import Dict, Iterable, Iterator
+
+from django.conf import settings
+
+from gps.models import Posicion
+from gps.recorrido_stats import AcumuladorEstadisticas
+
+CHUNK_SIZE = getattr(settings, 'WAYGPS_EXPORT_CHUNK_SIZE', 2000)
+
+# Columnas leídas de Posicion (en este orden)
+CAMPOS_EXPORTACION = ('fec_gps', 'lat', 'lon', 'direccion', 'velocidad', 'rumbo', 'altitud', 'sats', 'ign_on')
+
+# Columnas de CSV/NDJSON (mismas claves que el JSON de exportar_recorrido)
+COLUMNAS = ('timestamp', 'lat', 'lon', 'velocidad', 'rumbo', 'altitud', 'ignicion', 'satelites', 'calidad')
+
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+try:
+    from zoneinfo import ZoneInfo
+    TZ_ARGENTINA = ZoneInfo('America/Argentina/Buenos_Aires')
+except Exception:
+    TZ_ARGENTINA = timezone(timedelta(hours=-3))
+
+
+def iterar_posiciones(queryset, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple]:
+    """
+    Filas (CAMPOS_EXPORTACION) del recorrido ordenadas por fec_gps, de a chunks.
+
+    Args:
+        queryset: Posiciones del recorrido
+        chunk_size: Filas por lectura (cursor del lado del servidor en PostgreSQL)
+    """
+    return queryset.order_by('fec_gps').values_list(*CAMPOS_EXPORTACION).iterator(chunk_size=chunk_size)
+
+
+def _registro(fila: tuple) -> Dict:
+    """Fila de exportar_recorrido con la fecha en hora de Argentina (sin dirección, como siempre)"""
+    fec_gps, lat, lon, _direccion, velocidad, rumbo, altitud, sats, ign_on = fila
+    if fec_gps is not None:
+        fecha = fec_gps.astimezone(TZ_ARGENTINA) if fec_gps.tzinfo else fec_gps.replace(tzinfo=TZ_ARGENTINA)
+        timestamp = fecha.isoformat()
+    else:
+        timestamp = None
+    return {
+        'timestamp': timestamp,
+        'lat': float(lat),
+        'lon': float(lon),
+        'velocidad': velocidad or 0,
+        'rumbo': rumbo or 0,
+        'altitud': altitud or 0,
+        'ignicion': ign_on,
+        'satelites': sats or 0,
+        'calidad': Posicion.calidad_por_satelites(sats),
+    }
+
+
+def _registros(filas: Iterable[tuple]) -> Iterator[Dict]:
+    # Igual que antes: solo las posiciones con coordenadas
+    for fila in filas:
+        if fila[1] and fila[2]:
+            yield _registro(fila)
+
+
+def _agrupar(lineas: Iterator[str], tamanio: int = 500) -> Iterator[str]:
+    """Juntar líneas para no mandar un chunk HTTP por posición"""
+    bloque = []
+    for linea in lineas:
+        bloque.append(linea)
+        if len(bloque) >= tamanio:
+            yield ''.join(bloque)
+            bloque = []
+    if bloque:
+        yield ''.join(bloque)
+
+
+def stream_json(filas: Iterable[tuple], parametros: Dict) -> Iterator[str]:
+    """
+    Mismo JSON que devolvía exportar_recorrido ({recorrido, total_puntos,
+    parametros}), generado de a pedazos. total_puntos va al final porque se
+    conoce recién después de la última fila.
+    """
+    def lineas():
+        total = 0
+        yield '{"recorrido": ['
+        for registro in _registros(filas):
+            yield (', ' if total else '') + json.dumps(registro, ensure_ascii=False)
+            total += 1
+        yield '], "total_puntos": %d, "parametros": %s}' % (total, json.dumps(parametros, ensure_ascii=False))
+    return _agrupar(lineas())
+
+
+def stream_ndjson(filas: Iterable[tuple]) -> Iterator[str]:
+    """Una posición JSON por línea"""
+    return _agrupar(json.dumps(registro, ensure_ascii=False) + '\n' for registro in _registros(filas))
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve la línea en vez de escribirla"""
+
+    def write(self, valor):
+        return valor
+
+
+def stream_csv(filas: Iterable[tuple]) -> Iterator[str]:
+    """CSV con encabezado COLUMNAS"""
+    writer = csv.writer(_Eco())
+
+    def lineas():
+        yield writer.writerow(COLUMNAS)
+        for registro in _registros(filas):
+            yield writer.writerow([registro[columna] for columna in COLUMNAS])
+    return _agrupar(lineas())
+
+
+def generar_xlsx(filas: Iterable[tuple], movil_info: Dict):
+    """
+    Workbook del recorrido en modo write-only (hoja de posiciones + hoja de
+    información y estadísticas), escrito a un archivo temporal.
+
+    Args:
+        filas: Filas de iterar_posiciones()
+        movil_info: patente, alias, marca y modelo del móvil
+
+    Returns:
+        (archivo temporal posicionado al inicio, cantidad de posiciones)
+    """
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Recorrido GPS")
+
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    center_alignment = Alignment(horizontal="center", vertical="center")
+
+    def encabezado(hoja, titulos):
+        celdas = []
+        for titulo in titulos:
+            celda = WriteOnlyCell(hoja, value=titulo)
+            celda.font = header_font
+            celda.fill = header_fill
+            celda.alignment = center_alignment
+            celdas.append(celda)
+        hoja.append(celdas)
+
+    headers = [
+        'N°', 'Fecha/Hora', 'Latitud', 'Longitud', 'Dirección',
+        'Velocidad (km/h)', 'Rumbo (°)', 'Altitud (m)', 'Satélites',
+        'Encendido', 'Calidad Señal'
+    ]
+    for col in range(1, len(headers) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = 15
+    encabezado(ws, headers)
+
+    acumulador = AcumuladorEstadisticas()
+    numero = 0
+    for fec_gps, lat, lon, direccion, velocidad, rumbo, altitud, sats, ign_on in filas:
+        numero += 1
+        acumulador.agregar(fec_gps, lat, lon, velocidad)
+        ws.append([
+            numero,
+            fec_gps.isoformat() if fec_gps else '',
+            float(lat) if lat else None,
+            float(lon) if lon else None,
+            direccion or '',
+            velocidad or 0,
+            rumbo or 0,
+            altitud or 0,
+            sats or 0,
+            'Sí' if ign_on else 'No',
+            Posicion.calidad_por_satelites(sats),
+        ])
+
+    estadisticas = acumulador.resultado() or {}
+    ws_stats = wb.create_sheet("Información del Recorrido")
+    ws_stats.column_dimensions['A'].width = 25
+    ws_stats.column_dimensions['B'].width = 20
+    encabezado(ws_stats, ["Información", "Valor"])
+
+    filas_info = [
+        ('Patente', movil_info.get('patente', 'N/A')),
+        ('Alias', movil_info.get('alias', 'N/A')),
+        ('Marca', movil_info.get('marca', 'N/A')),
+        ('Modelo', movil_info.get('modelo', 'N/A')),
+        ('', ''),  # Línea en blanco
+        ('Duración (minutos)', estadisticas.get('duracion_minutos', 0)),
+        ('Distancia (km)', estadisticas.get('distancia_km', 0)),
+        ('Velocidad Máxima (km/h)', estadisticas.get('velocidad_maxima', 0)),
+        ('Velocidad Promedio (km/h)', estadisticas.get('velocidad_promedio', 0)),
+        ('Puntos GPS', estadisticas.get('puntos_gps', 0)),
+        ('Detenciones', estadisticas.get('detenciones', 0)),
+        ('Tiempo Detenido (minutos)', estadisticas.get('tiempo_detenido_minutos', 0)),
+        ('Tiempo en Movimiento (minutos)', estadisticas.get('tiempo_movimiento_minutos', 0)),
+    ]
+    for fila in filas_info:
+        ws_stats.append(list(fila))
+
+    archivo = tempfile.TemporaryFile()
+    wb.save(archivo)
+    archivo.seek(0)
+    return archivo, numero
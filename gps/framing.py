@@ -0,0 +1,195 @@
+"""
+Framing de streams TCP para protocolos GPS
+==========================================
+
+TCP no respeta los límites de mensaje: un recv() puede traer medio mensaje
+o varios mensajes juntos (típico cuando un equipo se reconecta y descarga
+las posiciones que tenía en buffer). Cada conexión tiene un framer con un
+único bytearray reutilizable donde se acumulan los bytes recibidos; feed()
+devuelve solo los mensajes completos y deja el resto para el próximo recv.
+
+Protocolos soportados:
+
+- TQ: tramas binarias que empiezan con 0x24 ('$') de largo fijo, tramas de
+  texto '*HQ,...#' y respuestas Queclink en texto '+RESP:...$'
+- Teltonika: paquete de IMEI (2 bytes de largo + IMEI) y paquetes AVL
+  (4 bytes en cero + 4 bytes de largo + datos + 4 bytes de CRC)
+- Genérico: cada recv() es un mensaje (comportamiento anterior)
+
+Este módulo no depende de Django (lo usa también tq_server_rpg.py).
+"""
+
+import re
+import struct
+from typing import List, Optional, Tuple
+
+# Resultado de _buscar_trama: (inicio, fin) de una trama completa,
+# (inicio, None) si la trama está incompleta o (None, salto) si hay que
+# descartar bytes hasta `salto`
+Busqueda = Tuple[Optional[int], Optional[int]]
+
+
+class StreamFramer:
+    """Base: buffer por conexión + extracción de tramas completas"""
+
+    def __init__(self, max_buffer: int = 65536):
+        """
+        Args:
+            max_buffer: Bytes máximos acumulados sin formar una trama
+                (protección ante basura o un equipo que no respeta el protocolo)
+        """
+        self.max_buffer = max_buffer
+        self._buffer = bytearray()
+        self.tramas = 0
+        self.bytes_descartados = 0
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """
+        Agregar bytes recibidos y devolver las tramas completas.
+
+        Args:
+            data: Bytes de un recv()
+
+        Returns:
+            Lista de tramas completas (cada una como bytes independiente)
+        """
+        buffer = self._buffer
+        buffer += data
+        tramas = []
+        pos = 0
+
+        while pos < len(buffer):
+            inicio, fin = self._buscar_trama(buffer, pos)
+            if inicio is None:
+                # Basura antes de la próxima trama reconocible
+                self.bytes_descartados += fin - pos
+                pos = fin
+                continue
+            if fin is None:
+                # Trama incompleta: esperar más bytes
+                self.bytes_descartados += inicio - pos
+                pos = inicio
+                break
+            self.bytes_descartados += inicio - pos
+            # Única copia por trama: el buffer se compacta a continuación
+            tramas.append(bytes(buffer[inicio:fin]))
+            pos = fin
+
+        if pos:
+            del buffer[:pos]
+        if len(buffer) > self.max_buffer:
+            self.bytes_descartados += len(buffer)
+            buffer.clear()
+
+        self.tramas += len(tramas)
+        return tramas
+
+    def pendientes(self) -> int:
+        """Bytes acumulados que todavía no forman una trama"""
+        return len(self._buffer)
+
+    def _buscar_trama(self, buffer: bytearray, pos: int) -> Busqueda:
+        raise NotImplementedError
+
+
+class GenericFramer(StreamFramer):
+    """Sin framing: cada recv() se procesa como un mensaje"""
+
+    def _buscar_trama(self, buffer: bytearray, pos: int) -> Busqueda:
+        return pos, len(buffer)
+
+
+class TQFramer(StreamFramer):
+    """
+    Tramas TQ/Queclink:
+
+    - binaria: 0x24 + largo fijo (por defecto 45 bytes, como envían los equipos TQ)
+    - texto '*HQ,...#'
+    - texto Queclink '+RESP:...$' / '+BUFF:...$' / '+ACK:...$'
+    """
+
+    INICIOS = re.compile(rb'[$*+]')
+    FIN_TEXTO = {0x2A: b'#', 0x2B: b'$'}
+    MAX_TEXTO = 1024
+
+    def __init__(self, longitud_binaria: int = 45, **kwargs):
+        super().__init__(**kwargs)
+        self.longitud_binaria = longitud_binaria
+
+    def _buscar_trama(self, buffer: bytearray, pos: int) -> Busqueda:
+        match = self.INICIOS.search(buffer, pos)
+        if match is None:
+            # Sin inicio reconocible: si es solo whitespace se descarta; si
+            # no, se entrega tal cual (mismo comportamiento que sin framing)
+            if buffer[pos:].strip():
+                return pos, len(buffer)
+            return None, len(buffer)
+
+        inicio = match.start()
+        if inicio > pos and buffer[pos:inicio].strip():
+            return pos, inicio
+
+        marca = buffer[inicio]
+        if marca == 0x24:
+            fin = inicio + self.longitud_binaria
+            return (inicio, fin) if fin <= len(buffer) else (inicio, None)
+
+        fin = buffer.find(self.FIN_TEXTO[marca], inicio + 1)
+        if fin == -1:
+            if len(buffer) - inicio > self.MAX_TEXTO:
+                return None, inicio + 1
+            return inicio, None
+        return inicio, fin + 1
+
+
+class TeltonikaFramer(StreamFramer):
+    """Paquete de IMEI y paquetes AVL (Codec 8 / 8E) de Teltonika sobre TCP"""
+
+    CABECERA_AVL = struct.Struct('>II')  # preámbulo (0) + largo de datos
+    MAX_AVL = 1280 * 10
+
+    def _buscar_trama(self, buffer: bytearray, pos: int) -> Busqueda:
+        disponibles = len(buffer) - pos
+        if disponibles < 2:
+            return pos, None
+
+        if buffer[pos] == 0 and buffer[pos + 1] == 0:
+            if disponibles < self.CABECERA_AVL.size:
+                return pos, None
+            preambulo, largo = self.CABECERA_AVL.unpack_from(buffer, pos)
+            if preambulo != 0 or largo > self.MAX_AVL:
+                return None, pos + 1
+            fin = pos + self.CABECERA_AVL.size + largo + 4  # + CRC
+            return (pos, fin) if fin <= len(buffer) else (pos, None)
+
+        # Paquete de identificación: largo (2 bytes) + IMEI en ASCII
+        largo_imei = struct.unpack_from('>H', buffer, pos)[0]
+        if not 1 <= largo_imei <= 20:
+            return None, pos + 1
+        fin = pos + 2 + largo_imei
+        return (pos, fin) if fin <= len(buffer) else (pos, None)
+
+
+FRAMERS = {
+    'tq': TQFramer,
+    'queclink': TQFramer,
+    'teltonika': TeltonikaFramer,
+    # Configuraciones viejas guardan el transporte en `protocolo`; el
+    # receptor TCP siempre usa el procesador TQ
+    'tcp': TQFramer,
+    'generic': GenericFramer,
+}
+
+
+def crear_framer(protocolo: str, **kwargs) -> StreamFramer:
+    """
+    Crear el framer de una conexión según el protocolo del receptor.
+
+    Args:
+        protocolo: Protocolo del receptor ('TQ', 'Teltonika', ...)
+
+    Returns:
+        Framer nuevo (uno por conexión, no es thread-safe)
+    """
+    framer_class = FRAMERS.get((protocolo or '').lower(), GenericFramer)
+    return framer_class(**kwargs)
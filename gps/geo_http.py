@@ -0,0 +1,285 @@
+"""
+Cliente HTTP compartido para servicios geográficos (Nominatim, OSRM)
+===================================================================
+
+Cada consulta a Nominatim u OSRM era un requests.get() suelto: DNS + TCP +
+TLS en cada llamada, sin límite de concurrencia y sin forma de dejar de
+insistir cuando el proveedor está caído (Sofía esperaba el timeout en cada
+pregunta). Acá hay un ClienteGeo por proveedor con:
+
+- requests.Session con pool keep-alive (HTTPAdapter, pool_maxsize =
+  concurrencia máxima), creada por proceso (gunicorn hace fork).
+- Semáforo de concurrencia y rate limit (consultas por segundo) por host.
+- Reintentos con backoff exponencial y jitter ante errores de red, 429 y
+  5xx (solo GET, que es idempotente).
+- Circuit breaker: después de `umbral_fallas` fallas seguidas el proveedor
+  queda "abierto" `enfriamiento` segundos y las consultas fallan al
+  instante con ProveedorNoDisponible; pasado ese tiempo se deja pasar una
+  consulta de prueba.
+- Métricas de latencia (promedio, p50, p95) y contadores en get_stats().
+
+Las URL base se configuran en settings para apuntar a un Nominatim/OSRM
+propio o a un stub local en tests:
+
+    WAYGPS_NOMINATIM_URL = 'https://nominatim.openstreetmap.org'
+    WAYGPS_OSRM_URL = 'http://router.project-osrm.org'
+
+Sin Django configurado (tq_server_rpg.py como script) se usan los defaults.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_REINTENTABLES = (429, 500, 502, 503, 504)
+
+
+class ProveedorNoDisponible(requests.RequestException):
+    """El circuit breaker del proveedor está abierto (no se hizo la consulta)"""
+
+
+class ClienteGeo:
+    """Sesión HTTP con pool, límites por host, reintentos y circuit breaker"""
+
+    def __init__(self, nombre: str, base_url: str, user_agent: str = 'WayGPS/1.0',
+                 timeout: float = 10, max_concurrentes: int = 4,
+                 consultas_por_segundo: Optional[float] = None, reintentos: int = 2,
+                 backoff: float = 0.5, umbral_fallas: int = 5, enfriamiento: float = 30):
+        """
+        Args:
+            nombre: Nombre del proveedor (logs y estadísticas)
+            base_url: URL base sin barra final
+            user_agent: User-Agent por defecto (Nominatim lo exige)
+            timeout: Timeout por defecto de cada intento, en segundos
+            max_concurrentes: Consultas simultáneas (y conexiones en el pool)
+            consultas_por_segundo: Rate limit del proceso (None: sin límite)
+            reintentos: Reintentos ante errores transitorios
+            backoff: Espera base entre reintentos (se duplica en cada uno, con jitter)
+            umbral_fallas: Fallas seguidas que abren el circuito
+            enfriamiento: Segundos que el circuito queda abierto
+        """
+        self.nombre = nombre
+        self.base_url = base_url.rstrip('/')
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.max_concurrentes = max_concurrentes
+        self.intervalo = 1 / consultas_por_segundo if consultas_por_segundo else 0
+        self.reintentos = reintentos
+        self.backoff = backoff
+        self.umbral_fallas = umbral_fallas
+        self.enfriamiento = enfriamiento
+
+        self._session: Optional[requests.Session] = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._semaforo = threading.BoundedSemaphore(max_concurrentes)
+        self._rate_lock = threading.Lock()
+        self._ultima_consulta = 0.0
+
+        self._fallas_seguidas = 0
+        self._abierto_hasta = 0.0
+        self._latencias = deque(maxlen=500)
+
+        self.stats = {
+            'consultas': 0,
+            'errores': 0,
+            'reintentos': 0,
+            'rechazadas_circuito': 0,
+            'aperturas_circuito': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Sesión
+    # ------------------------------------------------------------------
+
+    @property
+    def session(self) -> requests.Session:
+        """Sesión del proceso actual (después de un fork se crea otra)"""
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrentes, max_retries=0)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    session.headers['User-Agent'] = self.user_agent
+                    self._session, self._pid = session, pid
+        return self._session
+
+    def cerrar(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def get(self, ruta: str, params: Optional[Dict] = None, headers: Optional[Dict] = None,
+            timeout: Optional[float] = None) -> requests.Response:
+        """
+        GET a base_url + ruta con reintentos.
+
+        Returns:
+            La respuesta (puede tener un status de error no reintentable, p. ej. 404)
+
+        Raises:
+            ProveedorNoDisponible: si el circuito está abierto
+            requests.RequestException: si se agotaron los reintentos
+        """
+        if not self._permitir():
+            self.stats['rechazadas_circuito'] += 1
+            raise ProveedorNoDisponible(f"{self.nombre} no disponible (circuito abierto)")
+
+        url = self.base_url + ruta
+        ultimo_error: Optional[Exception] = None
+        for intento in range(self.reintentos + 1):
+            if intento:
+                self.stats['reintentos'] += 1
+                time.sleep(self.backoff * (2 ** (intento - 1)) * random.uniform(0.5, 1.5))
+            try:
+                respuesta = self._enviar(url, params, headers, timeout or self.timeout)
+            except requests.RequestException as e:
+                ultimo_error = e
+                continue
+            if respuesta.status_code in ESTADOS_REINTENTABLES:
+                ultimo_error = requests.HTTPError(f"{self.nombre}: HTTP {respuesta.status_code}", response=respuesta)
+                continue
+            self._registrar_exito()
+            return respuesta
+
+        self.stats['errores'] += 1
+        self._registrar_falla()
+        raise ultimo_error
+
+    def get_json(self, ruta: str, params: Optional[Dict] = None, headers: Optional[Dict] = None,
+                 timeout: Optional[float] = None):
+        """Como get(), pero con raise_for_status() y devolviendo el JSON"""
+        respuesta = self.get(ruta, params=params, headers=headers, timeout=timeout)
+        respuesta.raise_for_status()
+        return respuesta.json()
+
+    def _enviar(self, url, params, headers, timeout) -> requests.Response:
+        with self._semaforo:
+            if self.intervalo:
+                with self._rate_lock:
+                    espera = self._ultima_consulta + self.intervalo - time.monotonic()
+                    if espera > 0:
+                        time.sleep(espera)
+                    self._ultima_consulta = time.monotonic()
+            inicio = time.monotonic()
+            try:
+                return self.session.get(url, params=params, headers=headers, timeout=timeout)
+            finally:
+                self._latencias.append((time.monotonic() - inicio) * 1000)
+                self.stats['consultas'] += 1
+
+    # ------------------------------------------------------------------
+    # Circuit breaker
+    # ------------------------------------------------------------------
+
+    def _permitir(self) -> bool:
+        with self._lock:
+            if self._fallas_seguidas < self.umbral_fallas:
+                return True
+            ahora = time.monotonic()
+            if ahora < self._abierto_hasta:
+                return False
+            # Semiabierto: pasa una consulta de prueba y el resto espera otro enfriamiento
+            self._abierto_hasta = ahora + self.enfriamiento
+            return True
+
+    def _registrar_exito(self):
+        with self._lock:
+            if self._fallas_seguidas >= self.umbral_fallas:
+                logger.info(f"✅ {self.nombre} respondió de nuevo, circuito cerrado")
+            self._fallas_seguidas = 0
+
+    def _registrar_falla(self):
+        with self._lock:
+            self._fallas_seguidas += 1
+            if self._fallas_seguidas == self.umbral_fallas:
+                self._abierto_hasta = time.monotonic() + self.enfriamiento
+                self.stats['aperturas_circuito'] += 1
+                logger.warning(f"⚠️ {self.nombre} no responde: circuito abierto por {self.enfriamiento} s")
+
+    @property
+    def abierto(self) -> bool:
+        return self._fallas_seguidas >= self.umbral_fallas and time.monotonic() < self._abierto_hasta
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict:
+        latencias = sorted(self._latencias)
+
+        def percentil(p):
+            return round(latencias[min(len(latencias) - 1, int(len(latencias) * p))], 2) if latencias else None
+
+        return {
+            **self.stats,
+            'base_url': self.base_url,
+            'circuito_abierto': self.abierto,
+            'fallas_seguidas': self._fallas_seguidas,
+            'latencia_promedio_ms': round(sum(latencias) / len(latencias), 2) if latencias else None,
+            'latencia_p50_ms': percentil(0.5),
+            'latencia_p95_ms': percentil(0.95),
+        }
+
+
+def _config(nombre: str, por_defecto):
+    if os.environ.get('DJANGO_SETTINGS_MODULE'):
+        from django.conf import settings
+        return getattr(settings, nombre, por_defecto)
+    return por_defecto
+
+
+def _crear_clientes():
+    user_agent = _config('WAYGPS_GEOCODER_UA', 'WayGPS/1.0 (contact@waygps.com)')
+    nominatim = ClienteGeo(
+        'Nominatim',
+        _config('WAYGPS_NOMINATIM_URL', 'https://nominatim.openstreetmap.org'),
+        user_agent=user_agent,
+        timeout=_config('WAYGPS_NOMINATIM_TIMEOUT', 8),
+        max_concurrentes=_config('WAYGPS_NOMINATIM_CONCURRENTES', 2),
+        # Política del Nominatim público: 1 consulta por segundo
+        consultas_por_segundo=_config('WAYGPS_GEOCODE_CONSULTAS_POR_SEGUNDO', 1),
+    )
+    osrm = ClienteGeo(
+        'OSRM',
+        _config('WAYGPS_OSRM_URL', 'http://router.project-osrm.org'),
+        user_agent=user_agent,
+        timeout=_config('WAYGPS_OSRM_TIMEOUT', 3),
+        max_concurrentes=_config('WAYGPS_OSRM_CONCURRENTES', 4),
+        consultas_por_segundo=_config('WAYGPS_OSRM_CONSULTAS_POR_SEGUNDO', None),
+        reintentos=1,
+    )
+    return nominatim, osrm
+
+
+# Clientes globales (compartidos por todos los consumidores del proceso)
+nominatim, osrm = _crear_clientes()
+
+
+def ruta_osrm(lat1: float, lon1: float, lat2: float, lon2: float) -> Dict:
+    """Respuesta de OSRM /route (auto, sin geometría) entre dos puntos"""
+    return osrm.get_json(
+        f"/route/v1/driving/{lon1},{lat1};{lon2},{lat2}",
+        params={'overview': 'false', 'alternatives': 'false'},
+    )
+
+
+def get_stats() -> Dict:
+    return {'nominatim': nominatim.get_stats(), 'osrm': osrm.get_stats()}
@@ -0,0 +1,333 @@
+"""
+Cache compartido de geocodificación inversa por celda geohash
+=============================================================
+
+Las coordenadas se agrupan en celdas geohash (precisión configurable, por
+defecto 7 ≈ 150 m) y la respuesta del geocodificador se reutiliza para
+cualquier punto de la misma celda. Niveles, del más rápido al más lento:
+
+1. LRU en memoria del proceso
+2. Cache de Django (compartido entre workers si el backend lo permite)
+3. Tabla `geocode_celdas` (GeocodeCelda): persiste entre reinicios
+
+Lo guardado es la respuesta cruda de Nominatim; cada consumidor
+(GeocodingService, zonas.services.reverse_geocode, TQServerRPG) la
+interpreta a su manera. Sin Django configurado (p. ej. tq_server_rpg.py
+corriendo como script) solo se usa el nivel en memoria.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+PRECISION_DEFAULT = 7
+
+
+def encode_geohash(lat: float, lon: float, precision: int = PRECISION_DEFAULT) -> str:
+    """
+    Codificar coordenadas en geohash (base32 estándar).
+
+    Args:
+        lat: Latitud
+        lon: Longitud
+        precision: Cantidad de caracteres (7 ≈ 153 x 153 m, 8 ≈ 38 x 19 m)
+
+    Returns:
+        Geohash de la celda que contiene el punto
+    """
+    lat_min, lat_max = -90.0, 90.0
+    lon_min, lon_max = -180.0, 180.0
+    geohash = []
+    bits = 0
+    bit = 0
+    par = True  # los bits pares refinan la longitud
+
+    while len(geohash) < precision:
+        if par:
+            medio = (lon_min + lon_max) / 2
+            if lon >= medio:
+                bits = (bits << 1) | 1
+                lon_min = medio
+            else:
+                bits <<= 1
+                lon_max = medio
+        else:
+            medio = (lat_min + lat_max) / 2
+            if lat >= medio:
+                bits = (bits << 1) | 1
+                lat_min = medio
+            else:
+                bits <<= 1
+                lat_max = medio
+        par = not par
+        bit += 1
+        if bit == 5:
+            geohash.append(_BASE32[bits])
+            bits = 0
+            bit = 0
+
+    return ''.join(geohash)
+
+
+def _django_disponible() -> bool:
+    """True si el proceso corre con Django inicializado (ORM y cache utilizables)"""
+    try:
+        from django.apps import apps
+        return apps.ready
+    except ImportError:
+        return False
+
+
+class GeocodeCache:
+    """Cache de tres niveles (LRU / Django cache / tabla) indexado por geohash"""
+
+    def __init__(self, precision: int = PRECISION_DEFAULT, max_entradas: int = 10000,
+                 ttl_django: int = 7 * 86400, usar_django: Optional[bool] = None):
+        """
+        Args:
+            precision: Caracteres de geohash que definen el tamaño de celda
+            max_entradas: Capacidad del LRU en memoria
+            ttl_django: Segundos de vida en el cache de Django
+            usar_django: Habilitar niveles 2 y 3 (None: solo si Django está inicializado)
+        """
+        self.precision = precision
+        self.max_entradas = max_entradas
+        self.ttl_django = ttl_django
+        self._usar_django = usar_django
+
+        self._lru: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'hits_memoria': 0,
+            'hits_cache': 0,
+            'hits_db': 0,
+            'misses': 0,
+            'sin_resultado': 0,
+            'errores_nivel': 0,
+        }
+
+    @property
+    def usar_django(self) -> bool:
+        if self._usar_django is None:
+            return _django_disponible()
+        return self._usar_django
+
+    def geohash(self, lat: float, lon: float) -> str:
+        return encode_geohash(float(lat), float(lon), self.precision)
+
+    def obtener(self, lat: float, lon: float, resolver: Callable[[float, float], Optional[Dict]]) -> Optional[Dict]:
+        """
+        Obtener la respuesta cruda del geocodificador para un punto.
+
+        Args:
+            lat: Latitud
+            lon: Longitud
+            resolver: Función que consulta al geocodificador si la celda no
+                está en ningún nivel; debe devolver el dict crudo o None
+
+        Returns:
+            Respuesta cruda (dict) o None si el geocodificador no respondió
+        """
+        celda = self.geohash(lat, lon)
+
+        datos = self._get_memoria(celda)
+        if datos is not None:
+            self.stats['hits_memoria'] += 1
+            return datos
+
+        usar_django = self.usar_django
+        if usar_django:
+            datos = self._get_cache(celda)
+            if datos is not None:
+                self.stats['hits_cache'] += 1
+                self._set_memoria(celda, datos)
+                return datos
+
+            datos = self._get_db(celda)
+            if datos is not None:
+                self.stats['hits_db'] += 1
+                self._set_memoria(celda, datos)
+                self._set_cache(celda, datos)
+                return datos
+
+        self.stats['misses'] += 1
+        datos = resolver(float(lat), float(lon))
+        if not datos:
+            # No se cachean errores: el próximo pedido vuelve a intentar
+            self.stats['sin_resultado'] += 1
+            return None
+
+        self._set_memoria(celda, datos)
+        if usar_django:
+            self._set_cache(celda, datos)
+            self._set_db(celda, lat, lon, datos)
+        return datos
+
+    def buscar_celdas(self, celdas: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Buscar muchas celdas de una vez sin consultar al geocodificador.
+
+        Un get_many al cache de Django y un solo SELECT ... IN a la tabla
+        para las que falten (en vez de dos consultas por celda).
+
+        Returns:
+            {celda: respuesta cruda} solo para las celdas encontradas
+        """
+        encontradas: Dict[str, Dict] = {}
+        faltantes = []
+        for celda in dict.fromkeys(celdas):
+            datos = self._get_memoria(celda)
+            if datos is not None:
+                self.stats['hits_memoria'] += 1
+                encontradas[celda] = datos
+            else:
+                faltantes.append(celda)
+
+        if faltantes and self.usar_django:
+            for celda, datos in self._get_cache_muchas(faltantes).items():
+                self.stats['hits_cache'] += 1
+                self._set_memoria(celda, datos)
+                encontradas[celda] = datos
+            faltantes = [celda for celda in faltantes if celda not in encontradas]
+
+        if faltantes and self.usar_django:
+            for celda, datos in self._get_db_muchas(faltantes).items():
+                self.stats['hits_db'] += 1
+                self._set_memoria(celda, datos)
+                self._set_cache(celda, datos)
+                encontradas[celda] = datos
+
+        return encontradas
+
+    # ------------------------------------------------------------------
+    # Niveles
+    # ------------------------------------------------------------------
+
+    def _get_memoria(self, celda: str) -> Optional[Dict]:
+        with self._lock:
+            datos = self._lru.get(celda)
+            if datos is not None:
+                self._lru.move_to_end(celda)
+            return datos
+
+    def _set_memoria(self, celda: str, datos: Dict):
+        with self._lock:
+            self._lru[celda] = datos
+            self._lru.move_to_end(celda)
+            while len(self._lru) > self.max_entradas:
+                self._lru.popitem(last=False)
+
+    def _clave_cache(self, celda: str) -> str:
+        return f"geocode:celda:{celda}"
+
+    def _get_cache(self, celda: str) -> Optional[Dict]:
+        try:
+            from django.core.cache import cache
+            return cache.get(self._clave_cache(celda))
+        except Exception as e:
+            self.stats['errores_nivel'] += 1
+            logger.debug(f"Cache de Django no disponible para geocodificación: {e}")
+            return None
+
+    def _set_cache(self, celda: str, datos: Dict):
+        try:
+            from django.core.cache import cache
+            cache.set(self._clave_cache(celda), datos, self.ttl_django)
+        except Exception as e:
+            self.stats['errores_nivel'] += 1
+            logger.debug(f"No se pudo guardar celda {celda} en cache de Django: {e}")
+
+    def _get_cache_muchas(self, celdas) -> Dict[str, Dict]:
+        try:
+            from django.core.cache import cache
+            por_clave = cache.get_many([self._clave_cache(celda) for celda in celdas])
+        except Exception as e:
+            self.stats['errores_nivel'] += 1
+            logger.debug(f"Cache de Django no disponible para geocodificación: {e}")
+            return {}
+        return {
+            celda: por_clave[self._clave_cache(celda)]
+            for celda in celdas if por_clave.get(self._clave_cache(celda)) is not None
+        }
+
+    def _get_db_muchas(self, celdas) -> Dict[str, Dict]:
+        try:
+            from django.db.models import F
+            from gps.models import GeocodeCelda
+            encontradas = dict(
+                GeocodeCelda.objects.filter(geohash__in=list(celdas), datos__isnull=False)
+                .values_list('geohash', 'datos')
+            )
+            if encontradas:
+                GeocodeCelda.objects.filter(geohash__in=list(encontradas)).update(hits=F('hits') + 1)
+            return encontradas
+        except Exception as e:
+            self.stats['errores_nivel'] += 1
+            logger.debug(f"Tabla de celdas geocodificadas no disponible: {e}")
+            return {}
+
+    def _get_db(self, celda: str) -> Optional[Dict]:
+        try:
+            from django.db.models import F
+            from gps.models import GeocodeCelda
+            datos = GeocodeCelda.objects.filter(geohash=celda).values_list('datos', flat=True).first()
+            if datos is not None:
+                GeocodeCelda.objects.filter(geohash=celda).update(hits=F('hits') + 1)
+            return datos
+        except Exception as e:
+            self.stats['errores_nivel'] += 1
+            logger.debug(f"Tabla de celdas geocodificadas no disponible: {e}")
+            return None
+
+    def _set_db(self, celda: str, lat: float, lon: float, datos: Dict):
+        try:
+            from gps.models import GeocodeCelda
+            GeocodeCelda.objects.update_or_create(
+                geohash=celda,
+                defaults={
+                    'lat': round(float(lat), 7),
+                    'lon': round(float(lon), 7),
+                    'direccion_formateada': datos.get('display_name'),
+                    'datos': datos,
+                }
+            )
+        except Exception as e:
+            self.stats['errores_nivel'] += 1
+            logger.warning(f"⚠️ No se pudo persistir la celda geocodificada {celda}: {e}")
+
+    def limpiar_memoria(self):
+        with self._lock:
+            self._lru.clear()
+
+    def get_stats(self) -> Dict:
+        """Hits por nivel y ratio de aciertos"""
+        hits = self.stats['hits_memoria'] + self.stats['hits_cache'] + self.stats['hits_db']
+        total = hits + self.stats['misses']
+        return {
+            **self.stats,
+            'consultas': total,
+            'hit_ratio': round(hits / total, 4) if total else None,
+            'entradas_memoria': len(self._lru),
+            'precision': self.precision,
+        }
+
+
+def _crear_cache_global() -> GeocodeCache:
+    precision = PRECISION_DEFAULT
+    max_entradas = 10000
+    if os.environ.get('DJANGO_SETTINGS_MODULE'):
+        from django.conf import settings
+        precision = getattr(settings, 'WAYGPS_GEOCODE_GEOHASH_PRECISION', precision)
+        max_entradas = getattr(settings, 'WAYGPS_GEOCODE_CACHE_ENTRADAS', max_entradas)
+    return GeocodeCache(precision=precision, max_entradas=max_entradas)
+
+
+# Instancia global del cache (compartida por todos los consumidores del proceso)
+geocode_cache = _crear_cache_global()
@@ -0,0 +1,304 @@
+"""
+Geocodificación en lote de recorridos
+=====================================
+
+geocodificar_recorrido resolvía las posiciones de a una (con una pausa de
+0,1 s entre llamadas) y hacía get() + save() completo por fila: un
+recorrido de 2.000 puntos tenía un worker de gunicorn ocupado varios
+minutos. Ahora:
+
+1. Las posiciones se agrupan por celda geohash (la misma clave que
+   gps.geocode_cache): un camión parado 40 minutos es una sola celda.
+2. Las celdas ya conocidas salen de una sola búsqueda en el cache
+   (memoria, get_many al cache de Django, SELECT ... IN a geocode_celdas).
+3. Las restantes se consultan con un pool de WAYGPS_GEOCODE_LOTE_HILOS
+   hilos. El rate limit lo aplica GeocodingService para todo el proceso
+   (WAYGPS_GEOCODE_CONSULTAS_POR_SEGUNDO), así un lote no le saca cupo
+   de más al worker de ingesta ni a otro lote.
+4. Las direcciones se escriben con un solo bulk_update de `direccion`.
+
+Con `asincrono` el trabajo corre en un hilo del proceso y la respuesta
+vuelve enseguida con un job_id. El estado se guarda en el cache de Django:
+para consultarlo desde cualquier worker de gunicorn el backend tiene que
+ser compartido (Redis, Memcached, base de datos); con LocMemCache solo lo
+ve el worker que lanzó el trabajo. Mientras el hilo vive renueva un
+latido ('actualizado'); si el worker muere, el trabajo sin latido pasa a
+error en vez de quedar 'en_curso' hasta que venza TTL_TRABAJO.
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+from django.conf import settings
+
+from gps.geocode_cache import GeocodeCache, geocode_cache
+
+logger = logging.getLogger(__name__)
+
+HILOS = getattr(settings, 'WAYGPS_GEOCODE_LOTE_HILOS', 4)
+MAX_POSICIONES = getattr(settings, 'WAYGPS_GEOCODE_LOTE_MAX_POSICIONES', 20000)
+TTL_TRABAJO = 3600
+# Un trabajo en curso renueva su estado cada LATIDO_SEGUNDOS; sin latido por
+# más de ESTANCADO_SEGUNDOS se da por muerto
+LATIDO_SEGUNDOS = 10
+ESTANCADO_SEGUNDOS = getattr(settings, 'WAYGPS_GEOCODE_LOTE_ESTANCADO_SEGUNDOS', 60)
+# Duración máxima de un stream de progreso (ocupa un worker de gunicorn)
+STREAM_MAX_SEGUNDOS = getattr(settings, 'WAYGPS_GEOCODE_LOTE_STREAM_SEGUNDOS', 120)
+BATCH_UPDATE = 1000
+
+EN_CURSO = 'en_curso'
+TERMINADO = 'terminado'
+ERROR = 'error'
+
+
+def _coordenadas(posicion: Dict):
+    try:
+        lat, lon = float(posicion.get('lat')), float(posicion.get('lon'))
+    except (TypeError, ValueError):
+        return None
+    if not lat or not lon or not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        return None
+    return lat, lon
+
+
+def agrupar_por_celda(posiciones: Sequence[Dict], cache: GeocodeCache = geocode_cache) -> 'OrderedDict[str, List[int]]':
+    """
+    Args:
+        posiciones: Dicts con lat, lon (e id opcional), como los manda el frontend
+
+    Returns:
+        {celda: índices de las posiciones en esa celda}, en orden de aparición;
+        las posiciones sin coordenadas válidas no quedan en ninguna celda
+    """
+    celdas: 'OrderedDict[str, List[int]]' = OrderedDict()
+    for indice, posicion in enumerate(posiciones):
+        coordenadas = _coordenadas(posicion)
+        if coordenadas is not None:
+            celdas.setdefault(cache.geohash(*coordenadas), []).append(indice)
+    return celdas
+
+
+def geocodificar_lote(posiciones: Sequence[Dict], cache: GeocodeCache = geocode_cache,
+                      resolver: Optional[Callable[[float, float], Optional[Dict]]] = None,
+                      hilos: int = HILOS, guardar: bool = True,
+                      progreso: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Geocodificar un lote de posiciones.
+
+    Args:
+        posiciones: Dicts con id, lat, lon
+        cache: Cache de celdas
+        resolver: Consulta cruda al geocodificador (default: la de geocoding_service, con rate limit)
+        hilos: Consultas simultáneas al geocodificador
+        guardar: Escribir Posicion.direccion de las posiciones con id
+        progreso: Se llama con los contadores cada vez que se resuelve una celda
+
+    Returns:
+        {'geocodificadas', 'total', 'direcciones' (una por posición, en orden),
+        'celdas', 'celdas_cache', 'celdas_consultadas', 'guardadas', 'segundos'}
+    """
+    inicio = time.monotonic()
+    if resolver is None:
+        from gps.services import geocoding_service
+        resolver = geocoding_service._consultar_nominatim
+
+    celdas = agrupar_por_celda(posiciones, cache)
+    datos_por_celda = cache.buscar_celdas(celdas)
+    pendientes = [celda for celda in celdas if celda not in datos_por_celda]
+    contadores = {
+        'total': len(posiciones),
+        'celdas': len(celdas),
+        'celdas_cache': len(datos_por_celda),
+        'celdas_consultadas': 0,
+    }
+    if progreso:
+        progreso(dict(contadores))
+
+    def consultar(celda):
+        lat, lon = _coordenadas(posiciones[celdas[celda][0]])
+        try:
+            return cache.obtener(lat, lon, resolver)
+        finally:
+            # Cada hilo del pool abre su propia conexión (nivel tabla del cache)
+            if cache.usar_django:
+                from django.db import connection
+                connection.close()
+
+    if pendientes:
+        with ThreadPoolExecutor(max_workers=max(1, min(hilos, len(pendientes))),
+                                thread_name_prefix='GeocodeLote') as pool:
+            futuros = {pool.submit(consultar, celda): celda for celda in pendientes}
+            for futuro in as_completed(futuros):
+                try:
+                    datos = futuro.result()
+                except Exception as e:
+                    logger.warning(f"⚠️ Error geocodificando celda {futuros[futuro]}: {e}")
+                    datos = None
+                if datos:
+                    datos_por_celda[futuros[futuro]] = datos
+                contadores['celdas_consultadas'] += 1
+                if progreso:
+                    progreso(dict(contadores))
+
+    direcciones = []
+    geocodificadas = 0
+    por_id = {}
+    for indice, posicion in enumerate(posiciones):
+        coordenadas = _coordenadas(posicion)
+        if coordenadas is None:
+            direcciones.append('Coordenadas inválidas')
+            continue
+        direccion = (datos_por_celda.get(cache.geohash(*coordenadas)) or {}).get('display_name')
+        if not direccion:
+            direcciones.append(f"Coordenadas: {posicion.get('lat')}, {posicion.get('lon')}")
+            continue
+        direcciones.append(direccion)
+        geocodificadas += 1
+        try:
+            por_id[int(posicion['id'])] = direccion
+        except (KeyError, TypeError, ValueError):
+            pass
+
+    guardadas = guardar_direcciones(por_id) if guardar else 0
+    return {
+        **contadores,
+        'geocodificadas': geocodificadas,
+        'guardadas': guardadas,
+        'direcciones': direcciones,
+        'segundos': round(time.monotonic() - inicio, 2),
+    }
+
+
+def guardar_direcciones(por_id: Dict[int, str]) -> int:
+    """Escribe Posicion.direccion con bulk_update (solo esa columna)"""
+    from gps.models import Posicion
+
+    if not por_id:
+        return 0
+    return Posicion.objects.bulk_update(
+        [Posicion(id=pk, direccion=direccion) for pk, direccion in por_id.items()],
+        ['direccion'], batch_size=BATCH_UPDATE,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Trabajos asincrónicos
+# ---------------------------------------------------------------------------
+
+def _clave_trabajo(job_id: str) -> str:
+    return f"geocode:lote:{job_id}"
+
+
+def estado_trabajo(job_id: str) -> Optional[Dict]:
+    """
+    Estado guardado del trabajo (None si no existe o venció).
+
+    Un trabajo en curso cuyo latido ('actualizado') tiene más de
+    ESTANCADO_SEGUNDOS murió con su worker (reinicio, OOM, timeout de
+    gunicorn): se marca como error para que el cliente deje de esperar.
+    """
+    from django.core.cache import cache
+    estado = cache.get(_clave_trabajo(job_id))
+    if (estado and estado.get('estado') == EN_CURSO
+            and time.time() - estado.get('actualizado', time.time()) > ESTANCADO_SEGUNDOS):
+        estado = {
+            **estado, 'estado': ERROR,
+            'error': f"El trabajo dejó de responder hace más de {ESTANCADO_SEGUNDOS} s",
+        }
+        _guardar_estado(job_id, estado)
+        logger.warning(f"⚠️ Lote de geocodificación {job_id[:8]} sin latido, marcado como error")
+    return estado
+
+
+def _guardar_estado(job_id: str, estado: Dict):
+    from django.core.cache import cache
+    cache.set(_clave_trabajo(job_id), estado, TTL_TRABAJO)
+
+
+def iniciar_trabajo(posiciones: Sequence[Dict]) -> str:
+    """
+    Lanza geocodificar_lote en un hilo y devuelve el job_id.
+
+    El estado ({'estado', 'total', 'celdas', 'celdas_cache',
+    'celdas_consultadas', 'actualizado'} y al terminar 'resultado' o
+    'error') se consulta con estado_trabajo() o stream_progreso().
+    Mientras el hilo vive, 'actualizado' se renueva cada LATIDO_SEGUNDOS
+    aunque no avance (una celda lenta, el bulk_update final).
+    """
+    job_id = uuid.uuid4().hex
+    posiciones = list(posiciones)
+    ultimo = {'job_id': job_id, 'estado': EN_CURSO, 'total': len(posiciones)}
+    lock = threading.Lock()
+    terminado = threading.Event()
+
+    def guardar(estado):
+        nonlocal ultimo
+        with lock:
+            ultimo = estado
+            _guardar_estado(job_id, {**estado, 'actualizado': time.time()})
+
+    def progreso(contadores):
+        guardar({'job_id': job_id, 'estado': EN_CURSO, **contadores})
+
+    def latir():
+        while not terminado.wait(LATIDO_SEGUNDOS):
+            with lock:
+                if ultimo['estado'] == EN_CURSO:
+                    _guardar_estado(job_id, {**ultimo, 'actualizado': time.time()})
+
+    def correr():
+        from django.db import close_old_connections
+        try:
+            resultado = geocodificar_lote(posiciones, progreso=progreso)
+            guardar({
+                'job_id': job_id, 'estado': TERMINADO,
+                **{clave: valor for clave, valor in resultado.items() if clave != 'direcciones'},
+                'resultado': resultado,
+            })
+            logger.info(
+                f"🗺️ Lote {job_id[:8]}: {resultado['geocodificadas']}/{resultado['total']} posiciones, "
+                f"{resultado['celdas_consultadas']} celdas consultadas en {resultado['segundos']} s"
+            )
+        except Exception as e:
+            logger.exception(f"Error en el lote de geocodificación {job_id}")
+            guardar({'job_id': job_id, 'estado': ERROR, 'error': str(e)})
+        finally:
+            terminado.set()
+            close_old_connections()
+
+    guardar(ultimo)
+    threading.Thread(target=latir, name=f"GeocodeLoteLatido-{job_id[:8]}", daemon=True).start()
+    threading.Thread(target=correr, name=f"GeocodeLote-{job_id[:8]}", daemon=True).start()
+    return job_id
+
+
+def stream_progreso(job_id: str, intervalo: float = 1.0, timeout: Optional[float] = None) -> Iterator[str]:
+    """
+    Líneas NDJSON con el estado del trabajo cada vez que avanza, hasta que
+    termina o pasan `timeout` segundos (default: STREAM_MAX_SEGUNDOS).
+
+    El tope deja libre el worker de gunicorn: si el trabajo sigue en curso
+    la última línea dice 'en_curso' y el cliente vuelve a abrir el stream
+    (seguirGeocodificacion en static/js/recorridos.js).
+    """
+    anterior = None
+    limite = time.monotonic() + (STREAM_MAX_SEGUNDOS if timeout is None else timeout)
+    while True:
+        estado = estado_trabajo(job_id)
+        if estado is None:
+            yield json.dumps({'job_id': job_id, 'estado': ERROR, 'error': 'Trabajo no encontrado'}) + '\n'
+            return
+        # El latido solo renueva 'actualizado': no es un avance
+        avance = {clave: valor for clave, valor in estado.items() if clave != 'actualizado'}
+        if avance != anterior:
+            yield json.dumps(estado, default=str) + '\n'
+            anterior = avance
+        if estado.get('estado') != EN_CURSO or time.monotonic() + intervalo > limite:
+            return
+        time.sleep(intervalo)
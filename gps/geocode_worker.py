@@ -0,0 +1,308 @@
+"""
+Worker de geocodificación inversa fuera del camino de ingesta
+=============================================================
+
+El receptor TCP (y la señal de MovilStatus) ya no llaman a Nominatim: solo
+encolan (posicion_id, lat, lon) y vuelven. Uno o más hilos de este worker
+resuelven la dirección y actualizan Posicion.direccion y MovilGeocode.
+
+La cola coalesce por móvil: si la cola está atrasada y llega una posición
+nueva de un móvil que ya tenía una pendiente, se reemplaza la pendiente por
+la nueva (solo interesa la dirección del último punto). Así la cola nunca
+crece más allá de la cantidad de móviles y la latencia de ingesta no depende
+de la latencia del geocodificador.
+
+Modos (settings.WAYGPS_GEOCODE_WORKER):
+
+- 'embebido' (default): los hilos corren dentro del proceso del receptor
+- 'externo': el proceso del receptor no geocodifica; el comando
+  `python manage.py run_geocode_worker` lee las posiciones nuevas sin
+  dirección (LectorPosicionesNuevas, que relee los commits tardíos) y las
+  procesa en un proceso aparte
+
+Los hilos solo se inician explícitamente (TCPReceiver.start y el comando).
+En cualquier otro proceso (workers de gunicorn, shell, comandos) encolar()
+no hace nada: un save de MovilStatus desde una vista no levanta hilos.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from gps.geo_http import nominatim
+from gps.geocode_cache import geocode_cache
+
+logger = logging.getLogger(__name__)
+
+MODO_EMBEBIDO = 'embebido'
+MODO_EXTERNO = 'externo'
+
+# Ventana de relectura del worker externo: un INSERT con id menor puede
+# confirmarse después que otro con id mayor (ver LectorPosicionesNuevas)
+MARGEN_COMMIT_SEGUNDOS = getattr(settings, 'WAYGPS_GEOCODE_MARGEN_SEGUNDOS', 10)
+
+
+class GeocodeWorker:
+    """Cola coalescente por móvil + pool de hilos que geocodifican"""
+
+    def __init__(self, workers: int = 1, max_pendientes: int = 10000,
+                 modo: str = MODO_EMBEBIDO):
+        """
+        Args:
+            workers: Hilos que consultan al geocodificador
+            max_pendientes: Tope de pedidos pendientes (se descartan los más viejos)
+            modo: 'embebido' o 'externo' (ver docstring del módulo)
+        """
+        self.workers = workers
+        self.max_pendientes = max_pendientes
+        self.modo = modo
+
+        self._pendientes: 'OrderedDict[object, Dict]' = OrderedDict()
+        self._condicion = threading.Condition()
+        self._hilos = []
+        self._running = False
+
+        self.stats = {
+            'encolados': 0,
+            'coalescidos': 0,
+            'descartados': 0,
+            'procesados': 0,
+            'sin_resultado': 0,
+            'errores': 0,
+            'ultima_latencia_ms': None,
+            'latencia_promedio_ms': None,
+        }
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Iniciar los hilos del worker (idempotente; en modo externo no hace nada)"""
+        with self._condicion:
+            if self._running or self.modo != MODO_EMBEBIDO:
+                return
+            self._running = True
+            self._hilos = [
+                threading.Thread(target=self._run, name=f"GeocodeWorker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        for hilo in self._hilos:
+            hilo.start()
+        logger.info(f"🗺️ Worker de geocodificación iniciado ({self.workers} hilos, modo {self.modo})")
+
+    @property
+    def activo(self) -> bool:
+        """True si los hilos corren en este proceso"""
+        return self._running
+
+    def stop(self, timeout: float = 5.0):
+        """Detener los hilos; los pedidos pendientes se descartan"""
+        with self._condicion:
+            self._running = False
+            self._condicion.notify_all()
+        for hilo in self._hilos:
+            hilo.join(timeout=timeout)
+        self._hilos = []
+
+    # ------------------------------------------------------------------
+    # Productor
+    # ------------------------------------------------------------------
+
+    def encolar(self, posicion_id: Optional[int], lat, lon, movil_id: Optional[int] = None) -> bool:
+        """
+        Pedir la geocodificación de una posición. No bloquea.
+
+        Args:
+            posicion_id: ID de la Posicion a completar (puede ser None)
+            lat: Latitud
+            lon: Longitud
+            movil_id: Móvil de la posición; si tiene un pedido pendiente se reemplaza
+
+        Returns:
+            True si quedó encolado; False si el worker no corre en este
+            proceso (no se inició o el modo es externo) o faltan coordenadas
+        """
+        if not self._running or lat is None or lon is None:
+            return False
+
+        clave = ('movil', movil_id) if movil_id is not None else ('posicion', posicion_id)
+        pedido = {
+            'posicion_id': posicion_id,
+            'movil_id': movil_id,
+            'lat': float(lat),
+            'lon': float(lon),
+            'encolado_en': time.monotonic(),
+        }
+        with self._condicion:
+            if clave in self._pendientes:
+                # Coalescer: se conserva el lugar en la fila pero con el punto nuevo
+                self._pendientes[clave] = pedido
+                self.stats['coalescidos'] += 1
+            else:
+                if len(self._pendientes) >= self.max_pendientes:
+                    self._pendientes.popitem(last=False)
+                    self.stats['descartados'] += 1
+                self._pendientes[clave] = pedido
+            self.stats['encolados'] += 1
+            self._condicion.notify()
+        return True
+
+    # ------------------------------------------------------------------
+    # Consumidores
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        while True:
+            with self._condicion:
+                while self._running and not self._pendientes:
+                    self._condicion.wait()
+                if not self._running:
+                    return
+                _, pedido = self._pendientes.popitem(last=False)
+
+            try:
+                self.procesar(pedido)
+            except Exception as e:
+                self.stats['errores'] += 1
+                logger.warning(f"⚠️ Error geocodificando posición {pedido.get('posicion_id')}: {e}")
+
+    def procesar(self, pedido: Dict):
+        """
+        Geocodificar un pedido y persistir la dirección.
+
+        Actualiza Posicion.direccion y el MovilGeocode del móvil. Las celdas
+        ya resueltas salen del cache (gps.geocode_cache) sin esperar el rate
+        limit de Nominatim, que aplica GeocodingService.
+        """
+        from gps.models import Posicion
+        from gps.services import geocoding_service
+        from moviles.models import MovilGeocode
+
+        close_old_connections()
+        resultado = geocoding_service.geocodificar_coordenadas(pedido['lat'], pedido['lon'])
+
+        latencia_ms = (time.monotonic() - pedido['encolado_en']) * 1000
+        self.stats['ultima_latencia_ms'] = round(latencia_ms, 2)
+        previa = self.stats['latencia_promedio_ms']
+        self.stats['latencia_promedio_ms'] = round(latencia_ms if previa is None else previa * 0.9 + latencia_ms * 0.1, 2)
+
+        if not resultado:
+            self.stats['sin_resultado'] += 1
+            return
+
+        direccion_formateada = resultado.get('direccion_formateada') or resultado.get('display_name', '')
+
+        if pedido['posicion_id']:
+            Posicion.objects.filter(id=pedido['posicion_id']).update(direccion=direccion_formateada)
+
+        if pedido['movil_id']:
+            MovilGeocode.objects.update_or_create(
+                movil_id=pedido['movil_id'],
+                defaults={
+                    'direccion_formateada': direccion_formateada,
+                    'calle': resultado.get('calle'),
+                    'numero': resultado.get('numero'),
+                    'localidad': resultado.get('localidad'),
+                    'provincia': resultado.get('provincia'),
+                    'pais': resultado.get('pais'),
+                    'fuente_geocodificacion': resultado.get('fuente_geocodificacion'),
+                    'confianza_geocodificacion': resultado.get('confianza_geocodificacion'),
+                    'geohash': resultado.get('geohash'),
+                    'fecha_geocodificacion': timezone.now()
+                }
+            )
+        self.stats['procesados'] += 1
+
+    def get_stats(self) -> Dict:
+        """Estadísticas del worker (para TCPReceiver.get_stats y el comando)"""
+        return {
+            **self.stats,
+            'modo': self.modo,
+            'pendientes': len(self._pendientes),
+            'activo': self.activo,
+            'cache': geocode_cache.get_stats(),
+            'nominatim': nominatim.get_stats(),
+        }
+
+
+class LectorPosicionesNuevas:
+    """
+    Posiciones nuevas sin dirección para el worker externo (run_geocode_worker).
+
+    Los ids se asignan al insertar pero se ven recién con el commit, y cada
+    receptor confirma sus lotes por su cuenta: un lote con ids menores puede
+    verse después que otro con ids mayores. Además de las posiciones con id
+    mayor a la marca de agua, cada lectura vuelve a traer las que tienen id
+    hasta la marca y se crearon hasta `margen_segundos` antes de la lectura
+    anterior (lo mismo que hace el tail de posiciones). Una posición tardía
+    se devuelve solo si es más nueva que la última ya devuelta de su móvil:
+    un fix viejo no pisa la dirección de uno más nuevo.
+    """
+
+    def __init__(self, desde_id: int, lote: int = 5000, margen_segundos: float = MARGEN_COMMIT_SEGUNDOS):
+        self.ultimo_id = desde_id
+        self.lote = lote
+        self.margen_segundos = margen_segundos
+        # Arrancar con la ventana abierta: la marca inicial tiene el mismo problema
+        self._lectura_anterior = timezone.now()
+        self._ultimo_por_movil: Dict[int, int] = {}
+        self._vistas = set()
+        self.stats = {'tardias': 0}
+
+    def _queryset(self):
+        from gps.models import Posicion
+
+        return (
+            Posicion.objects.filter(direccion__isnull=True)
+            .exclude(lat__isnull=True).exclude(lon__isnull=True)
+            .order_by('id')
+            .values('id', 'movil_id', 'lat', 'lon')
+        )
+
+    def leer(self) -> List[Dict]:
+        """Posiciones a encolar, en orden de id ({'id', 'movil_id', 'lat', 'lon'})"""
+        lectura = timezone.now()
+        nuevas = list(self._queryset().filter(id__gt=self.ultimo_id)[:self.lote])
+        ventana = list(self._queryset().filter(
+            id__lte=self.ultimo_id,
+            created_at__gte=self._lectura_anterior - timedelta(seconds=self.margen_segundos),
+        )[:self.lote])
+        self._lectura_anterior = lectura
+
+        tardias = []
+        for posicion in ventana:
+            movil_id = posicion['movil_id']
+            if movil_id is None:
+                if posicion['id'] not in self._vistas:
+                    tardias.append(posicion)
+            elif posicion['id'] > self._ultimo_por_movil.get(movil_id, 0):
+                tardias.append(posicion)
+        # Lo que sale de la ventana no vuelve a leerse: el conjunto no crece
+        self._vistas = {posicion['id'] for posicion in ventana + nuevas if posicion['movil_id'] is None}
+        self.stats['tardias'] += len(tardias)
+
+        posiciones = sorted(tardias + nuevas, key=lambda posicion: posicion['id'])
+        for posicion in posiciones:
+            if posicion['movil_id'] is not None:
+                self._ultimo_por_movil[posicion['movil_id']] = max(
+                    posicion['id'], self._ultimo_por_movil.get(posicion['movil_id'], 0)
+                )
+        if nuevas:
+            self.ultimo_id = nuevas[-1]['id']
+        return posiciones
+
+
+# Instancia global del worker (compartida por receptores y señales)
+geocode_worker = GeocodeWorker(
+    workers=getattr(settings, 'WAYGPS_GEOCODE_WORKERS', 1),
+    max_pendientes=getattr(settings, 'WAYGPS_GEOCODE_MAX_PENDIENTES', 10000),
+    modo=getattr(settings, 'WAYGPS_GEOCODE_WORKER', MODO_EMBEBIDO),
+)
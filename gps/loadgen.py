@@ -0,0 +1,283 @@
+"""
+Generador de carga para receptores TCP (protocolo TQ)
+=====================================================
+
+Simula N equipos TQ reportando contra un receptor. A diferencia de los
+emuladores de scripts/ (un equipo, una conexión por posición), acá cada
+equipo mantiene su conexión abierta como los equipos reales y se puede
+forzar:
+
+- ráfagas: varias tramas en un solo write (equipo que descarga su buffer)
+- tormentas de reconexión: todos los equipos cortan y reconectan a la vez,
+  y al reconectar envían las posiciones "acumuladas"
+
+Todos los equipos corren como corrutinas de un único event loop, así que
+unos pocos miles de equipos no necesitan miles de hilos.
+
+No depende de Django. Lo usa el comando benchmark_ingesta (en un proceso
+aparte, para no competir por el GIL con el receptor) y se puede correr a
+mano contra cualquier receptor:
+
+    python -m gps.loadgen --host 127.0.0.1 --puerto 5003 --equipos 500 --duracion 60
+
+Al terminar imprime un JSON con los contadores del lado del generador.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+# Bytes finales de una trama real (campos que el procesador no interpreta)
+COLA_TRAMA_TQ = bytes.fromhex('ffffdfff000320a000000000000000df1600000c')
+
+# Los equipos simulados usan gps_id 90000-99999 (últimos 5 dígitos del ID)
+GPS_ID_BASE = 90000
+MAX_EQUIPOS = 10000
+
+
+def gps_id_simulado(indice: int) -> str:
+    """gps_id (5 dígitos) del equipo simulado número `indice`"""
+    return str(GPS_ID_BASE + indice)
+
+
+def construir_trama_tq(gps_id: str, lat: float, lon: float, velocidad_nudos: int,
+                       rumbo: int, momento: datetime) -> bytes:
+    """
+    Construir una trama TQ binaria de 45 bytes.
+
+    Args:
+        gps_id: ID del equipo (se completa a 10 dígitos)
+        lat: Latitud (hemisferio sur; se codifica el valor absoluto)
+        lon: Longitud (hemisferio oeste; se codifica el valor absoluto)
+        velocidad_nudos: Velocidad en nudos (0-255)
+        rumbo: Rumbo en grados (0-360)
+        momento: Fecha/hora GPS
+
+    Returns:
+        Trama lista para enviar
+    """
+    lat, lon = abs(lat), abs(lon)
+    lat_grados = int(lat)
+    lat_minutos = (lat - lat_grados) * 60
+    lon_grados = int(lon)
+    lon_minutos = (lon - lon_grados) * 60
+
+    hex_str = (
+        '24'
+        + gps_id[-10:].zfill(10)
+        + momento.strftime('%H%M%S')
+        + momento.strftime('%d%m%y')
+        + f'{lat_grados:02d}{int(lat_minutos):02d}{min(int(round((lat_minutos % 1) * 1000000)), 999999):06d}'
+        + f'{lon_grados:03d}{int(lon_minutos):02d}{min(int(round((lon_minutos % 1) * 100000)), 99999):05d}'
+        + f'{max(0, min(int(velocidad_nudos), 255)):03d}{max(0, min(int(rumbo), 360)):03d}'
+    )
+    return bytes.fromhex(hex_str) + COLA_TRAMA_TQ
+
+
+class EquipoSimulado:
+    """Recorrido simple de un equipo: avanza en línea recta y dobla de a ratos"""
+
+    def __init__(self, indice: int, rnd: random.Random):
+        self.gps_id = gps_id_simulado(indice)
+        # Punto de partida alrededor de Buenos Aires
+        self.lat = -34.60 + rnd.uniform(-0.3, 0.3)
+        self.lon = -58.38 + rnd.uniform(-0.3, 0.3)
+        self.rumbo = rnd.randrange(360)
+        self.velocidad_nudos = rnd.randrange(0, 50)
+        self.rnd = rnd
+
+    def siguiente_trama(self, segundos: float) -> bytes:
+        if self.rnd.random() < 0.1:
+            self.rumbo = (self.rumbo + self.rnd.randrange(-90, 91)) % 360
+            self.velocidad_nudos = max(0, min(80, self.velocidad_nudos + self.rnd.randrange(-10, 11)))
+        distancia_grados = self.velocidad_nudos * 1.852 / 3600 * segundos / 111.0
+        self.lat += distancia_grados * math.cos(math.radians(self.rumbo))
+        self.lon += distancia_grados * math.sin(math.radians(self.rumbo))
+        return construir_trama_tq(
+            self.gps_id, self.lat, self.lon, self.velocidad_nudos, self.rumbo,
+            datetime.now(timezone.utc),
+        )
+
+
+class GeneradorCarga:
+    """Corre los equipos simulados y junta contadores del lado del cliente"""
+
+    def __init__(self, host: str = '127.0.0.1', puerto: int = 5003, equipos: int = 100,
+                 intervalo: float = 10.0, duracion: float = 30.0, rafaga: int = 1,
+                 tormenta_cada: float = 0, rafaga_reconexion: int = 10, rampa: float = 2.0,
+                 semilla: int = 1):
+        """
+        Args:
+            host: Host del receptor
+            puerto: Puerto del receptor
+            equipos: Cantidad de equipos simulados (máximo MAX_EQUIPOS)
+            intervalo: Segundos entre reportes de cada equipo
+            duracion: Segundos de envío
+            rafaga: Tramas por reporte (enviadas en un solo write)
+            tormenta_cada: Segundos entre tormentas de reconexión (0 = sin tormentas)
+            rafaga_reconexion: Tramas que envía cada equipo al reconectar
+            rampa: Segundos en los que se reparten las conexiones iniciales
+            semilla: Semilla de los recorridos (corridas reproducibles)
+        """
+        if equipos > MAX_EQUIPOS:
+            raise ValueError(f'Máximo {MAX_EQUIPOS} equipos simulados')
+        self.host = host
+        self.puerto = puerto
+        self.equipos = equipos
+        self.intervalo = intervalo
+        self.duracion = duracion
+        self.rafaga = max(1, rafaga)
+        self.tormenta_cada = tormenta_cada
+        self.rafaga_reconexion = rafaga_reconexion
+        self.rampa = rampa
+        self.semilla = semilla
+
+        self.stats = {
+            'tramas_enviadas': 0,
+            'bytes_enviados': 0,
+            'conexiones': 0,
+            'reconexiones': 0,
+            'tormentas': 0,
+            'errores_conexion': 0,
+            'errores_envio': 0,
+        }
+        self._tormenta = None
+        self._fin = 0.0
+
+    async def ejecutar(self) -> Dict:
+        """Correr la carga completa y devolver el resumen"""
+        loop = asyncio.get_running_loop()
+        self._tormenta = loop.create_future()
+        inicio = time.monotonic()
+        self._fin = inicio + self.rampa + self.duracion
+
+        rnd = random.Random(self.semilla)
+        tareas = [
+            asyncio.create_task(self._equipo(EquipoSimulado(i, random.Random(rnd.random())), i))
+            for i in range(self.equipos)
+        ]
+        if self.tormenta_cada:
+            tareas.append(asyncio.create_task(self._tormentas()))
+        await asyncio.gather(*tareas)
+
+        duracion_real = time.monotonic() - inicio
+        return {
+            **self.stats,
+            'duracion_s': round(duracion_real, 3),
+            'tramas_por_segundo': round(self.stats['tramas_enviadas'] / duracion_real, 1) if duracion_real else None,
+            'config': {
+                'equipos': self.equipos,
+                'intervalo': self.intervalo,
+                'duracion': self.duracion,
+                'rafaga': self.rafaga,
+                'tormenta_cada': self.tormenta_cada,
+                'rafaga_reconexion': self.rafaga_reconexion,
+                'rampa': self.rampa,
+            },
+        }
+
+    async def _tormentas(self):
+        while time.monotonic() + self.tormenta_cada < self._fin:
+            await asyncio.sleep(self.tormenta_cada)
+            self.stats['tormentas'] += 1
+            tormenta, self._tormenta = self._tormenta, asyncio.get_running_loop().create_future()
+            tormenta.set_result(True)
+
+    async def _conectar(self):
+        espera = 0.1
+        while time.monotonic() < self._fin:
+            try:
+                conexion = await asyncio.open_connection(self.host, self.puerto)
+                self.stats['conexiones'] += 1
+                return conexion
+            except OSError:
+                self.stats['errores_conexion'] += 1
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, 5.0)
+        return None, None
+
+    async def _enviar(self, writer, tramas: List[bytes]) -> bool:
+        datos = b''.join(tramas)
+        try:
+            writer.write(datos)
+            await writer.drain()
+        except (OSError, ConnectionError):
+            self.stats['errores_envio'] += 1
+            return False
+        self.stats['tramas_enviadas'] += len(tramas)
+        self.stats['bytes_enviados'] += len(datos)
+        return True
+
+    async def _equipo(self, equipo: EquipoSimulado, indice: int):
+        # Repartir conexiones y reportes para no sincronizar a todos los equipos
+        await asyncio.sleep(self.rampa * indice / max(1, self.equipos))
+        reader, writer = await self._conectar()
+        pendientes = 0
+
+        while writer is not None and time.monotonic() < self._fin:
+            cantidad = self.rafaga + pendientes
+            tramas = [equipo.siguiente_trama(self.intervalo / self.rafaga) for _ in range(cantidad)]
+            pendientes = 0
+            if not await self._enviar(writer, tramas):
+                writer.close()
+                self.stats['reconexiones'] += 1
+                reader, writer = await self._conectar()
+                continue
+
+            espera = min(self.intervalo * equipo.rnd.uniform(0.9, 1.1), max(0.0, self._fin - time.monotonic()))
+            tormenta = self._tormenta
+            await asyncio.wait({tormenta}, timeout=espera)
+            if tormenta.done() and time.monotonic() < self._fin:
+                # Cortar, reconectar y descargar lo "acumulado" mientras tanto
+                writer.close()
+                self.stats['reconexiones'] += 1
+                reader, writer = await self._conectar()
+                pendientes = self.rafaga_reconexion
+
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (OSError, ConnectionError):
+                pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generador de carga TQ para receptores TCP')
+    parser.add_argument('--host', default='127.0.0.1', help='Host del receptor')
+    parser.add_argument('--puerto', type=int, default=5003, help='Puerto del receptor')
+    parser.add_argument('--equipos', type=int, default=100, help='Equipos simulados')
+    parser.add_argument('--intervalo', type=float, default=10.0, help='Segundos entre reportes de cada equipo')
+    parser.add_argument('--duracion', type=float, default=30.0, help='Segundos de envío')
+    parser.add_argument('--rafaga', type=int, default=1, help='Tramas por reporte')
+    parser.add_argument('--tormenta-cada', type=float, default=0, help='Segundos entre tormentas de reconexión (0 = sin)')
+    parser.add_argument('--rafaga-reconexion', type=int, default=10, help='Tramas enviadas al reconectar')
+    parser.add_argument('--rampa', type=float, default=2.0, help='Segundos para repartir las conexiones iniciales')
+    parser.add_argument('--semilla', type=int, default=1, help='Semilla de los recorridos')
+    args = parser.parse_args(argv)
+
+    generador = GeneradorCarga(
+        host=args.host,
+        puerto=args.puerto,
+        equipos=args.equipos,
+        intervalo=args.intervalo,
+        duracion=args.duracion,
+        rafaga=args.rafaga,
+        tormenta_cada=args.tormenta_cada,
+        rafaga_reconexion=args.rafaga_reconexion,
+        rampa=args.rampa,
+        semilla=args.semilla,
+    )
+    resumen = asyncio.run(generador.ejecutar())
+    json.dump(resumen, sys.stdout)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
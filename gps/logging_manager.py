@@ -1,10 +1,24 @@
 """
 Módulo para gestionar logs de receptores GPS con rotación automática
+
+Por defecto cada receptor loguea en modo asíncrono: los hilos de socket solo
+encolan el LogRecord (QueueHandler) y un QueueListener por receptor formatea
+y escribe a disco/consola. El volcado hex de las tramas se arma en ese hilo
+y se muestrea (1 de cada N por conexión; siempre ante errores).
+
+Settings:
+    WAYGPS_LOG_ASINCRONO: False para escribir en el hilo que loguea (default: True)
+    WAYGPS_LOG_MUESTREO_HEX: N para volcar el hex de 1 de cada N tramas por
+        conexión; 0 para no volcarlo nunca salvo errores (default: 1)
+    WAYGPS_LOG_MAX_COLA: Registros en cola; si se llena se descartan (default: 10000)
 """
 
 import os
+import atexit
 import logging
 import logging.handlers
+import queue
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, Optional
@@ -12,16 +26,76 @@ import gzip
 import shutil
 from django.conf import settings
 
+# Bytes de la trama que se vuelcan en hex
+MAX_BYTES_HEX = 50
+
+
+class HexDiferido:
+    """Bytes que se convierten a hex recién al formatear el registro (en el listener)"""
+    
+    __slots__ = ('data',)
+    
+    def __init__(self, data):
+        self.data = bytes(data[:MAX_BYTES_HEX + 1])
+    
+    def __str__(self):
+        preview = self.data[:MAX_BYTES_HEX].hex()
+        return preview + "..." if len(self.data) > MAX_BYTES_HEX else preview
+
+
+class ColaLogHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que no formatea en el hilo que loguea y descarta (contando)
+    cuando la cola está llena en lugar de bloquear el socket.
+    """
+    
+    def __init__(self, cola: queue.Queue):
+        super().__init__(cola)
+        self.descartados = 0
+    
+    def prepare(self, record):
+        # El listener está en el mismo proceso: el record viaja tal cual y
+        # el mensaje (%-args, hex) se arma en el hilo del listener
+        return record
+    
+    def enqueue(self, record):
+        try:
+            if record.levelno >= logging.WARNING:
+                # Advertencias y errores esperan un poco antes de descartarse
+                self.queue.put(record, timeout=0.5)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
 
 class ReceptorLogger:
     """Logger específico para un receptor con rotación automática"""
     
-    def __init__(self, port: int, transporte: str = 'TCP', max_days: int = 7):
+    # Conexiones cuyo contador de muestreo se recuerda (se reinicia al superarlo)
+    MAX_CONTADORES = 10000
+    
+    def __init__(self, port: int, transporte: str = 'TCP', max_days: int = 7,
+                 asincrono: bool = None, muestreo_hex: int = None):
+        """
+        Args:
+            port: Puerto del receptor
+            transporte: TCP/UDP (nombre del directorio de logs)
+            max_days: Días de logs que se conservan
+            asincrono: Escribir desde un QueueListener (default: WAYGPS_LOG_ASINCRONO)
+            muestreo_hex: Volcar el hex de 1 de cada N tramas por conexión
+                (default: WAYGPS_LOG_MUESTREO_HEX; 0 = solo en errores)
+        """
         self.port = port
         self.transporte = transporte
         self.max_days = max_days
+        self.asincrono = getattr(settings, 'WAYGPS_LOG_ASINCRONO', True) if asincrono is None else asincrono
+        self.muestreo_hex = getattr(settings, 'WAYGPS_LOG_MUESTREO_HEX', 1) if muestreo_hex is None else muestreo_hex
         self.logger = None
         self.log_dir = None
+        self.cola_handler = None
+        self.listener = None
+        self._contadores: Dict[str, int] = {}
         self._setup_logger()
     
     def _setup_logger(self):
@@ -62,63 +136,107 @@ class ReceptorLogger:
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(formatter)
         
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
+        if not self.asincrono:
+            self.logger.addHandler(file_handler)
+            self.logger.addHandler(console_handler)
+            return
+        
+        # Modo asíncrono: el logger solo encola; el listener escribe
+        self.cola_handler = ColaLogHandler(queue.Queue(getattr(settings, 'WAYGPS_LOG_MAX_COLA', 10000)))
+        self.listener = logging.handlers.QueueListener(
+            self.cola_handler.queue, file_handler, console_handler, respect_handler_level=True
+        )
+        self.listener.start()
+        self.logger.addHandler(self.cola_handler)
+        self.logger.propagate = False
+    
+    def cerrar(self):
+        """Escribir los registros pendientes y detener el listener"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+    
+    def _muestrear(self, client_address) -> bool:
+        """True si a esta trama de la conexión le toca volcar el hex"""
+        if self.muestreo_hex <= 0:
+            return False
+        if self.muestreo_hex == 1:
+            return True
+        clave = str(client_address)
+        contadores = self._contadores
+        if len(contadores) > self.MAX_CONTADORES:
+            contadores.clear()
+        n = contadores.get(clave, 0)
+        contadores[clave] = n + 1
+        return n % self.muestreo_hex == 0
     
     def log_connection(self, client_address: str, action: str):
         """Log de conexiones/desconexiones"""
-        self.logger.info(f"[CONEXION] {action} desde {client_address}")
-    
-    def log_data_received(self, client_address: str, data_size: int, hex_data: str = None):
-        """Log de datos recibidos"""
-        if hex_data:
-            # Truncar datos hex si son muy largos
-            hex_preview = hex_data[:100] + "..." if len(hex_data) > 100 else hex_data
-            self.logger.info(f"[DATOS] {data_size} bytes desde {client_address} - Hex: {hex_preview}")
-        else:
-            self.logger.info(f"[DATOS] {data_size} bytes desde {client_address}")
+        self.logger.info("[CONEXION] %s desde %s", action, client_address)
+        if action != "CONECTADO":
+            self._contadores.pop(str(client_address), None)
     
-    def log_parsed_data(self, parsed_data: dict):
-        """Log de datos parseados exitosamente"""
-        imei = parsed_data.get('imei', 'Unknown')
-        lat = parsed_data.get('latitud', 0)
-        lon = parsed_data.get('longitud', 0)
-        speed = parsed_data.get('velocidad', 0)
-        timestamp = parsed_data.get('timestamp', '')
-        fecha_gps = parsed_data.get('fecha_gps', '')
-        hora_gps = parsed_data.get('hora_gps', '')
+    def log_data_received(self, client_address: str, data_size: int, hex_data=None):
+        """
+        Log de datos recibidos
         
-        # Formatear timestamp para mostrar
-        timestamp_str = ''
-        if timestamp:
-            try:
-                from datetime import datetime
-                if isinstance(timestamp, str):
-                    dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                    timestamp_str = dt.strftime('%d/%m/%Y %H:%M:%S')
-                else:
-                    timestamp_str = timestamp.strftime('%d/%m/%Y %H:%M:%S')
-            except:
-                timestamp_str = str(timestamp)
-        
-        if timestamp_str:
-            self.logger.info(f"[PARSEADO] IMEI: {imei} - Lat: {lat}, Lon: {lon}, Vel: {speed} km/h - GPS: {timestamp_str}")
+        hex_data puede ser el string hexadecimal o los bytes crudos. El hex se
+        vuelca solo en las tramas que tocan según el muestreo y se arma al
+        escribir el registro (en el listener, en modo asíncrono).
+        """
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        if hex_data is not None and len(hex_data) and self._muestrear(client_address):
+            if isinstance(hex_data, (bytes, bytearray, memoryview)):
+                hex_data = HexDiferido(hex_data)
+            elif len(hex_data) > 100:
+                # Truncar datos hex si son muy largos
+                hex_data = hex_data[:100] + "..."
+            self.logger.info("[DATOS] %s bytes desde %s - Hex: %s", data_size, client_address, hex_data)
         else:
-            self.logger.info(f"[PARSEADO] IMEI: {imei} - Lat: {lat}, Lon: {lon}, Vel: {speed} km/h")
+            self.logger.info("[DATOS] %s bytes desde %s", data_size, client_address)
     
-    def log_error(self, error_msg: str, client_address: str = None):
-        """Log de errores"""
-        if client_address:
-            self.logger.error(f"[ERROR] {error_msg} desde {client_address}")
-        else:
-            self.logger.error(f"[ERROR] {error_msg}")
+    def log_parsed_data(self, parsed_data: dict):
+        """Log compacto de datos parseados exitosamente"""
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        self.logger.info(
+            "[PARSEADO] imei=%s lat=%s lon=%s vel=%s gps=%s %s",
+            parsed_data.get('imei', 'Unknown'),
+            parsed_data.get('latitud', 0),
+            parsed_data.get('longitud', 0),
+            parsed_data.get('velocidad', 0),
+            parsed_data.get('fecha_gps', ''),
+            parsed_data.get('hora_gps', ''),
+        )
+    
+    def log_error(self, error_msg: str, client_address: str = None, datos: bytes = None):
+        """Log de errores (con `datos`, siempre incluye el hex de la trama)"""
+        self._log_problema(logging.ERROR, "[ERROR]", error_msg, client_address, datos)
     
-    def log_warning(self, warning_msg: str, client_address: str = None):
-        """Log de advertencias"""
+    def log_warning(self, warning_msg: str, client_address: str = None, datos: bytes = None):
+        """Log de advertencias (con `datos`, siempre incluye el hex de la trama)"""
+        self._log_problema(logging.WARNING, "[WARNING]", warning_msg, client_address, datos)
+    
+    def _log_problema(self, nivel: int, etiqueta: str, mensaje: str, client_address, datos):
+        formato = "%s %s"
+        args = [etiqueta, mensaje]
         if client_address:
-            self.logger.warning(f"[WARNING] {warning_msg} desde {client_address}")
-        else:
-            self.logger.warning(f"[WARNING] {warning_msg}")
+            formato += " desde %s"
+            args.append(client_address)
+        if datos:
+            formato += " - Hex: %s"
+            args.append(HexDiferido(datos))
+        self.logger.log(nivel, formato, *args)
+    
+    def get_stats(self) -> Dict:
+        """Estado del logging asíncrono del receptor"""
+        return {
+            'asincrono': self.asincrono,
+            'muestreo_hex': self.muestreo_hex,
+            'en_cola': self.cola_handler.queue.qsize() if self.cola_handler else 0,
+            'descartados': self.cola_handler.descartados if self.cola_handler else 0,
+        }
     
     def log_receptor_status(self, status: str, details: str = None):
         """Log de cambios de estado del receptor"""
@@ -160,15 +278,24 @@ class LoggingManager:
     
     def __init__(self):
         self.loggers: Dict[int, ReceptorLogger] = {}
+        self._lock = threading.Lock()
         # Usar ruta absoluta basada en BASE_DIR para evitar problemas de cwd
         self.base_log_dir = Path(settings.BASE_DIR) / "logs"
         self.base_log_dir.mkdir(parents=True, exist_ok=True)
+        # No perder los registros encolados al terminar el proceso
+        atexit.register(self.cerrar_todos)
     
     def get_logger(self, port: int, transporte: str = 'TCP') -> ReceptorLogger:
         """Obtener o crear logger para un puerto específico"""
-        if port not in self.loggers:
-            self.loggers[port] = ReceptorLogger(port, transporte)
-        return self.loggers[port]
+        with self._lock:
+            if port not in self.loggers:
+                self.loggers[port] = ReceptorLogger(port, transporte)
+            return self.loggers[port]
+    
+    def cerrar_todos(self):
+        """Vaciar las colas de los loggers asíncronos"""
+        for receptor_logger in list(self.loggers.values()):
+            receptor_logger.cerrar()
     
     def get_log_files(self, port: int = None) -> list:
         """Obtener lista de archivos de log"""
@@ -0,0 +1,69 @@
+"""
+Comando Django para mantener los resúmenes diarios de recorridos (RecorridoDiario)
+Uso: python manage.py actualizar_recorridos_diarios [--intervalo 300] [--desde AAAA-MM-DD --hasta AAAA-MM-DD]
+
+Sin fechas procesa las posiciones nuevas desde la última pasada (la
+primera vez recorre toda la historia, de a --lote-ids). Con --desde/--hasta
+recalcula esos días, p. ej. después de corregir o invalidar posiciones.
+"""
+
+import time
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils.dateparse import parse_date
+
+from gps import rollups
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Actualiza los resúmenes diarios de recorridos por móvil'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            help='Repetir cada N segundos en vez de ejecutar una sola vez',
+        )
+        parser.add_argument(
+            '--lote-ids',
+            type=int,
+            default=rollups.LOTE_IDS,
+            help=f'Ids de posición por transacción (default: {rollups.LOTE_IDS})',
+        )
+        parser.add_argument('--desde', help='Recalcular desde este día (AAAA-MM-DD)')
+        parser.add_argument('--hasta', help='Recalcular hasta este día inclusive (default: --desde)')
+        parser.add_argument(
+            '--movil-id',
+            type=int,
+            action='append',
+            help='Limitar el recálculo a este móvil (se puede repetir)',
+        )
+
+    def handle(self, *args, **options):
+        if options['desde']:
+            desde = parse_date(options['desde'])
+            hasta = parse_date(options['hasta'] or options['desde'])
+            if desde is None or hasta is None or hasta < desde:
+                raise CommandError('Fechas inválidas: usar AAAA-MM-DD con --hasta >= --desde')
+            dias = rollups.reconstruir(desde, hasta, options['movil_id'])
+            self.stdout.write(self.style.SUCCESS(f'✅ {dias} recorridos diarios recalculados ({desde} a {hasta})'))
+            return
+
+        try:
+            while True:
+                close_old_connections()
+                resultado = rollups.actualizar_pendientes(options['lote_ids'])
+                if resultado['dias'] or not options['intervalo']:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"📅 {resultado['dias']} recorridos diarios actualizados "
+                        f"(posiciones hasta {resultado['hasta_id']})"
+                    ))
+                if not options['intervalo']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('🛑 Actualización de recorridos diarios detenida por el usuario'))
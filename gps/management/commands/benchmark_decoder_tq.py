@@ -0,0 +1,88 @@
+"""
+Comando Django para medir el decodificador de tramas TQ
+Uso: python manage.py benchmark_decoder_tq [--tramas 100000] [--repeticiones 3]
+
+Compara el camino hex (hexlify + get_*_chino de BaseProcessor), el
+decodificador binario decode_tq() y el modo lote decode_tq_lote(). No toca
+la base de datos.
+"""
+
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from gps.processors import QueclinkProcessor
+from gps.tq_decoder import NP_AVAILABLE, decode_tq, decode_tq_lote
+
+
+def _tramas_sinteticas(cantidad: int, semilla: int = 1):
+    """Tramas TQ de 45 bytes con coordenadas plausibles (Argentina)"""
+    rnd = random.Random(semilla)
+    tramas = []
+    for _ in range(cantidad):
+        hex_str = (
+            '24' + '2076668' + f'{rnd.randrange(100000):05d}'[:3]
+            + f'{rnd.randrange(24):02d}{rnd.randrange(60):02d}{rnd.randrange(60):02d}'
+            + f'{rnd.randrange(1, 29):02d}{rnd.randrange(1, 13):02d}25'
+            + f'{rnd.randrange(22, 55):02d}{rnd.randrange(60):02d}{rnd.randrange(1000000):06d}'
+            + f'{rnd.randrange(53, 73):03d}{rnd.randrange(60):02d}{rnd.randrange(100000):05d}'
+            + f'{rnd.randrange(130):03d}{rnd.randrange(361):03d}'
+            + 'ffffdfff000320a000000000000000df1600000c'
+        )
+        tramas.append(bytes.fromhex(hex_str))
+    return tramas
+
+
+class Command(BaseCommand):
+    help = 'Mide tramas/segundo del decodificador TQ (hex vs binario vs lote)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tramas',
+            type=int,
+            default=100000,
+            help='Cantidad de tramas sintéticas a decodificar (default: 100000)',
+        )
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=3,
+            help='Repeticiones por método; se informa la mejor (default: 3)',
+        )
+
+    def handle(self, *args, **options):
+        tramas = _tramas_sinteticas(options['tramas'])
+        processor = QueclinkProcessor()
+
+        def camino_hex():
+            for trama in tramas:
+                processor.decodificar_campos_hex(trama)
+
+        def camino_binario():
+            for trama in tramas:
+                decode_tq(trama)
+
+        def camino_lote():
+            decode_tq_lote(tramas)
+
+        metodos = [('hex (get_*_chino)', camino_hex), ('binario (decode_tq)', camino_binario)]
+        metodos.append(('lote (decode_tq_lote%s)' % ('' if NP_AVAILABLE else ', sin numpy'), camino_lote))
+
+        self.stdout.write(f'⏱️ Decodificando {len(tramas)} tramas x {options["repeticiones"]} repeticiones')
+
+        base = None
+        for nombre, funcion in metodos:
+            mejor = min(self._medir(funcion) for _ in range(max(1, options['repeticiones'])))
+            por_segundo = len(tramas) / mejor if mejor else float('inf')
+            base = base or por_segundo
+            self.stdout.write(
+                f'  {nombre:<32} {por_segundo:>12,.0f} tramas/s  ({por_segundo / base:.1f}x)'
+            )
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark finalizado'))
+
+    def _medir(self, funcion) -> float:
+        inicio = time.perf_counter()
+        funcion()
+        return time.perf_counter() - inicio
@@ -0,0 +1,391 @@
+"""
+Comando Django para medir la capacidad de ingesta de un receptor TCP
+Uso:
+    WAYGPS_DB_LOCAL=/tmp/bench.sqlite3 python manage.py benchmark_ingesta \\
+        --equipos 500 --intervalo 5 --duracion 60 --modo asyncio --write-behind
+
+Levanta un receptor (el mismo que arma receiver_manager) en un puerto local,
+lanza gps.loadgen en otro proceso con N equipos simulados y mide del lado
+del receptor:
+
+- mensajes/segundo sostenidos (posiciones confirmadas en la base)
+- latencia recepción -> commit (p50/p90/p99)
+- tiempos por etapa: parseo, guardado (o encolado), flush de lote,
+  estadísticas de recepción
+
+El resultado se guarda en JSON (logs/benchmarks/ por defecto) para comparar
+modos de receptor y detectar regresiones.
+
+Con WAYGPS_DB_LOCAL (ver settings) se usa un archivo SQLite y se crean solo
+las tablas que toca la recepción. Contra otra base hay que pasar
+--usar-db-actual; los móviles simulados (patente BENCH*) se borran al final.
+"""
+
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from authentication.models import Empresa as EmpresaCuenta
+from gps.geocode_worker import geocode_worker, MODO_EXTERNO
+from gps.loadgen import MAX_EQUIPOS, gps_id_simulado
+from gps.models import (
+    ConfiguracionReceptor, Empresa, Equipo, EstadisticasRecepcion, GeocodeCelda,
+    Posicion, TipoEquipoGPS,
+)
+from gps.receiver_manager import build_receiver
+from moviles.models import Movil, MovilGeocode, MovilStatus
+
+PREFIJO_PATENTE = 'BENCH'
+
+# Tablas que necesita la recepción (orden de creación en SQLite)
+MODELOS_RECEPCION = [
+    EmpresaCuenta, Empresa, TipoEquipoGPS, ConfiguracionReceptor, EstadisticasRecepcion,
+    Equipo, Movil, MovilStatus, MovilGeocode, GeocodeCelda, Posicion,
+]
+
+
+def percentiles(valores: List[float]) -> Dict:
+    """Resumen de una serie de tiempos en ms (percentil por rango más cercano)"""
+    if not valores:
+        return {'n': 0}
+    ordenados = sorted(valores)
+    n = len(ordenados)
+
+    def p(q):
+        return round(ordenados[min(n - 1, int(q * n))], 3)
+
+    return {
+        'n': n,
+        'promedio': round(sum(ordenados) / n, 3),
+        'p50': p(0.50),
+        'p90': p(0.90),
+        'p99': p(0.99),
+        'max': round(ordenados[-1], 3),
+    }
+
+
+class Instrumentacion:
+    """
+    Mide las etapas de un receptor envolviendo sus métodos de instancia.
+
+    La latencia recepción -> commit se toma desde que process_message
+    recibe la trama hasta que la posición queda escrita: al terminar
+    save_to_database (guardado sincrónico) o al terminar el flush del lote
+    que la contiene (write-behind; en ese caso desde fec_report, que se fija
+    al encolar, apenas después del parseo).
+    """
+
+    def __init__(self, receiver):
+        self.receiver = receiver
+        self.etapas = defaultdict(list)
+        self.latencias_ms = []
+        self.commits = []  # time.monotonic() de cada posición confirmada
+        self.guardados = 0
+        self._local = threading.local()
+
+    def instalar(self):
+        receiver = self.receiver
+        self._envolver(receiver.processor, 'parse', 'parseo')
+        self._envolver(receiver, 'update_statistics', 'estadisticas')
+
+        process_message = receiver.process_message
+
+        def process_message_medido(data, client_id):
+            self._local.ingreso = time.monotonic()
+            process_message(data, client_id)
+            self.etapas['mensaje'].append((time.monotonic() - self._local.ingreso) * 1000)
+
+        receiver.process_message = process_message_medido
+
+        save_to_database = receiver.save_to_database
+
+        def save_to_database_medido(parsed_data):
+            inicio = time.monotonic()
+            ok = save_to_database(parsed_data)
+            fin = time.monotonic()
+            self.etapas['guardado' if receiver.write_behind is None else 'encolado'].append((fin - inicio) * 1000)
+            if ok:
+                self.guardados += 1
+                if receiver.write_behind is None:
+                    self.latencias_ms.append((fin - getattr(self._local, 'ingreso', inicio)) * 1000)
+                    self.commits.append(fin)
+            return ok
+
+        receiver.save_to_database = save_to_database_medido
+
+        if receiver.write_behind is not None:
+            write_behind = receiver.write_behind
+            flush = write_behind._flush
+
+            def flush_medido(lote, reproceso=False):
+                inicio = time.monotonic()
+                ok = flush(lote, reproceso)
+                fin = time.monotonic()
+                self.etapas['flush_lote'].append((fin - inicio) * 1000)
+                if ok and not reproceso:
+                    ahora = time.time()
+                    for registro in lote:
+                        self.latencias_ms.append((ahora - registro['fec_report'].timestamp()) * 1000)
+                    self.commits.extend([fin] * len(lote))
+                return ok
+
+            write_behind._flush = flush_medido
+
+    def _envolver(self, objeto, metodo: str, etapa: str):
+        original = getattr(objeto, metodo)
+
+        def medido(*args, **kwargs):
+            inicio = time.monotonic()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.etapas[etapa].append((time.monotonic() - inicio) * 1000)
+
+        setattr(objeto, metodo, medido)
+
+    def confirmados(self) -> int:
+        return len(self.commits)
+
+    def resumen(self, inicio: float, fin_envio: float) -> Dict:
+        """
+        Args:
+            inicio: time.monotonic() al lanzar el generador
+            fin_envio: time.monotonic() al terminar el generador
+        """
+        commits = sorted(self.commits)
+        ventana = max(fin_envio - inicio, 1e-9)
+        en_ventana = sum(1 for t in commits if t <= fin_envio)
+        serie = defaultdict(int)
+        for t in commits:
+            serie[int(t - inicio)] += 1
+        segundos = max(serie) + 1 if serie else 0
+        return {
+            'posiciones_confirmadas': len(commits),
+            'posiciones_por_segundo': round(en_ventana / ventana, 1),
+            'posiciones_por_segundo_pico': max(serie.values()) if serie else 0,
+            'drenaje_s': round(commits[-1] - fin_envio, 3) if commits and commits[-1] > fin_envio else 0.0,
+            'serie_por_segundo': [serie.get(s, 0) for s in range(segundos)],
+            'latencia_commit_ms': percentiles(self.latencias_ms),
+            'etapas_ms': {etapa: percentiles(valores) for etapa, valores in sorted(self.etapas.items())},
+        }
+
+
+class Command(BaseCommand):
+    help = 'Mide mensajes/segundo y latencia de ingesta de un receptor TCP con equipos simulados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--equipos', type=int, default=100, help=f'Equipos simulados (máx. {MAX_EQUIPOS}, default: 100)')
+        parser.add_argument('--intervalo', type=float, default=5.0, help='Segundos entre reportes de cada equipo (default: 5)')
+        parser.add_argument('--duracion', type=float, default=30.0, help='Segundos de envío (default: 30)')
+        parser.add_argument('--rafaga', type=int, default=1, help='Tramas por reporte (default: 1)')
+        parser.add_argument('--tormenta-cada', type=float, default=0,
+                            help='Segundos entre tormentas de reconexión (default: 0 = sin tormentas)')
+        parser.add_argument('--rafaga-reconexion', type=int, default=10,
+                            help='Tramas que envía cada equipo al reconectar (default: 10)')
+        parser.add_argument('--rampa', type=float, default=2.0, help='Segundos para repartir las conexiones iniciales')
+        parser.add_argument('--modo', choices=['threads', 'asyncio'], default='threads', help='Modo del receptor')
+        parser.add_argument('--workers', type=int, default=8, help='Workers del receptor asyncio (default: 8)')
+        parser.add_argument('--write-behind', action='store_true', help='Guardar posiciones en lotes (write-behind)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Tamaño de lote del write-behind')
+        parser.add_argument('--flush-interval', type=float, default=1.0, help='Segundos máximos entre flushes')
+        parser.add_argument('--puerto', type=int, default=15003, help='Puerto local del receptor (default: 15003)')
+        parser.add_argument('--drenaje', type=float, default=30.0,
+                            help='Segundos máximos a esperar que se confirme lo recibido (default: 30)')
+        parser.add_argument('--etiqueta', default='', help='Nombre libre de la corrida (queda en el JSON)')
+        parser.add_argument('--salida', help='Archivo JSON de resultados (default: logs/benchmarks/...)')
+        parser.add_argument('--usar-db-actual', action='store_true',
+                            help='Permitir correr contra una base que no es la SQLite local')
+        parser.add_argument('--conservar-datos', action='store_true',
+                            help='No borrar móviles y posiciones simulados al terminar')
+
+    def handle(self, *args, **options):
+        if options['equipos'] > MAX_EQUIPOS:
+            raise CommandError(f'Máximo {MAX_EQUIPOS} equipos simulados')
+        if connection.vendor != 'sqlite' and not options['usar_db_actual']:
+            raise CommandError(
+                'El benchmark escribe posiciones simuladas. Usá WAYGPS_DB_LOCAL=/ruta/bench.sqlite3 '
+                'o pasá --usar-db-actual para correrlo contra la base configurada.'
+            )
+
+        if connection.vendor == 'sqlite':
+            self._preparar_esquema()
+        moviles_ids = self._crear_moviles(options['equipos'])
+        configuracion_creada = not ConfiguracionReceptor.objects.filter(puerto=options['puerto']).exists()
+
+        # Nominatim fuera del camino medido (y sin pegarle con datos simulados)
+        modo_geocode = geocode_worker.modo
+        geocode_worker.modo = MODO_EXTERNO
+
+        receiver = build_receiver('127.0.0.1', options['puerto'], self._configuracion(options))
+        instrumentacion = Instrumentacion(receiver)
+        instrumentacion.instalar()
+
+        self.stdout.write(
+            f"🚀 Receptor {receiver.modo}{' + write-behind' if receiver.write_behind else ''} "
+            f"en puerto {options['puerto']} ({connection.vendor})"
+        )
+        try:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                # El receptor imprime cada mensaje; a consola distorsionaría la medición
+                resultado = self._correr(receiver, instrumentacion, options)
+        finally:
+            geocode_worker.modo = modo_geocode
+            if not options['conservar_datos']:
+                self._limpiar(moviles_ids, options['puerto'] if configuracion_creada else None)
+
+        salida = self._guardar(resultado, options)
+        self._imprimir(resultado)
+        self.stdout.write(self.style.SUCCESS(f'✅ Resultados guardados en {salida}'))
+
+    # ------------------------------------------------------------------
+    # Preparación
+    # ------------------------------------------------------------------
+
+    def _preparar_esquema(self):
+        """Crear en SQLite las tablas de recepción que falten (sin migraciones: usan SQL de PostgreSQL)"""
+        existentes = set(connection.introspection.table_names())
+        with connection.schema_editor() as editor:
+            for modelo in MODELOS_RECEPCION:
+                if modelo._meta.db_table not in existentes:
+                    editor.create_model(modelo)
+        EmpresaCuenta.objects.get_or_create(id=1, defaults={'code': 'BENCH', 'legal_name': 'Benchmark'})
+        TipoEquipoGPS.objects.get_or_create(id=1, defaults={
+            'codigo': 'TQ', 'nombre': 'TQ', 'fabricante': 'Queclink', 'protocolo': 'TCP',
+            'puerto_default': 5003, 'formato_datos': {},
+        })
+
+    def _crear_moviles(self, cantidad: int) -> List[int]:
+        existentes = set(Movil.objects.filter(patente__startswith=PREFIJO_PATENTE).values_list('gps_id', flat=True))
+        nuevos = [
+            Movil(patente=f'{PREFIJO_PATENTE}{i:05d}', alias=f'Benchmark {i}', gps_id=gps_id_simulado(i), activo=True)
+            for i in range(cantidad)
+            if gps_id_simulado(i) not in existentes
+        ]
+        Movil.objects.bulk_create(nuevos, batch_size=1000)
+        return list(Movil.objects.filter(patente__startswith=PREFIJO_PATENTE).values_list('id', flat=True))
+
+    def _configuracion(self, options) -> ConfiguracionReceptor:
+        """ConfiguracionReceptor sin guardar: build_receiver arma el mismo receptor que en producción"""
+        avanzada = {'modo_receptor': options['modo'], 'workers': options['workers']}
+        if options['write_behind']:
+            avanzada['write_behind'] = {
+                'batch_size': options['batch_size'],
+                'flush_interval': options['flush_interval'],
+            }
+        return ConfiguracionReceptor(puerto=options['puerto'], protocolo='TQ', configuracion_avanzada=avanzada)
+
+    # ------------------------------------------------------------------
+    # Corrida
+    # ------------------------------------------------------------------
+
+    def _correr(self, receiver, instrumentacion: Instrumentacion, options) -> Dict:
+        hilo = threading.Thread(target=receiver.start, name=f'Benchmark-{options["puerto"]}', daemon=True)
+        hilo.start()
+        limite = time.monotonic() + 10
+        while not receiver.running:
+            if time.monotonic() > limite or not hilo.is_alive():
+                raise CommandError(f'El receptor no pudo iniciar en el puerto {options["puerto"]}')
+            time.sleep(0.05)
+
+        comando = [
+            sys.executable, '-m', 'gps.loadgen',
+            '--puerto', str(options['puerto']),
+            '--equipos', str(options['equipos']),
+            '--intervalo', str(options['intervalo']),
+            '--duracion', str(options['duracion']),
+            '--rafaga', str(options['rafaga']),
+            '--tormenta-cada', str(options['tormenta_cada']),
+            '--rafaga-reconexion', str(options['rafaga_reconexion']),
+            '--rampa', str(options['rampa']),
+        ]
+        inicio = time.monotonic()
+        proceso = subprocess.run(comando, cwd=settings.BASE_DIR, capture_output=True, text=True)
+        fin_envio = time.monotonic()
+        if proceso.returncode != 0:
+            receiver.stop()
+            raise CommandError(f'El generador de carga falló:\n{proceso.stderr}')
+        generador = json.loads(proceso.stdout.strip().splitlines()[-1])
+
+        # Esperar a que lo recibido quede confirmado (cola del pool / del write-behind)
+        limite = time.monotonic() + options['drenaje']
+        while time.monotonic() < limite:
+            parseados = receiver.stats['successful_parses']
+            if instrumentacion.guardados >= parseados and instrumentacion.confirmados() >= instrumentacion.guardados:
+                break
+            time.sleep(0.1)
+        # stop() escribe lo que quede en el write-behind
+        receiver.stop()
+        hilo.join(timeout=2)
+
+        stats_receptor = receiver.get_stats()
+        stats_receptor.pop('clients', None)
+        return {
+            'etiqueta': options['etiqueta'],
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'base_datos': connection.vendor,
+            'receptor': {
+                'modo': receiver.modo,
+                'write_behind': bool(receiver.write_behind),
+                'workers': options['workers'] if receiver.modo == 'asyncio' else None,
+                'batch_size': options['batch_size'] if receiver.write_behind else None,
+                'flush_interval': options['flush_interval'] if receiver.write_behind else None,
+            },
+            'generador': generador,
+            'resultados': instrumentacion.resumen(inicio, fin_envio),
+            'stats_receptor': stats_receptor,
+        }
+
+    def _limpiar(self, moviles_ids: List[int], puerto):
+        Posicion.objects.filter(movil_id__in=moviles_ids).delete()
+        MovilStatus.objects.filter(movil_id__in=moviles_ids).delete()
+        MovilGeocode.objects.filter(movil_id__in=moviles_ids).delete()
+        Movil.objects.filter(id__in=moviles_ids).delete()
+        if puerto is not None:
+            ConfiguracionReceptor.objects.filter(puerto=puerto).delete()
+
+    # ------------------------------------------------------------------
+    # Salida
+    # ------------------------------------------------------------------
+
+    def _guardar(self, resultado: Dict, options) -> Path:
+        if options['salida']:
+            salida = Path(options['salida'])
+        else:
+            nombre = '_'.join(filter(None, [
+                'ingesta',
+                resultado['receptor']['modo'],
+                'wb' if resultado['receptor']['write_behind'] else '',
+                options['etiqueta'],
+                datetime.now().strftime('%Y%m%d_%H%M%S'),
+            ]))
+            salida = Path(settings.BASE_DIR) / 'logs' / 'benchmarks' / f'{nombre}.json'
+        salida.parent.mkdir(parents=True, exist_ok=True)
+        salida.write_text(json.dumps(resultado, indent=2, ensure_ascii=False, default=str), encoding='utf-8')
+        return salida
+
+    def _imprimir(self, resultado: Dict):
+        generador = resultado['generador']
+        datos = resultado['resultados']
+        latencia = datos['latencia_commit_ms']
+        self.stdout.write(f"📤 Enviadas: {generador['tramas_enviadas']} tramas "
+                          f"({generador['tramas_por_segundo']}/s, {generador['reconexiones']} reconexiones)")
+        self.stdout.write(f"💾 Confirmadas: {datos['posiciones_confirmadas']} "
+                          f"({datos['posiciones_por_segundo']}/s sostenido, pico {datos['posiciones_por_segundo_pico']}/s)")
+        if latencia['n']:
+            self.stdout.write(f"⏱️ Latencia recepción -> commit: p50={latencia['p50']} ms "
+                              f"p99={latencia['p99']} ms max={latencia['max']} ms")
+        for etapa, valores in datos['etapas_ms'].items():
+            if valores['n']:
+                self.stdout.write(f"   {etapa:<14} p50={valores['p50']} ms p99={valores['p99']} ms (n={valores['n']})")
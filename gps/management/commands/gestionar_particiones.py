@@ -0,0 +1,158 @@
+"""
+Comando Django para mantener las particiones mensuales de posiciones
+Uso: python manage.py gestionar_particiones [--meses-futuros 3] [--retencion-meses 24] [--eliminar] [--dry-run]
+                                            [--convertir | --revertir]
+
+Crea las particiones del mes actual y los siguientes (así los INSERT no
+caen en posiciones_default) y desacopla las anteriores a la ventana de
+retención, moviéndolas al esquema de archivo o borrándolas. Pensado para
+cron diario, o como proceso propio con --intervalo-horas:
+
+    15 3 * * * cd /opt/waygps && python manage.py gestionar_particiones
+
+La conversión inicial de posiciones a tabla particionada (--convertir) y la
+vuelta a una tabla común (--revertir) copian toda la tabla bloqueada: van en
+una ventana de mantenimiento, con los receptores detenidos.
+"""
+
+import time
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from gps import particiones
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Crea particiones futuras de posiciones y desacopla/archiva las vencidas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--meses-futuros',
+            type=int,
+            default=particiones.MESES_FUTUROS,
+            help=f'Meses por delante del actual con partición creada (default: {particiones.MESES_FUTUROS})',
+        )
+        parser.add_argument(
+            '--retencion-meses',
+            type=int,
+            default=particiones.RETENCION_MESES,
+            help='Meses completos que quedan adjuntos además del actual (default: WAYGPS_RETENCION_MESES, sin límite)',
+        )
+        parser.add_argument(
+            '--esquema-archivo',
+            default=particiones.ESQUEMA_ARCHIVO,
+            help=f'Esquema al que se mueven las particiones desacopladas (default: {particiones.ESQUEMA_ARCHIVO})',
+        )
+        parser.add_argument(
+            '--eliminar',
+            action='store_true',
+            help='Borrar las particiones vencidas en vez de archivarlas',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Mostrar qué se haría sin tocar la base',
+        )
+        parser.add_argument(
+            '--intervalo-horas',
+            type=float,
+            help='Repetir cada N horas en vez de ejecutar una sola vez',
+        )
+        conversion = parser.add_mutually_exclusive_group()
+        conversion.add_argument(
+            '--convertir',
+            action='store_true',
+            help='Convertir posiciones en tabla particionada por mes antes de mantenerla (copia toda la tabla)',
+        )
+        conversion.add_argument(
+            '--revertir',
+            action='store_true',
+            help='Volver posiciones a una tabla común (las particiones archivadas no vuelven) y salir',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('El particionado de posiciones requiere PostgreSQL')
+
+        if options['revertir']:
+            self._reconstruir(options, particionar=False)
+            return
+        if options['convertir'] and not self._reconstruir(options, particionar=True):
+            return
+
+        try:
+            while True:
+                close_old_connections()
+                self._mantener(options)
+                if not options['intervalo_horas']:
+                    break
+                time.sleep(options['intervalo_horas'] * 3600)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('🛑 Gestión de particiones detenida por el usuario'))
+
+    def _reconstruir(self, options, particionar: bool) -> bool:
+        """
+        Convertir (o revertir) la tabla en una sola transacción.
+
+        Returns:
+            False si era un dry-run y quedó la conversión pendiente
+        """
+        with connection.cursor() as cursor:
+            particionada = particiones.es_particionada(cursor)
+        if particionada == particionar:
+            estado = 'ya está particionada' if particionada else 'no está particionada'
+            self.stdout.write(f'ℹ️ La tabla posiciones {estado}')
+            return True
+
+        accion = 'particionada por mes' if particionar else 'común'
+        if options['dry_run']:
+            self.stdout.write(f'🧪 Se convertiría posiciones en tabla {accion}')
+            return False
+
+        inicio = time.monotonic()
+        with transaction.atomic(), connection.cursor() as cursor:
+            if particionar:
+                particiones.particionar_tabla(cursor, meses_futuros=options['meses_futuros'])
+            else:
+                particiones.desparticionar_tabla(cursor)
+        duracion = time.monotonic() - inicio
+        logger.info(f"🗂️ posiciones convertida en tabla {accion} en {duracion:.1f}s")
+        self.stdout.write(self.style.SUCCESS(f'✅ posiciones convertida en tabla {accion} ({duracion:.1f}s)'))
+        return True
+
+    def _mantener(self, options):
+        hoy = timezone.now().date()
+        dry_run = options['dry_run']
+
+        with connection.cursor() as cursor:
+            if not particiones.es_particionada(cursor):
+                raise CommandError('La tabla posiciones no está particionada (ejecutar con --convertir)')
+            existentes = particiones.particiones(cursor)
+
+        for inicio in particiones.meses_a_crear(hoy, options['meses_futuros'], existentes):
+            nombre = particiones.nombre_particion(inicio)
+            if dry_run:
+                self.stdout.write(f'🧪 Se crearía {nombre}')
+                continue
+            with transaction.atomic(), connection.cursor() as cursor:
+                if particiones.crear_particion(cursor, inicio):
+                    self.stdout.write(self.style.SUCCESS(f'✅ Partición creada: {nombre}'))
+
+        destino = 'borrada' if options['eliminar'] else f"archivada en {options['esquema_archivo']}"
+        for nombre in particiones.particiones_vencidas(hoy, options['retencion_meses'], existentes):
+            if dry_run:
+                self.stdout.write(f'🧪 Se desacoplaría {nombre} ({destino})')
+                continue
+            with transaction.atomic(), connection.cursor() as cursor:
+                particiones.desacoplar_particion(
+                    cursor, nombre,
+                    esquema_archivo=options['esquema_archivo'],
+                    eliminar=options['eliminar'],
+                )
+            logger.info(f"🗄️ Partición {nombre} desacoplada ({destino})")
+            self.stdout.write(self.style.SUCCESS(f'🗄️ Partición desacoplada: {nombre} ({destino})'))
@@ -0,0 +1,87 @@
+"""
+Comando Django para ejecutar el worker de geocodificación en un proceso aparte
+Uso: python manage.py run_geocode_worker [--intervalo 2] [--desde-id ID]
+
+Pensado para settings.WAYGPS_GEOCODE_WORKER = 'externo': los receptores solo
+guardan posiciones y este proceso geocodifica las nuevas sin dirección
+(solo la última de cada móvil en cada ciclo). Las que se confirman tarde,
+con id menor a otras ya leídas, se releen durante
+WAYGPS_GEOCODE_MARGEN_SEGUNDOS (ver LectorPosicionesNuevas).
+"""
+
+import time
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from gps.geocode_worker import GeocodeWorker, LectorPosicionesNuevas, MODO_EMBEBIDO
+from gps.models import Posicion
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta el worker de geocodificación inversa de posiciones (proceso independiente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos entre lecturas de posiciones nuevas (default: 2)',
+        )
+        parser.add_argument(
+            '--desde-id',
+            type=int,
+            help='Procesar posiciones con ID mayor a este (default: solo las nuevas)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=5000,
+            help='Máximo de posiciones leídas por ciclo (default: 5000)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Hilos que consultan al geocodificador (default: 1)',
+        )
+
+    def handle(self, *args, **options):
+        worker = GeocodeWorker(workers=options['workers'], modo=MODO_EMBEBIDO)
+        worker.start()
+
+        ultimo_id = options['desde_id']
+        if ultimo_id is None:
+            ultimo_id = Posicion.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+        lector = LectorPosicionesNuevas(ultimo_id, lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'🗺️ Worker de geocodificación iniciado (desde posición {ultimo_id})'))
+
+        ciclos = 0
+        try:
+            while True:
+                close_old_connections()
+                posiciones = lector.leer()
+                for posicion in posiciones:
+                    # Encolar en orden de id: el worker se queda con la última de cada móvil
+                    worker.encolar(posicion['id'], posicion['lat'], posicion['lon'], movil_id=posicion['movil_id'])
+
+                ciclos += 1
+                if ciclos % 30 == 0:
+                    stats = worker.get_stats()
+                    self.stdout.write(
+                        f"📊 procesados={stats['procesados']} pendientes={stats['pendientes']} "
+                        f"coalescidos={stats['coalescidos']} errores={stats['errores']} "
+                        f"tardias={lector.stats['tardias']} "
+                        f"latencia_promedio_ms={stats['latencia_promedio_ms']}"
+                    )
+
+                if len(posiciones) < options['lote']:
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('🛑 Worker detenido por el usuario'))
+        finally:
+            worker.stop()
@@ -0,0 +1,69 @@
+"""
+Comando Django para mantener los viajes y detenciones (SegmentoRecorrido)
+Uso: python manage.py segmentar_recorridos [--intervalo 300] [--movil-id ID --desde AAAA-MM-DD]
+
+Sin --movil-id segmenta las posiciones nuevas desde la última pasada (la
+primera vez recorre toda la historia, de a --lote-ids). Con --movil-id y
+--desde rehace los segmentos de ese móvil, p. ej. después de cambiar los
+umbrales WAYGPS_DETENCION_MINIMA_SEGUNDOS / WAYGPS_RADIO_DETENCION_M /
+WAYGPS_VIAJE_MINIMO_KM.
+"""
+
+import time
+import logging
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils.dateparse import parse_date
+
+from gps import segmentacion
+from gps.rollups import TZ_ROLLUP
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Segmenta los recorridos de los móviles en viajes y detenciones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            help='Repetir cada N segundos en vez de ejecutar una sola vez',
+        )
+        parser.add_argument(
+            '--lote-ids',
+            type=int,
+            default=segmentacion.LOTE_IDS,
+            help=f'Ids de posición por transacción (default: {segmentacion.LOTE_IDS})',
+        )
+        parser.add_argument('--movil-id', type=int, help='Rehacer los segmentos de este móvil')
+        parser.add_argument('--desde', help='Con --movil-id: día desde el que se rehace (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        if options['movil_id']:
+            desde = parse_date(options['desde'] or '')
+            if desde is None:
+                raise CommandError('--movil-id requiere --desde AAAA-MM-DD')
+            inicio = datetime.combine(desde, datetime.min.time(), tzinfo=TZ_ROLLUP)
+            cantidad = segmentacion.reconstruir(options['movil_id'], inicio)
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {cantidad} segmentos recalculados para el móvil {options['movil_id']} desde {desde}"
+            ))
+            return
+
+        try:
+            while True:
+                close_old_connections()
+                resultado = segmentacion.actualizar_pendientes(options['lote_ids'])
+                if resultado['moviles'] or not options['intervalo']:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"🛑 Segmentos actualizados para {resultado['moviles']} móviles "
+                        f"(posiciones hasta {resultado['hasta_id']})"
+                    ))
+                if not options['intervalo']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('🛑 Segmentación detenida por el usuario'))
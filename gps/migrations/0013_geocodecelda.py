@@ -0,0 +1,32 @@
+# Generated manually
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps', '0012_create_default_tipo_equipo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeCelda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('geohash', models.CharField(max_length=12, unique=True)),
+                ('lat', models.DecimalField(decimal_places=7, help_text='Latitud del primer punto resuelto en la celda', max_digits=10)),
+                ('lon', models.DecimalField(decimal_places=7, help_text='Longitud del primer punto resuelto en la celda', max_digits=10)),
+                ('direccion_formateada', models.TextField(blank=True, null=True)),
+                ('datos', models.JSONField(default=dict, help_text='Respuesta cruda del geocodificador')),
+                ('hits', models.IntegerField(default=0)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Celda Geocodificada',
+                'verbose_name_plural': 'Celdas Geocodificadas',
+                'db_table': 'geocode_celdas',
+            },
+        ),
+    ]
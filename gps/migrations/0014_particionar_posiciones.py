@@ -0,0 +1,22 @@
+# Generated manually
+#
+# El particionado de posiciones es solo físico (el modelo no cambia), así que
+# esta migración no tiene operaciones. Convertir la tabla copia toda la
+# historia con la tabla bloqueada y tarda en proporción al tamaño: no puede
+# correr dentro de `migrate` en un deploy. Se hace aparte, en una ventana de
+# mantenimiento:
+#
+#     python manage.py gestionar_particiones --convertir
+#
+# (y `--revertir` para volver a una tabla común). Ver gps/particiones.py.
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps', '0013_geocodecelda'),
+    ]
+
+    operations = []
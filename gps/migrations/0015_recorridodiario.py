@@ -0,0 +1,54 @@
+# Generated manually
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps', '0014_particionar_posiciones'),
+        ('moviles', '0002_align_existing_schema'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecorridoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('primera_posicion', models.DateTimeField()),
+                ('ultima_posicion', models.DateTimeField()),
+                ('primera_lat', models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True)),
+                ('primera_lon', models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True)),
+                ('ultima_lat', models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True)),
+                ('ultima_lon', models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True)),
+                ('puntos', models.IntegerField(default=0)),
+                ('distancia_km', models.FloatField(default=0)),
+                ('velocidad_maxima', models.SmallIntegerField(default=0)),
+                ('velocidad_promedio', models.FloatField(default=0)),
+                ('minutos_movimiento', models.FloatField(default=0)),
+                ('minutos_detenido', models.FloatField(default=0)),
+                ('minutos_ignicion', models.FloatField(default=0)),
+                ('detenciones', models.IntegerField(default=0)),
+                ('lat_min', models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True)),
+                ('lat_max', models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True)),
+                ('lon_min', models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True)),
+                ('lon_max', models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True)),
+                ('por_hora', models.JSONField(default=list, help_text='estadisticas_por_hora del día')),
+                ('ultima_posicion_id', models.BigIntegerField(help_text='Mayor id de posición incluido en el resumen')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('movil', models.ForeignKey(db_column='movil_id', on_delete=django.db.models.deletion.CASCADE, related_name='recorridos_diarios', to='moviles.movil')),
+            ],
+            options={
+                'verbose_name': 'Recorrido Diario',
+                'verbose_name_plural': 'Recorridos Diarios',
+                'db_table': 'recorridos_diarios',
+                'unique_together': {('movil', 'fecha')},
+                'indexes': [
+                    models.Index(fields=['fecha'], name='recorridos__fecha_c9182d_idx'),
+                    models.Index(fields=['ultima_posicion_id'], name='recorridos__ultima__a16c7f_idx'),
+                ],
+            },
+        ),
+    ]
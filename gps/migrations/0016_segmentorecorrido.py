@@ -0,0 +1,54 @@
+# Generated manually
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps', '0015_recorridodiario'),
+        ('moviles', '0002_align_existing_schema'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SegmentoRecorrido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('viaje', 'Viaje'), ('detencion', 'Detención')], max_length=10)),
+                ('inicio', models.DateTimeField()),
+                ('fin', models.DateTimeField()),
+                ('duracion_segundos', models.IntegerField(default=0)),
+                ('puntos', models.IntegerField(default=0)),
+                ('posicion_inicio_id', models.BigIntegerField()),
+                ('posicion_fin_id', models.BigIntegerField()),
+                ('ultima_posicion_id', models.BigIntegerField(help_text='Mayor id de posición incluido en el segmento')),
+                ('lat_inicio', models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True)),
+                ('lon_inicio', models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True)),
+                ('lat_fin', models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True)),
+                ('lon_fin', models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True)),
+                ('lat_centro', models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True)),
+                ('lon_centro', models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True)),
+                ('distancia_km', models.FloatField(default=0)),
+                ('velocidad_maxima', models.SmallIntegerField(default=0)),
+                ('velocidad_promedio', models.FloatField(default=0)),
+                ('segundos_ignicion', models.IntegerField(default=0)),
+                ('direccion_inicio', models.TextField(blank=True, null=True)),
+                ('direccion_fin', models.TextField(blank=True, null=True)),
+                ('abierto', models.BooleanField(default=False)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('movil', models.ForeignKey(db_column='movil_id', on_delete=django.db.models.deletion.CASCADE, related_name='segmentos', to='moviles.movil')),
+            ],
+            options={
+                'verbose_name': 'Segmento de Recorrido',
+                'verbose_name_plural': 'Segmentos de Recorrido',
+                'db_table': 'segmentos_recorrido',
+                'indexes': [
+                    models.Index(fields=['movil', 'inicio'], name='segmentos_r_movil_i_0f44d9_idx'),
+                    models.Index(fields=['movil', 'tipo', 'inicio'], name='segmentos_r_movil_i_09cc02_idx'),
+                    models.Index(fields=['ultima_posicion_id'], name='segmentos_r_ultima__2c0a3a_idx'),
+                ],
+            },
+        ),
+    ]
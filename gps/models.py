@@ -423,6 +423,30 @@ class EstadisticasRecepcion(models.Model):
         return f"{self.receptor} - {self.fecha}"
 
 
+class GeocodeCelda(models.Model):
+    """
+    Celda geohash ya geocodificada (nivel persistente de gps.geocode_cache).
+    Comparte los resultados de Nominatim entre reinicios y workers de gunicorn.
+    """
+    
+    geohash = models.CharField(max_length=12, unique=True)
+    lat = models.DecimalField(max_digits=10, decimal_places=7, help_text="Latitud del primer punto resuelto en la celda")
+    lon = models.DecimalField(max_digits=10, decimal_places=7, help_text="Longitud del primer punto resuelto en la celda")
+    direccion_formateada = models.TextField(null=True, blank=True)
+    datos = models.JSONField(default=dict, help_text="Respuesta cruda del geocodificador")
+    hits = models.IntegerField(default=0)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'geocode_celdas'
+        verbose_name = 'Celda Geocodificada'
+        verbose_name_plural = 'Celdas Geocodificadas'
+    
+    def __str__(self):
+        return f"{self.geohash} - {self.direccion_formateada}"
+
+
 # class MovilObservacion(models.Model):  # MOVIDO A moviles/models.py
 #     """
 #     Observaciones y notas de cada móvil
@@ -708,6 +732,7 @@ class Posicion(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
+        # En PostgreSQL es una tabla particionada por mes de fec_gps (gps/particiones.py)
         db_table = 'posiciones'
         verbose_name = 'Posición GPS'
         verbose_name_plural = 'Posiciones GPS'
@@ -743,17 +768,132 @@ class Posicion(models.Model):
     @property
     def calidad_senal(self):
         """Determina la calidad de la señal basada en satélites y HDOP"""
-        if self.sats is None:
+        return self.calidad_por_satelites(self.sats)
+    
+    @staticmethod
+    def calidad_por_satelites(sats):
+        """Calidad de la señal según la cantidad de satélites (sin instanciar la posición)"""
+        if sats is None:
             return 'desconocida'
         
-        if self.sats >= 8:
+        if sats >= 8:
             return 'excelente'
-        elif self.sats >= 6:
+        elif sats >= 6:
             return 'buena'
-        elif self.sats >= 4:
+        elif sats >= 4:
             return 'regular'
         else:
             return 'mala'
 
 
+class RecorridoDiario(models.Model):
+    """
+    Resumen del recorrido de un móvil en un día (hora de Argentina).
+    Lo mantiene gps.rollups a partir de posiciones: los reportes de flota
+    leen una fila por móvil y día en vez de recorrer las posiciones.
+    """
+    
+    movil = models.ForeignKey('moviles.Movil', on_delete=models.CASCADE, db_column='movil_id', related_name='recorridos_diarios')
+    fecha = models.DateField()
+    
+    # Primera y última posición del día
+    primera_posicion = models.DateTimeField()
+    ultima_posicion = models.DateTimeField()
+    primera_lat = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    primera_lon = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    ultima_lat = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    ultima_lon = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    
+    # Totales (mismos criterios que gps.recorrido_stats)
+    puntos = models.IntegerField(default=0)
+    distancia_km = models.FloatField(default=0)
+    velocidad_maxima = models.SmallIntegerField(default=0)
+    velocidad_promedio = models.FloatField(default=0)
+    minutos_movimiento = models.FloatField(default=0)
+    minutos_detenido = models.FloatField(default=0)
+    minutos_ignicion = models.FloatField(default=0)
+    detenciones = models.IntegerField(default=0)
+    
+    # Área recorrida
+    lat_min = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    lat_max = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    lon_min = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    lon_max = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    
+    por_hora = models.JSONField(default=list, help_text="estadisticas_por_hora del día")
+    ultima_posicion_id = models.BigIntegerField(help_text="Mayor id de posición incluido en el resumen")
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'recorridos_diarios'
+        verbose_name = 'Recorrido Diario'
+        verbose_name_plural = 'Recorridos Diarios'
+        unique_together = ('movil', 'fecha')
+        indexes = [
+            models.Index(fields=['fecha']),
+            models.Index(fields=['ultima_posicion_id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.movil_id} - {self.fecha}: {self.distancia_km:.1f} km"
+
+
+class SegmentoRecorrido(models.Model):
+    """
+    Viaje o detención de un móvil, calculado por gps.segmentacion a partir
+    de posiciones. Los segmentos de un móvil son contiguos: cada uno empieza
+    en la posición donde terminó el anterior.
+    """
+    
+    TIPOS = [
+        ('viaje', 'Viaje'),
+        ('detencion', 'Detención'),
+    ]
+    
+    movil = models.ForeignKey('moviles.Movil', on_delete=models.CASCADE, db_column='movil_id', related_name='segmentos')
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    inicio = models.DateTimeField()
+    fin = models.DateTimeField()
+    duracion_segundos = models.IntegerField(default=0)
+    puntos = models.IntegerField(default=0)
+    
+    # Posiciones de borde (ids de posiciones, sin FK: la tabla es particionada)
+    posicion_inicio_id = models.BigIntegerField()
+    posicion_fin_id = models.BigIntegerField()
+    ultima_posicion_id = models.BigIntegerField(help_text="Mayor id de posición incluido en el segmento")
+    
+    # Coordenadas de inicio, fin y centro (lugar de la detención)
+    lat_inicio = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    lon_inicio = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    lat_fin = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    lon_fin = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    lat_centro = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    lon_centro = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    
+    distancia_km = models.FloatField(default=0)
+    velocidad_maxima = models.SmallIntegerField(default=0)
+    velocidad_promedio = models.FloatField(default=0)
+    segundos_ignicion = models.IntegerField(default=0)  # en detenciones: tiempo en ralentí
+    
+    direccion_inicio = models.TextField(blank=True, null=True)
+    direccion_fin = models.TextField(blank=True, null=True)
+    
+    # El último segmento del móvil puede seguir creciendo con posiciones nuevas
+    abierto = models.BooleanField(default=False)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'segmentos_recorrido'
+        verbose_name = 'Segmento de Recorrido'
+        verbose_name_plural = 'Segmentos de Recorrido'
+        indexes = [
+            models.Index(fields=['movil', 'inicio']),
+            models.Index(fields=['movil', 'tipo', 'inicio']),
+            models.Index(fields=['ultima_posicion_id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.movil_id} {self.inicio} - {self.fin}"
+
+
 # Create your models here.
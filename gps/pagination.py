@@ -0,0 +1,160 @@
+"""
+Paginación por cursor (keyset) para posiciones
+==============================================
+
+PageNumberPagination hace OFFSET n sobre posiciones ordenadas por fec_gps:
+la página 5.000 obliga a PostgreSQL a recorrer y descartar las 250.000
+filas anteriores, y además cuenta todo el rango para `count`. Con keyset
+cada página arranca donde terminó la anterior:
+
+    WHERE fec_gps >= :fec_gps AND NOT (fec_gps = :fec_gps AND id <= :id)
+    ORDER BY fec_gps, id LIMIT :page_size + 1
+
+que con el índice (movil_id, fec_gps) cuesta lo mismo en la página 1 que en
+la 5.000. DRF trae CursorPagination, pero usa solo el primer campo de
+orden más un offset para los empates; acá el cursor es el par completo
+(fec_gps, id).
+
+El cursor es opaco para el cliente (base64 de JSON). No hay `count` ni
+salto a una página arbitraria: solo next/previous.
+"""
+
+import base64
+import json
+from collections import OrderedDict
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def codificar_cursor(datos: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(datos, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor: str) -> dict:
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno).decode())
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValidationError({'cursor': 'Cursor inválido'})
+    if not isinstance(datos, dict):
+        raise ValidationError({'cursor': 'Cursor inválido'})
+    return datos
+
+
+class PosicionKeysetPagination(BasePagination):
+    """Paginación keyset sobre (fec_gps, id)"""
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 5000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        hacia_atras = False
+        queryset = queryset.filter(fec_gps__isnull=False)
+        if cursor:
+            datos = decodificar_cursor(cursor)
+            fec_gps = parse_datetime(str(datos.get('f', '')))
+            try:
+                pk = int(datos.get('i'))
+            except (TypeError, ValueError):
+                pk = None
+            if fec_gps is None or pk is None:
+                raise ValidationError({'cursor': 'Cursor inválido'})
+            hacia_atras = datos.get('d') == 'p'
+            if hacia_atras:
+                queryset = queryset.filter(fec_gps__lte=fec_gps).exclude(fec_gps=fec_gps, id__gte=pk)
+            else:
+                queryset = queryset.filter(fec_gps__gte=fec_gps).exclude(fec_gps=fec_gps, id__lte=pk)
+
+        if hacia_atras:
+            queryset = queryset.order_by('-fec_gps', '-id')
+        else:
+            queryset = queryset.order_by('fec_gps', 'id')
+
+        resultados = list(queryset[:self.page_size + 1])
+        hay_mas = len(resultados) > self.page_size
+        resultados = resultados[:self.page_size]
+        if hacia_atras:
+            resultados.reverse()
+
+        # Hacia adelante siempre hay "anterior" si se vino con cursor, y viceversa
+        if hacia_atras:
+            self.hay_siguiente, self.hay_anterior = bool(resultados), hay_mas
+        else:
+            self.hay_siguiente, self.hay_anterior = hay_mas, bool(cursor) and bool(resultados)
+
+        self.primero = resultados[0] if resultados else None
+        self.ultimo = resultados[-1] if resultados else None
+        return resultados
+
+    def get_page_size(self, request):
+        try:
+            tamanio = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(max(tamanio, 1), self.max_page_size)
+
+    def _url(self, posicion, direccion):
+        cursor = codificar_cursor({'f': posicion.fec_gps.isoformat(), 'i': posicion.pk, 'd': direccion})
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not self.hay_siguiente or self.ultimo is None:
+            return None
+        return self._url(self.ultimo, 'n')
+
+    def get_previous_link(self):
+        if not self.hay_anterior or self.primero is None:
+            return None
+        return self._url(self.primero, 'p')
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class KeysetOpcionalMixin:
+    """
+    ViewSets de posiciones: con ?paginacion=cursor (o si ya viene un cursor)
+    usan PosicionKeysetPagination en vez de la paginación por número de
+    página configurada, que se mantiene por compatibilidad con el frontend.
+    """
+
+    def usa_keyset(self) -> bool:
+        params = self.request.query_params
+        if params.get('vista_mapa') == 'true':
+            # vista_mapa responde sin paginar (queryset ya recortado a `limite`)
+            return False
+        return params.get('paginacion') == 'cursor' or 'cursor' in params
+
+    @property
+    def paginator(self):
+        if not self.usa_keyset():
+            return super().paginator
+        if not isinstance(getattr(self, '_paginator', None), PosicionKeysetPagination):
+            self._paginator = PosicionKeysetPagination()
+        return self._paginator
@@ -0,0 +1,337 @@
+"""
+Particionado mensual de posiciones
+==================================
+
+`posiciones` era una sola tabla con seis índices B-tree: cada INSERT
+mantiene índices que crecen con toda la historia, y borrar un mes viejo es
+un DELETE masivo que deja los índices inflados. Con particionado nativo de
+PostgreSQL por rango de fec_gps (un mes por partición, límites en UTC):
+
+- cada INSERT toca solo los índices de la partición del mes en curso
+- las consultas con filtro de fec_gps (todas las históricas) descartan las
+  particiones fuera del rango (partition pruning)
+- la retención es DETACH PARTITION: instantáneo, sin DELETE ni VACUUM
+
+Particiones:
+
+    posiciones_2025_01   FOR VALUES FROM ('2025-01-01 00:00:00+00') TO ('2025-02-01 00:00:00+00')
+    posiciones_default   DEFAULT (fec_gps NULL o meses sin partición)
+
+El ORM no cambia: el modelo sigue apuntando a `posiciones` (la tabla
+padre). La única diferencia en la base es que la clave primaria no puede
+ser solo `id` (PostgreSQL exige que incluya fec_gps, que admite NULL), así
+que el padre queda sin PRIMARY KEY y con un índice común sobre id; la
+unicidad la da la secuencia. Por lo mismo, los demás índices únicos se
+recrean con fec_gps agregado.
+
+`gestionar_particiones --convertir` convierte la tabla (copia toda la
+historia con la tabla bloqueada, así que tarda en proporción al tamaño y va
+en una ventana de mantenimiento, no en una migración) y el mismo comando
+crea las particiones futuras y desacopla/archiva las vencidas.
+"""
+
+import logging
+import re
+from datetime import date, datetime, timezone
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+TABLA = 'posiciones'
+PARTICION_DEFAULT = 'posiciones_default'
+INDICE_ID = 'posiciones_id_idx'
+
+MESES_FUTUROS = getattr(settings, 'WAYGPS_PARTICIONES_MESES_FUTUROS', 3)
+# Meses completos que se conservan adjuntos; None = no desacoplar nunca
+RETENCION_MESES = getattr(settings, 'WAYGPS_RETENCION_MESES', None)
+# Esquema al que se mueven las particiones desacopladas
+ESQUEMA_ARCHIVO = getattr(settings, 'WAYGPS_PARTICIONES_ESQUEMA_ARCHIVO', 'archivo')
+
+_PATRON_PARTICION = re.compile(r'^posiciones_(\d{4})_(\d{2})$')
+# Índice único simple: solo columnas, sin expresiones, INCLUDE ni WHERE
+_PATRON_INDICE_UNICO = re.compile(r'^(CREATE UNIQUE INDEX \S+ ON (?:ONLY )?\S+ USING btree \()([^()]+)(\))$')
+
+
+def inicio_mes(fecha) -> date:
+    return date(fecha.year, fecha.month, 1)
+
+
+def sumar_meses(inicio: date, meses: int) -> date:
+    total = inicio.year * 12 + inicio.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def nombre_particion(inicio: date) -> str:
+    return f'{TABLA}_{inicio.year:04d}_{inicio.month:02d}'
+
+
+def mes_de_particion(nombre: str) -> Optional[date]:
+    """Primer día del mes de una partición mensual, o None si el nombre no es de una"""
+    coincidencia = _PATRON_PARTICION.match(nombre)
+    if not coincidencia:
+        return None
+    return date(int(coincidencia.group(1)), int(coincidencia.group(2)), 1)
+
+
+def _limite(inicio: date) -> str:
+    return f"'{inicio.isoformat()} 00:00:00+00'"
+
+
+def sql_crear_particion(inicio: date) -> str:
+    return (
+        f'CREATE TABLE IF NOT EXISTS {nombre_particion(inicio)} PARTITION OF {TABLA} '
+        f'FOR VALUES FROM ({_limite(inicio)}) TO ({_limite(sumar_meses(inicio, 1))})'
+    )
+
+
+def indice_unico_particionado(definicion: str) -> str:
+    """
+    Definición de un índice único con fec_gps agregado al final de sus
+    columnas (PostgreSQL exige la clave de partición en los índices únicos
+    de una tabla particionada).
+
+    Raises:
+        RuntimeError: Si el índice tiene expresiones, INCLUDE o WHERE
+    """
+    coincidencia = _PATRON_INDICE_UNICO.match(definicion)
+    if not coincidencia:
+        raise RuntimeError(f'No se puede particionar {TABLA} con el índice único: {definicion}')
+    columnas = [columna.strip() for columna in coincidencia.group(2).split(',')]
+    if 'fec_gps' not in columnas:
+        columnas.append('fec_gps')
+    return f"{coincidencia.group(1)}{', '.join(columnas)}{coincidencia.group(3)}"
+
+
+def meses_a_crear(hoy: date, meses_futuros: int, existentes: Iterable[str]) -> List[date]:
+    """Meses desde el actual hasta `meses_futuros` adelante que todavía no tienen partición"""
+    actuales = {mes_de_particion(nombre) for nombre in existentes}
+    actual = inicio_mes(hoy)
+    return [
+        mes for mes in (sumar_meses(actual, k) for k in range(meses_futuros + 1))
+        if mes not in actuales
+    ]
+
+
+def particiones_vencidas(hoy: date, retencion_meses: Optional[int], existentes: Iterable[str]) -> List[str]:
+    """
+    Particiones mensuales anteriores a la ventana de retención.
+
+    Args:
+        hoy: Fecha de referencia
+        retencion_meses: Meses completos que se conservan además del actual (None = ninguna vence)
+        existentes: Nombres de las particiones adjuntas
+
+    Returns:
+        Nombres ordenados de la más vieja a la más nueva (nunca la default)
+    """
+    if retencion_meses is None:
+        return []
+    limite = sumar_meses(inicio_mes(hoy), -retencion_meses)
+    vencidas = [(mes_de_particion(nombre), nombre) for nombre in existentes]
+    return [nombre for mes, nombre in sorted(v for v in vencidas if v[0] is not None) if mes < limite]
+
+
+# ---------------------------------------------------------------------------
+# Operaciones sobre la base (solo PostgreSQL)
+# ---------------------------------------------------------------------------
+
+def es_particionada(cursor) -> bool:
+    cursor.execute('SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))', [TABLA])
+    return bool(cursor.fetchone()[0])
+
+
+def particiones(cursor) -> List[str]:
+    """Nombres de las particiones adjuntas a posiciones"""
+    cursor.execute(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname',
+        [TABLA],
+    )
+    return [fila[0] for fila in cursor.fetchall()]
+
+
+def crear_particion(cursor, inicio: date) -> bool:
+    """
+    Crea la partición del mes que empieza en `inicio`.
+
+    Si la partición default ya tiene filas de ese mes, PostgreSQL no deja
+    crearla directamente: se crea como tabla suelta, se mueven las filas y
+    se adjunta.
+
+    Returns:
+        True si se creó, False si ya existía
+    """
+    nombre = nombre_particion(inicio)
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [nombre])
+    if cursor.fetchone()[0]:
+        return False
+
+    desde = datetime(inicio.year, inicio.month, 1, tzinfo=timezone.utc)
+    fin = sumar_meses(inicio, 1)
+    hasta = datetime(fin.year, fin.month, 1, tzinfo=timezone.utc)
+
+    cursor.execute(
+        f'SELECT EXISTS (SELECT 1 FROM {PARTICION_DEFAULT} WHERE fec_gps >= %s AND fec_gps < %s)',
+        [desde, hasta],
+    )
+    if not cursor.fetchone()[0]:
+        cursor.execute(sql_crear_particion(inicio))
+        return True
+
+    cursor.execute(f'CREATE TABLE {nombre} (LIKE {TABLA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute(
+        f'WITH movidas AS (DELETE FROM {PARTICION_DEFAULT} WHERE fec_gps >= %s AND fec_gps < %s RETURNING *) '
+        f'INSERT INTO {nombre} SELECT * FROM movidas',
+        [desde, hasta],
+    )
+    logger.info(f"📦 {cursor.rowcount} posiciones movidas de {PARTICION_DEFAULT} a {nombre}")
+    cursor.execute(
+        f'ALTER TABLE {TABLA} ATTACH PARTITION {nombre} '
+        f'FOR VALUES FROM ({_limite(inicio)}) TO ({_limite(fin)})'
+    )
+    return True
+
+
+def desacoplar_particion(cursor, nombre: str, esquema_archivo: Optional[str] = ESQUEMA_ARCHIVO,
+                         eliminar: bool = False) -> None:
+    """
+    Saca una partición de posiciones.
+
+    Args:
+        nombre: Partición mensual (posiciones_AAAA_MM)
+        esquema_archivo: Esquema al que se mueve la tabla desacoplada (None = queda en el actual)
+        eliminar: Borrar la tabla en vez de archivarla
+    """
+    if mes_de_particion(nombre) is None:
+        raise ValueError(f'{nombre} no es una partición mensual de {TABLA}')
+    cursor.execute(f'ALTER TABLE {TABLA} DETACH PARTITION {nombre}')
+    if eliminar:
+        cursor.execute(f'DROP TABLE {nombre}')
+    elif esquema_archivo:
+        esquema = cursor.db.ops.quote_name(esquema_archivo)
+        cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {esquema}')
+        cursor.execute(f'ALTER TABLE {nombre} SET SCHEMA {esquema}')
+
+
+def _indices(cursor, tabla: str):
+    """(nombre, definición, es_único, es_pk, restricción) de los índices de `tabla`"""
+    cursor.execute(
+        'SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisunique, i.indisprimary, con.conname '
+        'FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+        'LEFT JOIN pg_constraint con ON con.conindid = i.indexrelid AND con.conrelid = i.indrelid '
+        'WHERE i.indrelid = to_regclass(%s)',
+        [tabla],
+    )
+    return cursor.fetchall()
+
+
+def _reconstruir(cursor, origen: str, particionar: bool, meses_futuros: int = MESES_FUTUROS) -> None:
+    """
+    Renombra posiciones a `origen`, crea una posiciones nueva (particionada
+    o común) con las mismas columnas, secuencia, índices y claves foráneas,
+    copia las filas y borra `origen`.
+    """
+    cursor.execute(
+        'SELECT COUNT(*) FROM pg_constraint WHERE confrelid = to_regclass(%s) AND contype = %s',
+        [TABLA, 'f'],
+    )
+    if cursor.fetchone()[0]:
+        raise RuntimeError(f'Hay claves foráneas que apuntan a {TABLA}: no se puede reconstruir la tabla')
+
+    # Índices (menos la clave primaria / índice de id, que se arman aparte):
+    # se borran antes de copiar y se recrean al final (carga más rápida). Los
+    # únicos que no admiten fec_gps cortan acá, antes de tocar la tabla
+    indices = []
+    for nombre, definicion, unico, primario, restriccion in _indices(cursor, TABLA):
+        if primario or nombre == INDICE_ID:
+            continue
+        if unico and particionar:
+            definicion = indice_unico_particionado(definicion)
+        indices.append((nombre, definicion, restriccion))
+
+    cursor.execute(f'ALTER TABLE {TABLA} RENAME TO {origen}')
+    for nombre, _, restriccion in indices:
+        if restriccion:
+            cursor.execute(f'ALTER TABLE {origen} DROP CONSTRAINT {restriccion}')
+        else:
+            cursor.execute(f'DROP INDEX {nombre}')
+
+    cursor.execute(
+        'SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = %s',
+        [origen, 'f'],
+    )
+    claves_foraneas = cursor.fetchall()
+
+    # id: serial (default nextval) o identity según con qué versión de Django se creó la tabla
+    cursor.execute(
+        'SELECT pg_get_serial_sequence(%s, %s), a.attidentity FROM pg_attribute a '
+        'WHERE a.attrelid = to_regclass(%s) AND a.attname = %s',
+        [origen, 'id', origen, 'id'],
+    )
+    secuencia, identidad = cursor.fetchone()
+    if identidad and secuencia:
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {origen}')
+        siguiente = cursor.fetchone()[0]
+        cursor.execute(f'ALTER TABLE {origen} ALTER COLUMN id DROP IDENTITY')
+        cursor.execute(f'CREATE SEQUENCE {secuencia} AS bigint')
+        cursor.execute('SELECT setval(%s, %s, false)', [secuencia, siguiente])
+
+    particion = ' PARTITION BY RANGE (fec_gps)' if particionar else ''
+    cursor.execute(f'CREATE TABLE {TABLA} (LIKE {origen} INCLUDING DEFAULTS INCLUDING CONSTRAINTS){particion}')
+    if identidad and secuencia:
+        cursor.execute(f"ALTER TABLE {TABLA} ALTER COLUMN id SET DEFAULT nextval('{secuencia}'::regclass)")
+    if secuencia:
+        cursor.execute(f'ALTER SEQUENCE {secuencia} OWNED BY {TABLA}.id')
+
+    if particionar:
+        # Un mes por cada mes con datos, más el actual y los futuros
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', fec_gps AT TIME ZONE 'UTC')::date "
+            f"FROM {origen} WHERE fec_gps IS NOT NULL"
+        )
+        meses = {fila[0] for fila in cursor.fetchall()}
+        meses.update(meses_a_crear(datetime.now(timezone.utc).date(), meses_futuros, ()))
+        for inicio in sorted(meses):
+            cursor.execute(sql_crear_particion(inicio))
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {PARTICION_DEFAULT} PARTITION OF {TABLA} DEFAULT')
+        logger.info(f"🗂️ {len(meses)} particiones mensuales creadas para {TABLA}")
+
+    cursor.execute(f'INSERT INTO {TABLA} SELECT * FROM {origen}')
+    logger.info(f"📦 {cursor.rowcount} posiciones copiadas de {origen} a {TABLA}")
+
+    if particionar:
+        cursor.execute(f'CREATE INDEX {INDICE_ID} ON {TABLA} (id)')
+    else:
+        cursor.execute(f'ALTER TABLE {TABLA} ADD CONSTRAINT {TABLA}_pkey PRIMARY KEY (id)')
+    for nombre, definicion, _ in indices:
+        cursor.execute(re.sub(r' ON (ONLY )?\S+ USING ', f' ON {TABLA} USING ', definicion, count=1))
+    for nombre, definicion in claves_foraneas:
+        cursor.execute(f'ALTER TABLE {TABLA} ADD CONSTRAINT {nombre} {definicion}')
+
+    cursor.execute(f'DROP TABLE {origen}')
+
+
+def particionar_tabla(cursor, meses_futuros: int = MESES_FUTUROS) -> bool:
+    """
+    Convierte posiciones en tabla particionada por mes (gestionar_particiones --convertir).
+
+    Returns:
+        False si ya estaba particionada
+    """
+    if es_particionada(cursor):
+        return False
+    _reconstruir(cursor, f'{TABLA}_sin_particionar', particionar=True, meses_futuros=meses_futuros)
+    return True
+
+
+def desparticionar_tabla(cursor) -> bool:
+    """
+    Inversa de particionar_tabla: vuelve a una tabla común con las filas de
+    las particiones adjuntas (las ya desacopladas/archivadas no vuelven).
+    """
+    if not es_particionada(cursor):
+        return False
+    _reconstruir(cursor, f'{TABLA}_particionada', particionar=False)
+    return True
@@ -36,6 +36,8 @@ except ImportError:
     except ImportError:
         ZONEINFO_AVAILABLE = False
 
+from gps.tq_decoder import decode_tq
+
 logger = logging.getLogger(__name__)
 
 
@@ -234,22 +236,21 @@ class QueclinkProcessor(BaseProcessor):
         existente en tq_server_rpg.py
         """
         try:
-            logger.info(f"Parseando datos Queclink - Bytes: {len(raw_data)}")
+            logger.debug("Parseando datos Queclink - Bytes: %s", len(raw_data))
             
-            # Convertir datos binarios a hexadecimal
-            hex_str = binascii.hexlify(raw_data).decode('ascii')
-            logger.debug(f"Datos hexadecimales: {hex_str}")
+            # Campos leídos directo de los bytes (BCD) sin pasar por hex
+            campos = self.decodificar_campos(raw_data)
             
-            # Extraer device_id (últimos 5 dígitos del ID completo)
-            device_id = self.get_id_ok(hex_str)
+            # device_id: últimos 5 dígitos del ID completo
+            device_id = campos['device_id']
             
             # Si no se proporcionó imei, usar el device_id extraído
             if not imei:
                 imei = device_id
             
-            # Extraer fecha y hora GPS del protocolo TQ
-            fecha_gps = self.get_fecha_gps_tq(hex_str)
-            hora_gps = self.get_hora_gps_tq(hex_str)
+            # Fecha y hora GPS del protocolo TQ
+            fecha_gps = campos['fecha_gps']
+            hora_gps = campos['hora_gps']
             
             # Construir timestamp si hay fecha/hora GPS
             timestamp = datetime.now().isoformat()
@@ -261,7 +262,7 @@ class QueclinkProcessor(BaseProcessor):
                     fecha_gps_dt = datetime(int('20' + año), int(mes), int(dia), 
                                            int(hora), int(minuto), int(segundo))
                     # Log de fecha/hora GPS original (UTC)
-                    logger.info(f"🕐 [GPS] Fecha/Hora GPS original (UTC): {fecha_gps} {hora_gps}")
+                    logger.debug("🕐 [GPS] Fecha/Hora GPS original (UTC): %s %s", fecha_gps, hora_gps)
                     
                     # Ajustar a hora local de Argentina (UTC-3): restar 3 horas
                     fecha_gps_local = fecha_gps_dt - timedelta(hours=3)
@@ -279,28 +280,28 @@ class QueclinkProcessor(BaseProcessor):
                     timestamp = fecha_gps_local.isoformat()
                     
                     # Log de fecha/hora GPS ajustada (Argentina UTC-3)
-                    logger.info(f"🕐 [GPS] Fecha/Hora GPS ajustada (Argentina UTC-3): {fecha_gps_local.strftime('%d/%m/%Y %H:%M:%S')}")
+                    logger.debug("🕐 [GPS] Fecha/Hora GPS ajustada (Argentina UTC-3): %s", fecha_gps_local)
                 except Exception as e:
                     logger.warning(f"⚠️ Error procesando fecha/hora GPS: {e}")
                     import traceback
                     logger.warning(traceback.format_exc())
                     pass
             
-            # Extraer coordenadas
-            latitud = self.get_lat_chino(hex_str)
-            longitud = self.get_lon_chino(hex_str)
+            # Coordenadas
+            latitud = campos['latitud']
+            longitud = campos['longitud']
             
             # Validar coordenadas
             if not self.validate_coordinates(latitud, longitud):
                 logger.warning(f"Coordenadas inválidas: lat={latitud}, lon={longitud}")
                 latitud = longitud = 0.0
             
-            # Extraer velocidad (en nudos) y convertir a km/h
-            speed_knots = self.get_vel_chino(hex_str)
+            # Velocidad (en nudos) convertida a km/h
+            speed_knots = campos['velocidad_nudos']
             velocidad = speed_knots * 1.852  # Convertir nudos a km/h
             
-            # Extraer rumbo
-            rumbo = self.get_rumbo_chino(hex_str)
+            # Rumbo
+            rumbo = campos['rumbo']
             
             # Construir diccionario de datos parseados
             parsed_data = {
@@ -318,11 +319,11 @@ class QueclinkProcessor(BaseProcessor):
                 'ignicion': False,  # No disponible en protocolo TQ
                 'bateria': None,  # No disponible en protocolo TQ
                 'quality': 'good' if abs(latitud) > 0.000001 else 'no_fix',
-                'raw_data': hex_str
+                'raw_data': raw_data.hex()
             }
             
-            logger.info(f"Datos parseados: lat={latitud:.6f}, lon={longitud:.6f}, "
-                       f"vel={velocidad:.1f} km/h, rumbo={rumbo}°")
+            logger.debug("Datos parseados: lat=%.6f, lon=%.6f, vel=%.1f km/h, rumbo=%s°",
+                         latitud, longitud, velocidad, rumbo)
             
             return self.format_response(parsed_data)
             
@@ -330,6 +331,31 @@ class QueclinkProcessor(BaseProcessor):
             logger.error(f"Error parseando datos Queclink: {e}", exc_info=True)
             return None
 
+    def decodificar_campos(self, raw_data: bytes) -> Dict[str, Any]:
+        """
+        Extraer los campos TQ de una trama.
+        
+        Usa el decodificador binario (gps.tq_decoder); solo las tramas más
+        cortas que el layout TQ pasan por las funciones get_*_chino sobre hex.
+        """
+        campos = decode_tq(raw_data)
+        if campos is not None:
+            return campos
+        return self.decodificar_campos_hex(raw_data)
+    
+    def decodificar_campos_hex(self, raw_data: bytes) -> Dict[str, Any]:
+        """Camino original: trama a hex y cada campo cortado del string"""
+        hex_str = binascii.hexlify(raw_data).decode('ascii')
+        return {
+            'device_id': self.get_id_ok(hex_str),
+            'hora_gps': self.get_hora_gps_tq(hex_str),
+            'fecha_gps': self.get_fecha_gps_tq(hex_str),
+            'latitud': self.get_lat_chino(hex_str),
+            'longitud': self.get_lon_chino(hex_str),
+            'velocidad_nudos': self.get_vel_chino(hex_str),
+            'rumbo': self.get_rumbo_chino(hex_str),
+        }
+
 
 class GenericProcessor(BaseProcessor):
     """
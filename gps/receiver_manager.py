@@ -5,10 +5,54 @@ Módulo para gestionar múltiples receptores GPS (TCP, UDP, HTTP)
 import threading
 from typing import Optional, Dict
 from gps.receivers.tcp_receiver import TCPReceiver
+from gps.receivers.async_tcp_receiver import AsyncTCPReceiver
 
 # Diccionario de receptores activos: {puerto: {receiver, thread}}
 _active_receivers: Dict[int, dict] = {}
 
+# Modos de receptor seleccionables desde ConfiguracionReceptor.configuracion_avanzada['modo_receptor']
+RECEIVER_MODES = {
+    'threads': TCPReceiver,
+    'asyncio': AsyncTCPReceiver,
+}
+
+
+def build_receiver(host: str, port: int, config=None) -> TCPReceiver:
+    """
+    Crear la instancia de receptor adecuada según la configuración del puerto.
+
+    Args:
+        host: Dirección IP donde escuchar
+        port: Puerto donde escuchar
+        config: ConfiguracionReceptor del puerto (opcional)
+
+    Returns:
+        TCPReceiver (hilo por conexión) o AsyncTCPReceiver (event loop)
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+
+    avanzada = (config.configuracion_avanzada if config else None) or {}
+    modo = str(avanzada.get('modo_receptor', 'threads')).lower()
+    clase = RECEIVER_MODES.get(modo)
+    if clase is None:
+        logger.warning(f"⚠️ [MANAGER] modo_receptor={modo!r} desconocido para el puerto {port}, se usa 'threads'")
+        clase = TCPReceiver
+
+    kwargs = {
+        'host': host,
+        'port': port,
+        'protocolo': config.protocolo if config else 'TQ',
+        # True o {"batch_size": ..., "flush_interval": ...} para escritura en lotes
+        'write_behind': avanzada.get('write_behind'),
+        'tamano_lectura': int(avanzada.get('tamano_lectura', 4096)),
+    }
+    # Opciones propias del modo (p. ej. workers y max_pendientes de asyncio)
+    for opcion, tipo in clase.OPCIONES_AVANZADAS.items():
+        if opcion in avanzada:
+            kwargs[opcion] = tipo(avanzada[opcion])
+    return clase(**kwargs)
+
 
 def get_receiver(port: int) -> Optional[TCPReceiver]:
     """Obtener la instancia del receptor para un puerto específico"""
@@ -25,6 +69,17 @@ def is_receiver_running(port: int) -> bool:
     return False
 
 
+def flush_receiver_statistics():
+    """
+    Volcar a EstadisticasRecepcion los contadores en memoria de los
+    receptores de este proceso (para que una consulta vea los números al día)
+    """
+    for data in list(_active_receivers.values()):
+        receiver = data['receiver']
+        if receiver is not None and receiver.running:
+            receiver.estadisticas.flush()
+
+
 def get_all_running_receivers() -> dict:
     """Obtener todos los receptores activos"""
     result = {}
@@ -118,6 +173,7 @@ def start_receiver(host: str = '0.0.0.0', port: int = 5003) -> dict:
         from gps.models import ConfiguracionReceptor, TipoEquipoGPS
         
         # Verificar si existe la configuración
+        config = None
         try:
             config = ConfiguracionReceptor.objects.get(puerto=port)
             logger.info(f"🚀 [MANAGER] Config encontrada: {config.nombre}, activo={config.activo}")
@@ -145,7 +201,7 @@ def start_receiver(host: str = '0.0.0.0', port: int = 5003) -> dict:
                         activo=True
                     )
                 
-                ConfiguracionReceptor.objects.create(
+                config = ConfiguracionReceptor.objects.create(
                     nombre=f'Receptor Puerto {port}',
                     tipo_equipo=tipo_equipo,
                     puerto=port,
@@ -161,10 +217,10 @@ def start_receiver(host: str = '0.0.0.0', port: int = 5003) -> dict:
             except Exception as e:
                 pass
         
-        logger.info(f"🚀 [MANAGER] Creando instancia de TCPReceiver para puerto {port}...")
-        # Crear nueva instancia del receptor
-        receiver = TCPReceiver(host=host, port=port)
-        logger.info(f"✅ [MANAGER] Instancia de TCPReceiver creada. running={receiver.running}")
+        logger.info(f"🚀 [MANAGER] Creando instancia de receptor para puerto {port}...")
+        # Crear nueva instancia del receptor (modo según configuracion_avanzada)
+        receiver = build_receiver(host, port, config)
+        logger.info(f"✅ [MANAGER] Instancia de {type(receiver).__name__} creada. modo={receiver.modo}, running={receiver.running}")
         
         # Iniciar en un hilo separado con manejo de errores mejorado
         def run_receiver():
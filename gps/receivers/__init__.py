@@ -3,5 +3,6 @@ Módulo de receptores de datos GPS
 """
 
 from .tcp_receiver import TCPReceiver
+from .async_tcp_receiver import AsyncTCPReceiver
 
-__all__ = ['TCPReceiver']
+__all__ = ['TCPReceiver', 'AsyncTCPReceiver']
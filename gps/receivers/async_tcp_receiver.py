@@ -0,0 +1,263 @@
+"""
+Receptor TCP asíncrono para equipos GPS
+=======================================
+
+Variante de TCPReceiver que multiplexa todas las conexiones de un puerto
+sobre un único event loop de asyncio en lugar de crear un hilo por socket.
+El parseo y el guardado en base de datos se delegan a un pool acotado de
+workers, de modo que miles de equipos conectados (la mayoría ociosos entre
+reportes) no consumen miles de hilos del sistema operativo.
+
+Las tramas de una misma conexión se procesan en orden: cada lectura del
+socket es un trabajo del pool y cada conexión tiene un único consumidor
+que espera a que termine el anterior antes de mandar el siguiente (si no,
+un fix viejo podía pisar el MovilStatus de uno más nuevo). Al detenerse se
+termina lo encolado antes de cortar el write-behind.
+
+Se habilita por receptor desde ConfiguracionReceptor.configuracion_avanzada:
+
+    {"modo_receptor": "asyncio", "workers": 8, "max_pendientes": 1000}
+
+NOTA: para sostener ~10k conexiones simultáneas el proceso necesita un
+límite de descriptores de archivo acorde (ulimit -n / LimitNOFILE en systemd).
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+from gps.framing import crear_framer
+from gps.geocode_worker import geocode_worker
+from gps.receivers.tcp_receiver import TCPReceiver
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTCPReceiver(TCPReceiver):
+    """
+    Receptor TCP basado en asyncio.
+
+    Expone la misma interfaz que TCPReceiver (start, stop, get_stats) para
+    que receiver_manager y las vistas de estadísticas funcionen sin cambios.
+    """
+
+    modo = 'asyncio'
+    OPCIONES_AVANZADAS = {'workers': int, 'max_pendientes': int, 'timeout_drenado': float}
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 5003, protocolo: str = 'TQ',
+                 workers: int = 8, max_pendientes: int = 1000, tamano_lectura: int = 4096,
+                 backlog: int = 1024, write_behind=None, timeout_drenado: float = 30.0):
+        """
+        Inicializar receptor TCP asíncrono.
+
+        Args:
+            host: Dirección IP donde escuchar
+            port: Puerto TCP donde escuchar
+            protocolo: Protocolo del receptor (default: TQ)
+            workers: Cantidad de hilos del pool que procesan mensajes
+            max_pendientes: Máximo de lecturas encoladas al pool antes de
+                dejar de leer sockets (backpressure hacia los equipos)
+            tamano_lectura: Bytes máximos por lectura de socket
+            backlog: Cola de conexiones pendientes del socket de escucha
+            write_behind: Opciones del pipeline de escritura en lotes (ver TCPReceiver)
+            timeout_drenado: Segundos que stop() espera a que se procese lo encolado
+        """
+        super().__init__(host=host, port=port, protocolo=protocolo, write_behind=write_behind,
+                         tamano_lectura=tamano_lectura)
+        self.workers = workers
+        self.max_pendientes = max_pendientes
+        self.backlog = backlog
+        self.timeout_drenado = timeout_drenado
+
+        self.loop = None
+        self.server = None
+        self.executor = None
+        self._stop_event = None
+        self._slots = None
+        self._pendientes = 0
+        self._conexiones = set()
+        # Se marca cuando el event loop terminó (y con él, todo lo encolado)
+        self._detenido = threading.Event()
+
+    def start(self):
+        """
+        Iniciar el servidor asíncrono.
+
+        Este método bloquea (corre el event loop) hasta que el servidor sea detenido.
+        """
+        error_occurred = False
+        logger.info(f"🔵 [RECEPTOR {self.port}] Iniciando modo asyncio - Thread ID: {threading.current_thread().ident}")
+
+        try:
+            asyncio.run(self._serve())
+        except OSError as e:
+            error_occurred = True
+            logger.error(f"❌ [RECEPTOR {self.port}] OSError iniciando servidor TCP asíncrono: {e}")
+            print(f"❌ Error iniciando servidor TCP: {e}")
+        except Exception as e:
+            error_occurred = True
+            logger.error(f"❌ [RECEPTOR {self.port}] Error en servidor TCP asíncrono: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+        finally:
+            self._detenido.set()
+            self.stop(update_db_on_error=error_occurred)
+            logger.info(f"🔵 [RECEPTOR {self.port}] Método start() finalizado")
+
+    async def _serve(self):
+        """Levantar el servidor y esperar la señal de detención"""
+        self.loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_pendientes)
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix=f"AsyncTCPReceiver-{self.port}"
+        )
+
+        self.server = await asyncio.start_server(
+            self._handle_connection,
+            self.host,
+            self.port,
+            reuse_address=True,
+            backlog=self.backlog,
+            limit=self.tamano_lectura,
+        )
+        self.running = True
+
+        # El ORM no puede usarse desde el event loop (SynchronousOnlyOperation)
+        await self.loop.run_in_executor(self.executor, self._cargar_registro_equipos)
+        if self.write_behind:
+            self.write_behind.start()
+        self.estadisticas.start()
+        geocode_worker.start()
+
+        self.receptor_logger.log_receptor_status(
+            "INICIADO",
+            f"Escuchando en {self.host}:{self.port} - Protocolo: {self.protocolo} - Modo: asyncio ({self.workers} workers)"
+        )
+        logger.info(f"✅ [RECEPTOR {self.port}] Receptor TCP asíncrono iniciado en {self.host}:{self.port}")
+        print(f"✅ Receptor TCP (asyncio) iniciado en {self.host}:{self.port}")
+
+        try:
+            await self._stop_event.wait()
+        finally:
+            self.running = False
+            self.server.close()
+            for writer in list(self.clients.values()):
+                writer.close()
+            # Cada conexión termina de procesar sus lecturas pendientes al cerrarse
+            if self._conexiones:
+                await asyncio.wait(list(self._conexiones), timeout=self.timeout_drenado)
+            await self.loop.run_in_executor(None, self.executor.shutdown, True)
+
+    def stop(self, update_db_on_error=False):
+        """
+        Detener el servidor asíncrono.
+
+        Puede llamarse desde cualquier hilo (p. ej. receiver_manager.stop_receiver).
+        Espera a que el pool procese lo encolado antes de detener el
+        write-behind; si no, esas tramas terminarían en el spill.
+        """
+        self.running = False
+        if self.loop is not None and self._stop_event is not None and not self._detenido.is_set():
+            try:
+                self.loop.call_soon_threadsafe(self._stop_event.set)
+            except RuntimeError:
+                # El loop ya fue cerrado
+                pass
+            else:
+                if not self._detenido.wait(self.timeout_drenado):
+                    logger.warning(f"⚠️ [RECEPTOR {self.port}] El pool no terminó en {self.timeout_drenado} s; "
+                                   f"lo pendiente puede ir al spill")
+        super().stop(update_db_on_error=update_db_on_error)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Atender una conexión de equipo GPS dentro del event loop.
+
+        Args:
+            reader: Stream de lectura del socket
+            writer: Stream de escritura del socket
+        """
+        client_address = writer.get_extra_info('peername') or ('?', 0)
+        client_id = f"{client_address[0]}:{client_address[1]}"
+        self.clients[client_id] = writer
+        self.stats['total_connections'] += 1
+        self.receptor_logger.log_connection(client_address, "CONECTADO")
+        framer = crear_framer(self.protocolo)
+        self._conexiones.add(asyncio.current_task())
+        cola = asyncio.Queue()
+        consumidor = asyncio.create_task(self._consumir(cola, client_address, client_id))
+
+        try:
+            while self.running:
+                data = await reader.read(self.tamano_lectura)
+                if not data:
+                    break
+
+                tramas = framer.feed(data)
+                if tramas:
+                    # Backpressure: si el pool está saturado dejamos de leer este
+                    # socket y TCP frena al equipo en lugar de acumular memoria
+                    await self._slots.acquire()
+                    self._pendientes += 1
+                    cola.put_nowait(tramas)
+
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.debug(f"Conexión interrumpida {client_id}: {e}")
+        except Exception as e:
+            logger.error(f"Error manejando cliente {client_id}: {e}")
+        finally:
+            # Lo ya leído de este equipo se procesa antes de cerrar la conexión
+            cola.put_nowait(None)
+            await asyncio.shield(consumidor)
+            self._conexiones.discard(asyncio.current_task())
+            self.stats['bytes_descartados'] += framer.bytes_descartados + framer.pendientes()
+            self.clients.pop(client_id, None)
+            self.receptor_logger.log_connection(client_address, "DESCONECTADO")
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+            logger.debug(f"🔌 Conexión cerrada: {client_id}")
+
+    async def _consumir(self, cola: asyncio.Queue, client_address, client_id: str):
+        """
+        Único consumidor de una conexión: manda sus lecturas al pool de a una,
+        así las tramas de un equipo se guardan en el orden en que llegaron.
+        """
+        while True:
+            tramas = await cola.get()
+            if tramas is None:
+                return
+            try:
+                await self.loop.run_in_executor(
+                    self.executor, self._procesar_en_worker, tramas, client_address, client_id
+                )
+            except Exception as e:
+                logger.error(f"Error procesando tramas de {client_id}: {e}")
+            finally:
+                self._pendientes -= 1
+                self._slots.release()
+
+    def _procesar_en_worker(self, tramas, client_address, client_id: str):
+        """Logging y procesamiento de las tramas de una lectura, fuera del event loop"""
+        for data in tramas:
+            self.receptor_logger.log_data_received(client_address, len(data), data)
+            self.process_message(data, client_id)
+
+    def get_stats(self) -> Dict:
+        """
+        Obtener estadísticas del receptor.
+
+        Returns:
+            Diccionario con las mismas claves que TCPReceiver más datos del pool
+        """
+        stats = super().get_stats()
+        stats['workers'] = self.workers
+        stats['pending_jobs'] = self._pendientes
+        stats['max_pending_jobs'] = self.max_pendientes
+        return stats
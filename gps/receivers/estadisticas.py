@@ -0,0 +1,239 @@
+"""
+Estadísticas de recepción acumuladas en memoria
+===============================================
+
+Antes, cada posición guardada hacía un get de ConfiguracionReceptor, un
+COUNT(DISTINCT movil_id) sobre las posiciones del día (que crece todo el
+día), un get_or_create y un UPDATE de EstadisticasRecepcion. Ahora el
+receptor solo suma contadores en memoria y un hilo los vuelca cada
+`flush_interval` segundos con un único upsert:
+
+    INSERT ... ON CONFLICT (receptor_id, fecha) DO UPDATE
+    SET datos_recibidos = datos_recibidos + EXCLUDED.datos_recibidos, ...
+
+Los equipos del día se llevan en un set de movil_id (el tamaño está acotado
+por la flota). Para que un reinicio a mitad del día no "pierda" equipos, el
+set se inicializa una vez por día con el mismo COUNT DISTINCT de antes, y
+equipos_conectados nunca baja dentro del día.
+"""
+
+import logging
+import threading
+from typing import Dict, Iterable, Optional
+
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from gps.models import ConfiguracionReceptor, EstadisticasRecepcion, Posicion
+
+logger = logging.getLogger(__name__)
+
+
+class EstadisticasRecepcionMemoria:
+    """Contadores del día de un receptor + hilo que los persiste periódicamente"""
+
+    def __init__(self, puerto: int, protocolo: str = 'TQ', flush_interval: float = 10.0,
+                 nombre: str = 'estadisticas'):
+        """
+        Args:
+            puerto: Puerto del receptor (identifica su ConfiguracionReceptor)
+            protocolo: Protocolo, por si hay que crear la configuración
+            flush_interval: Segundos entre volcados a EstadisticasRecepcion
+            nombre: Nombre del hilo (para logs)
+        """
+        self.puerto = puerto
+        self.protocolo = protocolo
+        self.flush_interval = flush_interval
+        self.nombre = nombre
+
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._thread = None
+        self._receptor_id: Optional[int] = None
+
+        self._fecha = None
+        self._equipos = set()
+        self._equipos_inicializados = False
+        self._recibidos = 0
+        self._procesados = 0
+        self._errores = 0
+
+        self.stats = {
+            'flushes': 0,
+            'errores_flush': 0,
+            'ultimo_flush': None,
+        }
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._detener.clear()
+        self._thread = threading.Thread(target=self._run, name=self.nombre, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Detener el hilo y volcar lo acumulado"""
+        self._detener.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._detener.wait(self.flush_interval):
+            self.flush()
+            close_old_connections()
+
+    # ------------------------------------------------------------------
+    # Registro (hilos de socket / flusher del write-behind)
+    # ------------------------------------------------------------------
+
+    def registrar_recibido(self, cantidad: int = 1):
+        with self._lock:
+            self._rotar_dia()
+            self._recibidos += cantidad
+
+    def registrar_procesado(self, moviles: Iterable[int] = (), cantidad: int = 1):
+        """
+        Args:
+            moviles: movil_id de las posiciones guardadas
+            cantidad: Posiciones guardadas
+        """
+        with self._lock:
+            self._rotar_dia()
+            self._procesados += cantidad
+            self._equipos.update(m for m in moviles if m is not None)
+
+    def registrar_error(self, cantidad: int = 1):
+        with self._lock:
+            self._rotar_dia()
+            self._errores += cantidad
+
+    def _rotar_dia(self):
+        """Con el lock tomado: al cambiar el día, los contadores pendientes quedan en el día anterior"""
+        hoy = timezone.now().date()
+        if self._fecha == hoy:
+            return
+        if self._fecha is not None and (self._recibidos or self._procesados or self._errores):
+            pendiente = self._tomar_pendiente()
+            threading.Thread(target=self._escribir, args=(pendiente,), daemon=True).start()
+        self._fecha = hoy
+        self._equipos = set()
+        self._equipos_inicializados = False
+
+    def _tomar_pendiente(self) -> Dict:
+        pendiente = {
+            'fecha': self._fecha,
+            'recibidos': self._recibidos,
+            'procesados': self._procesados,
+            'errores': self._errores,
+            'equipos': len(self._equipos),
+        }
+        self._recibidos = self._procesados = self._errores = 0
+        return pendiente
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+
+    def flush(self) -> bool:
+        """Volcar los contadores acumulados con un único upsert"""
+        if not self._equipos_inicializados:
+            self._inicializar_equipos()
+        with self._lock:
+            self._rotar_dia()
+            if not (self._recibidos or self._procesados or self._errores):
+                return True
+            pendiente = self._tomar_pendiente()
+        return self._escribir(pendiente)
+
+    def _inicializar_equipos(self):
+        """Una vez por día: equipos que ya reportaron hoy (p. ej. antes de un reinicio)"""
+        hoy = timezone.now().date()
+        try:
+            ids = Posicion.objects.filter(
+                fec_gps__date=hoy,
+                movil__gps_id__isnull=False
+            ).values_list('movil_id', flat=True).distinct()
+            ids = set(ids)
+        except Exception as e:
+            logger.warning(f"⚠️ [{self.nombre}] No se pudieron leer los equipos del día: {e}")
+            return
+        with self._lock:
+            if self._fecha in (None, hoy):
+                self._fecha = hoy
+                self._equipos.update(ids)
+                self._equipos_inicializados = True
+
+    def _escribir(self, pendiente: Dict) -> bool:
+        try:
+            receptor_id = self._obtener_receptor_id()
+            tabla = EstadisticasRecepcion._meta.db_table
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {tabla}
+                        (receptor_id, fecha, equipos_conectados, datos_recibidos, datos_procesados, errores)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (receptor_id, fecha) DO UPDATE SET
+                        datos_recibidos = {tabla}.datos_recibidos + EXCLUDED.datos_recibidos,
+                        datos_procesados = {tabla}.datos_procesados + EXCLUDED.datos_procesados,
+                        errores = {tabla}.errores + EXCLUDED.errores,
+                        equipos_conectados = CASE
+                            WHEN EXCLUDED.equipos_conectados > {tabla}.equipos_conectados
+                            THEN EXCLUDED.equipos_conectados ELSE {tabla}.equipos_conectados END
+                    """,
+                    [
+                        receptor_id, pendiente['fecha'], pendiente['equipos'],
+                        pendiente['recibidos'], pendiente['procesados'], pendiente['errores'],
+                    ],
+                )
+        except Exception as e:
+            # Devolver los contadores para el próximo intento
+            self.stats['errores_flush'] += 1
+            logger.warning(f"⚠️ [{self.nombre}] Error guardando estadísticas de recepción: {e}")
+            with self._lock:
+                if self._fecha == pendiente['fecha']:
+                    self._recibidos += pendiente['recibidos']
+                    self._procesados += pendiente['procesados']
+                    self._errores += pendiente['errores']
+            return False
+
+        self.stats['flushes'] += 1
+        self.stats['ultimo_flush'] = timezone.now().isoformat()
+        return True
+
+    def _obtener_receptor_id(self) -> int:
+        if self._receptor_id is None:
+            receptor, _ = ConfiguracionReceptor.objects.get_or_create(
+                puerto=self.puerto,
+                defaults={
+                    'nombre': f'Receptor TCP Puerto {self.puerto}',
+                    'protocolo': self.protocolo,
+                    'activo': True,
+                    'max_conexiones': 100,
+                    'max_equipos': 1000,
+                    'timeout': 30,
+                    'tipo_equipo_id': 1
+                }
+            )
+            self._receptor_id = receptor.id
+        return self._receptor_id
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self.stats,
+                'fecha': self._fecha.isoformat() if self._fecha else None,
+                'equipos_hoy': len(self._equipos),
+                'pendientes': {
+                    'recibidos': self._recibidos,
+                    'procesados': self._procesados,
+                    'errores': self._errores,
+                },
+                'flush_interval': self.flush_interval,
+            }
@@ -32,14 +32,19 @@ except ImportError:
     except ImportError:
         ZONEINFO_AVAILABLE = False
 
+from django.conf import settings
 from django.utils import timezone
 from django.db import connection
 
 from gps.processors import ProcessorFactory
-from gps.models import Posicion, Empresa, ConfiguracionReceptor, EstadisticasRecepcion
-from moviles.models import Movil, MovilStatus, MovilGeocode
-from gps.services import GeocodingService
+from gps.framing import crear_framer
+from gps.models import Posicion, Empresa, ConfiguracionReceptor
+from moviles.models import MovilStatus
 from gps.logging_manager import logging_manager
+from gps.receivers.write_behind import PosicionWriteBehind
+from gps.receivers.estadisticas import EstadisticasRecepcionMemoria
+from gps.device_registry import device_registry
+from gps.geocode_worker import geocode_worker
 
 logger = logging.getLogger(__name__)
 
@@ -53,7 +58,17 @@ class TCPReceiver:
     base de datos.
     """
     
-    def __init__(self, host: str = '0.0.0.0', port: int = 5003, protocolo: str = 'TQ'):
+    # Modo de atención de conexiones (un hilo por socket)
+    modo = 'threads'
+    
+    # Opciones aceptadas en configuracion_avanzada['write_behind']
+    OPCIONES_WRITE_BEHIND = ('batch_size', 'flush_interval', 'max_cola', 'backpressure_timeout')
+    
+    # Opciones de configuracion_avanzada propias del modo (nombre -> tipo)
+    OPCIONES_AVANZADAS = {}
+    
+    def __init__(self, host: str = '0.0.0.0', port: int = 5003, protocolo: str = 'TQ',
+                 write_behind=None, tamano_lectura: int = 4096):
         """
         Inicializar receptor TCP.
         
@@ -61,10 +76,14 @@ class TCPReceiver:
             host: Dirección IP donde escuchar (0.0.0.0 = todas las interfaces)
             port: Puerto TCP donde escuchar (default: 5003)
             protocolo: Protocolo del receptor (default: TQ)
+            write_behind: True o dict de opciones para escribir las posiciones
+                en lotes desde un hilo aparte (ver write_behind.py)
+            tamano_lectura: Bytes máximos por recv() (las tramas se separan con gps.framing)
         """
         self.host = host
         self.port = port
         self.protocolo = protocolo
+        self.tamano_lectura = tamano_lectura
         self.server_socket = None
         self.running = False
         self.clients = {}
@@ -74,12 +93,32 @@ class TCPReceiver:
             'total_messages': 0,
             'successful_parses': 0,
             'failed_parses': 0,
-            'database_errors': 0
+            'database_errors': 0,
+            'bytes_descartados': 0
         }
         
         # Configurar logger específico para este receptor
         self.receptor_logger = logging_manager.get_logger(port, 'TCP')
         
+        # Pipeline de escritura diferida (None = guardado sincrónico por mensaje)
+        self.write_behind = None
+        if write_behind:
+            opciones = write_behind if isinstance(write_behind, dict) else {}
+            self.write_behind = PosicionWriteBehind(
+                spill_path=self.receptor_logger.log_dir / 'spill_posiciones.jsonl',
+                on_flush=self._post_flush,
+                nombre=f"WriteBehind-{port}",
+                **{k: v for k, v in opciones.items() if k in self.OPCIONES_WRITE_BEHIND}
+            )
+        
+        # Contadores diarios en memoria, volcados a EstadisticasRecepcion cada tanto
+        self.estadisticas = EstadisticasRecepcionMemoria(
+            puerto=port,
+            protocolo=protocolo,
+            flush_interval=getattr(settings, 'WAYGPS_ESTADISTICAS_FLUSH_INTERVAL', 10),
+            nombre=f"Estadisticas-{port}",
+        )
+        
         # Registrar configuración del receptor
         self._register_configuration()
     
@@ -113,6 +152,14 @@ class TCPReceiver:
         except Exception as e:
             logger.warning(f"No se pudo registrar configuración de receptor: {e}")
     
+    def _cargar_registro_equipos(self):
+        """Precargar el registro gps_id -> móvil antes de aceptar conexiones"""
+        try:
+            device_registry.cargar()
+        except Exception as e:
+            # Sin precarga el registro se llena bajo demanda en el primer mensaje
+            logger.warning(f"⚠️ [RECEPTOR {self.port}] No se pudo precargar el registro de equipos: {e}")
+    
     def start(self):
         """
         Iniciar el servidor TCP.
@@ -136,6 +183,14 @@ class TCPReceiver:
             self.running = True
             logger.info(f"🔵 [RECEPTOR {self.port}] Socket creado y escuchando. running={self.running}")
             
+            self._cargar_registro_equipos()
+            
+            if self.write_behind:
+                self.write_behind.start()
+            self.estadisticas.start()
+            # Solo el proceso del receptor geocodifica (en modo embebido)
+            geocode_worker.start()
+            
             # Log de inicio
             self.receptor_logger.log_receptor_status(
                 "INICIADO", 
@@ -228,6 +283,11 @@ class TCPReceiver:
             except Exception as e:
                 logger.warning(f"⚠️ [RECEPTOR {self.port}] Error cerrando socket: {e}")
         
+        # Escribir (o volcar al spill) las posiciones que quedaron en cola
+        if self.write_behind:
+            self.write_behind.stop()
+        self.estadisticas.stop()
+        
         # Log de detención
         self.receptor_logger.log_receptor_status("DETENIDO", f"Puerto {self.port} cerrado")
         
@@ -267,23 +327,23 @@ class TCPReceiver:
         self.stats['total_connections'] += 1
         
         logger.info(f"🔗 Nueva conexión desde {client_id}")
-        print(f"🔗 Nueva conexión desde {client_id}")
+        
+        # Un recv() puede traer medio mensaje o varios: el framer arma las tramas
+        framer = crear_framer(self.protocolo)
         
         try:
             while self.running:
                 # Recibir datos del cliente
-                data = client_socket.recv(1024)
+                data = client_socket.recv(self.tamano_lectura)
                 if not data:
                     break
                 
-                # Convertir datos a hexadecimal para logging
-                hex_data = data.hex()
-                
-                # Log de datos recibidos
-                self.receptor_logger.log_data_received(client_address, len(data), hex_data)
+                # Log de datos recibidos (el hex se arma solo para el preview)
+                self.receptor_logger.log_data_received(client_address, len(data), data)
                 
-                # Procesar el mensaje
-                self.process_message(data, client_id)
+                # Procesar cada mensaje completo
+                for trama in framer.feed(data):
+                    self.process_message(trama, client_id)
                 
         except Exception as e:
             logger.error(f"Error manejando cliente {client_id}: {e}")
@@ -291,11 +351,12 @@ class TCPReceiver:
             
         finally:
             # Limpiar conexión
+            self.stats['bytes_descartados'] += framer.bytes_descartados + framer.pendientes()
             client_socket.close()
             if client_id in self.clients:
                 del self.clients[client_id]
+            self.receptor_logger.log_connection(client_address, "DESCONECTADO")
             logger.info(f"🔌 Conexión cerrada: {client_id}")
-            print(f"🔌 Conexión cerrada: {client_id}")
     
     def process_message(self, data: bytes, client_id: str):
         """
@@ -307,8 +368,9 @@ class TCPReceiver:
         """
         try:
             self.stats['total_messages'] += 1
+            self.estadisticas.registrar_recibido()
             
-            logger.info(f"📨 Mensaje recibido de {client_id} ({len(data)} bytes)")
+            logger.debug("📨 Mensaje recibido de %s (%s bytes)", client_id, len(data))
             
             # Parsear datos usando el procesador
             parsed_data = self.processor.parse(data)
@@ -319,28 +381,23 @@ class TCPReceiver:
                 # Log de datos parseados exitosamente
                 self.receptor_logger.log_parsed_data(parsed_data)
                 
-                logger.info(f"✅ Datos parseados: {parsed_data}")
+                logger.debug("✅ Datos parseados: %s", parsed_data)
                 
                 # Guardar en base de datos
-                success = self.save_to_database(parsed_data)
-                
-                if success:
-                    print(f"💾 Posición guardada: {parsed_data.get('latitud'):.6f}, "
-                          f"{parsed_data.get('longitud'):.6f}")
-                else:
-                    print(f"⚠️  Posición no guardada (equipo no encontrado o error)")
+                if not self.save_to_database(parsed_data):
+                    logger.debug("⚠️ Posición no guardada (equipo no encontrado o error)")
             else:
                 self.stats['failed_parses'] += 1
+                self.estadisticas.registrar_error()
                 
-                # Log de error de parsing
-                self.receptor_logger.log_warning(f"No se pudo parsear el mensaje desde {client_id}")
+                # Log de error de parsing (siempre con el hex de la trama)
+                self.receptor_logger.log_warning("No se pudo parsear el mensaje", client_id, datos=data)
                 
                 logger.warning(f"⚠️  No se pudo parsear el mensaje de {client_id}")
-                print(f"⚠️  No se pudo parsear el mensaje")
                 
         except Exception as e:
             logger.error(f"Error procesando mensaje de {client_id}: {e}")
-            print(f"❌ Error procesando mensaje: {e}")
+            self.receptor_logger.log_error(f"Error procesando mensaje: {e}", client_id, datos=data)
     
     def save_to_database(self, parsed_data: Dict) -> bool:
         """
@@ -365,12 +422,10 @@ class TCPReceiver:
                 logger.error("No se pudo obtener device_id del mensaje")
                 return False
             
-            # Buscar el móvil por gps_id
-            try:
-                movil = Movil.objects.get(gps_id=device_id)
-            except Movil.DoesNotExist:
+            # Buscar el móvil por gps_id (registro en memoria, sin query por mensaje)
+            movil = device_registry.resolver(device_id)
+            if movil is None:
                 logger.warning(f"Equipo GPS con ID {device_id} no encontrado en la base de datos")
-                print(f"⚠️  Equipo {device_id} no está registrado en la base de datos")
                 return False
             
             # Usar ID de empresa directamente (default: 1)
@@ -394,7 +449,7 @@ class TCPReceiver:
                         fecha_gps = fecha_gps.astimezone(tz_argentina)
                     # Remover timezone para guardar como "naive"
                     fecha_gps = fecha_gps.replace(tzinfo=None)
-                    logger.info(f"🕐 [GUARDAR] Fecha GPS (naive, hora Argentina): {fecha_gps.strftime('%d/%m/%Y %H:%M:%S')}")
+                    logger.debug("🕐 [GUARDAR] Fecha GPS (naive, hora Argentina): %s", fecha_gps)
                 except Exception as e:
                     fecha_gps = timezone.now().replace(tzinfo=None)
                     logger.warning(f"⚠️ [GUARDAR] Error parseando timestamp, usando hora actual: {e}")
@@ -411,7 +466,7 @@ class TCPReceiver:
                         fecha_gps = fecha_gps.astimezone(tz_argentina)
                     # Remover timezone para guardar como "naive"
                     fecha_gps = fecha_gps.replace(tzinfo=None)
-                    logger.info(f"🕐 [GUARDAR] Fecha GPS (naive, hora Argentina): {fecha_gps.strftime('%d/%m/%Y %H:%M:%S')}")
+                    logger.debug("🕐 [GUARDAR] Fecha GPS (naive, hora Argentina): %s", fecha_gps)
                 else:
                     fecha_gps = timezone.now().replace(tzinfo=None)
             
@@ -441,10 +496,32 @@ class TCPReceiver:
             fecha_recepcion_utc_value = fecha_recepcion_naive + timedelta(hours=3)
             fecha_recepcion_utc = fecha_recepcion_utc_value.replace(tzinfo=tz_utc)
             
+            if self.write_behind:
+                # Escritura diferida: el flusher inserta en lote y hace el upsert de MovilStatus
+                self.write_behind.encolar({
+                    'empresa_id': empresa_id,
+                    'movil_id': movil.id,
+                    'device_id': device_id,
+                    'fec_gps': fecha_gps_utc,
+                    'fec_report': timezone.now(),
+                    'lat': latitud,
+                    'lon': longitud,
+                    'velocidad': velocidad,
+                    'rumbo': rumbo,
+                    'altitud': parsed_data.get('altitud', 0),
+                    'sats': parsed_data.get('satelites', 0),
+                    'ign_on': parsed_data.get('ignicion', False),
+                    'is_valid': True,
+                    'protocol': 'TQ',
+                    'provider': 'Queclink',
+                    'fecha_recepcion': fecha_recepcion_utc,
+                })
+                return True
+            
             # Crear registro en Posicion
             posicion = Posicion.objects.create(
                 empresa_id=empresa_id,
-                movil=movil,
+                movil_id=movil.id,
                 device_id=device_id,
                 fec_gps=fecha_gps_utc,  # UTC con valor ajustado
                 fec_report=timezone.now(),
@@ -462,7 +539,7 @@ class TCPReceiver:
             
             # Actualizar MovilStatus
             MovilStatus.objects.update_or_create(
-                movil=movil,
+                movil_id=movil.id,
                 defaults={
                     'ultimo_lat': latitud,
                     'ultimo_lon': longitud,
@@ -478,111 +555,58 @@ class TCPReceiver:
                 }
             )
             
-            logger.info(f"✅ [GUARDAR] Guardado: fecha_gps UTC ajustado={fecha_gps_utc.strftime('%d/%m/%Y %H:%M:%S')} (equivale a {fecha_gps.strftime('%d/%m/%Y %H:%M:%S')} Argentina)")
+            logger.debug("✅ [GUARDAR] Guardado: fecha_gps UTC ajustado=%s (equivale a %s Argentina)", fecha_gps_utc, fecha_gps)
             
-            # Geocodificar la posición
-            try:
-                geocoding_service = GeocodingService()
-                resultado_geocode = geocoding_service.geocodificar_coordenadas(latitud, longitud)
-                
-                if resultado_geocode:
-                    direccion_formateada = resultado_geocode.get('direccion_formateada') or \
-                                          resultado_geocode.get('display_name', '')
-                    
-                    # Actualizar Posicion con dirección geocodificada
-                    posicion.direccion = direccion_formateada
-                    posicion.save()
-                    
-                    # Actualizar MovilGeocode
-                    MovilGeocode.objects.update_or_create(
-                        movil=movil,
-                        defaults={
-                            'direccion_formateada': direccion_formateada,
-                            'calle': resultado_geocode.get('calle'),
-                            'numero': resultado_geocode.get('numero'),
-                            'localidad': resultado_geocode.get('localidad'),
-                            'provincia': resultado_geocode.get('provincia'),
-                            'pais': resultado_geocode.get('pais'),
-                            'fuente_geocodificacion': resultado_geocode.get('fuente_geocodificacion'),
-                            'confianza_geocodificacion': resultado_geocode.get('confianza_geocodificacion'),
-                            'geohash': resultado_geocode.get('geohash'),
-                            'fecha_geocodificacion': timezone.now()
-                        }
-                    )
-            except Exception as e:
-                logger.warning(f"Error en geocodificación: {e}")
+            # Geocodificación diferida (no bloquea el socket esperando a Nominatim)
+            geocode_worker.encolar(posicion.id, latitud, longitud, movil_id=movil.id)
             
             # Actualizar estadísticas de recepción
             self.update_statistics(movil.id)
             
-            logger.info(f"✅ Posición guardada para móvil {movil.patente}")
+            logger.debug("✅ Posición guardada para móvil %s", movil.patente)
             return True
             
         except Exception as e:
             self.stats['database_errors'] += 1
+            self.estadisticas.registrar_error()
             logger.error(f"Error guardando en base de datos: {e}")
             return False
     
-    def update_statistics(self, movil_id: int):
+    def _post_flush(self, posiciones: list):
         """
-        Actualizar estadísticas de recepción.
+        Post-procesamiento de un lote escrito por el pipeline write-behind.
+        
+        Solo se encola para geocodificar la última posición de cada móvil del lote.
+        
+        Args:
+            posiciones: Posiciones creadas en el lote (con id)
+        """
+        ultimas = {}
+        for posicion in posiciones:
+            previa = ultimas.get(posicion.movil_id)
+            if previa is None or posicion.fec_gps >= previa.fec_gps:
+                ultimas[posicion.movil_id] = posicion
+        
+        for posicion in ultimas.values():
+            geocode_worker.encolar(posicion.id, posicion.lat, posicion.lon, movil_id=posicion.movil_id)
+        
+        self.update_statistics(cantidad=len(posiciones), moviles=ultimas.keys())
+    
+    def update_statistics(self, movil_id: int = None, cantidad: int = 1, moviles=None):
+        """
+        Sumar posiciones guardadas a las estadísticas de recepción.
+        
+        Solo actualiza contadores en memoria; EstadisticasRecepcionMemoria
+        los vuelca a la base periódicamente (ver gps/receivers/estadisticas.py).
         
         Args:
             movil_id: ID del móvil que envió datos
+            cantidad: Cantidad de posiciones a sumar (lotes del write-behind)
+            moviles: IDs de los móviles del lote (write-behind)
         """
-        try:
-            from django.db.models import F, Count
-            
-            # Obtener configuración de receptor (debería existir ya que se registró en __init__)
-            try:
-                receptor = ConfiguracionReceptor.objects.get(puerto=self.port)
-            except ConfiguracionReceptor.DoesNotExist:
-                # Si no existe, crearla (fallback)
-                receptor = ConfiguracionReceptor.objects.create(
-                    puerto=self.port,
-                    nombre=f'Receptor TCP Puerto {self.port}',
-                    protocolo=self.protocolo,
-                    activo=True,
-                    max_conexiones=100,
-                    max_equipos=1000,
-                    timeout=30,
-                    tipo_equipo_id=1
-                )
-            
-            # Obtener o crear estadísticas para hoy
-            hoy = timezone.now().date()
-            
-            # Contar equipos únicos conectados hoy
-            equipos_conectados_count = Posicion.objects.filter(
-                fec_gps__date=hoy,
-                movil__gps_id__isnull=False
-            ).values('movil_id').distinct().count()
-            
-            # Obtener o crear estadísticas
-            stats, created = EstadisticasRecepcion.objects.get_or_create(
-                receptor=receptor,
-                fecha=hoy,
-                defaults={
-                    'equipos_conectados': equipos_conectados_count,
-                    'datos_recibidos': 1,
-                    'datos_procesados': 1,
-                    'errores': 0
-                }
-            )
-            
-            if not created:
-                # Incrementar contadores si ya existe
-                # Y actualizar contador de equipos conectados
-                estadisticas_hoy = EstadisticasRecepcion.objects.filter(id=stats.id)
-                estadisticas_hoy.update(
-                    datos_recibidos=F('datos_recibidos') + 1,
-                    datos_procesados=F('datos_procesados') + 1,
-                    equipos_conectados=equipos_conectados_count
-                )
-            
-        except Exception as e:
-            # No fallar si hay error en estadísticas
-            logger.warning(f"Error actualizando estadísticas: {e}")
+        if moviles is None:
+            moviles = (movil_id,)
+        self.estadisticas.registrar_procesado(moviles, cantidad)
     
     def get_stats(self) -> Dict:
         """
@@ -591,14 +615,22 @@ class TCPReceiver:
         Returns:
             Diccionario con estadísticas
         """
-        return {
+        stats = {
             **self.stats,
             'running': self.running,
+            'modo': self.modo,
             'host': self.host,
             'port': self.port,
             'active_connections': len(self.clients),
-            'clients': list(self.clients.keys())
+            'clients': list(self.clients.keys()),
+            'geocoding': geocode_worker.get_stats(),
+            'logging': self.receptor_logger.get_stats()
         }
+        if self.write_behind:
+            # Profundidad de cola y latencia de flush del pipeline write-behind
+            stats['write_behind'] = self.write_behind.get_stats()
+        stats['estadisticas'] = self.estadisticas.get_stats()
+        return stats
     
     def print_stats(self):
         """Imprimir estadísticas en consola"""
@@ -0,0 +1,359 @@
+"""
+Pipeline write-behind para posiciones GPS
+=========================================
+
+En lugar de hacer varios round trips a la base por cada fix en el hilo del
+socket, el receptor encola registros ya preparados y un hilo "flusher" los
+escribe en lotes:
+
+- Posicion: un único INSERT por lote (bulk_create)
+- MovilStatus: un único upsert (INSERT ... ON CONFLICT) con la última
+  posición de cada móvil del lote (gana la de fec_gps más reciente). El
+  UPDATE solo se aplica si la fila guardada no tiene una fecha_gps más
+  nueva: una descarga atrasada del equipo o el reproceso del spill no
+  pisan la última posición conocida.
+
+El lote se escribe al alcanzar `batch_size` registros o cuando pasan
+`flush_interval` segundos. Si la cola se llena el productor espera
+(backpressure) y, pasado `backpressure_timeout`, el registro va al archivo
+de spill. Si la base falla, el lote completo se vuelca al archivo de spill
+(JSON por línea, con fsync) y se reintenta más tarde, de modo que un corte
+de la base no pierde fixes. Al iniciar se reprocesa el spill pendiente.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from gps.models import Posicion
+from moviles.models import MovilStatus
+
+logger = logging.getLogger(__name__)
+
+# Campos de MovilStatus que se actualizan en el upsert
+CAMPOS_STATUS = [
+    'ultimo_lat', 'ultimo_lon', 'ultima_altitud', 'ultima_velocidad_kmh', 'ultimo_rumbo',
+    'satelites', 'ignicion', 'fecha_gps', 'fecha_recepcion', 'id_ultima_posicion',
+    'estado_conexion', 'ultima_actualizacion',
+]
+
+# Campos datetime del registro (se serializan en ISO en el spill)
+CAMPOS_FECHA = ('fec_gps', 'fec_report', 'fecha_recepcion')
+
+
+class PosicionWriteBehind:
+    """
+    Cola en memoria + hilo flusher que persiste posiciones en lotes.
+
+    Cada registro es un dict con los campos de Posicion (movil_id, device_id,
+    fec_gps, fec_report, lat, lon, velocidad, rumbo, altitud, sats, ign_on)
+    más `fecha_recepcion` para MovilStatus.
+    """
+
+    def __init__(self, spill_path: Path, batch_size: int = 500, flush_interval: float = 1.0,
+                 max_cola: int = 20000, backpressure_timeout: float = 2.0,
+                 on_flush: Optional[Callable[[List[Posicion]], None]] = None,
+                 nombre: str = 'write-behind'):
+        """
+        Args:
+            spill_path: Archivo JSONL donde se vuelcan los lotes que no se pudieron escribir
+            batch_size: Registros máximos por lote
+            flush_interval: Segundos máximos que un registro espera en la cola
+            max_cola: Capacidad de la cola en memoria
+            backpressure_timeout: Segundos que espera el productor con la cola llena
+            on_flush: Callback con las posiciones creadas tras cada lote exitoso
+            nombre: Nombre del hilo flusher (para logs)
+        """
+        self.spill_path = Path(spill_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.backpressure_timeout = backpressure_timeout
+        self.on_flush = on_flush
+        self.nombre = nombre
+
+        self.cola: queue.Queue = queue.Queue(maxsize=max_cola)
+        self._spill_lock = threading.Lock()
+        self._thread = None
+        self._running = False
+
+        self.stats = {
+            'encolados': 0,
+            'escritos': 0,
+            'lotes': 0,
+            'errores_flush': 0,
+            'spill_registros': 0,
+            'spill_reprocesados': 0,
+            'backpressure_eventos': 0,
+            'ultimo_flush_ms': None,
+            'flush_promedio_ms': None,
+        }
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Iniciar el hilo flusher (reprocesa el spill pendiente primero)"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.nombre, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Detener el flusher escribiendo (o volcando a spill) lo que quede en cola"""
+        if not self._running:
+            return
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        # Último lote; si la base no responde queda a salvo en el spill
+        restantes = self._drenar(sin_limite=True)
+        if restantes:
+            self._flush(restantes)
+
+    # ------------------------------------------------------------------
+    # Productor
+    # ------------------------------------------------------------------
+
+    def encolar(self, registro: Dict) -> bool:
+        """
+        Encolar un registro para escritura diferida.
+
+        Bloquea hasta `backpressure_timeout` si la cola está llena; si aun así
+        no hay lugar (o el flusher está detenido), el registro se escribe
+        directo al spill.
+
+        Returns:
+            True si quedó en la cola, False si fue al spill
+        """
+        if not self._running:
+            # Flusher detenido: el registro se reprocesa en el próximo inicio
+            self._volcar_spill([registro])
+            return False
+        try:
+            self.cola.put(registro, timeout=self.backpressure_timeout)
+            self.stats['encolados'] += 1
+            return True
+        except queue.Full:
+            self.stats['backpressure_eventos'] += 1
+            logger.warning(f"⚠️ [{self.nombre}] Cola llena ({self.cola.maxsize}), registro enviado al spill")
+            self._volcar_spill([registro])
+            return False
+
+    # ------------------------------------------------------------------
+    # Flusher
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        self._reprocesar_spill()
+        while self._running:
+            lote = self._drenar()
+            # Si la base volvió, aprovechar para vaciar el spill
+            if lote and self._flush(lote) and self.spill_path.exists():
+                self._reprocesar_spill()
+
+    def _drenar(self, sin_limite: bool = False) -> List[Dict]:
+        """Tomar de la cola hasta batch_size registros o hasta que venza flush_interval"""
+        lote = []
+        if sin_limite:
+            while True:
+                try:
+                    lote.append(self.cola.get_nowait())
+                except queue.Empty:
+                    return lote
+
+        limite = time.monotonic() + self.flush_interval
+        while len(lote) < self.batch_size:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self.cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _flush(self, lote: List[Dict], reproceso: bool = False) -> bool:
+        """
+        Escribir un lote en la base. Ante error, el lote va al spill.
+
+        Args:
+            lote: Registros a escribir
+            reproceso: True al reprocesar el spill (no dispara on_flush; el
+                upsert de MovilStatus igual descarta lo que sea más viejo)
+        """
+        inicio = time.monotonic()
+        close_old_connections()
+        try:
+            with transaction.atomic():
+                posiciones = Posicion.objects.bulk_create(
+                    [Posicion(**self._campos_posicion(r)) for r in lote],
+                    batch_size=self.batch_size,
+                )
+                self._upsert_status(lote, posiciones)
+        except Exception as e:
+            self.stats['errores_flush'] += 1
+            logger.error(f"❌ [{self.nombre}] Error escribiendo lote de {len(lote)} posiciones: {e}")
+            self._volcar_spill(lote)
+            return False
+
+        duracion_ms = (time.monotonic() - inicio) * 1000
+        self.stats['lotes'] += 1
+        self.stats['escritos'] += len(lote)
+        self.stats['ultimo_flush_ms'] = round(duracion_ms, 2)
+        previo = self.stats['flush_promedio_ms']
+        self.stats['flush_promedio_ms'] = round(duracion_ms if previo is None else previo * 0.9 + duracion_ms * 0.1, 2)
+        logger.debug(f"💾 [{self.nombre}] Lote de {len(lote)} posiciones escrito en {duracion_ms:.1f} ms")
+
+        if self.on_flush and not reproceso:
+            try:
+                self.on_flush(posiciones)
+            except Exception as e:
+                logger.warning(f"⚠️ [{self.nombre}] Error en post-procesamiento del lote: {e}")
+        return True
+
+    def _upsert_status(self, lote: List[Dict], posiciones: List[Posicion]):
+        """
+        Un único INSERT ... ON CONFLICT con la última posición de cada móvil.
+
+        bulk_create(update_conflicts=True) no admite condición en el UPDATE,
+        por eso el SQL se arma a mano (vale para PostgreSQL y SQLite):
+
+            ON CONFLICT (movil_id) DO UPDATE SET ... = EXCLUDED....
+            WHERE moviles_status.fecha_gps IS NULL
+               OR EXCLUDED.fecha_gps > moviles_status.fecha_gps
+        """
+        ultimos: Dict[int, tuple] = {}
+        for registro, posicion in zip(lote, posiciones):
+            previo = ultimos.get(registro['movil_id'])
+            if previo is None or registro['fec_gps'] >= previo[0]['fec_gps']:
+                ultimos[registro['movil_id']] = (registro, posicion)
+
+        estados = [
+            MovilStatus(
+                movil_id=movil_id,
+                ultimo_lat=registro['lat'],
+                ultimo_lon=registro['lon'],
+                ultima_altitud=registro.get('altitud', 0),
+                ultima_velocidad_kmh=registro.get('velocidad', 0),
+                ultimo_rumbo=registro.get('rumbo', 0),
+                satelites=registro.get('sats', 0),
+                ignicion=registro.get('ign_on', False),
+                fecha_gps=registro['fec_gps'],
+                fecha_recepcion=registro.get('fecha_recepcion'),
+                id_ultima_posicion=posicion.id,
+                estado_conexion='conectado',
+            )
+            for movil_id, (registro, posicion) in ultimos.items()
+        ]
+        if not estados:
+            return
+
+        ahora = timezone.now()
+        campos = [MovilStatus._meta.get_field(nombre) for nombre in ['movil'] + CAMPOS_STATUS]
+        quote = connection.ops.quote_name
+        tabla = quote(MovilStatus._meta.db_table)
+        columnas = [quote(campo.column) for campo in campos]
+        fecha_gps = quote(MovilStatus._meta.get_field('fecha_gps').column)
+
+        parametros = []
+        for estado in estados:
+            estado.ultima_actualizacion = ahora
+            parametros.extend(campo.get_db_prep_save(getattr(estado, campo.attname), connection) for campo in campos)
+        fila = '(' + ', '.join(['%s'] * len(campos)) + ')'
+
+        sql = (
+            f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES {', '.join([fila] * len(estados))} "
+            f"ON CONFLICT ({columnas[0]}) DO UPDATE SET "
+            + ', '.join(f"{columna} = EXCLUDED.{columna}" for columna in columnas[1:])
+            + f" WHERE {tabla}.{fecha_gps} IS NULL OR EXCLUDED.{fecha_gps} > {tabla}.{fecha_gps}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, parametros)
+
+    @staticmethod
+    def _campos_posicion(registro: Dict) -> Dict:
+        campos = dict(registro)
+        campos.pop('fecha_recepcion', None)
+        return campos
+
+    # ------------------------------------------------------------------
+    # Spill a disco
+    # ------------------------------------------------------------------
+
+    def _volcar_spill(self, registros: List[Dict]):
+        """Agregar registros al archivo de spill (append + fsync)"""
+        try:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with self._spill_lock:
+                with open(self.spill_path, 'a', encoding='utf-8') as f:
+                    for registro in registros:
+                        f.write(json.dumps(_serializar(registro)) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+            self.stats['spill_registros'] += len(registros)
+        except Exception as e:
+            # Último recurso: sin disco no hay dónde guardar
+            logger.error(f"❌ [{self.nombre}] No se pudo escribir el spill ({len(registros)} registros perdidos): {e}")
+
+    def _reprocesar_spill(self):
+        """Reintentar los registros del spill; si vuelve a fallar quedan en disco"""
+        procesando = self.spill_path.with_suffix('.procesando')
+        with self._spill_lock:
+            # Un .procesando previo quedó de una caída durante el reproceso
+            if not procesando.exists():
+                if not self.spill_path.exists():
+                    return
+                os.replace(self.spill_path, procesando)
+
+        try:
+            with open(procesando, 'r', encoding='utf-8') as f:
+                registros = [_deserializar(json.loads(linea)) for linea in f if linea.strip()]
+        except Exception as e:
+            logger.error(f"❌ [{self.nombre}] Spill ilegible {procesando}: {e}")
+            return
+
+        logger.info(f"🔁 [{self.nombre}] Reprocesando {len(registros)} posiciones del spill")
+        for i in range(0, len(registros), self.batch_size):
+            lote = registros[i:i + self.batch_size]
+            if self._flush(lote, reproceso=True):
+                self.stats['spill_reprocesados'] += len(lote)
+            else:
+                # _flush ya lo devolvió al spill; el resto también
+                self._volcar_spill(registros[i + self.batch_size:])
+                break
+        procesando.unlink(missing_ok=True)
+
+    def get_stats(self) -> Dict:
+        """Estadísticas de la cola para TCPReceiver.get_stats()"""
+        return {
+            **self.stats,
+            'profundidad_cola': self.cola.qsize(),
+            'capacidad_cola': self.cola.maxsize,
+            'spill_pendiente': self.spill_path.exists(),
+        }
+
+
+def _serializar(registro: Dict) -> Dict:
+    datos = dict(registro)
+    for campo in CAMPOS_FECHA:
+        if isinstance(datos.get(campo), datetime):
+            datos[campo] = datos[campo].isoformat()
+    return datos
+
+
+def _deserializar(datos: Dict) -> Dict:
+    for campo in CAMPOS_FECHA:
+        if isinstance(datos.get(campo), str):
+            datos[campo] = datetime.fromisoformat(datos[campo])
+    return datos
@@ -0,0 +1,326 @@
+"""
+Estadísticas de un recorrido en una sola pasada
+===============================================
+
+estadisticas_recorrido recorría todas las Posicion como objetos para sumar
+distancias y después hacía una decena de COUNT (detenciones, cada rango de
+velocidad, puntos_gps dos veces) más first()/last(). Acá se trae una sola
+vez las cuatro columnas necesarias (fec_gps, lat, lon, velocidad) con
+values_list y se calcula todo sobre ellas: con numpy vectorizado y, si no
+está instalado, punto a punto con AcumuladorEstadisticas (mismos números).
+
+Criterios:
+
+- Un punto está detenido si su velocidad es <= VELOCIDAD_DETENIDO (o nula).
+- El tiempo entre dos puntos consecutivos se asigna al estado del primero,
+  así tiempo_detenido + tiempo_movimiento == duración del recorrido.
+- detenciones cuenta episodios (rachas de puntos detenidos), no puntos.
+- La distancia es haversine entre puntos consecutivos con coordenadas.
+- estadisticas_por_hora agrupa por hora del primer punto de cada tramo.
+"""
+
+import math
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.utils import timezone
+
+# Dependencia opcional: sin numpy se usa el bucle en Python
+try:
+    import numpy as np
+    NP_AVAILABLE = True
+except Exception:
+    NP_AVAILABLE = False
+    np = None  # type: ignore
+
+CAMPOS = ('fec_gps', 'lat', 'lon', 'velocidad')
+VELOCIDAD_DETENIDO = 5
+RADIO_TIERRA_KM = 6371.0
+
+# (nombre, límite superior inclusivo); el último rango no tiene límite
+RANGOS_VELOCIDAD = (
+    ('detenido', 5),
+    ('muy_lento', 15),
+    ('lento', 30),
+    ('moderado', 50),
+    ('rapido', 80),
+    ('muy_rapido', None),
+)
+_LIMITES = [limite for _, limite in RANGOS_VELOCIDAD if limite is not None]
+
+Fila = Tuple[Optional[datetime], object, object, Optional[int]]
+
+
+def estadisticas_queryset(queryset) -> Optional[Dict]:
+    """
+    Calcular las estadísticas de un queryset de Posicion con una sola consulta.
+
+    Args:
+        queryset: Posiciones del recorrido (se ordenan por fec_gps)
+
+    Returns:
+        Ver calcular_estadisticas()
+    """
+    filas = queryset.order_by('fec_gps').values_list(*CAMPOS)
+    return calcular_estadisticas(filas)
+
+
+def calcular_estadisticas(filas: Iterable[Fila]) -> Optional[Dict]:
+    """
+    Calcular las estadísticas a partir de filas (fec_gps, lat, lon, velocidad).
+
+    Args:
+        filas: Filas ordenadas por fec_gps; las que no tienen fecha se ignoran
+
+    Returns:
+        Dict con fecha_inicio, fecha_fin, duracion_minutos, distancia_km,
+        velocidad_maxima, velocidad_promedio, puntos_gps, detenciones,
+        tiempo_detenido_minutos, tiempo_movimiento_minutos,
+        rango_velocidades y estadisticas_por_hora, o None si no hay filas
+    """
+    if not NP_AVAILABLE:
+        acumulador = AcumuladorEstadisticas()
+        for fila in filas:
+            acumulador.agregar(*fila)
+        return acumulador.resultado()
+
+    fechas, lats, lons, velocidades = [], [], [], []
+    for fec_gps, lat, lon, velocidad in filas:
+        if fec_gps is None:
+            continue
+        fechas.append(fec_gps)
+        lats.append(_coordenada(lat))
+        lons.append(_coordenada(lon))
+        velocidades.append(velocidad)
+
+    if not fechas:
+        return None
+
+    segundos = [fecha.timestamp() for fecha in fechas]
+    resumen = _calcular_numpy(segundos, lats, lons, velocidades)
+    return _formatear(fechas[0], fechas[-1], len(fechas), resumen)
+
+
+def _coordenada(valor) -> Optional[float]:
+    # Igual que antes, lat/lon en cero se consideran sin coordenadas
+    return float(valor) if valor else None
+
+
+def _formatear(fecha_inicio: datetime, fecha_fin: datetime, puntos: int, resumen: Dict) -> Dict:
+    duracion = (fecha_fin - fecha_inicio).total_seconds() / 60
+    return {
+        'fecha_inicio': fecha_inicio,
+        'fecha_fin': fecha_fin,
+        'duracion_minutos': round(duracion, 2),
+        'distancia_km': round(resumen['distancia_km'], 2),
+        'velocidad_maxima': resumen['velocidad_maxima'],
+        'velocidad_promedio': round(resumen['velocidad_promedio'], 2),
+        'puntos_gps': puntos,
+        'detenciones': resumen['detenciones'],
+        'tiempo_detenido_minutos': round(resumen['segundos_detenido'] / 60, 2),
+        'tiempo_movimiento_minutos': round(resumen['segundos_movimiento'] / 60, 2),
+        'rango_velocidades': resumen['rango_velocidades'],
+        'estadisticas_por_hora': [_formatear_hora(hora) for hora in resumen['por_hora']],
+    }
+
+
+def _formatear_hora(hora: Dict) -> Dict:
+    inicio = timezone.localtime(datetime.fromtimestamp(hora['hora'] * 3600, tz=dt_timezone.utc))
+    return {
+        'hora': inicio.isoformat(),
+        'puntos_gps': hora['puntos_gps'],
+        'distancia_km': round(hora['distancia_km'], 2),
+        'velocidad_maxima': hora['velocidad_maxima'],
+        'velocidad_promedio': round(hora['velocidad_promedio'], 2),
+        'tiempo_detenido_minutos': round(hora['segundos_detenido'] / 60, 2),
+        'tiempo_movimiento_minutos': round(hora['segundos_movimiento'] / 60, 2),
+    }
+
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = (math.sin(dlat / 2) ** 2
+         + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2)
+    return RADIO_TIERRA_KM * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def _indice_rango(velocidad: int) -> int:
+    for indice, limite in enumerate(_LIMITES):
+        if velocidad <= limite:
+            return indice
+    return len(_LIMITES)
+
+
+class AcumuladorEstadisticas:
+    """
+    Mismas estadísticas punto a punto, sin guardar las filas.
+
+    Es el cálculo sin numpy y el que usan las exportaciones en streaming:
+    la memoria queda acotada por la cantidad de horas del recorrido.
+    """
+
+    def __init__(self):
+        self.fecha_inicio = None
+        self.fecha_fin = None
+        self.puntos = 0
+        self._rangos = [0] * len(RANGOS_VELOCIDAD)
+        self._por_hora: Dict[int, Dict] = {}
+        self._distancia = self._segundos_detenido = self._segundos_movimiento = 0.0
+        self._suma_vel = self._cantidad_vel = 0
+        self._velocidad_maxima = None
+        self._detenciones = 0
+        # Punto anterior: (segundos, lat, lon, detenido, hora)
+        self._anterior = None
+
+    def agregar(self, fec_gps: Optional[datetime], lat, lon, velocidad: Optional[int]):
+        """Agregar la siguiente posición del recorrido (ordenado por fec_gps)"""
+        if fec_gps is None:
+            return
+        if self.fecha_inicio is None:
+            self.fecha_inicio = fec_gps
+        self.fecha_fin = fec_gps
+        self._agregar(fec_gps.timestamp(), _coordenada(lat), _coordenada(lon), velocidad)
+
+    def _agregar(self, segundos: float, lat: Optional[float], lon: Optional[float],
+                 velocidad: Optional[int]):
+        self.puntos += 1
+        detenido = velocidad is None or velocidad <= VELOCIDAD_DETENIDO
+
+        # Tramo desde el punto anterior, asignado al estado y la hora de ese punto
+        anterior = self._anterior
+        if anterior is not None:
+            seg_ant, lat_ant, lon_ant, detenido_ant, hora_ant = anterior
+            dt = segundos - seg_ant
+            if detenido_ant:
+                self._segundos_detenido += dt
+                hora_ant['segundos_detenido'] += dt
+            else:
+                self._segundos_movimiento += dt
+                hora_ant['segundos_movimiento'] += dt
+            if None not in (lat_ant, lon_ant, lat, lon):
+                distancia = _haversine_km(lat_ant, lon_ant, lat, lon)
+                self._distancia += distancia
+                hora_ant['distancia_km'] += distancia
+        if detenido and (anterior is None or not anterior[3]):
+            self._detenciones += 1
+
+        clave = int(segundos // 3600)
+        hora = self._por_hora.get(clave)
+        if hora is None:
+            hora = self._por_hora[clave] = {
+                'hora': clave, 'puntos_gps': 0, 'distancia_km': 0.0, 'velocidad_maxima': 0,
+                'suma_vel': 0, 'cantidad_vel': 0, 'segundos_detenido': 0.0, 'segundos_movimiento': 0.0,
+            }
+        hora['puntos_gps'] += 1
+
+        if velocidad is not None:
+            self._suma_vel += velocidad
+            self._cantidad_vel += 1
+            if self._velocidad_maxima is None or velocidad > self._velocidad_maxima:
+                self._velocidad_maxima = velocidad
+            self._rangos[_indice_rango(velocidad)] += 1
+            hora['suma_vel'] += velocidad
+            hora['cantidad_vel'] += 1
+            hora['velocidad_maxima'] = max(hora['velocidad_maxima'], velocidad)
+
+        self._anterior = (segundos, lat, lon, detenido, hora)
+
+    def _resumen(self) -> Dict:
+        por_hora = []
+        for clave in sorted(self._por_hora):
+            hora = dict(self._por_hora[clave])
+            cantidad_vel = hora.pop('cantidad_vel')
+            suma_vel = hora.pop('suma_vel')
+            hora['velocidad_promedio'] = suma_vel / cantidad_vel if cantidad_vel else 0
+            por_hora.append(hora)
+
+        return {
+            'distancia_km': self._distancia,
+            'velocidad_maxima': self._velocidad_maxima or 0,
+            'velocidad_promedio': self._suma_vel / self._cantidad_vel if self._cantidad_vel else 0,
+            'detenciones': self._detenciones,
+            'segundos_detenido': self._segundos_detenido,
+            'segundos_movimiento': self._segundos_movimiento,
+            'rango_velocidades': {nombre: self._rangos[i] for i, (nombre, _) in enumerate(RANGOS_VELOCIDAD)},
+            'por_hora': por_hora,
+        }
+
+    def resultado(self) -> Optional[Dict]:
+        """Mismo formato que calcular_estadisticas(); None si no se agregó ningún punto"""
+        if not self.puntos:
+            return None
+        return _formatear(self.fecha_inicio, self.fecha_fin, self.puntos, self._resumen())
+
+
+def _calcular_python(segundos: Sequence[float], lats: Sequence, lons: Sequence,
+                     velocidades: Sequence) -> Dict:
+    """Cálculo sin numpy sobre columnas (el mismo que hace AcumuladorEstadisticas)"""
+    acumulador = AcumuladorEstadisticas()
+    for i in range(len(segundos)):
+        acumulador._agregar(segundos[i], lats[i], lons[i], velocidades[i])
+    return acumulador._resumen()
+
+
+def _calcular_numpy(segundos: Sequence[float], lats: Sequence, lons: Sequence,
+                    velocidades: Sequence) -> Dict:
+    """Mismo cálculo vectorizado sobre arrays"""
+    t = np.asarray(segundos, dtype=np.float64)
+    lat = np.array(lats, dtype=np.float64)  # None -> nan
+    lon = np.array(lons, dtype=np.float64)
+    vel = np.array(velocidades, dtype=np.float64)
+    hay_vel = ~np.isnan(vel)
+    detenido = ~(vel > VELOCIDAD_DETENIDO)  # nan cuenta como detenido
+
+    # Tramos entre puntos consecutivos (asignados al primer punto)
+    dt = np.diff(t)
+    lat_r, lon_r = np.radians(lat), np.radians(lon)
+    a = (np.sin(np.diff(lat_r) / 2) ** 2
+         + np.cos(lat_r[:-1]) * np.cos(lat_r[1:]) * np.sin(np.diff(lon_r) / 2) ** 2)
+    with np.errstate(invalid='ignore'):
+        distancias = RADIO_TIERRA_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    distancias = np.nan_to_num(distancias, nan=0.0)
+    tramo_detenido = detenido[:-1]
+
+    inicio_detencion = detenido.copy()
+    inicio_detencion[1:] &= ~detenido[:-1]
+
+    vel_validas = vel[hay_vel]
+    rangos = np.bincount(np.searchsorted(_LIMITES, vel_validas, side='left'),
+                         minlength=len(RANGOS_VELOCIDAD))
+
+    # Por hora
+    horas, grupo = np.unique((t // 3600).astype(np.int64), return_inverse=True)
+    cantidad_horas = len(horas)
+    grupo_tramo = grupo[:-1]
+    puntos_hora = np.bincount(grupo, minlength=cantidad_horas)
+    cantidad_vel_hora = np.bincount(grupo[hay_vel], minlength=cantidad_horas)
+    suma_vel_hora = np.bincount(grupo[hay_vel], weights=vel_validas, minlength=cantidad_horas)
+    max_vel_hora = np.zeros(cantidad_horas)
+    np.maximum.at(max_vel_hora, grupo[hay_vel], vel_validas)
+    distancia_hora = np.bincount(grupo_tramo, weights=distancias, minlength=cantidad_horas)
+    detenido_hora = np.bincount(grupo_tramo, weights=np.where(tramo_detenido, dt, 0.0), minlength=cantidad_horas)
+    movimiento_hora = np.bincount(grupo_tramo, weights=np.where(tramo_detenido, 0.0, dt), minlength=cantidad_horas)
+
+    por_hora: List[Dict] = []
+    for i, clave in enumerate(horas.tolist()):
+        por_hora.append({
+            'hora': clave,
+            'puntos_gps': int(puntos_hora[i]),
+            'distancia_km': float(distancia_hora[i]),
+            'velocidad_maxima': int(max_vel_hora[i]),
+            'velocidad_promedio': float(suma_vel_hora[i] / cantidad_vel_hora[i]) if cantidad_vel_hora[i] else 0,
+            'segundos_detenido': float(detenido_hora[i]),
+            'segundos_movimiento': float(movimiento_hora[i]),
+        })
+
+    return {
+        'distancia_km': float(distancias.sum()),
+        'velocidad_maxima': int(vel_validas.max()) if vel_validas.size else 0,
+        'velocidad_promedio': float(vel_validas.mean()) if vel_validas.size else 0,
+        'detenciones': int(inicio_detencion.sum()),
+        'segundos_detenido': float(dt[tramo_detenido].sum()),
+        'segundos_movimiento': float(dt[~tramo_detenido].sum()),
+        'rango_velocidades': {nombre: int(rangos[i]) for i, (nombre, _) in enumerate(RANGOS_VELOCIDAD)},
+        'por_hora': por_hora,
+    }
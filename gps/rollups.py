@@ -0,0 +1,253 @@
+"""
+Resúmenes diarios de recorridos (móvil × día)
+=============================================
+
+Distancia, velocidad máxima, tiempo en movimiento y detenciones se
+recalculaban desde posiciones en cada consulta: "cuánto anduvo cada camión
+esta semana" recorría millones de filas. RecorridoDiario guarda esos
+totales por móvil y día (hora de Argentina), así los reportes de flota leen
+unos cientos de filas.
+
+Mantenimiento incremental (comando actualizar_recorridos_diarios, por cron
+o en bucle): la marca de agua es el mayor `ultima_posicion_id` guardado.
+Cada pasada toma las posiciones con id mayor, de a LOTE_IDS ids, junta los
+pares (móvil, día) que tocaron y recalcula esos días completos con
+gps.recorrido_stats (las posiciones que llegan tarde caen en su día, no en
+el de llegada). Cada lote se guarda en una transacción y solo con
+posiciones hasta el tope del lote, así una pasada interrumpida se retoma
+sin saltear nada.
+
+Los ids se asignan al insertar pero se ven con el commit: un lote del
+write-behind con ids menores puede confirmarse después que otro con ids
+mayores. Por eso cada pasada llega solo hasta la última posición creada
+hace más de MARGEN_COMMIT_SEGUNDOS; lo más nuevo queda para la próxima.
+
+Los tramos que cruzan la medianoche no suman a ningún día (cada día se
+calcula solo con sus posiciones).
+"""
+
+import logging
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from gps.recorrido_stats import calcular_estadisticas
+
+logger = logging.getLogger(__name__)
+
+# Ids de posición por transacción al ponerse al día
+LOTE_IDS = getattr(settings, 'WAYGPS_ROLLUP_LOTE_IDS', 200000)
+
+# Antigüedad mínima (created_at) de una posición para que la marca de agua la pase
+MARGEN_COMMIT_SEGUNDOS = getattr(settings, 'WAYGPS_ROLLUP_MARGEN_SEGUNDOS', 120)
+
+CAMPOS_ROLLUP = ('id', 'fec_gps', 'lat', 'lon', 'velocidad', 'ign_on')
+
+try:
+    from zoneinfo import ZoneInfo
+    TZ_ROLLUP = ZoneInfo(getattr(settings, 'WAYGPS_ROLLUP_TZ', 'America/Argentina/Buenos_Aires'))
+except Exception:
+    TZ_ROLLUP = dt_timezone(timedelta(hours=-3))
+
+
+def dia_local(fec_gps: datetime) -> date:
+    return fec_gps.astimezone(TZ_ROLLUP).date()
+
+
+def rango_dia(fecha: date) -> Tuple[datetime, datetime]:
+    """[inicio, fin) del día en TZ_ROLLUP"""
+    desde = datetime.combine(fecha, time.min, tzinfo=TZ_ROLLUP)
+    return desde, datetime.combine(fecha + timedelta(days=1), time.min, tzinfo=TZ_ROLLUP)
+
+
+def resumir_dia(filas: Sequence[tuple]) -> Optional[Dict]:
+    """
+    Totales de un día a partir de sus posiciones.
+
+    Args:
+        filas: Filas CAMPOS_ROLLUP ordenadas por fec_gps
+
+    Returns:
+        Dict con los campos de RecorridoDiario (salvo movil y fecha), o None si no hay filas con fecha
+    """
+    filas = [fila for fila in filas if fila[1] is not None]
+    estadisticas = calcular_estadisticas([fila[1:5] for fila in filas])
+    if estadisticas is None:
+        return None
+
+    # Igual que el tiempo detenido/en movimiento: cada tramo cuenta con la ignición del primer punto
+    segundos_ignicion = sum(
+        (actual[1] - anterior[1]).total_seconds()
+        for anterior, actual in zip(filas, filas[1:]) if anterior[5]
+    )
+    con_coordenadas = [fila for fila in filas if fila[2] and fila[3]]
+    lats = [fila[2] for fila in con_coordenadas]
+    lons = [fila[3] for fila in con_coordenadas]
+    primera = con_coordenadas[0] if con_coordenadas else (None, None, None, None)
+    ultima = con_coordenadas[-1] if con_coordenadas else (None, None, None, None)
+
+    return {
+        'primera_posicion': estadisticas['fecha_inicio'],
+        'ultima_posicion': estadisticas['fecha_fin'],
+        'primera_lat': primera[2],
+        'primera_lon': primera[3],
+        'ultima_lat': ultima[2],
+        'ultima_lon': ultima[3],
+        'puntos': estadisticas['puntos_gps'],
+        'distancia_km': estadisticas['distancia_km'],
+        'velocidad_maxima': estadisticas['velocidad_maxima'],
+        'velocidad_promedio': estadisticas['velocidad_promedio'],
+        'minutos_movimiento': estadisticas['tiempo_movimiento_minutos'],
+        'minutos_detenido': estadisticas['tiempo_detenido_minutos'],
+        'minutos_ignicion': round(segundos_ignicion / 60, 2),
+        'detenciones': estadisticas['detenciones'],
+        'lat_min': min(lats) if lats else None,
+        'lat_max': max(lats) if lats else None,
+        'lon_min': min(lons) if lons else None,
+        'lon_max': max(lons) if lons else None,
+        'por_hora': estadisticas['estadisticas_por_hora'],
+        'ultima_posicion_id': max(fila[0] for fila in filas),
+    }
+
+
+def marca_de_agua() -> int:
+    """Mayor id de posición ya incluido en los resúmenes"""
+    from gps.models import RecorridoDiario
+    return RecorridoDiario.objects.aggregate(maximo=Max('ultima_posicion_id'))['maximo'] or 0
+
+
+def ultimo_id_confirmado(margen_segundos: float = MARGEN_COMMIT_SEGUNDOS) -> int:
+    """
+    Mayor id de las posiciones creadas hace más de `margen_segundos`.
+
+    Cualquier posición con id menor ya está confirmada (un INSERT tarda
+    mucho menos que el margen), así que la marca de agua puede avanzar hasta
+    acá sin saltear las que todavía no se ven.
+    """
+    from gps.models import Posicion
+
+    limite = timezone.now() - timedelta(seconds=margen_segundos)
+    return Posicion.objects.filter(created_at__lt=limite).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def dias_afectados(queryset) -> List[Tuple[int, date]]:
+    """Pares (movil_id, día) distintos de un queryset de Posicion"""
+    return list(
+        queryset.filter(is_valid=True, movil_id__isnull=False, fec_gps__isnull=False)
+        .annotate(dia=TruncDate('fec_gps', tzinfo=TZ_ROLLUP))
+        .order_by()
+        .values_list('movil_id', 'dia')
+        .distinct()
+    )
+
+
+def actualizar_dia(movil_id: int, fecha: date, hasta_id: int):
+    """
+    Recalcula el resumen de un móvil en un día con sus posiciones de id <= hasta_id.
+
+    Returns:
+        RecorridoDiario actualizado, o None si el día quedó sin posiciones (se borra)
+    """
+    from gps.models import Posicion, RecorridoDiario
+
+    desde, hasta = rango_dia(fecha)
+    filas = list(
+        Posicion.objects.filter(
+            movil_id=movil_id, is_valid=True, fec_gps__gte=desde, fec_gps__lt=hasta, id__lte=hasta_id,
+        ).order_by('fec_gps', 'id').values_list(*CAMPOS_ROLLUP)
+    )
+    resumen = resumir_dia(filas)
+    if resumen is None:
+        RecorridoDiario.objects.filter(movil_id=movil_id, fecha=fecha).delete()
+        return None
+    rollup, _ = RecorridoDiario.objects.update_or_create(movil_id=movil_id, fecha=fecha, defaults=resumen)
+    return rollup
+
+
+def actualizar_pendientes(lote_ids: int = LOTE_IDS, margen_segundos: float = MARGEN_COMMIT_SEGUNDOS) -> Dict:
+    """
+    Pone al día los resúmenes con las posiciones nuevas desde la marca de agua
+    (hasta las creadas hace margen_segundos, ver ultimo_id_confirmado).
+
+    Returns:
+        {'dias': días recalculados, 'desde_id', 'hasta_id'}
+    """
+    from gps.models import Posicion
+
+    desde_id = inicio = marca_de_agua()
+    ultimo_id = ultimo_id_confirmado(margen_segundos)
+    dias = 0
+    while desde_id < ultimo_id:
+        tope = min(desde_id + lote_ids, ultimo_id)
+        with transaction.atomic():
+            pendientes = dias_afectados(Posicion.objects.filter(id__gt=desde_id, id__lte=tope))
+            for movil_id, fecha in pendientes:
+                actualizar_dia(movil_id, fecha, tope)
+        dias += len(pendientes)
+        desde_id = tope
+    if dias:
+        logger.info(f"📅 {dias} recorridos diarios actualizados (posiciones {inicio + 1}-{ultimo_id})")
+    return {'dias': dias, 'desde_id': inicio, 'hasta_id': ultimo_id}
+
+
+def reconstruir(desde: date, hasta: date, movil_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recalcula los días [desde, hasta] (p. ej. después de corregir posiciones).
+
+    Solo usa posiciones hasta la marca de agua, para no adelantarla: las más
+    nuevas las toma la próxima actualizar_pendientes().
+
+    Returns:
+        Cantidad de días recalculados
+    """
+    from gps.models import Posicion
+
+    hasta_id = marca_de_agua()
+    queryset = Posicion.objects.filter(
+        fec_gps__gte=rango_dia(desde)[0], fec_gps__lt=rango_dia(hasta)[1], id__lte=hasta_id,
+    )
+    if movil_ids:
+        queryset = queryset.filter(movil_id__in=list(movil_ids))
+    pendientes = dias_afectados(queryset)
+    for movil_id, fecha in pendientes:
+        with transaction.atomic():
+            actualizar_dia(movil_id, fecha, hasta_id)
+    return len(pendientes)
+
+
+def resumen_flota(desde: date, hasta: date, movil_ids: Optional[Iterable[int]] = None) -> List[Dict]:
+    """
+    Totales por móvil entre dos fechas (inclusive), leyendo solo RecorridoDiario.
+
+    Returns:
+        Una fila por móvil ordenadas por distancia: movil_id, patente, alias,
+        dias, puntos, distancia_km, velocidad_maxima, minutos_movimiento,
+        minutos_detenido, minutos_ignicion, detenciones, primera_posicion,
+        ultima_posicion
+    """
+    from gps.models import RecorridoDiario
+
+    queryset = RecorridoDiario.objects.filter(fecha__gte=desde, fecha__lte=hasta)
+    if movil_ids:
+        queryset = queryset.filter(movil_id__in=list(movil_ids))
+    return list(
+        queryset.values('movil_id', patente=F('movil__patente'), alias=F('movil__alias'))
+        .annotate(
+            dias=Count('id'),
+            puntos=Sum('puntos'),
+            distancia_km=Sum('distancia_km'),
+            velocidad_maxima=Max('velocidad_maxima'),
+            minutos_movimiento=Sum('minutos_movimiento'),
+            minutos_detenido=Sum('minutos_detenido'),
+            minutos_ignicion=Sum('minutos_ignicion'),
+            detenciones=Sum('detenciones'),
+            primera_posicion=Min('primera_posicion'),
+            ultima_posicion=Max('ultima_posicion'),
+        )
+        .order_by('-distancia_km')
+    )
@@ -0,0 +1,264 @@
+"""
+Segmentación de recorridos en viajes y detenciones
+==================================================
+
+Las detenciones se aproximaban contando posiciones con velocidad <= 5 y
+las consultas de paradas recorrían posiciones crudas. Acá el recorrido de
+cada móvil se corta en segmentos alternados que se guardan en
+SegmentoRecorrido, así "paradas de ayer" o "viajes de la semana" son una
+consulta por índice (movil, inicio).
+
+Criterios (umbrales configurables en settings):
+
+- Un punto está quieto si su velocidad es <= VELOCIDAD_DETENIDO (o nula).
+  La ignición no decide (muchos equipos no la tienen cableada), solo se
+  informa como segundos_ignicion de cada segmento (ralentí en detenciones).
+- Detención: racha de puntos quietos a menos de RADIO_DETENCION_M del
+  primero que dura al menos DETENCION_MINIMA_SEGUNDOS.
+- Dos detenciones separadas por menos de VIAJE_MINIMO_KM se unen en una
+  (deriva del GPS, maniobras en el lugar).
+- Viaje: lo que queda entre detenciones. Comparte el punto de borde con la
+  detención anterior y la siguiente, así los segmentos quedan contiguos.
+
+El último segmento de cada móvil queda `abierto` y se rehace cuando llegan
+posiciones nuevas (comando segmentar_recorridos, misma marca de agua por id
+y mismo margen para los commits tardíos que gps.rollups).
+"""
+
+import logging
+import math
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
+
+from gps.recorrido_stats import VELOCIDAD_DETENIDO, RADIO_TIERRA_KM
+from gps.rollups import MARGEN_COMMIT_SEGUNDOS, ultimo_id_confirmado
+
+logger = logging.getLogger(__name__)
+
+DETENCION_MINIMA_SEGUNDOS = getattr(settings, 'WAYGPS_DETENCION_MINIMA_SEGUNDOS', 180)
+RADIO_DETENCION_M = getattr(settings, 'WAYGPS_RADIO_DETENCION_M', 100)
+VIAJE_MINIMO_KM = getattr(settings, 'WAYGPS_VIAJE_MINIMO_KM', 0.2)
+
+# Ids de posición por transacción y filas por lectura al resegmentar un móvil
+LOTE_IDS = getattr(settings, 'WAYGPS_SEGMENTOS_LOTE_IDS', 200000)
+MAX_FILAS = 200000
+
+CAMPOS_SEGMENTACION = ('id', 'fec_gps', 'lat', 'lon', 'velocidad', 'ign_on', 'direccion')
+
+DETENCION = 'detencion'
+VIAJE = 'viaje'
+
+
+def _distancia_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = (math.sin(dlat / 2) ** 2
+         + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2)
+    return RADIO_TIERRA_KM * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def _quieto(fila) -> bool:
+    return fila[4] is None or fila[4] <= VELOCIDAD_DETENIDO
+
+
+def segmentar(filas: Sequence[tuple], detencion_minima: float = DETENCION_MINIMA_SEGUNDOS,
+              radio_m: float = RADIO_DETENCION_M, viaje_minimo_km: float = VIAJE_MINIMO_KM) -> List[Dict]:
+    """
+    Cortar un recorrido en viajes y detenciones.
+
+    Args:
+        filas: Filas CAMPOS_SEGMENTACION de un móvil ordenadas por fec_gps
+        detencion_minima: Segundos mínimos de una detención
+        radio_m: Radio (metros) dentro del cual los puntos quietos son la misma detención
+        viaje_minimo_km: Viajes más cortos entre dos detenciones se absorben en una sola
+
+    Returns:
+        Segmentos en orden (dicts con los campos de SegmentoRecorrido salvo movil y abierto)
+    """
+    filas = [fila for fila in filas if fila[1] is not None and fila[2] and fila[3]]
+    n = len(filas)
+    lats = [float(fila[2]) for fila in filas]
+    lons = [float(fila[3]) for fila in filas]
+    # acumulada[i]: km desde el primer punto hasta el i
+    acumulada = [0.0] * n
+    for i in range(1, n):
+        acumulada[i] = acumulada[i - 1] + _distancia_km(lats[i - 1], lons[i - 1], lats[i], lons[i])
+
+    detenciones: List[List[int]] = []
+    radio_km = radio_m / 1000.0
+    i = 0
+    while i < n:
+        if not _quieto(filas[i]):
+            i += 1
+            continue
+        j = i
+        while (j + 1 < n and _quieto(filas[j + 1])
+               and _distancia_km(lats[i], lons[i], lats[j + 1], lons[j + 1]) <= radio_km):
+            j += 1
+        if (filas[j][1] - filas[i][1]).total_seconds() >= detencion_minima:
+            if detenciones and acumulada[i] - acumulada[detenciones[-1][1]] < viaje_minimo_km:
+                detenciones[-1][1] = j
+            else:
+                detenciones.append([i, j])
+        i = j + 1
+
+    segmentos = []
+    borde = 0
+    for inicio, fin in detenciones:
+        if inicio > borde:
+            segmentos.append(_segmento(VIAJE, filas, lats, lons, acumulada, borde, inicio))
+        segmentos.append(_segmento(DETENCION, filas, lats, lons, acumulada, inicio, fin))
+        borde = fin
+    if borde < n - 1:
+        segmentos.append(_segmento(VIAJE, filas, lats, lons, acumulada, borde, n - 1))
+    return segmentos
+
+
+def _segmento(tipo: str, filas, lats, lons, acumulada, a: int, b: int) -> Dict:
+    tramo = filas[a:b + 1]
+    velocidades = [fila[4] for fila in tramo if fila[4] is not None]
+    segundos_ignicion = sum(
+        (actual[1] - anterior[1]).total_seconds()
+        for anterior, actual in zip(tramo, tramo[1:]) if anterior[5]
+    )
+    if tipo == DETENCION:
+        # La dirección de cualquier punto de la detención sirve
+        direcciones = [fila[6] for fila in tramo if fila[6]]
+        direccion_inicio = direcciones[0] if direcciones else None
+        direccion_fin = direcciones[-1] if direcciones else None
+    else:
+        direccion_inicio, direccion_fin = tramo[0][6] or None, tramo[-1][6] or None
+
+    return {
+        'tipo': tipo,
+        'inicio': tramo[0][1],
+        'fin': tramo[-1][1],
+        'duracion_segundos': int((tramo[-1][1] - tramo[0][1]).total_seconds()),
+        'puntos': len(tramo),
+        'posicion_inicio_id': tramo[0][0],
+        'posicion_fin_id': tramo[-1][0],
+        'ultima_posicion_id': max(fila[0] for fila in tramo),
+        'lat_inicio': tramo[0][2],
+        'lon_inicio': tramo[0][3],
+        'lat_fin': tramo[-1][2],
+        'lon_fin': tramo[-1][3],
+        'lat_centro': round(sum(lats[a:b + 1]) / len(tramo), 7),
+        'lon_centro': round(sum(lons[a:b + 1]) / len(tramo), 7),
+        'distancia_km': round(acumulada[b] - acumulada[a], 3),
+        'velocidad_maxima': max(velocidades) if velocidades else 0,
+        'velocidad_promedio': round(sum(velocidades) / len(velocidades), 2) if velocidades else 0,
+        'segundos_ignicion': int(segundos_ignicion),
+        'direccion_inicio': direccion_inicio,
+        'direccion_fin': direccion_fin,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Persistencia incremental
+# ---------------------------------------------------------------------------
+
+def marca_de_agua() -> int:
+    """Mayor id de posición ya incluido en algún segmento"""
+    from gps.models import SegmentoRecorrido
+    return SegmentoRecorrido.objects.aggregate(maximo=Max('ultima_posicion_id'))['maximo'] or 0
+
+
+def resegmentar(movil_id: int, desde: datetime, hasta_id: int) -> int:
+    """
+    Rehace los segmentos del móvil a partir de `desde` con sus posiciones de id <= hasta_id.
+
+    Arranca en el inicio del segmento que contiene `desde` (o del último, si
+    `desde` es posterior), así un viaje o una detención en curso se extiende
+    en vez de cortarse.
+
+    Returns:
+        Cantidad de segmentos guardados
+    """
+    from gps.models import Posicion, SegmentoRecorrido
+
+    segmentos_movil = SegmentoRecorrido.objects.filter(movil_id=movil_id)
+    previo = (segmentos_movil.filter(fin__gte=desde).order_by('inicio').first()
+              or segmentos_movil.order_by('-inicio').first())
+    inicio = min(previo.inicio, desde) if previo else desde
+    segmentos_movil.filter(inicio__gte=inicio).delete()
+
+    posiciones = Posicion.objects.filter(
+        movil_id=movil_id, is_valid=True, id__lte=hasta_id,
+    ).order_by('fec_gps', 'id')
+    guardados = 0
+    while True:
+        filas = list(posiciones.filter(fec_gps__gte=inicio).values_list(*CAMPOS_SEGMENTACION)[:MAX_FILAS])
+        segmentos = segmentar(filas)
+        completo = len(filas) < MAX_FILAS
+        siguiente = None
+        if not completo:
+            if len(segmentos) > 1 and segmentos[-1]['inicio'] > inicio:
+                # El último segmento puede seguir en las filas que faltan: se retoma desde su inicio
+                siguiente = segmentos.pop()['inicio']
+            else:
+                # Un solo segmento de más de MAX_FILAS filas (o ninguno): se corta al final de la lectura
+                siguiente = segmentos[-1]['fin'] if segmentos else filas[-1][1]
+        SegmentoRecorrido.objects.bulk_create([
+            SegmentoRecorrido(movil_id=movil_id, abierto=completo and k == len(segmentos) - 1, **segmento)
+            for k, segmento in enumerate(segmentos)
+        ])
+        guardados += len(segmentos)
+        if siguiente is None or siguiente <= inicio:
+            return guardados
+        inicio = siguiente
+
+
+def actualizar_pendientes(lote_ids: int = LOTE_IDS, margen_segundos: float = MARGEN_COMMIT_SEGUNDOS) -> Dict:
+    """
+    Segmenta las posiciones nuevas desde la marca de agua, de a lote_ids ids por
+    transacción, hasta las creadas hace margen_segundos (ver rollups.ultimo_id_confirmado).
+
+    Returns:
+        {'moviles': resegmentaciones hechas, 'desde_id', 'hasta_id'}
+    """
+    from gps.models import Posicion
+
+    desde_id = inicio = marca_de_agua()
+    ultimo_id = ultimo_id_confirmado(margen_segundos)
+    moviles = 0
+    while desde_id < ultimo_id:
+        tope = min(desde_id + lote_ids, ultimo_id)
+        with transaction.atomic():
+            pendientes = list(
+                Posicion.objects.filter(
+                    id__gt=desde_id, id__lte=tope, is_valid=True,
+                    movil_id__isnull=False, fec_gps__isnull=False,
+                ).order_by().values('movil_id').annotate(desde=Min('fec_gps')).values_list('movil_id', 'desde')
+            )
+            for movil_id, desde in pendientes:
+                resegmentar(movil_id, desde, tope)
+        moviles += len(pendientes)
+        desde_id = tope
+    if moviles:
+        logger.info(f"🛑 Segmentos actualizados para {moviles} móviles (posiciones {inicio + 1}-{ultimo_id})")
+    return {'moviles': moviles, 'desde_id': inicio, 'hasta_id': ultimo_id}
+
+
+def reconstruir(movil_id: int, desde: datetime) -> int:
+    """Rehace los segmentos de un móvil desde una fecha, con posiciones hasta la marca de agua"""
+    with transaction.atomic():
+        return resegmentar(movil_id, desde, marca_de_agua())
+
+
+def segmentos_periodo(movil_id: int, desde: Optional[datetime], hasta: Optional[datetime],
+                      tipo: Optional[str] = None):
+    """Segmentos del móvil que se superponen con [desde, hasta]"""
+    from gps.models import SegmentoRecorrido
+
+    queryset = SegmentoRecorrido.objects.filter(movil_id=movil_id)
+    if desde:
+        queryset = queryset.filter(fin__gte=desde)
+    if hasta:
+        queryset = queryset.filter(inicio__lte=hasta)
+    if tipo:
+        queryset = queryset.filter(tipo=tipo)
+    return queryset.order_by('inicio')
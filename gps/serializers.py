@@ -1,7 +1,15 @@
+from datetime import timedelta, timezone as dt_timezone
+
 from rest_framework import serializers
-from .models import Equipo, Posicion, CatMovil, TipoEquipoGPS, ConfiguracionReceptor, EstadisticasRecepcion
+from .models import Equipo, Posicion, CatMovil, TipoEquipoGPS, ConfiguracionReceptor, EstadisticasRecepcion, SegmentoRecorrido
 from moviles.models import Movil, MovilStatus, MovilGeocode, MovilObservacion, MovilFoto, MovilNota
 
+try:
+    from zoneinfo import ZoneInfo
+    TZ_ARGENTINA = ZoneInfo('America/Argentina/Buenos_Aires')
+except ImportError:
+    TZ_ARGENTINA = dt_timezone(timedelta(hours=-3))
+
 
 class MovilSerializer(serializers.ModelSerializer):
     equipo_gps_info = serializers.SerializerMethodField(read_only=True)
@@ -362,6 +370,24 @@ class PosicionSerializer(serializers.ModelSerializer):
         return fecha_argentina.isoformat()
 
 
+def timestamp_argentina(fec_gps):
+    """fec_gps en ISO 8601 con zona horaria de Argentina (UTC-3), o None"""
+    if not fec_gps:
+        return None
+    
+    # IMPORTANTE: El datetime en la BD está guardado como UTC pero con valor ajustado
+    # (sumamos 3 horas al valor de Argentina antes de guardar)
+    # Para obtener la hora correcta de Argentina, convertimos de UTC a Argentina
+    if fec_gps.tzinfo:
+        # Si tiene timezone (UTC), convertir a Argentina (resta 3 horas automáticamente)
+        fecha_argentina = fec_gps.astimezone(TZ_ARGENTINA)
+    else:
+        # Si es "naive", Django lo interpreta como UTC, convertir a Argentina
+        fecha_argentina = fec_gps.replace(tzinfo=dt_timezone.utc).astimezone(TZ_ARGENTINA)
+    
+    return fecha_argentina.isoformat()
+
+
 class PosicionRecorridoSerializer(serializers.ModelSerializer):
     """Serializer liviano para recorridos (solo campos necesarios para UI)."""
 
@@ -394,27 +420,7 @@ class PosicionRecorridoSerializer(serializers.ModelSerializer):
 
     def get_timestamp(self, obj):
         """Devolver timestamp en zona horaria de Argentina (UTC-3)"""
-        if not obj.fec_gps:
-            return None
-        
-        try:
-            from zoneinfo import ZoneInfo
-            tz_argentina = ZoneInfo('America/Argentina/Buenos_Aires')
-        except ImportError:
-            from datetime import timezone, timedelta
-            tz_argentina = timezone(timedelta(hours=-3))
-        
-        # IMPORTANTE: El datetime en la BD está guardado como UTC pero con valor ajustado
-        # (sumamos 3 horas al valor de Argentina antes de guardar)
-        # Para obtener la hora correcta de Argentina, convertimos de UTC a Argentina
-        if obj.fec_gps.tzinfo:
-            # Si tiene timezone (UTC), convertir a Argentina (resta 3 horas automáticamente)
-            fecha_argentina = obj.fec_gps.astimezone(tz_argentina)
-        else:
-            # Si es "naive", Django lo interpreta como UTC, convertir a Argentina
-            fecha_argentina = obj.fec_gps.replace(tzinfo=dt_timezone.utc).astimezone(tz_argentina)
-        
-        return fecha_argentina.isoformat()
+        return timestamp_argentina(obj.fec_gps)
 
     def get_satelites(self, obj):
         return obj.sats
@@ -429,19 +435,43 @@ class RecorridoStatsSerializer(serializers.Serializer):
     movil_info = serializers.DictField()
     fecha_inicio = serializers.DateTimeField()
     fecha_fin = serializers.DateTimeField()
-    duracion_minutos = serializers.IntegerField()
+    duracion_minutos = serializers.FloatField()
     distancia_km = serializers.FloatField()
     velocidad_maxima = serializers.IntegerField()
     velocidad_promedio = serializers.FloatField()
     puntos_gps = serializers.IntegerField()
     detenciones = serializers.IntegerField()
-    tiempo_detenido_minutos = serializers.IntegerField()
-    tiempo_movimiento_minutos = serializers.IntegerField()
+    tiempo_detenido_minutos = serializers.FloatField()
+    tiempo_movimiento_minutos = serializers.FloatField()
     eficiencia_combustible = serializers.FloatField(allow_null=True)
     rango_velocidades = serializers.DictField()
     estadisticas_por_hora = serializers.ListField()
 
 
+class SegmentoRecorridoSerializer(serializers.ModelSerializer):
+    """Viaje o detención de un recorrido (gps/segmentacion.py)"""
+
+    inicio_local = serializers.SerializerMethodField(read_only=True)
+    fin_local = serializers.SerializerMethodField(read_only=True)
+
+    class Meta:
+        model = SegmentoRecorrido
+        fields = [
+            'id', 'movil', 'tipo', 'inicio', 'fin', 'inicio_local', 'fin_local',
+            'duracion_segundos', 'puntos', 'posicion_inicio_id', 'posicion_fin_id',
+            'lat_inicio', 'lon_inicio', 'lat_fin', 'lon_fin', 'lat_centro', 'lon_centro',
+            'distancia_km', 'velocidad_maxima', 'velocidad_promedio', 'segundos_ignicion',
+            'direccion_inicio', 'direccion_fin', 'abierto',
+        ]
+        read_only_fields = fields
+
+    def get_inicio_local(self, obj):
+        return timestamp_argentina(obj.inicio)
+
+    def get_fin_local(self, obj):
+        return timestamp_argentina(obj.fin)
+
+
 class RecorridoFiltrosSerializer(serializers.Serializer):
     """Serializer para filtros de recorridos"""
     movil_id = serializers.IntegerField(required=False)
@@ -2,23 +2,23 @@
 Servicios para GPS - Geocodificación automática
 """
 
-import requests
 import time
 from django.utils import timezone
 from django.db import transaction
 from typing import Optional, Dict, Any
 
+from . import geo_http
+from .geocode_cache import geocode_cache
+
 class GeocodingService:
     """
     Servicio para geocodificación automática usando OpenStreetMap Nominatim
     """
     
     def __init__(self):
-        self.base_url = "https://nominatim.openstreetmap.org/reverse"
-        self.headers = {
-            'User-Agent': 'WayGPS/1.0 (contact@waygps.com)'
-        }
-        self.rate_limit_delay = 1  # 1 segundo entre llamadas
+        # Sesión, rate limit (WAYGPS_GEOCODE_CONSULTAS_POR_SEGUNDO) y reintentos en gps.geo_http
+        self.cliente = geo_http.nominatim
+        self.rate_limit_delay = self.cliente.intervalo
     
     def geocodificar_coordenadas(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
         """
@@ -32,29 +32,10 @@ class GeocodingService:
             Diccionario con datos de geocodificación o None si hay error
         """
         try:
-            # Parámetros para la consulta
-            params = {
-                'format': 'json',
-                'lat': lat,
-                'lon': lon,
-                'zoom': 18,
-                'addressdetails': 1,
-                'accept-language': 'es'
-            }
-            
-            print(f"Geocodificando coordenadas: {lat}, {lon}")
-            
-            # Hacer la consulta a la API
-            response = requests.get(
-                self.base_url, 
-                params=params, 
-                headers=self.headers, 
-                timeout=10
-            )
+            # Cache compartido por celda geohash: solo consulta a la API si la celda es nueva
+            data = geocode_cache.obtener(lat, lon, self._consultar_nominatim)
             
-            if response.status_code == 200:
-                data = response.json()
-                
+            if data:
                 if 'address' in data:
                     address = data['address']
                     
@@ -77,8 +58,8 @@ class GeocodingService:
                     fuente_geocodificacion = 'OpenStreetMap Nominatim'
                     confianza_geocodificacion = 0.8  # Asumimos buena confianza para OSM
                     
-                    # Calcular geohash simple (truncado para el campo)
-                    geohash = f"{lat:.2f},{lon:.2f}"
+                    # Celda geohash del punto (misma clave que el cache)
+                    geohash = geocode_cache.geohash(lat, lon)
                     
                     return {
                         'direccion_formateada': direccion_formateada,
@@ -101,13 +82,37 @@ class GeocodingService:
                     print(f"No se encontró información de dirección para {lat}, {lon}")
                     return None
             else:
-                print(f"Error en geocodificación: {response.status_code}")
                 return None
                 
         except Exception as e:
             print(f"Error en geocodificación: {e}")
             return None
     
+    def _consultar_nominatim(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
+        """
+        Consulta cruda a Nominatim (solo se llama ante un miss del cache)
+        
+        Returns:
+            Respuesta JSON de la API o None si hay error
+        """
+        params = {
+            'format': 'json',
+            'lat': lat,
+            'lon': lon,
+            'zoom': 18,
+            'addressdetails': 1,
+            'accept-language': 'es'
+        }
+        
+        print(f"Geocodificando coordenadas: {lat}, {lon}")
+        
+        response = self.cliente.get('/reverse', params=params, timeout=10)
+        
+        if response.status_code != 200:
+            print(f"Error en geocodificación: {response.status_code}")
+            return None
+        return response.json()
+    
     def actualizar_geocodificacion_movil(self, movil_id: int) -> bool:
         """
         Actualizar geocodificación para un móvil específico
@@ -2,58 +2,61 @@
 Señales Django para geocodificación automática
 """
 
-from django.db.models.signals import post_save
+from datetime import timedelta
+
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.db import transaction
-from moviles.models import MovilStatus, MovilGeocode
-from .services import geocoding_service
+from django.utils import timezone
+from moviles.models import Movil, MovilStatus, MovilGeocode
+from .models import Equipo
+from .device_registry import device_registry
+from .geocode_worker import geocode_worker
+
+@receiver(post_save, sender=Movil)
+@receiver(post_delete, sender=Movil)
+@receiver(post_save, sender=Equipo)
+@receiver(post_delete, sender=Equipo)
+def invalidar_registro_equipos(sender, instance, **kwargs):
+    """
+    Invalidar el registro en memoria gps_id -> móvil cuando cambia un móvil
+    o un equipo (alta, baja, cambio de gps_id/IMEI, patente o empresa).
+    El registro se recarga completo en el próximo acceso.
+    """
+    device_registry.invalidar()
 
 @receiver(post_save, sender=MovilStatus)
 def actualizar_geocodificacion_automatica(sender, instance, created, **kwargs):
     """
     Señal que se ejecuta automáticamente cuando se actualiza MovilStatus
-    Si las coordenadas han cambiado, geocodifica automáticamente
+    Si las coordenadas están presentes y el móvil no tiene una
+    geocodificación reciente, encola la geocodificación en el worker (nunca
+    llama al geocodificador dentro de la transacción del save). Fuera del
+    proceso del receptor el worker no corre y no se encola nada.
     """
     
-    # Solo procesar si no es una creación inicial o si las coordenadas están presentes
-    if created and (not instance.ultimo_lat or not instance.ultimo_lon):
-        return
-    
     # Verificar si las coordenadas están presentes
     if not instance.ultimo_lat or not instance.ultimo_lon:
         return
     
+    if not geocode_worker.activo:
+        return
+    
     try:
-        # Obtener el móvil asociado
-        movil = instance.movil
-        
-        # Verificar si ya tiene geocodificación reciente (últimas 24 horas)
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        try:
-            geocode = movil.geocode
-            if geocode.fecha_geocodificacion:
-                # Si la geocodificación es reciente, no volver a geocodificar
-                tiempo_diferencia = timezone.now() - geocode.fecha_geocodificacion
-                if tiempo_diferencia < timedelta(hours=24):
-                    print(f"Geocodificación reciente para móvil {movil.patente}, omitiendo")
-                    return
-        except MovilGeocode.DoesNotExist:
-            pass  # No hay geocodificación, proceder
-        
-        # Ejecutar geocodificación en una transacción separada para evitar bloqueos
-        def geocodificar_async():
-            try:
-                print(f"Geocodificación automática para móvil {movil.patente}")
-                geocoding_service.actualizar_geocodificacion_movil(movil.id)
-            except Exception as e:
-                print(f"Error en geocodificación automática para móvil {movil.patente}: {e}")
+        # Si la geocodificación es reciente (últimas 24 horas), no volver a geocodificar
+        reciente = MovilGeocode.objects.filter(
+            movil_id=instance.movil_id,
+            fecha_geocodificacion__gte=timezone.now() - timedelta(hours=24)
+        ).exists()
+        if reciente:
+            return
         
-        # Ejecutar en transacción separada
-        with transaction.atomic():
-            geocodificar_async()
-            
+        # El worker coalesce por móvil: si el receptor ya encoló este punto no se repite
+        geocode_worker.encolar(
+            instance.id_ultima_posicion,
+            instance.ultimo_lat,
+            instance.ultimo_lon,
+            movil_id=instance.movil_id
+        )
     except Exception as e:
         print(f"Error en señal de geocodificación automática: {e}")
 
@@ -0,0 +1,162 @@
+"""
+Simplificación de recorridos para el mapa (nivel de detalle)
+============================================================
+
+Con vista_mapa=true el listado devolvía hasta 100.000 posiciones
+serializadas completas. En el mapa, a un zoom dado, la mayoría de esos
+puntos caen a menos de un píxel de la línea que une a sus vecinos: acá se
+simplifica el recorrido con Douglas-Peucker a una tolerancia en metros
+(derivada del zoom) y se devuelven solo los índices a conservar.
+
+Douglas-Peucker solo mira la geometría, así que antes de simplificar se
+marcan puntos obligatorios que la UI usa aunque no cambien la forma:
+
+- primer y último punto
+- inicio y fin de cada detención (velocidad <= VELOCIDAD_DETENIDO)
+- cambios de ignición (el punto anterior y el posterior)
+- extremos de velocidad: la máxima del recorrido y los picos/valles
+  locales que se apartan UMBRAL_EXTREMO_VELOCIDAD km/h de sus vecinos
+
+y el algoritmo corre por separado entre cada par de obligatorios.
+"""
+
+import math
+from typing import List, Optional, Sequence
+
+# Dependencia opcional: sin numpy las distancias se calculan punto a punto
+try:
+    import numpy as np
+    NP_AVAILABLE = True
+except Exception:
+    NP_AVAILABLE = False
+    np = None  # type: ignore
+
+VELOCIDAD_DETENIDO = 5
+UMBRAL_EXTREMO_VELOCIDAD = 15
+RADIO_TIERRA_M = 6371000.0
+
+# Metros por píxel en el ecuador a zoom 0 (tiles de 256 px, Web Mercator)
+METROS_POR_PIXEL_Z0 = 156543.03392
+# Fracción de píxel tolerada: por debajo de esto el trazo se ve idéntico
+PIXELES_TOLERANCIA = 0.5
+ZOOM_MAXIMO = 22
+
+
+def tolerancia_para_zoom(zoom: float, latitud: float = 0.0, pixeles: float = PIXELES_TOLERANCIA) -> float:
+    """
+    Tolerancia en metros equivalente a `pixeles` píxeles de pantalla.
+
+    Args:
+        zoom: Nivel de zoom del mapa (0-22)
+        latitud: Latitud de referencia (la escala de Mercator cambia con la latitud)
+        pixeles: Píxeles de tolerancia
+
+    Returns:
+        Tolerancia en metros
+    """
+    zoom = min(max(float(zoom), 0.0), ZOOM_MAXIMO)
+    return pixeles * METROS_POR_PIXEL_Z0 * math.cos(math.radians(latitud)) / (2 ** zoom)
+
+
+def indices_obligatorios(velocidades: Sequence[Optional[int]], igniciones: Sequence[bool]) -> List[int]:
+    """Índices que se conservan siempre (ver docstring del módulo)"""
+    n = len(velocidades)
+    if n == 0:
+        return []
+    obligatorios = {0, n - 1}
+    vel = [v if v is not None else 0 for v in velocidades]
+
+    maxima = max(range(n), key=vel.__getitem__)
+    obligatorios.add(maxima)
+
+    for i in range(1, n):
+        detenido = vel[i] <= VELOCIDAD_DETENIDO
+        if detenido != (vel[i - 1] <= VELOCIDAD_DETENIDO) or igniciones[i] != igniciones[i - 1]:
+            obligatorios.add(i - 1)
+            obligatorios.add(i)
+        if i + 1 < n:
+            anterior, actual, siguiente = vel[i - 1], vel[i], vel[i + 1]
+            if (actual - anterior >= UMBRAL_EXTREMO_VELOCIDAD and actual - siguiente >= UMBRAL_EXTREMO_VELOCIDAD) or \
+                    (anterior - actual >= UMBRAL_EXTREMO_VELOCIDAD and siguiente - actual >= UMBRAL_EXTREMO_VELOCIDAD):
+                obligatorios.add(i)
+
+    return sorted(obligatorios)
+
+
+def simplificar(lats: Sequence[float], lons: Sequence[float], tolerancia_m: float,
+                obligatorios: Sequence[int] = ()) -> List[int]:
+    """
+    Douglas-Peucker entre puntos obligatorios.
+
+    Args:
+        lats: Latitudes (grados)
+        lons: Longitudes (grados)
+        tolerancia_m: Distancia máxima (metros) de un punto descartado al trazo simplificado
+        obligatorios: Índices que se conservan siempre (además del primero y el último)
+
+    Returns:
+        Índices conservados, ordenados
+    """
+    n = len(lats)
+    if n <= 2:
+        return list(range(n))
+
+    # Proyección equirectangular local: alcanza para distancias de unos pocos km
+    lat0 = math.radians(sum(lats) / n)
+    escala_x = RADIO_TIERRA_M * math.cos(lat0)
+    if NP_AVAILABLE:
+        x = np.radians(np.asarray(lons, dtype=np.float64)) * escala_x
+        y = np.radians(np.asarray(lats, dtype=np.float64)) * RADIO_TIERRA_M
+        distancia_maxima = _distancia_maxima_numpy
+    else:
+        x = [math.radians(lon) * escala_x for lon in lons]
+        y = [math.radians(lat) * RADIO_TIERRA_M for lat in lats]
+        distancia_maxima = _distancia_maxima_python
+
+    cortes = sorted({0, n - 1, *(i for i in obligatorios if 0 <= i < n)})
+    conservar = set(cortes)
+    tramos = [(cortes[k], cortes[k + 1]) for k in range(len(cortes) - 1)]
+
+    # Iterativo (con pila) para no depender del límite de recursión
+    while tramos:
+        inicio, fin = tramos.pop()
+        if fin - inicio < 2:
+            continue
+        indice, distancia = distancia_maxima(x, y, inicio, fin)
+        if distancia > tolerancia_m:
+            conservar.add(indice)
+            tramos.append((inicio, indice))
+            tramos.append((indice, fin))
+
+    return sorted(conservar)
+
+
+def _distancia_maxima_numpy(x, y, inicio: int, fin: int):
+    """Punto de (inicio, fin) más alejado del segmento inicio-fin"""
+    px, py = x[inicio + 1:fin], y[inicio + 1:fin]
+    ax, ay, bx, by = x[inicio], y[inicio], x[fin], y[fin]
+    dx, dy = bx - ax, by - ay
+    largo2 = dx * dx + dy * dy
+    if largo2 == 0.0:
+        distancias = np.hypot(px - ax, py - ay)
+    else:
+        t = np.clip(((px - ax) * dx + (py - ay) * dy) / largo2, 0.0, 1.0)
+        distancias = np.hypot(px - (ax + t * dx), py - (ay + t * dy))
+    relativo = int(np.argmax(distancias))
+    return inicio + 1 + relativo, float(distancias[relativo])
+
+
+def _distancia_maxima_python(x, y, inicio: int, fin: int):
+    ax, ay, bx, by = x[inicio], y[inicio], x[fin], y[fin]
+    dx, dy = bx - ax, by - ay
+    largo2 = dx * dx + dy * dy
+    mejor, mejor_distancia = inicio + 1, -1.0
+    for i in range(inicio + 1, fin):
+        if largo2 == 0.0:
+            t = 0.0
+        else:
+            t = min(1.0, max(0.0, ((x[i] - ax) * dx + (y[i] - ay) * dy) / largo2))
+        distancia = math.hypot(x[i] - (ax + t * dx), y[i] - (ay + t * dy))
+        if distancia > mejor_distancia:
+            mejor, mejor_distancia = i, distancia
+    return mejor, mejor_distancia
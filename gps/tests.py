@@ -1,3 +1,1758 @@
-from django.test import TestCase
+# Tests for gps app
+import contextlib
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone as dj_timezone
+
+from . import (codificacion, exportacion, framing, geo_http, geocode_lote, particiones, receiver_manager,
+               recorrido_stats, rollups, segmentacion, simplificacion)
+from .device_registry import DeviceRegistry, EntradaMovil
+from .geocode_cache import GeocodeCache, encode_geohash
+from .geocode_worker import MODO_EXTERNO, GeocodeWorker, LectorPosicionesNuevas, geocode_worker
+from .logging_manager import MAX_BYTES_HEX, ColaLogHandler, HexDiferido, ReceptorLogger
+from .models import Posicion
+from .pagination import codificar_cursor, decodificar_cursor
+from .processors import QueclinkProcessor
+from .receivers import async_tcp_receiver
+from .receivers.async_tcp_receiver import AsyncTCPReceiver
+from .receivers.estadisticas import EstadisticasRecepcionMemoria
+from .receivers.tcp_receiver import TCPReceiver
+from .receivers.write_behind import PosicionWriteBehind
+from .tq_decoder import LARGO_MINIMO, NP_AVAILABLE, decode_tq, decode_tq_lote
+
+# protocolo.py se usa como script (importa `funciones` sin el prefijo gps.)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import protocolo  # noqa: E402
+
+TRAMAS_MUESTRA = [
+    '24207666813312154518092534416956060583529692001126ffffdfff000320a000000000000000df1600000c',
+    '24207666813314301017102534395112060450117700031215ffffdfff000320a000000000000000df1600000c',
+    '24207666813300000001012590595999180595999925536099ffffdfff000320a000000000000000df1600000c',
+]
+
+
+def trama_aleatoria(rnd, solo_digitos=True):
+    """Trama TQ de 45 bytes con campos BCD aleatorios (o nibbles cualquiera)"""
+    nibbles = '0123456789' if solo_digitos else '0123456789abcdef'
+    cuerpo = ''.join(rnd.choice(nibbles) for _ in range(48))
+    return bytes.fromhex('24' + cuerpo + 'ff' * 20)
+
+
+class DecoderTQParidadTest(SimpleTestCase):
+    """decode_tq debe devolver exactamente lo mismo que el camino hex"""
+
+    def setUp(self):
+        self.processor = QueclinkProcessor()
+        rnd = random.Random(20251018)
+        self.tramas = [bytes.fromhex(t) for t in TRAMAS_MUESTRA]
+        self.tramas += [trama_aleatoria(rnd) for _ in range(500)]
+        self.tramas += [trama_aleatoria(rnd, solo_digitos=False) for _ in range(500)]
+
+    def campos_hex(self, trama):
+        hex_str = trama.hex()
+        p = self.processor
+        return {
+            'device_id': p.get_id_ok(hex_str),
+            'hora_gps': p.get_hora_gps_tq(hex_str),
+            'fecha_gps': p.get_fecha_gps_tq(hex_str),
+            'latitud': p.get_lat_chino(hex_str),
+            'longitud': p.get_lon_chino(hex_str),
+            'velocidad_nudos': p.get_vel_chino(hex_str),
+            'rumbo': p.get_rumbo_chino(hex_str),
+        }
+
+    def test_paridad_con_processor(self):
+        for trama in self.tramas:
+            with self.subTest(trama=trama.hex()):
+                self.assertEqual(decode_tq(trama), self.campos_hex(trama))
+
+    def test_paridad_con_protocolo(self):
+        for trama in self.tramas:
+            hex_str = trama.hex()
+            campos = decode_tq(trama)
+            with self.subTest(trama=hex_str):
+                self.assertEqual(campos['latitud'], protocolo.getLATchino(hex_str))
+                self.assertEqual(campos['longitud'], protocolo.getLONchino(hex_str))
+                self.assertEqual(campos['velocidad_nudos'], protocolo.getVELchino(hex_str))
+                self.assertEqual(campos['rumbo'], protocolo.getRUMBOchino(hex_str))
+
+    def test_trama_corta_usa_camino_hex(self):
+        trama = bytes.fromhex(TRAMAS_MUESTRA[0])[:LARGO_MINIMO - 1]
+        self.assertIsNone(decode_tq(trama))
+        self.assertEqual(self.processor.decodificar_campos(trama), self.campos_hex(trama))
+
+    def test_memoryview(self):
+        trama = self.tramas[0]
+        self.assertEqual(decode_tq(memoryview(trama)), decode_tq(trama))
+
+    def test_parse_conserva_formato(self):
+        trama = self.tramas[0]
+        datos = self.processor.parse(trama)
+        self.assertEqual(datos['imei'], '68133')
+        self.assertEqual(datos['raw_data'], TRAMAS_MUESTRA[0])
+        self.assertEqual(datos['latitud'], self.processor.get_lat_chino(TRAMAS_MUESTRA[0]))
+        self.assertEqual(datos['rumbo'], 126)
+
+    def test_lote(self):
+        tramas = self.tramas + [self.tramas[0][:10]]
+        columnas = decode_tq_lote(tramas)
+        self.assertEqual(len(columnas['latitud']), len(tramas))
+        self.assertFalse(columnas['completa'][-1])
+
+        for i, trama in enumerate(self.tramas):
+            esperado = self.campos_hex(trama)
+            with self.subTest(trama=trama.hex()):
+                self.assertTrue(columnas['completa'][i])
+                self.assertEqual(columnas['device_id'][i], esperado['device_id'])
+                # np.round redondea escalando por 10^7 y puede diferir de
+                # round() en el séptimo decimal (~1 cm)
+                self.assertAlmostEqual(float(columnas['latitud'][i]), esperado['latitud'], delta=2e-7)
+                self.assertAlmostEqual(float(columnas['longitud'][i]), esperado['longitud'], delta=2e-7)
+                self.assertEqual(int(columnas['velocidad_nudos'][i]), esperado['velocidad_nudos'])
+                self.assertEqual(int(columnas['rumbo'][i]), esperado['rumbo'])
+
+    def test_lote_sin_numpy(self):
+        from . import tq_decoder
+        if not NP_AVAILABLE:
+            self.skipTest('numpy no instalado: decode_tq_lote ya usa el modo Python')
+        python = tq_decoder._decode_lote_python(self.tramas)
+        vectorizado = decode_tq_lote(self.tramas)
+        self.assertEqual(python['device_id'], vectorizado['device_id'])
+        self.assertEqual(python['rumbo'], [int(v) for v in vectorizado['rumbo']])
+        self.assertEqual(python['hora'], [int(v) for v in vectorizado['hora']])
+
+
+class FramingTest(SimpleTestCase):
+    """Framing de streams TCP (gps/framing.py)"""
+
+    def setUp(self):
+        self.tramas = [bytes.fromhex(t) for t in TRAMAS_MUESTRA]
+
+    def test_trama_binaria_tq_de_45_bytes(self):
+        framer = framing.TQFramer()
+        self.assertEqual(len(self.tramas[0]), 45)
+        self.assertEqual(framer.feed(self.tramas[0]), [self.tramas[0]])
+        self.assertEqual(framer.pendientes(), 0)
+        # Los bytes 0x24/0x2A/0x2B dentro del cuerpo no cortan la trama
+        self.assertEqual(framer.feed(self.tramas[0][:44]), [])
+        self.assertEqual(framer.feed(self.tramas[0][44:] + self.tramas[1]), [self.tramas[0], self.tramas[1]])
+
+    def test_trama_partida_en_varios_recv(self):
+        framer = framing.TQFramer()
+        stream = self.tramas[0] + b'*HQ,4209917484,V1,120000,A#' + self.tramas[1]
+        recibidas = []
+        for i in range(len(stream)):
+            recibidas += framer.feed(stream[i:i + 1])
+        self.assertEqual(recibidas, [self.tramas[0], b'*HQ,4209917484,V1,120000,A#', self.tramas[1]])
+        self.assertEqual(framer.pendientes(), 0)
+        self.assertEqual(framer.bytes_descartados, 0)
+
+    def test_tramas_juntas_en_un_recv(self):
+        framer = framing.TQFramer()
+        stream = b''.join(self.tramas) + b'+RESP:GTFRI,1,2$' + self.tramas[0][:10]
+        self.assertEqual(framer.feed(stream), self.tramas + [b'+RESP:GTFRI,1,2$'])
+        self.assertEqual(framer.pendientes(), 10)
+        self.assertEqual(framer.tramas, 4)
+        self.assertEqual(framer.feed(self.tramas[0][10:]), [self.tramas[0]])
+
+    def test_resincroniza_despues_de_basura(self):
+        framer = framing.TQFramer()
+        # El whitespace entre tramas se descarta sin entregarse
+        self.assertEqual(framer.feed(b'\r\n  ' + self.tramas[0] + b'\r\n' + self.tramas[1]),
+                         [self.tramas[0], self.tramas[1]])
+        self.assertEqual(framer.bytes_descartados, 6)
+
+        # Un '*' sin '#' más largo que MAX_TEXTO no bloquea las tramas siguientes
+        framer = framing.TQFramer()
+        recibidas = framer.feed(b'*' + b'A' * (framing.TQFramer.MAX_TEXTO + 50) + self.tramas[2])
+        self.assertEqual(recibidas[-1], self.tramas[2])
+        self.assertEqual(framer.pendientes(), 0)
+
+    def test_buffer_maximo_descarta(self):
+        framer = framing.TQFramer(max_buffer=100)
+        self.assertEqual(framer.feed(b'*' + b'A' * 200), [])
+        self.assertEqual(framer.pendientes(), 0)
+        self.assertEqual(framer.bytes_descartados, 201)
+        self.assertEqual(framer.feed(self.tramas[0]), [self.tramas[0]])
+
+    def test_teltonika_imei_y_avl(self):
+        framer = framing.TeltonikaFramer()
+        imei = b'\x00\x0f356307042441013'
+        avl = b'\x00\x00\x00\x00\x00\x00\x00\x05' + b'\x08\x01\x02\x03\x01' + b'\x00\x00\x12\x34'
+        self.assertEqual(framer.feed(imei + avl[:6]), [imei])
+        self.assertEqual(framer.feed(avl[6:] + avl), [avl, avl])
+
+    def test_crear_framer_por_protocolo(self):
+        self.assertIsInstance(framing.crear_framer('TQ'), framing.TQFramer)
+        self.assertIsInstance(framing.crear_framer('tcp'), framing.TQFramer)
+        self.assertIsInstance(framing.crear_framer('Teltonika'), framing.TeltonikaFramer)
+        self.assertIsInstance(framing.crear_framer(None), framing.GenericFramer)
+        self.assertEqual(framing.crear_framer('otro').feed(b'abc'), [b'abc'])
+
+
+class EstadisticasRecorridoTest(SimpleTestCase):
+    """Estadísticas de recorrido en una sola pasada"""
+
+    def setUp(self):
+        inicio = datetime(2025, 9, 18, 12, 50, tzinfo=timezone.utc)
+        # (minuto, lat, lon, velocidad): detenido, en marcha, sin coordenadas, detenido
+        self.filas = [
+            (inicio + timedelta(minutes=m), lat, lon, vel) for m, lat, lon, vel in [
+                (0, '-34.6000000', '-58.3800000', 0),
+                (5, '-34.6000000', '-58.3800000', 3),
+                (10, '-34.6100000', '-58.3800000', 40),
+                (15, '-34.6200000', '-58.3800000', 90),
+                (20, None, None, 60),
+                (25, '-34.6300000', '-58.3800000', None),
+                (30, '-34.6300000', '-58.3800000', 0),
+            ]
+        ]
+
+    def test_estadisticas(self):
+        resumen = recorrido_stats.calcular_estadisticas(self.filas)
+        self.assertEqual(resumen['puntos_gps'], 7)
+        self.assertEqual(resumen['duracion_minutos'], 30)
+        self.assertEqual(resumen['velocidad_maxima'], 90)
+        self.assertAlmostEqual(resumen['velocidad_promedio'], 193 / 6, places=2)
+        # Solo los tramos con coordenadas en ambos extremos: 2 x 0.01° de latitud
+        self.assertAlmostEqual(resumen['distancia_km'], 2.22, places=2)
+        self.assertEqual(resumen['detenciones'], 2)
+        self.assertEqual(resumen['tiempo_detenido_minutos'], 15)
+        self.assertEqual(resumen['tiempo_movimiento_minutos'], 15)
+        self.assertEqual(resumen['rango_velocidades'], {
+            'detenido': 3, 'muy_lento': 0, 'lento': 0, 'moderado': 1, 'rapido': 1, 'muy_rapido': 1,
+        })
+        horas = resumen['estadisticas_por_hora']
+        self.assertEqual([h['puntos_gps'] for h in horas], [2, 5])
+        self.assertEqual(sum(h['tiempo_detenido_minutos'] + h['tiempo_movimiento_minutos'] for h in horas), 30)
+
+    def test_sin_posiciones(self):
+        self.assertIsNone(recorrido_stats.calcular_estadisticas([]))
+
+    def test_paridad_sin_numpy(self):
+        if not NP_AVAILABLE:
+            self.skipTest('numpy no instalado: ya se usa el bucle en Python')
+        rnd = random.Random(7)
+        inicio = datetime(2025, 9, 18, tzinfo=timezone.utc)
+        segundos, lats, lons, velocidades = [], [], [], []
+        for i in range(2000):
+            segundos.append((inicio + timedelta(seconds=30 * i)).timestamp())
+            lats.append(None if rnd.random() < 0.05 else -34.6 + rnd.uniform(-0.1, 0.1))
+            lons.append(None if rnd.random() < 0.05 else -58.4 + rnd.uniform(-0.1, 0.1))
+            velocidades.append(None if rnd.random() < 0.05 else rnd.randrange(0, 120))
+
+        python = recorrido_stats._calcular_python(segundos, lats, lons, velocidades)
+        vectorizado = recorrido_stats._calcular_numpy(segundos, lats, lons, velocidades)
+        for clave in ('velocidad_maxima', 'detenciones', 'rango_velocidades'):
+            self.assertEqual(python[clave], vectorizado[clave])
+        for clave in ('distancia_km', 'velocidad_promedio', 'segundos_detenido', 'segundos_movimiento'):
+            self.assertAlmostEqual(python[clave], vectorizado[clave], places=6)
+        self.assertEqual(len(python['por_hora']), len(vectorizado['por_hora']))
+        for hora_py, hora_np in zip(python['por_hora'], vectorizado['por_hora']):
+            self.assertEqual(hora_py['puntos_gps'], hora_np['puntos_gps'])
+            self.assertEqual(hora_py['velocidad_maxima'], hora_np['velocidad_maxima'])
+            self.assertAlmostEqual(hora_py['distancia_km'], hora_np['distancia_km'], places=6)
+
+
+class SimplificacionRecorridoTest(SimpleTestCase):
+    """Douglas-Peucker con puntos obligatorios para la vista de mapa"""
+
+    def setUp(self):
+        # Dos tramos rectos (norte y después este) con una detención en la esquina
+        self.lats = [-34.6 + i * 0.0001 for i in range(50)] + [-34.6 + 49 * 0.0001] * 50
+        self.lons = [-58.4] * 50 + [-58.4 + i * 0.0001 for i in range(50)]
+        self.velocidades = [40] * 45 + [0] * 10 + [40] * 45
+        self.igniciones = [True] * 100
+
+    def test_rectas_quedan_en_sus_extremos(self):
+        obligatorios = simplificacion.indices_obligatorios(self.velocidades, self.igniciones)
+        indices = simplificacion.simplificar(self.lats, self.lons, 1.0, obligatorios)
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices[-1], 99)
+        self.assertIn(49, indices)  # la esquina
+        # Inicio y fin de la detención se conservan aunque no cambien el trazo
+        self.assertIn(45, indices)
+        self.assertIn(54, indices)
+        self.assertLess(len(indices), 12)
+
+    def test_cambio_de_ignicion(self):
+        igniciones = [True] * 30 + [False] * 70
+        obligatorios = simplificacion.indices_obligatorios(self.velocidades, igniciones)
+        self.assertIn(29, obligatorios)
+        self.assertIn(30, obligatorios)
+
+    def test_pico_de_velocidad(self):
+        velocidades = list(self.velocidades)
+        velocidades[20] = 90
+        self.assertIn(20, simplificacion.indices_obligatorios(velocidades, self.igniciones))
+
+    def test_tolerancia_por_zoom(self):
+        self.assertAlmostEqual(simplificacion.tolerancia_para_zoom(0, 0, pixeles=1), 156543.03392)
+        self.assertAlmostEqual(
+            simplificacion.tolerancia_para_zoom(15, 0), simplificacion.tolerancia_para_zoom(14, 0) / 2
+        )
+
+
+def recorrido_anterior(posiciones):
+    """Lista 'recorrido' como la armaba exportar_recorrido antes del streaming"""
+    datos = []
+    for posicion in posiciones:
+        if posicion.lat and posicion.lon:
+            if posicion.fec_gps:
+                if posicion.fec_gps.tzinfo:
+                    fecha = posicion.fec_gps.astimezone(exportacion.TZ_ARGENTINA)
+                else:
+                    fecha = posicion.fec_gps.replace(tzinfo=exportacion.TZ_ARGENTINA)
+                timestamp = fecha.isoformat()
+            else:
+                timestamp = None
+            datos.append({
+                'timestamp': timestamp,
+                'lat': float(posicion.lat),
+                'lon': float(posicion.lon),
+                'velocidad': posicion.velocidad or 0,
+                'rumbo': posicion.rumbo or 0,
+                'altitud': posicion.altitud or 0,
+                'ignicion': posicion.ign_on,
+                'satelites': posicion.sats or 0,
+                'calidad': posicion.calidad_senal,
+            })
+    return datos
+
+
+class ExportacionRecorridoTest(SimpleTestCase):
+    """Exportación en streaming (gps/exportacion.py) contra el JSON de antes"""
+
+    def setUp(self):
+        inicio = datetime(2025, 10, 18, 12, 0, tzinfo=timezone.utc)
+        self.posiciones = []
+        for n in range(1200):
+            self.posiciones.append(Posicion(
+                fec_gps=inicio + timedelta(seconds=30 * n),
+                lat=Decimal('-34.6') - Decimal(n) / 10000, lon=Decimal('-58.4'),
+                direccion='Av. Corrientes %d' % n if n % 2 else None,
+                velocidad=(n * 7) % 90 or None, rumbo=n % 360, altitud=None if n % 5 else 25,
+                sats=None if n % 11 == 0 else n % 12, ign_on=n % 3 != 0,
+            ))
+        # Sin coordenadas (se omite) y con fecha sin zona
+        self.posiciones.append(Posicion(fec_gps=inicio + timedelta(hours=20), lat=None, lon=None, sats=8))
+        self.posiciones.append(Posicion(fec_gps=datetime(2025, 10, 19, 9, 0), lat=Decimal('-34.7'),
+                                        lon=Decimal('-58.5'), sats=4, ign_on=False))
+        self.parametros = {'movil_id': '7', 'fecha_desde': '2025-10-18', 'fecha_hasta': '2025-10-19'}
+
+    def filas(self):
+        return [tuple(getattr(p, campo) for campo in exportacion.CAMPOS_EXPORTACION) for p in self.posiciones]
+
+    def test_json_igual_al_anterior(self):
+        partes = list(exportacion.stream_json(self.filas(), self.parametros))
+        self.assertGreater(len(partes), 1)
+        anterior = recorrido_anterior(self.posiciones)
+        self.assertEqual(json.loads(''.join(partes)), {
+            'recorrido': json.loads(json.dumps(anterior)),
+            'total_puntos': len(anterior),
+            'parametros': self.parametros,
+        })
+        self.assertEqual(len(anterior), 1201)
+
+    def test_json_sin_posiciones(self):
+        self.assertEqual(json.loads(''.join(exportacion.stream_json([], self.parametros))),
+                         {'recorrido': [], 'total_puntos': 0, 'parametros': self.parametros})
+
+    def test_ndjson_y_csv_mismas_filas(self):
+        anterior = json.loads(json.dumps(recorrido_anterior(self.posiciones)))
+        lineas = ''.join(exportacion.stream_ndjson(self.filas())).splitlines()
+        self.assertEqual([json.loads(linea) for linea in lineas], anterior)
+
+        filas_csv = list(csv.reader(io.StringIO(''.join(exportacion.stream_csv(self.filas())))))
+        self.assertEqual(filas_csv[0], list(exportacion.COLUMNAS))
+        self.assertEqual(sorted(exportacion.COLUMNAS), sorted(anterior[0]))
+        self.assertEqual(filas_csv[1:], [
+            ['' if registro[columna] is None else str(registro[columna]) for columna in exportacion.COLUMNAS]
+            for registro in recorrido_anterior(self.posiciones)
+        ])
+
+    def test_xlsx_filas_y_estadisticas(self):
+        import openpyxl
+
+        # Con USE_TZ la base devuelve todas las fechas con zona
+        filas = self.filas()[:-1]
+        archivo, cantidad = exportacion.generar_xlsx(filas, {'patente': 'AA123BB', 'alias': 'Camión 5'})
+        self.addCleanup(archivo.close)
+        self.assertEqual(cantidad, len(filas))
+
+        wb = openpyxl.load_workbook(archivo, read_only=True)
+        datos = list(wb['Recorrido GPS'].values)
+        self.assertEqual(len(datos), len(filas) + 1)
+        self.assertEqual(datos[2][:5], (2, filas[1][0].isoformat(), float(filas[1][1]), -58.4, 'Av. Corrientes 1'))
+        self.assertEqual(datos[2][9:], ('Sí', Posicion.calidad_por_satelites(1)))
+
+        info = {fila[0]: fila[1] for fila in wb['Información del Recorrido'].values if fila[0]}
+        esperadas = recorrido_stats.calcular_estadisticas([(f[0], f[1], f[2], f[4]) for f in filas])
+        self.assertEqual(info['Patente'], 'AA123BB')
+        self.assertEqual(info['Modelo'], 'N/A')
+        for titulo, clave in (
+            ('Duración (minutos)', 'duracion_minutos'),
+            ('Distancia (km)', 'distancia_km'),
+            ('Velocidad Máxima (km/h)', 'velocidad_maxima'),
+            ('Velocidad Promedio (km/h)', 'velocidad_promedio'),
+            ('Puntos GPS', 'puntos_gps'),
+            ('Detenciones', 'detenciones'),
+            ('Tiempo Detenido (minutos)', 'tiempo_detenido_minutos'),
+            ('Tiempo en Movimiento (minutos)', 'tiempo_movimiento_minutos'),
+        ):
+            self.assertAlmostEqual(info[titulo], esperadas[clave], places=2, msg=titulo)
+        wb.close()
+
+
+class RecorridoSimplificadoVistaTest(TestCase):
+    """Recorrido simplificado de RecorridosViewSet (vista_mapa con tolerancia)"""
+
+    def setUp(self):
+        from authentication.models import Empresa
+        from moviles.models import Movil
+
+        empresa = Empresa.objects.create(code='TEST', legal_name='Empresa test')
+        self.movil = Movil.objects.create(patente='AA123BB', gps_id='866813300000001')
+        inicio = datetime(2025, 10, 18, 12, 0, tzinfo=timezone.utc)
+        posiciones = []
+        for n in range(40):
+            # Recta hacia el norte con un desvío en la posición 10
+            posiciones.append(Posicion(
+                empresa=empresa, device_id=866813300000001, movil=self.movil,
+                fec_gps=inicio + timedelta(minutes=n), lat=Decimal('-34.6') + Decimal(n) / 1000,
+                lon=Decimal('-58.39') if n == 10 else Decimal('-58.4'), velocidad=50, ign_on=True,
+            ))
+        Posicion.objects.bulk_create(posiciones)
+        self.ids = list(Posicion.objects.order_by('fec_gps').values_list('id', flat=True))
+
+    def pedir(self, **parametros):
+        from rest_framework.test import APIRequestFactory
+
+        from .views import RecorridosViewSet
+
+        parametros = {'movil_id': self.movil.id, 'vista_mapa': 'true', 'tolerancia': 5, **parametros}
+        vista = RecorridosViewSet.as_view({'get': 'list'})
+        response = vista(APIRequestFactory().get('/recorridos/', parametros))
+        response.render()
+        return response
+
+    def test_respeta_el_limite(self):
+        response = self.pedir(limite=20)
+        self.assertEqual(response['X-Puntos-Originales'], '20')
+        ids = [posicion['id'] for posicion in json.loads(response.content)]
+        self.assertEqual(ids, [self.ids[0], self.ids[9], self.ids[10], self.ids[11], self.ids[19]])
+
+    def test_segunda_pasada_por_rango_de_fechas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.pedir()
+        self.assertEqual(response['X-Puntos-Originales'], '40')
+        ids = [posicion['id'] for posicion in json.loads(response.content)]
+        self.assertEqual(ids, [self.ids[0], self.ids[9], self.ids[10], self.ids[11], self.ids[39]])
+        segunda = consultas.captured_queries[-1]['sql']
+        self.assertIn('fec_gps', segunda)
+        self.assertNotIn(' IN (', segunda)
+
+
+class CodificacionRecorridoTest(SimpleTestCase):
+    """Codificaciones compactas de recorridos (columnas, polyline, binario)"""
+
+    def setUp(self):
+        inicio = datetime(2025, 9, 18, 12, 0, tzinfo=timezone.utc)
+        self.filas = [
+            (500 + i, inicio + timedelta(seconds=15 * i), -34.6 + i * 0.0001, -58.4 - i * 0.0002, i % 90, i % 360, i % 2 == 0)
+            for i in range(100)
+        ]
+
+    def test_polyline_ejemplo_google(self):
+        texto = codificacion.encode_polyline([38.5, 40.7, 43.252], [-120.2, -120.95, -126.453])
+        self.assertEqual(texto, '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        self.assertEqual(codificacion.decode_polyline(texto), [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)])
+
+    def test_columnas(self):
+        datos = codificacion.columnas(self.filas)
+        self.assertEqual(datos['n'], 100)
+        self.assertEqual(datos['t0'], int(self.filas[0][1].timestamp()))
+        self.assertEqual(datos['dt'][:3], [0, 15, 15])
+        self.assertEqual(datos['id_delta'][:3], [500, 1, 1])
+        self.assertEqual(datos['ignicion'][:3], [1, 0, 1])
+
+    def test_binario(self):
+        datos = codificacion.binario(self.filas)
+        self.assertEqual(len(datos), codificacion.CABECERA_BINARIO.size + 17 * 100)
+        columnas = codificacion.decode_binario(datos)
+        self.assertEqual(columnas['dt'][-1], 15 * 99)
+        self.assertEqual(columnas['velocidad'], [f[4] for f in self.filas])
+        self.assertAlmostEqual(columnas['lat'][-1], self.filas[-1][2], places=5)
+
+    def test_binario_sin_numpy(self):
+        if not codificacion.NP_AVAILABLE:
+            self.skipTest('numpy no instalado: ya se usa struct')
+        vectorizado = codificacion.binario(self.filas)
+        codificacion.NP_AVAILABLE = False
+        try:
+            self.assertEqual(codificacion.binario(self.filas), vectorizado)
+        finally:
+            codificacion.NP_AVAILABLE = True
+
+
+class CursorKeysetTest(SimpleTestCase):
+    """Cursores opacos de la paginación keyset"""
+
+    def test_ida_y_vuelta(self):
+        datos = {'f': '2025-09-18T12:00:00+00:00', 'i': 123456789, 'd': 'n'}
+        cursor = codificar_cursor(datos)
+        self.assertNotIn('=', cursor)
+        self.assertEqual(decodificar_cursor(cursor), datos)
+
+    def test_cursor_invalido(self):
+        from rest_framework.exceptions import ValidationError
+        for cursor in ('no-es-base64!', codificar_cursor([1, 2])):
+            with self.subTest(cursor=cursor), self.assertRaises(ValidationError):
+                decodificar_cursor(cursor)
+
+
+class PosicionesCursorVistaTest(TestCase):
+    """tail de PosicionViewSet y paginación keyset en las vistas"""
+
+    def setUp(self):
+        from authentication.models import Empresa
+        from moviles.models import Movil
+
+        self.empresa = Empresa.objects.create(code='TEST', legal_name='Empresa test')
+        self.movil = Movil.objects.create(patente='AA123BB', gps_id='866813300000001')
+        self.inicio = datetime(2025, 10, 18, 12, 0, tzinfo=timezone.utc)
+
+    def crear(self, pk, minutos=0):
+        return Posicion.objects.create(
+            id=pk, empresa=self.empresa, device_id=866813300000001, movil=self.movil,
+            fec_gps=self.inicio + timedelta(minutes=minutos), lat=Decimal('-34.6'), lon=Decimal('-58.4'),
+        )
+
+    def pedir(self, vista, accion, **parametros):
+        from rest_framework.test import APIRequestFactory
+
+        response = vista.as_view({'get': accion})(APIRequestFactory().get('/posiciones/', parametros))
+        response.render()
+        return response
+
+    def tail(self, **parametros):
+        from .views import PosicionViewSet
+
+        response = self.pedir(PosicionViewSet, 'tail', movil_id=self.movil.id, **parametros)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_tail_trae_posiciones_confirmadas_tarde(self):
+        self.crear(10)
+        self.crear(12)
+        primera = self.tail()
+        self.assertEqual([p['id'] for p in primera['results']], [10, 12])
+
+        # La 11 se insertó antes que la 12 pero su commit llega después de la lectura
+        self.crear(11)
+        self.crear(13)
+        segunda = self.tail(cursor=primera['cursor'])
+        ids = [p['id'] for p in segunda['results']]
+        self.assertIn(11, ids)
+        self.assertEqual(ids[-1], 13)
+        self.assertEqual(decodificar_cursor(segunda['cursor'])['t'], 13)
+
+    def test_tail_no_relee_posiciones_viejas(self):
+        self.crear(10)
+        self.crear(12)
+        Posicion.objects.update(created_at=dj_timezone.now() - timedelta(hours=1))
+        cursor = self.tail()['cursor']
+        self.crear(13)
+        self.assertEqual([p['id'] for p in self.tail(cursor=cursor)['results']], [13])
+        # Cursor de antes de la relectura (sin 's'): solo lo nuevo
+        self.assertEqual([p['id'] for p in self.tail(cursor=codificar_cursor({'t': 12}))['results']], [13])
+
+    def test_cursor_invalido_es_400(self):
+        from .views import PosicionViewSet, RecorridosViewSet
+
+        for vista, accion in ((PosicionViewSet, 'tail'), (PosicionViewSet, 'list'), (RecorridosViewSet, 'list')):
+            for cursor in ('no-es-base64!', codificar_cursor({'x': 1}), codificar_cursor({'f': 'ayer', 'i': 1})):
+                with self.subTest(vista=vista.__name__, accion=accion, cursor=cursor):
+                    response = self.pedir(vista, accion, movil_id=self.movil.id, cursor=cursor)
+                    self.assertEqual(response.status_code, 400)
+
+    def test_vista_mapa_no_usa_cursor(self):
+        from .views import RecorridosViewSet
+
+        for pk in range(1, 4):
+            self.crear(pk, minutos=pk)
+        response = self.pedir(RecorridosViewSet, 'list', movil_id=self.movil.id, vista_mapa='true',
+                              paginacion='cursor')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['id'] for p in response.data], [1, 2, 3])
+
+        response = self.pedir(RecorridosViewSet, 'list', movil_id=self.movil.id, paginacion='cursor', page_size=2)
+        self.assertEqual([p['id'] for p in response.data['results']], [1, 2])
+        self.assertIsNotNone(response.data['next'])
+
+
+class ParticionesPosicionesTest(SimpleTestCase):
+    """Cálculo de particiones mensuales de posiciones"""
+
+    def test_nombres_y_limites(self):
+        inicio = datetime(2025, 12, 1).date()
+        self.assertEqual(particiones.nombre_particion(inicio), 'posiciones_2025_12')
+        self.assertEqual(particiones.mes_de_particion('posiciones_2025_12'), inicio)
+        self.assertIsNone(particiones.mes_de_particion(particiones.PARTICION_DEFAULT))
+        sql = particiones.sql_crear_particion(inicio)
+        self.assertIn("FROM ('2025-12-01 00:00:00+00') TO ('2026-01-01 00:00:00+00')", sql)
+
+    def test_meses_a_crear(self):
+        hoy = datetime(2025, 11, 20).date()
+        existentes = ['posiciones_2025_11', 'posiciones_default']
+        meses = particiones.meses_a_crear(hoy, 3, existentes)
+        self.assertEqual([particiones.nombre_particion(m) for m in meses],
+                         ['posiciones_2025_12', 'posiciones_2026_01', 'posiciones_2026_02'])
+
+    def test_particiones_vencidas(self):
+        hoy = datetime(2026, 3, 5).date()
+        existentes = ['posiciones_default', 'posiciones_2026_03', 'posiciones_2025_01',
+                      'posiciones_2025_03', 'posiciones_2025_02']
+        self.assertEqual(particiones.particiones_vencidas(hoy, 12, existentes),
+                         ['posiciones_2025_01', 'posiciones_2025_02'])
+        self.assertEqual(particiones.particiones_vencidas(hoy, None, existentes), [])
+
+    def test_indice_unico_agrega_fec_gps(self):
+        self.assertEqual(
+            particiones.indice_unico_particionado(
+                'CREATE UNIQUE INDEX posiciones_msg_uid_uniq ON public.posiciones USING btree (device_id, msg_uid)'),
+            'CREATE UNIQUE INDEX posiciones_msg_uid_uniq ON public.posiciones USING btree (device_id, msg_uid, fec_gps)',
+        )
+        ya_incluye = 'CREATE UNIQUE INDEX u ON posiciones USING btree (fec_gps, seq)'
+        self.assertEqual(particiones.indice_unico_particionado(ya_incluye), ya_incluye)
+        for definicion in (
+            'CREATE UNIQUE INDEX u ON posiciones USING btree (lower((msg_uid)::text))',
+            'CREATE UNIQUE INDEX u ON posiciones USING btree (msg_uid) WHERE (msg_uid IS NOT NULL)',
+            'CREATE UNIQUE INDEX u ON posiciones USING btree (msg_uid) INCLUDE (seq)',
+        ):
+            with self.subTest(definicion=definicion), self.assertRaises(RuntimeError):
+                particiones.indice_unico_particionado(definicion)
+
+    def cursor_falso(self, indices):
+        """Cursor que responde las consultas de catálogo de _reconstruir y guarda el SQL"""
+        ejecutado = []
+        respuestas = {
+            'pg_partitioned_table': [(False,)],
+            'SELECT COUNT(*) FROM pg_constraint': [(0,)],
+            'pg_get_indexdef': indices,
+            'pg_get_constraintdef': [],
+            'pg_get_serial_sequence': [('public.posiciones_id_seq', '')],
+            'SELECT DISTINCT date_trunc': [(datetime(2025, 10, 1).date(),)],
+        }
+
+        class Cursor:
+            rowcount = 0
+
+            def execute(self, sql, parametros=None):
+                ejecutado.append(sql)
+                self.filas = next((filas for clave, filas in respuestas.items() if clave in sql), [])
+
+            def fetchone(self):
+                return self.filas[0]
+
+            def fetchall(self):
+                return self.filas
+
+        return Cursor(), ejecutado
+
+    def test_reconstruir_recrea_indices_unicos(self):
+        cursor, ejecutado = self.cursor_falso([
+            ('posiciones_pkey', 'CREATE UNIQUE INDEX posiciones_pkey ON public.posiciones USING btree (id)',
+             True, True, 'posiciones_pkey'),
+            ('posiciones_movil_fec_idx', 'CREATE INDEX posiciones_movil_fec_idx ON public.posiciones '
+             'USING btree (movil_id, fec_gps)', False, False, None),
+            ('posiciones_msg_uid_uniq', 'CREATE UNIQUE INDEX posiciones_msg_uid_uniq ON public.posiciones '
+             'USING btree (msg_uid)', True, False, None),
+            ('posiciones_device_seq_uniq', 'CREATE UNIQUE INDEX posiciones_device_seq_uniq ON public.posiciones '
+             'USING btree (device_id, seq)', True, False, 'posiciones_device_seq_uniq'),
+        ])
+        with mock.patch.object(particiones, 'meses_a_crear', return_value=[]):
+            particiones._reconstruir(cursor, 'posiciones_sin_particionar', particionar=True)
+
+        self.assertIn('DROP INDEX posiciones_msg_uid_uniq', ejecutado)
+        self.assertIn('ALTER TABLE posiciones_sin_particionar DROP CONSTRAINT posiciones_device_seq_uniq', ejecutado)
+        self.assertNotIn('DROP INDEX posiciones_pkey', ejecutado)
+        self.assertIn('CREATE UNIQUE INDEX posiciones_msg_uid_uniq ON posiciones USING btree (msg_uid, fec_gps)',
+                      ejecutado)
+        self.assertIn('CREATE UNIQUE INDEX posiciones_device_seq_uniq ON posiciones USING btree '
+                      '(device_id, seq, fec_gps)', ejecutado)
+        self.assertIn('CREATE INDEX posiciones_movil_fec_idx ON posiciones USING btree (movil_id, fec_gps)', ejecutado)
+        self.assertEqual(ejecutado[-1], 'DROP TABLE posiciones_sin_particionar')
+
+    def test_reconstruir_falla_antes_de_tocar_la_tabla(self):
+        cursor, ejecutado = self.cursor_falso([
+            ('posiciones_uid_lower', 'CREATE UNIQUE INDEX posiciones_uid_lower ON public.posiciones '
+             'USING btree (lower((msg_uid)::text))', True, False, None),
+        ])
+        with self.assertRaises(RuntimeError):
+            particiones.particionar_tabla(cursor)
+        self.assertFalse([sql for sql in ejecutado if sql.startswith(('ALTER', 'DROP', 'CREATE'))])
+
+
+class GestionarParticionesTest(TestCase):
+    """Conversión de posiciones desde el comando gestionar_particiones"""
+
+    def test_convertir(self):
+        from django.core.management import call_command
+        from django.db import connection
+
+        salida = io.StringIO()
+        with mock.patch.object(connection, 'vendor', 'postgresql'), \
+                mock.patch.object(particiones, 'es_particionada', return_value=False), \
+                mock.patch.object(particiones, 'particionar_tabla') as particionar:
+            call_command('gestionar_particiones', '--convertir', '--dry-run', stdout=salida)
+        particionar.assert_not_called()
+        self.assertIn('Se convertiría posiciones en tabla particionada', salida.getvalue())
+
+        with mock.patch.object(connection, 'vendor', 'postgresql'), \
+                mock.patch.object(particiones, 'es_particionada', side_effect=[False, True]), \
+                mock.patch.object(particiones, 'particionar_tabla') as particionar, \
+                mock.patch.object(particiones, 'particiones', return_value=[]), \
+                mock.patch.object(particiones, 'crear_particion', return_value=True) as crear:
+            call_command('gestionar_particiones', '--convertir', '--meses-futuros', '1', stdout=io.StringIO())
+        particionar.assert_called_once()
+        self.assertEqual(particionar.call_args.kwargs, {'meses_futuros': 1})
+        self.assertEqual(crear.call_count, 2)
+
+
+class RecorridoDiarioTest(SimpleTestCase):
+    """Resumen diario de un móvil (gps/rollups.py)"""
+
+    def test_resumir_dia(self):
+        inicio = datetime(2025, 9, 18, 12, 0, tzinfo=timezone.utc)
+        # 10 min en marcha con ignición, 5 min detenido con ignición apagada
+        filas = [(100 + i, inicio + timedelta(minutes=i), -34.6 - i * 0.001, -58.4, 40, True) for i in range(11)]
+        filas += [(111 + i, inicio + timedelta(minutes=11 + i), -34.61, -58.4, 0, False) for i in range(5)]
+        resumen = rollups.resumir_dia(filas)
+        esperado = recorrido_stats.calcular_estadisticas([fila[1:5] for fila in filas])
+
+        self.assertEqual(resumen['puntos'], 16)
+        self.assertEqual(resumen['distancia_km'], esperado['distancia_km'])
+        self.assertEqual(resumen['detenciones'], 1)
+        self.assertEqual(resumen['minutos_ignicion'], 11.0)
+        self.assertEqual((resumen['lat_min'], resumen['lat_max']), (-34.61, -34.6))
+        self.assertEqual(resumen['ultima_posicion_id'], 115)
+        self.assertIsNone(rollups.resumir_dia([]))
+
+    def test_dia_local(self):
+        # 01:30 UTC todavía es el día anterior en Argentina
+        self.assertEqual(rollups.dia_local(datetime(2025, 9, 18, 1, 30, tzinfo=timezone.utc)).day, 17)
+        desde, hasta = rollups.rango_dia(datetime(2025, 9, 17).date())
+        self.assertEqual(desde.astimezone(timezone.utc), datetime(2025, 9, 17, 3, 0, tzinfo=timezone.utc))
+        self.assertEqual(hasta - desde, timedelta(days=1))
+
+
+class PosicionesConAntiguedadMixin:
+    """Posiciones de un móvil con created_at controlado (marca de agua con margen de commit)"""
+
+    def setUp(self):
+        from authentication.models import Empresa
+        from moviles.models import Movil
+
+        self.empresa = Empresa.objects.create(code='TEST', legal_name='Empresa test')
+        self.movil = Movil.objects.create(patente='AA123BB', gps_id='866813300000001')
+        self.inicio = datetime(2025, 10, 18, 12, 0, tzinfo=timezone.utc)
+
+    def crear(self, pk, minutos, hace_segundos, velocidad=40):
+        Posicion.objects.create(
+            id=pk, empresa=self.empresa, device_id=866813300000001, movil=self.movil,
+            fec_gps=self.inicio + timedelta(minutes=minutos), lat=Decimal('-34.6') - Decimal(minutos) / 1000,
+            lon=Decimal('-58.4'), velocidad=velocidad, ign_on=True,
+        )
+        Posicion.objects.filter(id=pk).update(created_at=dj_timezone.now() - timedelta(seconds=hace_segundos))
+
+    def envejecer(self):
+        Posicion.objects.update(created_at=dj_timezone.now() - timedelta(hours=1))
+
+
+class RollupsMarcaDeAguaTest(PosicionesConAntiguedadMixin, TestCase):
+    """actualizar_pendientes de gps/rollups.py no saltea commits tardíos"""
+
+    def test_no_pasa_posiciones_recientes(self):
+        from gps.models import RecorridoDiario
+
+        self.crear(1, 0, 600)
+        self.crear(2, 1, 600)
+        self.crear(4, 3, 5)
+        resultado = rollups.actualizar_pendientes(margen_segundos=60)
+        self.assertEqual(resultado['hasta_id'], 2)
+        self.assertEqual(RecorridoDiario.objects.get().puntos, 2)
+
+        # La 3 tenía id menor que la 4 pero se confirmó después de la primera pasada
+        self.crear(3, 2, 30)
+        self.envejecer()
+        resultado = rollups.actualizar_pendientes(margen_segundos=60)
+        self.assertEqual((resultado['desde_id'], resultado['hasta_id']), (2, 4))
+        resumen = RecorridoDiario.objects.get()
+        self.assertEqual((resumen.puntos, resumen.ultima_posicion_id), (4, 4))
+
+    def test_ultimo_id_confirmado(self):
+        self.assertEqual(rollups.ultimo_id_confirmado(60), 0)
+        self.crear(7, 0, 600)
+        self.crear(9, 1, 10)
+        self.assertEqual(rollups.ultimo_id_confirmado(60), 7)
+        self.assertEqual(rollups.ultimo_id_confirmado(0), 9)
+
+
+class SegmentacionMarcaDeAguaTest(PosicionesConAntiguedadMixin, TestCase):
+    """actualizar_pendientes de gps/segmentacion.py no saltea commits tardíos"""
+
+    def test_no_pasa_posiciones_recientes(self):
+        from gps.models import SegmentoRecorrido
+
+        self.crear(1, 0, 600)
+        self.crear(2, 1, 600)
+        self.crear(4, 3, 5)
+        resultado = segmentacion.actualizar_pendientes(margen_segundos=60)
+        self.assertEqual(resultado['hasta_id'], 2)
+        self.assertEqual(segmentacion.marca_de_agua(), 2)
+
+        self.crear(3, 2, 30)
+        self.envejecer()
+        resultado = segmentacion.actualizar_pendientes(margen_segundos=60)
+        self.assertEqual((resultado['desde_id'], resultado['hasta_id']), (2, 4))
+        segmento = SegmentoRecorrido.objects.get()
+        self.assertEqual((segmento.tipo, segmento.puntos, segmento.ultima_posicion_id), (segmentacion.VIAJE, 4, 4))
+
+
+class SegmentacionRecorridoTest(SimpleTestCase):
+    """Viajes y detenciones (gps/segmentacion.py)"""
+
+    def setUp(self):
+        self.inicio = datetime(2025, 9, 18, 12, 0, tzinfo=timezone.utc)
+        self.filas = []
+
+    def agregar(self, minutos, lat, velocidad, ign_on=True, direccion=None):
+        pk = len(self.filas) + 1
+        self.filas.append((pk, self.inicio + timedelta(minutes=minutos), lat, -58.4, velocidad, ign_on, direccion))
+
+    def test_viaje_detencion_viaje(self):
+        for i in range(10):  # ~1,1 km por minuto hacia el sur
+            self.agregar(i, -34.6 - i * 0.01, 60)
+        for i in range(10, 20):  # 10 min parado, motor apagado desde el minuto 12
+            self.agregar(i, -34.69 + (i % 2) * 0.0002, 0, ign_on=i < 12, direccion='Ruta 3 km 40')
+        for i in range(20, 25):
+            self.agregar(i, -34.69 - (i - 19) * 0.01, 60)
+
+        segmentos = segmentacion.segmentar(self.filas)
+        self.assertEqual([s['tipo'] for s in segmentos], ['viaje', 'detencion', 'viaje'])
+        viaje, detencion, _ = segmentos
+        self.assertEqual(detencion['inicio'], self.filas[10][1])
+        self.assertEqual(detencion['duracion_segundos'], 9 * 60)
+        self.assertEqual(detencion['segundos_ignicion'], 2 * 60)
+        self.assertEqual(detencion['direccion_inicio'], 'Ruta 3 km 40')
+        self.assertEqual(viaje['posicion_fin_id'], detencion['posicion_inicio_id'])
+        self.assertAlmostEqual(viaje['distancia_km'], 10.0, delta=0.1)
+
+    def test_detenciones_cercanas_se_unen(self):
+        for i in range(5):
+            self.agregar(i, -34.6, 0)
+        self.agregar(5, -34.6005, 20)  # maniobra de ~50 m
+        for i in range(6, 11):
+            self.agregar(i, -34.601, 0)
+        segmentos = segmentacion.segmentar(self.filas)
+        self.assertEqual([s['tipo'] for s in segmentos], ['detencion'])
+        self.assertEqual(segmentos[0]['duracion_segundos'], 10 * 60)
+
+    def test_parada_corta_no_es_detencion(self):
+        for i in range(10):
+            self.agregar(i, -34.6 - i * 0.01, 0 if i in (4, 5) else 60)
+        self.assertEqual([s['tipo'] for s in segmentacion.segmentar(self.filas)], ['viaje'])
+
+
+class GeocodeCacheTest(SimpleTestCase):
+    """Geohash y niveles del cache de geocodificación (gps/geocode_cache.py)"""
+
+    def setUp(self):
+        self.cache = GeocodeCache(usar_django=True)
+        self.consultas = []
+        self.niveles = {}
+        stack = contextlib.ExitStack()
+        self.addCleanup(stack.close)
+        for nombre in ('_get_cache', '_set_cache', '_get_db', '_set_db'):
+            self.niveles[nombre] = stack.enter_context(mock.patch.object(self.cache, nombre))
+        self.niveles['_get_cache'].return_value = None
+        self.niveles['_get_db'].return_value = None
+
+    def resolver(self, lat, lon):
+        self.consultas.append((lat, lon))
+        return {'display_name': 'Av. Corrientes 1000'}
+
+    def test_geohash_vectores_conocidos(self):
+        self.assertEqual(encode_geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(encode_geohash(42.6, -5.6, 5), 'ezs42')
+        self.assertEqual(encode_geohash(-34.6037, -58.3816), '69y7pkx')
+        self.assertEqual(len(self.cache.geohash(-34.6037, -58.3816)), self.cache.precision)
+
+    def test_geohash_celda_vecina(self):
+        # Dos puntos a pocos metros comparten celda; a ~1 km ya no
+        self.assertEqual(encode_geohash(-34.60370, -58.38160), encode_geohash(-34.60372, -58.38162))
+        self.assertNotEqual(encode_geohash(-34.60370, -58.38160), encode_geohash(-34.61370, -58.38160))
+
+    def test_miss_total_consulta_y_guarda_en_todos_los_niveles(self):
+        datos = self.cache.obtener(-34.6037, -58.3816, self.resolver)
+        self.assertEqual(datos, {'display_name': 'Av. Corrientes 1000'})
+        self.assertEqual(len(self.consultas), 1)
+        self.niveles['_get_cache'].assert_called_once()
+        self.niveles['_get_db'].assert_called_once()
+        self.niveles['_set_cache'].assert_called_once()
+        self.niveles['_set_db'].assert_called_once()
+        self.assertEqual(self.cache.stats['misses'], 1)
+
+    def test_hit_en_memoria_no_baja_de_nivel(self):
+        self.cache.obtener(-34.6037, -58.3816, self.resolver)
+        self.niveles['_get_cache'].reset_mock()
+        self.niveles['_get_db'].reset_mock()
+        self.cache.obtener(-34.60371, -58.38161, self.resolver)
+        self.assertEqual(len(self.consultas), 1)
+        self.niveles['_get_cache'].assert_not_called()
+        self.niveles['_get_db'].assert_not_called()
+        self.assertEqual(self.cache.stats['hits_memoria'], 1)
+
+    def test_hit_en_cache_sube_a_memoria_sin_tocar_la_tabla(self):
+        self.niveles['_get_cache'].return_value = {'display_name': 'Desde cache'}
+        datos = self.cache.obtener(-34.6037, -58.3816, self.resolver)
+        self.assertEqual(datos['display_name'], 'Desde cache')
+        self.niveles['_get_db'].assert_not_called()
+        self.assertEqual(self.consultas, [])
+        self.assertEqual(self.cache.stats['hits_cache'], 1)
+        self.assertEqual(self.cache.obtener(-34.6037, -58.3816, self.resolver)['display_name'], 'Desde cache')
+        self.assertEqual(self.cache.stats['hits_memoria'], 1)
+
+    def test_hit_en_tabla_sube_a_cache_y_memoria(self):
+        self.niveles['_get_db'].return_value = {'display_name': 'Desde tabla'}
+        datos = self.cache.obtener(-34.6037, -58.3816, self.resolver)
+        self.assertEqual(datos['display_name'], 'Desde tabla')
+        self.assertEqual(self.consultas, [])
+        self.niveles['_set_cache'].assert_called_once_with('69y7pkx', {'display_name': 'Desde tabla'})
+        self.niveles['_set_db'].assert_not_called()
+        self.assertEqual(self.cache.stats['hits_db'], 1)
+        self.assertEqual(self.cache.get_stats()['entradas_memoria'], 1)
+
+    def test_sin_resultado_no_se_guarda(self):
+        self.assertIsNone(self.cache.obtener(-34.6037, -58.3816, lambda lat, lon: None))
+        self.niveles['_set_cache'].assert_not_called()
+        self.niveles['_set_db'].assert_not_called()
+        self.assertEqual(self.cache.get_stats()['entradas_memoria'], 0)
+        self.assertEqual(self.cache.stats['sin_resultado'], 1)
+
+
+class GeocodificacionLoteTest(SimpleTestCase):
+    """Geocodificación de recorridos en lote (gps/geocode_lote.py)"""
+
+    def setUp(self):
+        self.cache = GeocodeCache(usar_django=False)
+        self.consultas = []
+        # Tres puntos en la misma celda, uno en otra y uno sin coordenadas
+        self.posiciones = [
+            {'id': 1, 'lat': -34.60370, 'lon': -58.38160},
+            {'id': 2, 'lat': -34.60371, 'lon': -58.38161},
+            {'id': 3, 'lat': -34.60372, 'lon': -58.38162},
+            {'id': 4, 'lat': -34.70000, 'lon': -58.50000},
+            {'id': 5, 'lat': None, 'lon': None},
+        ]
+
+    def resolver(self, lat, lon):
+        self.consultas.append((lat, lon))
+        return {'display_name': f'Calle {len(self.consultas)}'}
+
+    def test_una_consulta_por_celda(self):
+        resultado = geocode_lote.geocodificar_lote(self.posiciones, cache=self.cache, resolver=self.resolver,
+                                                   guardar=False)
+        self.assertEqual(len(self.consultas), 2)
+        self.assertEqual(resultado['celdas'], 2)
+        self.assertEqual(resultado['celdas_consultadas'], 2)
+        self.assertEqual(resultado['geocodificadas'], 4)
+        direcciones = resultado['direcciones']
+        self.assertEqual(direcciones[0], direcciones[1])
+        self.assertEqual(direcciones[1], direcciones[2])
+        self.assertNotEqual(direcciones[0], direcciones[3])
+        self.assertEqual(direcciones[4], 'Coordenadas inválidas')
+
+    def test_celdas_conocidas_salen_del_cache(self):
+        geocode_lote.geocodificar_lote(self.posiciones, cache=self.cache, resolver=self.resolver, guardar=False)
+        avances = []
+        resultado = geocode_lote.geocodificar_lote(self.posiciones, cache=self.cache, resolver=self.resolver,
+                                                   guardar=False, progreso=avances.append)
+        self.assertEqual(len(self.consultas), 2)
+        self.assertEqual(resultado['celdas_cache'], 2)
+        self.assertEqual(resultado['celdas_consultadas'], 0)
+        self.assertEqual(avances, [{'total': 5, 'celdas': 2, 'celdas_cache': 2, 'celdas_consultadas': 0}])
+
+    def test_sin_respuesta_no_se_cachea(self):
+        resultado = geocode_lote.geocodificar_lote(self.posiciones[:1], cache=self.cache,
+                                                   resolver=lambda lat, lon: None, guardar=False)
+        self.assertEqual(resultado['geocodificadas'], 0)
+        self.assertTrue(resultado['direcciones'][0].startswith('Coordenadas: '))
+        self.assertEqual(self.cache.buscar_celdas(geocode_lote.agrupar_por_celda(self.posiciones, self.cache)), {})
+
+
+class GeocodificacionLoteTrabajoTest(SimpleTestCase):
+    """Trabajos asincrónicos de geocodificación: latido, trabajos muertos y tope del stream"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        self.cache = cache
+        self.addCleanup(cache.clear)
+
+    def guardar(self, **estado):
+        self.cache.set(geocode_lote._clave_trabajo('abc'), {'job_id': 'abc', **estado}, geocode_lote.TTL_TRABAJO)
+
+    def test_latido_mientras_el_trabajo_corre(self):
+        liberar = threading.Event()
+
+        def lote_lento(posiciones, progreso=None):
+            progreso({'total': 1, 'celdas': 1, 'celdas_cache': 0, 'celdas_consultadas': 0})
+            liberar.wait(5)
+            return {'total': 1, 'geocodificadas': 1, 'celdas_consultadas': 1, 'segundos': 0, 'direcciones': ['x']}
+
+        with mock.patch.object(geocode_lote, 'geocodificar_lote', lote_lento), \
+                mock.patch.object(geocode_lote, 'LATIDO_SEGUNDOS', 0.01):
+            job_id = geocode_lote.iniciar_trabajo([{'id': 1, 'lat': -34.6, 'lon': -58.4}])
+            primero = geocode_lote.estado_trabajo(job_id)['actualizado']
+            time.sleep(0.1)
+            estado = geocode_lote.estado_trabajo(job_id)
+            self.assertEqual(estado['estado'], geocode_lote.EN_CURSO)
+            self.assertEqual(estado['celdas'], 1)
+            self.assertGreater(estado['actualizado'], primero)
+            liberar.set()
+            for _ in range(100):
+                if geocode_lote.estado_trabajo(job_id)['estado'] != geocode_lote.EN_CURSO:
+                    break
+                time.sleep(0.01)
+        self.assertEqual(geocode_lote.estado_trabajo(job_id)['estado'], geocode_lote.TERMINADO)
+
+    def test_trabajo_sin_latido_pasa_a_error(self):
+        self.guardar(estado=geocode_lote.EN_CURSO, total=10,
+                     actualizado=time.time() - geocode_lote.ESTANCADO_SEGUNDOS - 1)
+        estado = geocode_lote.estado_trabajo('abc')
+        self.assertEqual(estado['estado'], geocode_lote.ERROR)
+        self.assertIn('dejó de responder', estado['error'])
+        self.assertEqual(self.cache.get(geocode_lote._clave_trabajo('abc'))['estado'], geocode_lote.ERROR)
+
+        lineas = [json.loads(linea) for linea in geocode_lote.stream_progreso('abc', intervalo=0)]
+        self.assertEqual([linea['estado'] for linea in lineas], [geocode_lote.ERROR])
+
+    def test_stream_con_tope(self):
+        self.assertLess(geocode_lote.STREAM_MAX_SEGUNDOS, geocode_lote.TTL_TRABAJO / 10)
+        latidos = ({'job_id': 'abc', 'estado': geocode_lote.EN_CURSO, 'total': 10, 'actualizado': time.time() + i}
+                   for i in itertools.count())
+        inicio = time.monotonic()
+        with mock.patch.object(geocode_lote, 'estado_trabajo', side_effect=lambda job_id: next(latidos)):
+            lineas = list(geocode_lote.stream_progreso('abc', intervalo=0.01, timeout=0.1))
+        self.assertLess(time.monotonic() - inicio, 1)
+        # El latido no es un avance: una sola línea, que sigue en curso
+        self.assertEqual(len(lineas), 1)
+        self.assertEqual(json.loads(lineas[0])['estado'], geocode_lote.EN_CURSO)
+
+    def test_stream_cortado_en_curso_se_reabre(self):
+        from rest_framework.test import APIRequestFactory
+
+        from .views import RecorridosViewSet
+
+        def seguir():
+            vista = RecorridosViewSet.as_view({'get': 'geocodificar_recorrido_estado'})
+            response = vista(APIRequestFactory().get('/recorridos/', {'job_id': 'abc', 'stream': 'true'}))
+            return [json.loads(linea) for linea in b''.join(response.streaming_content).decode().splitlines()]
+
+        self.guardar(estado=geocode_lote.EN_CURSO, total=10, celdas=4, celdas_cache=0, celdas_consultadas=1,
+                     actualizado=time.time())
+        with mock.patch.object(geocode_lote, 'STREAM_MAX_SEGUNDOS', 0):
+            # El stream se corta con el lote todavía en curso
+            lineas = seguir()
+            self.assertEqual([linea['estado'] for linea in lineas], [geocode_lote.EN_CURSO])
+            self.assertEqual(lineas[-1]['celdas_consultadas'], 1)
+
+            # Al reabrirlo sigue desde el estado actual hasta el final
+            self.guardar(estado=geocode_lote.TERMINADO, total=10, geocodificadas=9, actualizado=time.time())
+            lineas = seguir()
+        self.assertEqual([linea['estado'] for linea in lineas], [geocode_lote.TERMINADO])
+        self.assertEqual(lineas[-1]['geocodificadas'], 9)
+
+
+class StubGeoHandler(BaseHTTPRequestHandler):
+    """Proveedor falso: responde server.estados en orden (200 cuando se acaban)"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.pedidos.append(self.client_address[1])
+        estado = self.server.estados.pop(0) if self.server.estados else 200
+        cuerpo = b'{"routes": []}'
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+class ClienteGeoTest(SimpleTestCase):
+    """Cliente HTTP compartido de servicios geográficos (gps/geo_http.py)"""
+
+    def setUp(self):
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), StubGeoHandler)
+        self.servidor.pedidos = []
+        self.servidor.estados = []
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.cliente = geo_http.ClienteGeo(
+            'Stub', f'http://127.0.0.1:{self.servidor.server_address[1]}',
+            reintentos=2, backoff=0.01, umbral_fallas=2, enfriamiento=60,
+        )
+
+    def tearDown(self):
+        self.cliente.cerrar()
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+    def test_conexion_reutilizada(self):
+        for _ in range(3):
+            self.assertEqual(self.cliente.get_json('/route/v1/driving/1,2;3,4'), {'routes': []})
+        # Mismo puerto de origen: una sola conexión TCP keep-alive
+        self.assertEqual(len(set(self.servidor.pedidos)), 1)
+        self.assertEqual(self.cliente.get_stats()['consultas'], 3)
+
+    def test_reintenta_errores_transitorios(self):
+        self.servidor.estados = [503, 502]
+        self.assertEqual(self.cliente.get('/reverse').status_code, 200)
+        self.assertEqual(self.cliente.get_stats()['reintentos'], 2)
+
+    def test_circuito_abierto(self):
+        self.servidor.estados = [503] * 6
+        for _ in range(2):
+            with self.assertRaises(geo_http.requests.HTTPError):
+                self.cliente.get('/reverse')
+        pedidos = len(self.servidor.pedidos)
+        with self.assertRaises(geo_http.ProveedorNoDisponible):
+            self.cliente.get('/reverse')
+        self.assertEqual(len(self.servidor.pedidos), pedidos)
+        self.assertTrue(self.cliente.get_stats()['circuito_abierto'])
+
+
+class RegistrosCapturados(logging.Handler):
+    """Handler que guarda los LogRecord sin formatear"""
+
+    def __init__(self):
+        super().__init__()
+        self.registros = []
+
+    def emit(self, record):
+        self.registros.append(record)
+
+
+class LoggingReceptorTest(SimpleTestCase):
+    """Muestreo del hex y logging diferido de los receptores (gps/logging_manager.py)"""
+
+    puertos = itertools.count(47000)
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        parche = override_settings(BASE_DIR=directorio.name)
+        parche.enable()
+        self.addCleanup(parche.disable)
+        self.directorio = Path(directorio.name)
+
+    def crear_logger(self, **kwargs):
+        with contextlib.redirect_stderr(io.StringIO()):
+            receptor_logger = ReceptorLogger(next(self.puertos), **kwargs)
+        capturados = RegistrosCapturados()
+        receptor_logger.logger.addHandler(capturados)
+
+        def limpiar():
+            receptor_logger.cerrar()
+            for handler in list(receptor_logger.logger.handlers):
+                receptor_logger.logger.removeHandler(handler)
+                handler.close()
+        self.addCleanup(limpiar)
+        return receptor_logger, capturados.registros
+
+    def test_hex_diferido(self):
+        datos = bytearray(range(MAX_BYTES_HEX + 20))
+        diferido = HexDiferido(datos)
+        datos[0] = 0xff  # el buffer del socket se reutiliza: el hex no cambia
+        self.assertEqual(str(diferido), bytes(range(MAX_BYTES_HEX)).hex() + '...')
+        self.assertEqual(str(HexDiferido(b'$\x01\x02')), '240102')
+        self.assertEqual(len(diferido.data), MAX_BYTES_HEX + 1)
+
+    def test_muestreo_por_conexion(self):
+        receptor_logger, _ = self.crear_logger(asincrono=False, muestreo_hex=3)
+        self.assertEqual([receptor_logger._muestrear('a') for _ in range(7)],
+                         [True, False, False, True, False, False, True])
+        # Cada conexión lleva su propio contador, que se reinicia al desconectarse
+        self.assertTrue(receptor_logger._muestrear('b'))
+        receptor_logger.log_connection('a', 'DESCONECTADO')
+        self.assertTrue(receptor_logger._muestrear('a'))
+
+        nunca, _ = self.crear_logger(asincrono=False, muestreo_hex=0)
+        siempre, _ = self.crear_logger(asincrono=False, muestreo_hex=1)
+        self.assertFalse(any(nunca._muestrear('a') for _ in range(5)))
+        self.assertTrue(all(siempre._muestrear('a') for _ in range(5)))
+
+    def test_hex_solo_en_las_tramas_muestreadas(self):
+        receptor_logger, registros = self.crear_logger(asincrono=False, muestreo_hex=2)
+        for _ in range(4):
+            receptor_logger.log_data_received('1.2.3.4:5000', 45, b'$\xaa' * 30)
+        con_hex = [r for r in registros if 'Hex:' in r.msg]
+        self.assertEqual(len(con_hex), 2)
+        # El hex viaja sin formatear hasta que un handler arma el mensaje
+        self.assertIsInstance(con_hex[0].args[-1], HexDiferido)
+        self.assertIn('24aa24aa', con_hex[0].getMessage())
+
+    def test_errores_siempre_con_hex(self):
+        receptor_logger, registros = self.crear_logger(asincrono=False, muestreo_hex=0)
+        receptor_logger.log_data_received('1.2.3.4:5000', 3, b'\x01\x02\x03')
+        receptor_logger.log_error('trama inválida', '1.2.3.4:5000', datos=b'\x01\x02\x03')
+        self.assertEqual([r.getMessage() for r in registros], [
+            '[DATOS] 3 bytes desde 1.2.3.4:5000',
+            '[ERROR] trama inválida desde 1.2.3.4:5000 - Hex: 010203',
+        ])
+        self.assertEqual(registros[1].levelno, logging.ERROR)
+
+    def test_cola_llena_descarta_info(self):
+        handler = ColaLogHandler(queue.Queue(1))
+        registro = logging.LogRecord('x', logging.INFO, __file__, 1, 'hex %s', (HexDiferido(b'\x01'),), None)
+        handler.handle(registro)
+        handler.handle(registro)
+        self.assertEqual(handler.descartados, 1)
+        # prepare() no formatea: el record encolado conserva msg y args
+        encolado = handler.queue.get_nowait()
+        self.assertIs(encolado, registro)
+        self.assertEqual(encolado.msg, 'hex %s')
+
+    def test_asincrono_escribe_al_cerrar(self):
+        receptor_logger, _ = self.crear_logger(asincrono=True, muestreo_hex=1)
+        self.assertIsNotNone(receptor_logger.listener)
+        receptor_logger.log_data_received('1.2.3.4:5000', 2, b'\xab\xcd')
+        receptor_logger.log_parsed_data({'imei': '866813300000001', 'latitud': -34.6, 'longitud': -58.4})
+        receptor_logger.cerrar()
+        contenido = (receptor_logger.log_dir / f'receptor_{receptor_logger.port}.log').read_text(encoding='utf-8')
+        self.assertIn('[DATOS] 2 bytes desde 1.2.3.4:5000 - Hex: abcd', contenido)
+        self.assertIn('[PARSEADO] imei=866813300000001 lat=-34.6 lon=-58.4', contenido)
+        self.assertEqual(receptor_logger.get_stats()['descartados'], 0)
+
+
+class ReceptorAsyncTest(SimpleTestCase):
+    """Orden por conexión y drenado al detener (gps/receivers/async_tcp_receiver.py)"""
+
+    CONEXIONES = 3
+    TRAMAS = 30
+
+    def setUp(self):
+        self.framers = []
+        crear = async_tcp_receiver.crear_framer
+
+        def crear_framer(protocolo):
+            self.framers.append(crear(protocolo))
+            return self.framers[-1]
+
+        pila = contextlib.ExitStack()
+        self.addCleanup(pila.close)
+        pila.enter_context(mock.patch.object(TCPReceiver, '_register_configuration'))
+        pila.enter_context(mock.patch.object(TCPReceiver, '_cargar_registro_equipos'))
+        pila.enter_context(mock.patch.object(EstadisticasRecepcionMemoria, 'flush', return_value=True))
+        pila.enter_context(mock.patch.object(geocode_worker, 'start'))
+        pila.enter_context(mock.patch('gps.receivers.tcp_receiver.logging_manager'))
+        pila.enter_context(mock.patch.object(async_tcp_receiver, 'crear_framer', crear_framer))
+        pila.enter_context(contextlib.redirect_stdout(io.StringIO()))
+
+        self.liberar = threading.Event()
+        self.procesadas = []
+        rnd = random.Random(1)
+
+        def process_message(data, client_id):
+            self.liberar.wait(5)
+            time.sleep(rnd.random() / 1000)
+            self.procesadas.append(data)
+
+        self.receptor = AsyncTCPReceiver(host='127.0.0.1', port=0, workers=4, max_pendientes=1000)
+        self.receptor.process_message = process_message
+        self.hilo = threading.Thread(target=self.receptor.start, daemon=True)
+        self.hilo.start()
+        self.esperar(lambda: self.receptor.running and self.receptor.server.sockets)
+        self.puerto = self.receptor.server.sockets[0].getsockname()[1]
+
+    def esperar(self, condicion, timeout=5.0):
+        limite = time.monotonic() + timeout
+        while not condicion():
+            self.assertLess(time.monotonic(), limite, 'timeout esperando al receptor')
+            time.sleep(0.01)
+
+    def trama(self, conexion, numero):
+        return b'$' + f'{conexion}-{numero:04d}'.encode().ljust(44, b'0')
+
+    def test_orden_por_conexion_y_drenado(self):
+        rnd = random.Random(2)
+        sockets = []
+        for conexion in range(self.CONEXIONES):
+            datos = b''.join(self.trama(conexion, n) for n in range(self.TRAMAS))
+            cliente = socket.create_connection(('127.0.0.1', self.puerto))
+            sockets.append(cliente)
+            # Cortes al azar: tramas partidas y varias tramas en un mismo envío
+            while datos:
+                corte = rnd.randint(1, 120)
+                cliente.sendall(datos[:corte])
+                datos = datos[corte:]
+
+        total = self.CONEXIONES * self.TRAMAS
+        self.esperar(lambda: sum(f.tramas for f in self.framers) == total)
+        # Todo leído pero nada procesado: stop() debe esperar a que el pool termine
+        threading.Timer(0.1, self.liberar.set).start()
+        self.receptor.stop()
+        self.assertEqual(len(self.procesadas), total)
+        for conexion in range(self.CONEXIONES):
+            propias = [t for t in self.procesadas if t.startswith(f'${conexion}-'.encode())]
+            self.assertEqual(propias, [self.trama(conexion, n) for n in range(self.TRAMAS)])
+
+        self.hilo.join(5)
+        self.assertFalse(self.hilo.is_alive())
+        for cliente in sockets:
+            cliente.close()
+
+
+class ReceiverManagerTest(SimpleTestCase):
+    """build_receiver elige la clase por RECEIVER_MODES"""
+
+    def setUp(self):
+        for parche in (
+            mock.patch.object(TCPReceiver, '_register_configuration'),
+            mock.patch('gps.receivers.tcp_receiver.logging_manager'),
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def test_modos(self):
+        config = SimpleNamespace(protocolo='TQ', configuracion_avanzada={
+            'modo_receptor': 'ASYNCIO', 'workers': '3', 'max_pendientes': 50, 'tamano_lectura': '1024',
+        })
+        receptor = receiver_manager.build_receiver('127.0.0.1', 5999, config)
+        self.assertIs(type(receptor), AsyncTCPReceiver)
+        self.assertEqual((receptor.workers, receptor.max_pendientes, receptor.tamano_lectura), (3, 50, 1024))
+
+        config.configuracion_avanzada = {'modo_receptor': 'threads', 'workers': 3}
+        self.assertIs(type(receiver_manager.build_receiver('127.0.0.1', 5999, config)), TCPReceiver)
+        config.configuracion_avanzada = {'modo_receptor': 'otro'}
+        with self.assertLogs('gps.receiver_manager', 'WARNING'):
+            self.assertIs(type(receiver_manager.build_receiver('127.0.0.1', 5999, config)), TCPReceiver)
+        self.assertIs(type(receiver_manager.build_receiver('127.0.0.1', 5999)), TCPReceiver)
+
+
+def registro_posicion(numero, fec_gps, movil_id=1, empresa_id=1):
+    """Registro como los que encola TCPReceiver.save_to_database en el write-behind"""
+    return {
+        'empresa_id': empresa_id, 'movil_id': movil_id, 'device_id': 866813300000000 + numero,
+        'fec_gps': fec_gps, 'fec_report': fec_gps + timedelta(seconds=2),
+        'lat': -34.6 - numero / 1000, 'lon': -58.4, 'velocidad': 40 + numero, 'rumbo': 90, 'altitud': 0,
+        'sats': 8, 'ign_on': True, 'is_valid': True, 'protocol': 'TQ', 'provider': 'Queclink',
+        'fecha_recepcion': fec_gps + timedelta(seconds=3),
+    }
+
+
+class WriteBehindSpillTest(SimpleTestCase):
+    """Spill a disco y reproceso del write-behind (gps/receivers/write_behind.py)"""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.spill = Path(directorio.name) / 'spill_posiciones.jsonl'
+        self.write_behind = PosicionWriteBehind(self.spill, batch_size=2)
+        inicio = datetime(2025, 10, 18, 12, 0, tzinfo=timezone.utc)
+        self.registros = [registro_posicion(n, inicio + timedelta(seconds=n)) for n in range(3)]
+        self.lotes = []
+
+    def flush_falso(self, falla_en=None):
+        def flush(lote, reproceso=False):
+            if lote[0]['device_id'] == falla_en:
+                # Como el _flush real: el lote fallido vuelve al spill
+                self.write_behind._volcar_spill(lote)
+                return False
+            self.lotes.append((lote, reproceso))
+            return True
+        return flush
+
+    def test_detenido_va_al_spill_y_se_reprocesa(self):
+        for registro in self.registros:
+            self.assertFalse(self.write_behind.encolar(dict(registro)))
+        self.assertEqual(self.write_behind.stats['spill_registros'], 3)
+
+        self.write_behind._flush = self.flush_falso()
+        self.write_behind._reprocesar_spill()
+        # Mismos registros (fechas con zona incluida), en orden y en lotes de batch_size
+        self.assertEqual(self.lotes, [(self.registros[:2], True), (self.registros[2:], True)])
+        self.assertEqual(self.write_behind.stats['spill_reprocesados'], 3)
+        self.assertFalse(self.spill.exists())
+        self.assertFalse(self.spill.with_suffix('.procesando').exists())
+
+    def test_lote_fallido_queda_en_el_spill(self):
+        self.write_behind.batch_size = 1
+        self.write_behind._volcar_spill(self.registros)
+        self.write_behind._flush = self.flush_falso(falla_en=self.registros[1]['device_id'])
+        self.write_behind._reprocesar_spill()
+        self.assertEqual(self.lotes, [(self.registros[:1], True)])
+
+        self.write_behind._flush = self.flush_falso()
+        self.write_behind._reprocesar_spill()
+        self.assertEqual([lote for lote, _ in self.lotes[1:]], [self.registros[1:2], self.registros[2:]])
+        self.assertFalse(self.spill.exists())
+
+    def test_error_de_base_va_al_spill(self):
+        # SimpleTestCase no deja consultar la base: el lote entero tiene que quedar en disco
+        with self.assertLogs('gps.receivers.write_behind', 'ERROR'):
+            self.assertFalse(self.write_behind._flush(self.registros))
+        self.assertEqual(self.write_behind.stats['errores_flush'], 1)
+        self.assertEqual(len(self.spill.read_text(encoding='utf-8').splitlines()), 3)
+
+
+class WriteBehindStatusTest(TestCase):
+    """El upsert de MovilStatus no pisa una posición más nueva"""
+
+    def setUp(self):
+        from authentication.models import Empresa
+        from moviles.models import Movil
+
+        self.empresa = Empresa.objects.create(code='TEST', legal_name='Empresa test')
+        self.movil = Movil.objects.create(patente='AA123BB', gps_id='866813300000001')
+        self.write_behind = PosicionWriteBehind(Path(tempfile.gettempdir()) / 'spill_status_test.jsonl')
+        self.inicio = datetime(2025, 10, 18, 12, 0, tzinfo=timezone.utc)
+
+    def registro(self, numero, minutos):
+        return registro_posicion(numero, self.inicio + timedelta(minutes=minutos),
+                                 movil_id=self.movil.id, empresa_id=self.empresa.id)
+
+    def status(self):
+        from moviles.models import MovilStatus
+        return MovilStatus.objects.get(movil=self.movil)
+
+    def test_no_pisa_posicion_mas_nueva(self):
+        self.assertTrue(self.write_behind._flush([self.registro(1, 10)]))
+        self.assertEqual(self.status().fecha_gps, self.inicio + timedelta(minutes=10))
+
+        # Descarga atrasada del equipo / reproceso del spill: no cambia el status
+        self.assertTrue(self.write_behind._flush([self.registro(2, 5)]))
+        self.assertTrue(self.write_behind._flush([self.registro(3, 1)], reproceso=True))
+        status = self.status()
+        self.assertEqual(status.fecha_gps, self.inicio + timedelta(minutes=10))
+        self.assertEqual(float(status.ultima_velocidad_kmh), 41)
+
+        # Dentro del lote gana la más reciente, y una más nueva sí actualiza
+        self.assertTrue(self.write_behind._flush([self.registro(5, 20), self.registro(4, 15)], reproceso=True))
+        status = self.status()
+        self.assertEqual(status.fecha_gps, self.inicio + timedelta(minutes=20))
+        self.assertEqual(float(status.ultima_velocidad_kmh), 45)
+
+
+class EstadisticasRecepcionMemoriaTest(TestCase):
+    """Contadores en memoria y upsert de EstadisticasRecepcion (gps/receivers/estadisticas.py)"""
+
+    def setUp(self):
+        from gps.models import TipoEquipoGPS
+
+        TipoEquipoGPS.objects.create(id=1, codigo='TQ', nombre='TQ', fabricante='Queclink', protocolo='TCP',
+                                     puerto_default=5003, formato_datos={})
+        self.estadisticas = EstadisticasRecepcionMemoria(puerto=5003)
+
+    def fila(self):
+        from gps.models import EstadisticasRecepcion
+        return EstadisticasRecepcion.objects.get(receptor__puerto=5003, fecha=dj_timezone.now().date())
+
+    def test_flush_suma_sobre_la_fila_del_dia(self):
+        self.estadisticas.registrar_recibido(3)
+        self.estadisticas.registrar_procesado([1, 2, 2], cantidad=3)
+        self.estadisticas.registrar_error()
+        self.assertTrue(self.estadisticas.flush())
+        fila = self.fila()
+        self.assertEqual((fila.datos_recibidos, fila.datos_procesados, fila.errores, fila.equipos_conectados),
+                         (3, 3, 1, 2))
+        # La configuración del receptor se crea una sola vez
+        self.assertEqual(fila.receptor.nombre, 'Receptor TCP Puerto 5003')
+
+        self.estadisticas.registrar_recibido(2)
+        self.estadisticas.registrar_procesado([3, None], cantidad=2)
+        self.assertTrue(self.estadisticas.flush())
+        fila = self.fila()
+        self.assertEqual((fila.datos_recibidos, fila.datos_procesados, fila.errores, fila.equipos_conectados),
+                         (5, 5, 1, 3))
+        self.assertEqual(self.estadisticas.stats['flushes'], 2)
+        self.assertEqual(self.estadisticas.get_stats()['pendientes'], {'recibidos': 0, 'procesados': 0, 'errores': 0})
+
+    def test_sin_pendientes_no_escribe(self):
+        from gps.models import EstadisticasRecepcion
+
+        self.assertTrue(self.estadisticas.flush())
+        self.assertFalse(EstadisticasRecepcion.objects.exists())
+        self.assertEqual(self.estadisticas.stats['flushes'], 0)
+
+    def test_equipos_conectados_no_baja(self):
+        self.estadisticas.registrar_procesado(range(10), cantidad=10)
+        self.assertTrue(self.estadisticas.flush())
+
+        # Otro proceso (p. ej. después de un reinicio) con menos equipos vistos
+        otro = EstadisticasRecepcionMemoria(puerto=5003)
+        otro.registrar_procesado([1, 2], cantidad=2)
+        self.assertTrue(otro.flush())
+        fila = self.fila()
+        self.assertEqual(fila.equipos_conectados, 10)
+        self.assertEqual(fila.datos_procesados, 12)
+
+    def test_error_de_escritura_devuelve_los_contadores(self):
+        self.estadisticas.registrar_recibido(4)
+        with mock.patch('gps.receivers.estadisticas.connection.cursor', side_effect=RuntimeError('sin base')):
+            self.assertFalse(self.estadisticas.flush())
+        self.assertEqual(self.estadisticas.stats['errores_flush'], 1)
+        self.assertEqual(self.estadisticas.get_stats()['pendientes']['recibidos'], 4)
+
+        self.estadisticas.registrar_recibido(1)
+        self.assertTrue(self.estadisticas.flush())
+        self.assertEqual(self.fila().datos_recibidos, 5)
+
+    def test_cambio_de_dia_escribe_lo_pendiente_en_el_dia_anterior(self):
+        self.estadisticas.registrar_recibido(7)
+        ayer = self.estadisticas.get_stats()['fecha']
+        manana = dj_timezone.now() + timedelta(days=1)
+        with mock.patch('gps.receivers.estadisticas.timezone.now', return_value=manana), \
+                mock.patch('gps.receivers.estadisticas.threading.Thread') as hilo:
+            self.estadisticas.registrar_recibido(1)
+        pendiente = hilo.call_args.kwargs['args'][0]
+        self.assertEqual(pendiente['fecha'].isoformat(), ayer)
+        self.assertEqual(pendiente['recibidos'], 7)
+        stats = self.estadisticas.get_stats()
+        self.assertEqual(stats['fecha'], manana.date().isoformat())
+        self.assertEqual(stats['pendientes']['recibidos'], 1)
+
+
+class DeviceRegistryTest(SimpleTestCase):
+    """Resolución de equipos y búsqueda de móviles en memoria (gps/device_registry.py)"""
+
+    def setUp(self):
+        self.entradas = [
+            EntradaMovil(7, patente='OVV799', alias='Camion 15', codigo='C15', gps_id='860007', empresa_id=1),
+            EntradaMovil(3, patente='ASN773', alias='Camion 5', codigo='C5', gps_id='860003', empresa_id=1),
+            EntradaMovil(5, patente='AB123CD', alias=None, codigo='5', gps_id=None, activo=False),
+        ]
+        self.cargas = []
+        self.busquedas = []
+        self.en_base = {}
+
+        def loader(gps_id=None):
+            self.cargas.append(gps_id)
+            if gps_id is None:
+                return list(self.entradas)
+            return [e for e in self.entradas if e.gps_id == gps_id]
+
+        def buscador(texto, exacto):
+            self.busquedas.append((texto, exacto))
+            return self.en_base.get(texto)
+
+        self.registro = DeviceRegistry(loader=loader, buscador=buscador)
+
+    def test_buscar_como_icontains_en_orden_de_id(self):
+        self.assertEqual(self.registro.buscar('camion').id, 3)
+        self.assertEqual(self.registro.buscar('CAMION 1').id, 7)
+        self.assertEqual(self.registro.buscar('5').id, 3)
+        self.assertEqual(self.registro.buscar('5', exacto=True).id, 5)
+        self.assertEqual(self.registro.buscar('asn773', exacto=True).id, 3)
+        self.assertIsNone(self.registro.buscar(''))
+        self.assertEqual(self.cargas, [None])
+        self.assertEqual(self.busquedas, [])
+
+    def test_buscar_en_la_base_si_no_esta(self):
+        # Móvil creado (o renombrado) en otro proceso después de la carga
+        self.en_base['AA001AA'] = EntradaMovil(2, patente='AA001AA', alias='Nuevo', gps_id='860002', empresa_id=1)
+        self.assertEqual(self.registro.buscar('AA001AA').id, 2)
+        self.assertEqual(self.busquedas, [('AA001AA', False)])
+        # Queda en el registro: ni la búsqueda ni el gps_id vuelven a la base
+        self.assertEqual(self.registro.buscar('nuevo').id, 2)
+        self.assertEqual(self.registro.buscar('camion').id, 3)
+        self.assertEqual(self.registro.resolver('860002').id, 2)
+        self.assertEqual(len(self.busquedas), 1)
+        self.assertEqual(self.cargas, [None])
+
+        self.assertIsNone(self.registro.buscar('XYZ', exacto=True))
+        self.assertEqual(self.busquedas[-1], ('XYZ', True))
+        self.assertEqual(self.registro.get_stats()['busquedas_db'], 2)
+
+    def test_orden_tras_actualizar(self):
+        self.registro.buscar('camion')
+        self.registro.actualizar(EntradaMovil(1, patente='ZZ999ZZ', alias='Camion 9'))
+        self.assertEqual(self.registro.buscar('camion').id, 1)
+        self.registro.invalidar(movil_id=1)
+        self.assertEqual(self.registro.buscar('camion').id, 3)
+
+    def test_resolver_con_cache_negativa(self):
+        self.assertEqual(self.registro.resolver(' 860003 ').id, 3)
+        self.assertIsNone(self.registro.resolver('999'))
+        self.assertIsNone(self.registro.resolver('999'))
+        self.assertEqual(self.cargas, [None, '999'])
+        self.assertEqual(self.registro.get_stats()['negativos'], 1)
+        self.registro.invalidar(gps_id='999')
+        self.registro.resolver('999')
+        self.assertEqual(self.cargas, [None, '999', '999'])
+
+
+class GeocodeWorkerTest(SimpleTestCase):
+    """Cola coalescente del worker de geocodificación (gps/geocode_worker.py)"""
+
+    def test_sin_iniciar_no_encola(self):
+        worker = GeocodeWorker()
+        self.assertFalse(worker.encolar(1, -34.6, -58.4, movil_id=1))
+        self.assertFalse(worker.activo)
+        self.assertEqual(worker._hilos, [])
+
+        externo = GeocodeWorker(modo=MODO_EXTERNO)
+        externo.start()
+        self.assertFalse(externo.activo)
+        self.assertFalse(externo.encolar(1, -34.6, -58.4, movil_id=1))
+
+    def test_coalesce_por_movil(self):
+        worker = GeocodeWorker(max_pendientes=3)
+        worker._running = True  # cola activa sin hilos consumidores
+        self.assertTrue(worker.encolar(10, -34.60, -58.40, movil_id=1))
+        self.assertTrue(worker.encolar(11, -34.70, -58.50, movil_id=2))
+        self.assertTrue(worker.encolar(12, -34.61, -58.41, movil_id=1))
+        self.assertTrue(worker.encolar(13, -34.80, -58.60))
+        self.assertFalse(worker.encolar(14, None, -58.60, movil_id=3))
+
+        # El móvil 1 conserva su lugar en la fila pero con el punto nuevo
+        pendientes = list(worker._pendientes.values())
+        self.assertEqual([p['posicion_id'] for p in pendientes], [12, 11, 13])
+        self.assertEqual(pendientes[0]['lat'], -34.61)
+        self.assertEqual(worker.stats['coalescidos'], 1)
+
+        # Con la cola llena se descarta el pedido más viejo
+        worker.encolar(15, -34.90, -58.70, movil_id=4)
+        self.assertEqual([p['posicion_id'] for p in worker._pendientes.values()], [11, 13, 15])
+        self.assertEqual(worker.stats['descartados'], 1)
+
+    def test_hilos_procesan_la_cola(self):
+        worker = GeocodeWorker(workers=2)
+        procesados = []
+        listo = threading.Event()
+
+        def procesar(pedido):
+            procesados.append(pedido['posicion_id'])
+            if len(procesados) == 3:
+                listo.set()
+
+        worker.procesar = procesar
+        worker.start()
+        self.addCleanup(worker.stop)
+        self.assertTrue(worker.activo)
+        for movil_id in range(3):
+            worker.encolar(100 + movil_id, -34.6, -58.4, movil_id=movil_id)
+        self.assertTrue(listo.wait(5))
+        self.assertEqual(sorted(procesados), [100, 101, 102])
+
+
+class LectorPosicionesNuevasTest(PosicionesConAntiguedadMixin, TestCase):
+    """El worker externo de geocodificación no saltea commits tardíos (gps/geocode_worker.py)"""
+
+    def setUp(self):
+        from moviles.models import Movil
+
+        super().setUp()
+        self.otro = Movil.objects.create(patente='AD789EF', gps_id='866813300000002')
+
+    def leer(self, lector):
+        return [posicion['id'] for posicion in lector.leer()]
+
+    def test_commit_tardio(self):
+        self.crear(1, 0, 600)
+        lector = LectorPosicionesNuevas(0, margen_segundos=60)
+        self.assertEqual(self.leer(lector), [1])
+        self.crear(3, 2, 1)
+        self.assertEqual(self.leer(lector), [3])
+
+        # La 2 (último fix del otro móvil antes de estacionar) se confirmó
+        # después de que se leyó la 3: se lee en la vuelta siguiente y una sola vez
+        self.crear(2, 1, 1)
+        Posicion.objects.filter(id=2).update(movil=self.otro)
+        self.assertEqual(self.leer(lector), [2])
+        self.assertEqual(self.leer(lector), [])
+        self.assertEqual(lector.ultimo_id, 3)
+        self.assertEqual(lector.stats['tardias'], 1)
+
+    def test_tardia_mas_vieja_no_pisa_la_nueva(self):
+        lector = LectorPosicionesNuevas(0, margen_segundos=60)
+        self.crear(5, 2, 1)
+        self.assertEqual(self.leer(lector), [5])
+        # Fix anterior del mismo móvil: su dirección no es la actual
+        self.crear(4, 1, 1)
+        self.assertEqual(self.leer(lector), [])
+
+    def test_fuera_de_la_ventana_no_se_relee(self):
+        lector = LectorPosicionesNuevas(0, margen_segundos=60)
+        self.crear(8, 2, 1)
+        self.assertEqual(self.leer(lector), [8])
+        self.crear(7, 1, 600)
+        Posicion.objects.filter(id=7).update(movil=self.otro)
+        self.assertEqual(self.leer(lector), [])
+
+
+class GeocodificacionSenalTest(TestCase):
+    """La señal de MovilStatus respeta la geocodificación reciente y no inicia el worker"""
+
+    def setUp(self):
+        from moviles.models import Movil
+        from . import signals
+
+        self.movil = Movil.objects.create(patente='AC456DE')
+        # La posición histórica automática no es parte de este test
+        post_save.disconnect(signals.crear_posicion_historica, sender=signals.MovilStatus)
+        self.addCleanup(post_save.connect, signals.crear_posicion_historica, sender=signals.MovilStatus)
+        parche = mock.patch.object(geocode_worker, 'encolar')
+        self.encolar = parche.start()
+        self.addCleanup(parche.stop)
+
+    def guardar_status(self):
+        from moviles.models import MovilStatus
+        MovilStatus.objects.update_or_create(movil=self.movil, defaults={'ultimo_lat': -34.6, 'ultimo_lon': -58.4})
+
+    def test_worker_inactivo(self):
+        self.assertFalse(geocode_worker.activo)
+        self.guardar_status()
+        self.encolar.assert_not_called()
+
+    def test_omite_geocodificacion_reciente(self):
+        from moviles.models import MovilGeocode
+
+        with mock.patch.object(geocode_worker, '_running', True):
+            self.guardar_status()
+            self.assertEqual(self.encolar.call_count, 1)
+
+            geocode = MovilGeocode.objects.create(movil=self.movil, fecha_geocodificacion=dj_timezone.now())
+            self.guardar_status()
+            self.assertEqual(self.encolar.call_count, 1)
+
+            geocode.fecha_geocodificacion = dj_timezone.now() - timedelta(hours=25)
+            geocode.save()
+            self.guardar_status()
+            self.assertEqual(self.encolar.call_count, 2)
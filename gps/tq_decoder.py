@@ -0,0 +1,196 @@
+"""
+Decodificador binario de tramas TQ (sin pasar por hexadecimal)
+==============================================================
+
+Las funciones get_*_chino de BaseProcessor (y getLATchino/getLONchino de
+gps/protocolo.py) convierten la trama entera a hex y después cortan el
+string e int()-ean cada campo. Los campos de la trama TQ están en BCD
+(cada nibble es un dígito decimal), así que se pueden leer directamente de
+los bytes con una tabla de 256 entradas.
+
+Layout de la trama binaria (offsets en bytes; el hex equivalente es 2x):
+
+    0       0x24 ('$')
+    1-5     ID del equipo (10 dígitos BCD, se usan los últimos 5)
+    6-8     hora GPS HHMMSS
+    9-11    fecha GPS DDMMYY
+    12-16   latitud GGMM + 6 decimales de minuto
+    17-21   longitud GGGMM + 5 decimales de minuto
+    22-24   velocidad (3 dígitos, nudos) + rumbo (3 dígitos, grados)
+
+decode_tq() devuelve exactamente los mismos valores que el camino hex
+(ver gps/tests.py); decode_tq_lote() decodifica una lista de tramas en
+columnas (arrays de numpy si está instalado).
+"""
+
+import struct
+from typing import Dict, List, Optional, Sequence
+
+# Dependencia opcional: el modo lote funciona sin numpy (más lento)
+try:
+    import numpy as np
+    NP_AVAILABLE = True
+except Exception:
+    NP_AVAILABLE = False
+    np = None  # type: ignore
+
+# Los 25 bytes con campos útiles, leídos de una vez
+TRAMA_TQ = struct.Struct('>25B')
+LARGO_MINIMO = TRAMA_TQ.size
+
+# byte -> dos dígitos hex (para ID/fecha/hora, que el camino hex devuelve como texto)
+_HEX = tuple(f'{i:02x}' for i in range(256))
+# byte -> valor BCD (0-99) o -1 si algún nibble no es un dígito decimal
+_BCD = tuple((i >> 4) * 10 + (i & 0x0F) if (i >> 4) < 10 and (i & 0x0F) < 10 else -1 for i in range(256))
+
+
+def decode_tq(data: bytes) -> Optional[Dict]:
+    """
+    Decodificar los campos de una trama TQ binaria.
+
+    Args:
+        data: Trama completa (bytes, bytearray o memoryview)
+
+    Returns:
+        Diccionario con device_id, hora_gps, fecha_gps, latitud, longitud,
+        velocidad_nudos y rumbo, o None si la trama es más corta que
+        LARGO_MINIMO (el llamador debe usar el camino hex)
+    """
+    if len(data) < LARGO_MINIMO:
+        return None
+    b = TRAMA_TQ.unpack_from(data)
+
+    return {
+        'device_id': _HEX[b[3]][1] + _HEX[b[4]] + _HEX[b[5]],
+        'hora_gps': f"{_HEX[b[6]]}:{_HEX[b[7]]}:{_HEX[b[8]]}",
+        'fecha_gps': f"{_HEX[b[9]]}/{_HEX[b[10]]}/{_HEX[b[11]]}",
+        'latitud': _latitud(b),
+        'longitud': _longitud(b),
+        'velocidad_nudos': _velocidad(b),
+        'rumbo': _rumbo(b),
+    }
+
+
+def _latitud(b) -> float:
+    grados, minutos, d1, d2, d3 = _BCD[b[12]], _BCD[b[13]], _BCD[b[14]], _BCD[b[15]], _BCD[b[16]]
+    if min(grados, minutos, d1, d2, d3) < 0:
+        return 0.0
+    decimales_minutos = (d1 * 10000 + d2 * 100 + d3) / 1000000.0
+    minutos_completos = minutos + decimales_minutos
+    latitud = grados + (minutos_completos / 60.0)
+    return round(-latitud, 7)
+
+
+def _longitud(b) -> float:
+    # GGG MM DDDDD: los campos cortan los bytes a mitad de nibble
+    if min(_BCD[b[17]], _BCD[b[18]], _BCD[b[19]], _BCD[b[20]], _BCD[b[21]]) < 0:
+        return 0.0
+    grados = _BCD[b[17]] * 10 + (b[18] >> 4)
+    minutos = (b[18] & 0x0F) * 10 + (b[19] >> 4)
+    decimales_minutos = ((b[19] & 0x0F) * 10000 + _BCD[b[20]] * 100 + _BCD[b[21]]) / 100000.0
+    minutos_completos = minutos + decimales_minutos
+    longitud = grados + (minutos_completos / 60.0)
+    return round(-longitud, 7)
+
+
+def _velocidad(b) -> int:
+    if _BCD[b[22]] < 0 or (b[23] >> 4) > 9:
+        return 0
+    velocidad = _BCD[b[22]] * 10 + (b[23] >> 4)
+    return velocidad if velocidad <= 255 else 0
+
+
+def _rumbo(b) -> int:
+    if (b[23] & 0x0F) > 9 or _BCD[b[24]] < 0:
+        return 0
+    rumbo = (b[23] & 0x0F) * 100 + _BCD[b[24]]
+    return rumbo if rumbo <= 360 else 0
+
+
+def decode_tq_lote(tramas: Sequence[bytes]) -> Dict[str, object]:
+    """
+    Decodificar muchas tramas a la vez en formato columnar.
+
+    Con numpy, los campos numéricos se calculan vectorizados sobre una
+    matriz (n_tramas x 25) armada con una sola copia. Las tramas más cortas
+    que LARGO_MINIMO quedan con completa=False y valores en cero.
+    Latitud/longitud pueden diferir de decode_tq() en el séptimo decimal
+    (np.round escala por 10^7 en vez de redondear exacto como round()).
+
+    Args:
+        tramas: Tramas binarias TQ
+
+    Returns:
+        Dict de columnas: device_id (lista de str), latitud, longitud
+        (float64), velocidad_nudos, rumbo, dia, mes, anio, hora, minuto,
+        segundo (int16) y completa (bool)
+    """
+    if not NP_AVAILABLE:
+        return _decode_lote_python(tramas)
+
+    n = len(tramas)
+    relleno = b'\xff' * LARGO_MINIMO
+    matriz = np.frombuffer(
+        b''.join(bytes(t[:LARGO_MINIMO]) + relleno[len(t):] for t in tramas),
+        dtype=np.uint8,
+    ).reshape(n, LARGO_MINIMO)
+    completa = np.fromiter((len(t) >= LARGO_MINIMO for t in tramas), dtype=bool, count=n)
+
+    alto = (matriz >> 4).astype(np.int32)
+    bajo = (matriz & 0x0F).astype(np.int32)
+    digitos_ok = (alto < 10) & (bajo < 10)
+    bcd = alto * 10 + bajo
+
+    def ok(*columnas):
+        return np.logical_and.reduce([digitos_ok[:, c] for c in columnas])
+
+    # Latitud GG MM DDDDDD
+    lat_ok = ok(12, 13, 14, 15, 16)
+    lat = bcd[:, 12] + (bcd[:, 13] + (bcd[:, 14] * 10000 + bcd[:, 15] * 100 + bcd[:, 16]) / 1000000.0) / 60.0
+    latitud = np.where(lat_ok, np.round(-lat, 7), 0.0)
+
+    # Longitud GGG MM DDDDD
+    lon_ok = ok(17, 18, 19, 20, 21)
+    grados = bcd[:, 17] * 10 + alto[:, 18]
+    minutos = bajo[:, 18] * 10 + alto[:, 19]
+    decimales = (bajo[:, 19] * 10000 + bcd[:, 20] * 100 + bcd[:, 21]) / 100000.0
+    lon = grados + (minutos + decimales) / 60.0
+    longitud = np.where(lon_ok, np.round(-lon, 7), 0.0)
+
+    vel = bcd[:, 22] * 10 + alto[:, 23]
+    vel_ok = digitos_ok[:, 22] & (alto[:, 23] < 10) & (vel <= 255)
+    rumbo = bajo[:, 23] * 100 + bcd[:, 24]
+    rumbo_ok = (bajo[:, 23] < 10) & digitos_ok[:, 24] & (rumbo <= 360)
+
+    columnas = {
+        'device_id': [_HEX[b3][1] + _HEX[b4] + _HEX[b5] for b3, b4, b5 in matriz[:, 3:6].tolist()],
+        'latitud': latitud,
+        'longitud': longitud,
+        'velocidad_nudos': np.where(vel_ok, vel, 0).astype(np.int16),
+        'rumbo': np.where(rumbo_ok, rumbo, 0).astype(np.int16),
+        'completa': completa,
+    }
+    for nombre, columna in (('hora', 6), ('minuto', 7), ('segundo', 8), ('dia', 9), ('mes', 10), ('anio', 11)):
+        columnas[nombre] = np.where(digitos_ok[:, columna], bcd[:, columna], -1).astype(np.int16)
+    return columnas
+
+
+def _decode_lote_python(tramas: Sequence[bytes]) -> Dict[str, List]:
+    """Modo lote sin numpy: mismas columnas como listas"""
+    columnas = {nombre: [] for nombre in (
+        'device_id', 'latitud', 'longitud', 'velocidad_nudos', 'rumbo',
+        'hora', 'minuto', 'segundo', 'dia', 'mes', 'anio', 'completa',
+    )}
+    relleno = b'\xff' * LARGO_MINIMO
+    for trama in tramas:
+        completa = len(trama) >= LARGO_MINIMO
+        b = TRAMA_TQ.unpack_from(bytes(trama[:LARGO_MINIMO]) + relleno[len(trama):])
+        columnas['device_id'].append(_HEX[b[3]][1] + _HEX[b[4]] + _HEX[b[5]])
+        columnas['latitud'].append(_latitud(b))
+        columnas['longitud'].append(_longitud(b))
+        columnas['velocidad_nudos'].append(_velocidad(b))
+        columnas['rumbo'].append(_rumbo(b))
+        for nombre, indice in (('hora', 6), ('minuto', 7), ('segundo', 8), ('dia', 9), ('mes', 10), ('anio', 11)):
+            columnas[nombre].append(_BCD[b[indice]])
+        columnas['completa'].append(completa)
+    return columnas
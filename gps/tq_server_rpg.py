@@ -20,6 +20,9 @@ from typing import Dict, Optional, Tuple
 # Importar las funciones y protocolos existentes
 import funciones
 import protocolo
+from geocode_cache import geocode_cache
+from geo_http import nominatim
+from framing import TQFramer
 
 class TQServerRPG:
     def __init__(self, host: str = '0.0.0.0', port: int = 5003, 
@@ -40,7 +43,8 @@ class TQServerRPG:
         
         # Configuración de geocodificación
         self.geocoding_enabled = True  # Variable para habilitar/deshabilitar geocodificación
-        self.geocoding_cache = {}  # Cache para evitar consultas repetidas
+        self.geocoding_cache = geocode_cache  # Instancia global del módulo (ver geocode_cache.py)
+        self._ultimo_error_geocoding = None
         self.last_geocoding_request = 0  # Control de rate limiting
         
         # Configurar logging
@@ -240,57 +244,14 @@ class TQServerRPG:
             return ""
         
         try:
-            # Crear clave para cache (redondeada a 4 decimales para evitar consultas muy precisas)
-            cache_key = f"{latitude:.4f},{longitude:.4f}"
-            
-            # Verificar cache
-            if cache_key in self.geocoding_cache:
-                return self.geocoding_cache[cache_key]
-            
-            # Rate limiting: máximo 1 consulta por segundo (respetando política de Nominatim)
-            current_time = time.time()
-            if current_time - self.last_geocoding_request < 1.0:
-                time.sleep(1.0 - (current_time - self.last_geocoding_request))
-            
-            # Realizar consulta a Nominatim
-            url = "https://nominatim.openstreetmap.org/reverse"
-            params = {
-                'format': 'json',
-                'lat': latitude,
-                'lon': longitude,
-                'zoom': 18,  # Nivel de detalle (18 = dirección específica)
-                'addressdetails': 1,
-                'accept-language': 'es'  # Preferir respuestas en español
-            }
-            
-            headers = {
-                'User-Agent': 'TQ-Server-RPG/1.0 (GPS Tracking System)'  # Identificar la aplicación
-            }
-            
-            response = requests.get(url, params=params, headers=headers, timeout=5)
-            self.last_geocoding_request = time.time()
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                if 'display_name' in data:
-                    address = data['display_name']
-                    
-                    # Guardar en cache
-                    self.geocoding_cache[cache_key] = address
-                    
-                    # Limpiar cache si crece mucho (mantener últimos 100)
-                    if len(self.geocoding_cache) > 100:
-                        # Eliminar 20 entradas más antiguas
-                        old_keys = list(self.geocoding_cache.keys())[:20]
-                        for key in old_keys:
-                            del self.geocoding_cache[key]
-                    
-                    return address
-                else:
-                    return "Dirección no encontrada"
-            else:
-                return f"Error geocodificación: HTTP {response.status_code}"
+            # Cache por celda geohash; corriendo como script solo está el nivel en memoria
+            # del proceso (sin Django no se comparte con los workers ni con la tabla)
+            self._ultimo_error_geocoding = None
+            data = self.geocoding_cache.obtener(latitude, longitude, self._consultar_nominatim)
+            
+            if data:
+                return data['display_name']
+            return self._ultimo_error_geocoding or "Dirección no encontrada"
                 
         except requests.exceptions.Timeout:
             return "Timeout geocodificación"
@@ -300,6 +261,34 @@ class TQServerRPG:
             self.logger.error(f"Error en geocodificación: {e}")
             return f"Error geocodificación: {str(e)[:30]}"
 
+    def _consultar_nominatim(self, latitude: float, longitude: float) -> Optional[Dict]:
+        """Consulta a Nominatim ante un miss del cache (None si no hay dirección)"""
+        # Realizar consulta a Nominatim (sesión keep-alive y rate limit de 1/s en geo_http)
+        params = {
+            'format': 'json',
+            'lat': latitude,
+            'lon': longitude,
+            'zoom': 18,  # Nivel de detalle (18 = dirección específica)
+            'addressdetails': 1,
+            'accept-language': 'es'  # Preferir respuestas en español
+        }
+        
+        headers = {
+            'User-Agent': 'TQ-Server-RPG/1.0 (GPS Tracking System)'  # Identificar la aplicación
+        }
+        
+        response = nominatim.get('/reverse', params=params, headers=headers, timeout=5)
+        self.last_geocoding_request = time.time()
+        
+        if response.status_code != 200:
+            self._ultimo_error_geocoding = f"Error geocodificación: HTTP {response.status_code}"
+            return None
+        
+        data = response.json()
+        if 'display_name' not in data:
+            return None
+        return data
+
     def save_position_to_file(self, position_data: Dict):
         """Guarda una posición en el archivo CSV aplicando filtros de calidad"""
         try:
@@ -838,15 +827,19 @@ class TQServerRPG:
         self.logger.info(f"Nueva conexión desde {client_id}")
         print(f"🔗 Nueva conexión desde {client_id}")
         
+        # Separar tramas completas (un recv puede traer varias o una a medias)
+        framer = TQFramer()
+        
         try:
             while self.running:
                 # Recibir datos del cliente
-                data = client_socket.recv(1024)
+                data = client_socket.recv(4096)
                 if not data:
                     break
                     
-                # Procesar el mensaje recibido con conversión RPG y reenvío UDP
-                self.process_message_with_rpg(data, client_id)
+                # Procesar cada mensaje con conversión RPG y reenvío UDP
+                for trama in framer.feed(data):
+                    self.process_message_with_rpg(trama, client_id)
                 
         except Exception as e:
             self.logger.error(f"Error manejando cliente {client_id}: {e}")
@@ -903,8 +896,10 @@ class TQServerRPG:
         """Retorna estadísticas de geocodificación"""
         return {
             'enabled': self.geocoding_enabled,
-            'cache_size': len(self.geocoding_cache),
-            'last_request': self.last_geocoding_request
+            'cache_size': self.geocoding_cache.get_stats()['entradas_memoria'],
+            'cache': self.geocoding_cache.get_stats(),
+            'last_request': self.last_geocoding_request,
+            'nominatim': nominatim.get_stats()
         }
 
     def create_rpg_message_from_gps(self, position_data: Dict, terminal_id: str) -> str:
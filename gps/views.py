@@ -1,12 +1,25 @@
+import hashlib
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
 
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.permissions import AllowAny
-from .models import Equipo, Posicion, CatMovil, TipoEquipoGPS, ConfiguracionReceptor, EstadisticasRecepcion
+from .models import (
+    Equipo, Posicion, CatMovil, TipoEquipoGPS, ConfiguracionReceptor, EstadisticasRecepcion,
+    RecorridoDiario,
+)
 from moviles.models import Movil, MovilStatus, MovilGeocode, MovilObservacion, MovilFoto, MovilNota
 from .serializers import (
     EquipoSerializer,
@@ -18,14 +31,35 @@ from .serializers import (
     EstadisticasRecepcionSerializer,
     RecorridoStatsSerializer,
     RecorridoFiltrosSerializer,
+    SegmentoRecorridoSerializer,
+    timestamp_argentina,
 )
 from moviles.serializers import (
     MovilSerializer, MovilStatusSerializer, MovilGeocodeSerializer,
     MovilObservacionSerializer, MovilFotoSerializer, MovilNotaSerializer
 )
+from . import codificacion, exportacion, geocode_lote, rollups, segmentacion, simplificacion
+from .pagination import KeysetOpcionalMixin, codificar_cursor, decodificar_cursor
+from .recorrido_stats import estadisticas_queryset
 
 logger = logging.getLogger(__name__)
 
+# Recorridos simplificados de rangos ya cerrados (no cambian)
+LOD_CACHE_TTL = getattr(settings, 'WAYGPS_LOD_CACHE_TTL', 24 * 3600)
+
+# tail vuelve a leer, por debajo del cursor, las posiciones creadas poco antes
+# de la lectura anterior: un INSERT con id menor puede confirmarse después que
+# otro con id mayor y no estar visible todavía cuando se leyó
+TAIL_MARGEN_SEGUNDOS = getattr(settings, 'WAYGPS_TAIL_MARGEN_SEGUNDOS', 10)
+TAIL_VENTANA_IDS = getattr(settings, 'WAYGPS_TAIL_VENTANA_IDS', 5000)
+
+# Columnas del recorrido para el mapa (mismas que PosicionRecorridoSerializer)
+CAMPOS_MAPA = (
+    'id', 'movil_id', 'fec_gps', 'velocidad', 'rumbo', 'lat', 'lon',
+    'altitud', 'sats', 'hdop', 'ign_on', 'direccion',
+)
+FORMATOS_MAPA = ('objetos', 'columnas', 'polyline', 'binario')
+
 
 # MovilViewSet, MovilStatusViewSet, MovilGeocodeViewSet, MovilObservacionViewSet, MovilFotoViewSet, MovilNotaViewSet
 # se movieron a moviles/views.py
@@ -146,15 +180,83 @@ def equipos_frontend(request):
 #     serializer_class = MovilGeocodeSerializer
 
 
-class PosicionViewSet(viewsets.ModelViewSet):
+class PosicionViewSet(KeysetOpcionalMixin, viewsets.ModelViewSet):
     queryset = Posicion.objects.none()
     serializer_class = PosicionSerializer
     
     def get_queryset(self):
         """Optimizar consultas de posiciones"""
-        return Posicion.objects.filter(is_valid=True).select_related('movil').only(
+        queryset = Posicion.objects.filter(is_valid=True).select_related('movil').only(
             'id', 'movil', 'fec_gps', 'lat', 'lon', 'velocidad', 'rumbo', 'sats', 'hdop', 'ign_on', 'direccion'
         )
+        # Con paginación por cursor, filtrar por móvil usa el índice (movil_id, fec_gps)
+        movil_id = self.request.query_params.get('movil_id')
+        if movil_id and self.action in ('list', 'tail'):
+            queryset = queryset.filter(movil_id=movil_id)
+        return queryset
+    
+    @action(detail=False, methods=['get'])
+    def tail(self, request):
+        """
+        Posiciones nuevas desde un cursor, para clientes que hacen polling.
+        
+        Sin cursor devuelve las últimas `limite` posiciones; cada respuesta trae
+        el cursor para la próxima consulta. El cursor es el id de la última
+        posición entregada (no fec_gps), así también aparecen las posiciones que
+        llegan tarde con fec_gps viejo, más el momento de la lectura.
+        
+        Los ids se asignan al insertar pero se ven recién con el commit, así que
+        cada consulta vuelve a traer las posiciones con id hasta el cursor
+        creadas hasta TAIL_MARGEN_SEGUNDOS antes de la lectura anterior: una
+        posición puede llegar repetida y el cliente descarta los ids ya vistos.
+        
+        Parámetros: movil_id (opcional), cursor, limite (default 500, máx. 5000)
+        """
+        try:
+            limite = min(max(int(request.query_params.get('limite', 500)), 1), 5000)
+        except (TypeError, ValueError):
+            limite = 500
+        
+        queryset = self.get_queryset()
+        lectura = timezone.now()
+        cursor = request.query_params.get('cursor')
+        tardias = []
+        if cursor:
+            datos = decodificar_cursor(cursor)
+            try:
+                ultimo_id = int(datos['t'])
+            except (KeyError, TypeError, ValueError):
+                raise ValidationError({'cursor': 'Cursor inválido'})
+            posiciones = list(queryset.filter(id__gt=ultimo_id).order_by('id')[:limite + 1])
+            hay_mas = len(posiciones) > limite
+            posiciones = posiciones[:limite]
+            
+            # Cursores anteriores a la relectura no traen el momento de la lectura
+            lectura_anterior = parse_datetime(str(datos.get('s', '')))
+            if lectura_anterior is not None:
+                tardias = list(queryset.filter(
+                    id__lte=ultimo_id,
+                    id__gt=ultimo_id - TAIL_VENTANA_IDS,
+                    created_at__gte=lectura_anterior - timedelta(seconds=TAIL_MARGEN_SEGUNDOS),
+                ).order_by('id'))
+        else:
+            ultimo_id = 0
+            posiciones = list(queryset.order_by('-id')[:limite])
+            posiciones.reverse()
+            hay_mas = False
+        
+        if posiciones:
+            ultimo_id = posiciones[-1].id
+        nuevo_cursor = codificar_cursor({'t': ultimo_id, 's': lectura.isoformat()})
+        posiciones = tardias + posiciones
+        
+        serializer = self.get_serializer(posiciones, many=True)
+        return Response({
+            'results': serializer.data,
+            'cursor': nuevo_cursor,
+            'next': replace_query_param(request.build_absolute_uri(), 'cursor', nuevo_cursor),
+            'hay_mas': hay_mas,
+        })
     
     @action(detail=False, methods=['get'])
     def por_movil(self, request):
@@ -201,6 +303,10 @@ class EstadisticasRecepcionViewSet(viewsets.ModelViewSet):
     
     def list(self, request, *args, **kwargs):
         """Obtener estadísticas. Si no hay datos en EstadisticasRecepcion, generar desde las posiciones."""
+        # Los receptores acumulan contadores en memoria: volcarlos antes de leer
+        from gps.receiver_manager import flush_receiver_statistics
+        flush_receiver_statistics()
+        
         queryset = self.get_queryset()
         
         # Filtrar por receptor si se proporciona el parámetro receptor
@@ -361,15 +467,45 @@ class EstadisticasRecepcionViewSet(viewsets.ModelViewSet):
 #         return queryset
 
 
-class RecorridosViewSet(viewsets.ModelViewSet):
+class RecorridosViewSet(KeysetOpcionalMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de recorridos GPS (optimizado para grandes volúmenes)."""
 
     queryset = Posicion.objects.none()
     serializer_class = PosicionRecorridoSerializer
     permission_classes = [AllowAny]
 
+    def perform_content_negotiation(self, request, force=False):
+        # Los Accept de las codificaciones compactas se resuelven en list()/exportar_recorrido
+        # (gps/codificacion.py); sin force DRF respondería 406 antes de llegar a la vista
+        return super().perform_content_negotiation(request, force=True)
+
     def get_queryset(self):
         """Filtrar posiciones según parámetros de consulta."""
+        queryset = self._posiciones_filtradas()
+
+        if self.request.query_params.get('vista_mapa') == 'true':
+            self.pagination_class = None
+        elif self.usa_keyset():
+            # El cursor ya acota cada página: sin límite total
+            return queryset
+
+        return queryset[:self._limite_registros()]
+
+    def _limite_registros(self):
+        """`limite` de la consulta, acotado según vista_mapa"""
+        vista_mapa = self.request.query_params.get('vista_mapa')
+        limite_default = 50000 if vista_mapa == 'true' else 10000
+        limite_maximo = 100000 if vista_mapa == 'true' else 50000
+
+        limite = self.request.query_params.get('limite', limite_default)
+        try:
+            limite = int(limite)
+            return min(max(limite, 1), limite_maximo)
+        except (TypeError, ValueError):
+            return limite_default
+
+    def _posiciones_filtradas(self):
+        """Posiciones del móvil con los filtros de la consulta, sin límite"""
         movil_id_param = self.request.query_params.get('movil_id')
         if not movil_id_param:
             return Posicion.objects.none()
@@ -428,21 +564,153 @@ class RecorridosViewSet(viewsets.ModelViewSet):
         if ignicion_encendida == 'true':
             queryset = queryset.filter(ign_on=True)
 
-        vista_mapa = self.request.query_params.get('vista_mapa')
-        limite_default = 50000 if vista_mapa == 'true' else 10000
-        limite_maximo = 100000 if vista_mapa == 'true' else 50000
+        return queryset
 
-        if vista_mapa == 'true':
-            self.pagination_class = None
+    def list(self, request, *args, **kwargs):
+        """
+        Con vista_mapa=true:
+        - zoom o tolerancia: recorrido simplificado (ver _recorrido_simplificado)
+        - formato=columnas|polyline|binario (o Accept equivalente): codificación
+          compacta en vez de la lista de objetos (ver gps/codificacion.py)
+        """
+        if request.query_params.get('vista_mapa') != 'true':
+            return super().list(request, *args, **kwargs)
 
-        limite = self.request.query_params.get('limite', limite_default)
+        formato = codificacion.formato_solicitado(request)
+        if formato not in FORMATOS_MAPA:
+            return Response({'error': f'formato debe ser uno de: {", ".join(FORMATOS_MAPA)}'}, status=400)
+
+        if request.query_params.get('zoom') or request.query_params.get('tolerancia'):
+            return self._recorrido_simplificado(request, formato)
+
+        if formato in codificacion.FORMATOS:
+            filas = self.get_queryset().values_list(*codificacion.CAMPOS_COMPACTOS)
+            contenido, content_type = codificacion.codificar(formato, filas)
+            return HttpResponse(contenido, content_type=content_type)
+        return super().list(request, *args, **kwargs)
+
+    def _recorrido_simplificado(self, request, formato='objetos'):
+        """
+        Nivel de detalle para el mapa (ver gps/simplificacion.py).
+
+        Devuelve la misma lista de posiciones que vista_mapa (mismas claves que
+        PosicionRecorridoSerializer) pero solo con los puntos que cambian el
+        trazo a la tolerancia pedida, más detenciones, cambios de ignición y
+        extremos de velocidad. La cantidad original y la simplificada van en
+        los headers X-Puntos-Originales / X-Puntos-Simplificados. También
+        acepta las codificaciones compactas de list().
+
+        Parámetros: zoom (nivel del mapa) o tolerancia (metros). Se simplifican
+        las primeras `limite` posiciones, igual que sin simplificar.
+        Los recorridos que terminan en el pasado se guardan en cache.
+        """
+        zoom = request.query_params.get('zoom')
+        tolerancia = request.query_params.get('tolerancia')
         try:
-            limite = int(limite)
-            limite = min(max(limite, 1), limite_maximo)
+            zoom = float(zoom) if zoom else None
+            tolerancia = float(tolerancia) if tolerancia else None
         except (TypeError, ValueError):
-            limite = limite_default
-
-        return queryset[:limite]
+            return Response({'error': 'zoom y tolerancia deben ser numéricos'}, status=400)
+
+        clave_cache = None
+        fecha_hasta = parse_datetime(request.query_params.get('fecha_hasta') or '')
+        if fecha_hasta is not None:
+            if timezone.is_naive(fecha_hasta):
+                fecha_hasta = timezone.make_aware(fecha_hasta)
+            if fecha_hasta < timezone.now():
+                parametros = urlencode(sorted(
+                    (clave, valor) for clave, valor in request.query_params.items() if clave != 'formato'
+                ))
+                clave_cache = 'recorrido_lod:' + hashlib.md5(parametros.encode()).hexdigest()
+                simplificado = cache.get(clave_cache)
+                if simplificado is not None:
+                    return self._respuesta_simplificada(formato, *simplificado)
+
+        queryset = self._posiciones_filtradas()
+
+        # Primera pasada: solo lo necesario para decidir qué puntos quedan,
+        # con el mismo tope de filas que el recorrido sin simplificar
+        ids, fechas, lats, lons, velocidades, igniciones = [], [], [], [], [], []
+        primera_pasada = queryset.values_list('id', 'fec_gps', 'lat', 'lon', 'velocidad', 'ign_on')
+        for pk, fec_gps, lat, lon, velocidad, ign_on in primera_pasada[:self._limite_registros()].iterator(
+                chunk_size=5000):
+            if lat is None or lon is None:
+                continue
+            ids.append(pk)
+            fechas.append(fec_gps)
+            lats.append(float(lat))
+            lons.append(float(lon))
+            velocidades.append(velocidad)
+            igniciones.append(ign_on)
+
+        if not ids:
+            return self._respuesta_simplificada(formato, [], 0, tolerancia or 0)
+
+        if tolerancia is None:
+            latitud_media = sum(lats) / len(lats)
+            tolerancia = simplificacion.tolerancia_para_zoom(zoom, latitud_media)
+        indices = simplificacion.simplificar(
+            lats, lons, tolerancia, simplificacion.indices_obligatorios(velocidades, igniciones)
+        )
+        total_original = len(ids)
+        ids_conservados = {ids[i] for i in indices}
+        con_fecha = [fechas[i] for i in indices if fechas[i] is not None]
+        del ids, fechas, lats, lons, velocidades, igniciones
+
+        # Segunda pasada: filas completas de los puntos conservados, leídas por
+        # rango de fec_gps (índice y particiones) en vez de un IN con miles de
+        # ids; las que no quedaron en la simplificación se descartan acá
+        rango = Q(fec_gps__isnull=True)
+        if con_fecha:
+            en_rango = Q(fec_gps__gte=min(con_fecha), fec_gps__lte=max(con_fecha))
+            rango = en_rango if len(con_fecha) == len(ids_conservados) else en_rango | rango
+        filas = [
+            fila for fila in queryset.filter(rango).values_list(*CAMPOS_MAPA).iterator(chunk_size=5000)
+            if fila[0] in ids_conservados
+        ]
+
+        if clave_cache:
+            cache.set(clave_cache, (filas, total_original, tolerancia), LOD_CACHE_TTL)
+        return self._respuesta_simplificada(formato, filas, total_original, tolerancia)
+
+    def _respuesta_simplificada(self, formato, filas, total_original, tolerancia):
+        """Filas CAMPOS_MAPA en el formato pedido, con los headers de la simplificación"""
+        if formato in codificacion.FORMATOS:
+            compactas = (
+                (pk, fec_gps, lat, lon, velocidad, rumbo, ign_on)
+                for pk, _, fec_gps, velocidad, rumbo, lat, lon, _, _, _, ign_on, _ in filas
+            )
+            contenido, content_type = codificacion.codificar(formato, compactas)
+            response = HttpResponse(contenido, content_type=content_type)
+        else:
+            response = Response([self._posicion_mapa(fila) for fila in filas])
+        response['X-Puntos-Originales'] = str(total_original)
+        response['X-Puntos-Simplificados'] = str(len(filas))
+        response['X-Tolerancia-Metros'] = f'{tolerancia:.2f}'
+        return response
+
+    @staticmethod
+    def _posicion_mapa(fila):
+        """Fila CAMPOS_MAPA con las mismas claves que PosicionRecorridoSerializer"""
+        pk, movil_id, fec_gps, velocidad, rumbo, lat, lon, altitud, sats, hdop, ign_on, direccion = fila
+        return {
+            'id': pk,
+            'movil': movil_id,
+            'fec_gps': fec_gps.isoformat() if fec_gps else None,
+            'timestamp': timestamp_argentina(fec_gps),
+            'velocidad': velocidad,
+            'rumbo': rumbo,
+            'lat': float(lat),
+            'lon': float(lon),
+            'altitud': altitud,
+            'sats': sats,
+            'satelites': sats,
+            'hdop': float(hdop) if hdop is not None else None,
+            'ign_on': ign_on,
+            'ignicion': ign_on,
+            'direccion': direccion,
+            'calidad': Posicion.calidad_por_satelites(sats),
+        }
 
     @action(detail=False, methods=['post'])
     def filtrar_recorrido(self, request):
@@ -509,100 +777,19 @@ class RecorridosViewSet(viewsets.ModelViewSet):
             }, status=400)
         
         try:
-            from django.utils import timezone
-            from datetime import datetime, timedelta
-            import math
-            
-            # Obtener posiciones del recorrido
             posiciones = Posicion.objects.filter(
                 movil_id=movil_id,
                 fec_gps__gte=fecha_desde,
                 fec_gps__lte=fecha_hasta,
                 is_valid=True
-            ).order_by('fec_gps')
+            )
+            estadisticas = self._calcular_estadisticas_recorrido(movil_id, posiciones)
             
-            if not posiciones.exists():
+            if estadisticas is None:
                 return Response({
                     'error': 'No se encontraron posiciones para el recorrido especificado'
                 }, status=404)
             
-            # Calcular estadísticas básicas
-            primera_posicion = posiciones.first()
-            ultima_posicion = posiciones.last()
-            
-            # Duración en minutos
-            duracion = (ultima_posicion.fec_gps - primera_posicion.fec_gps).total_seconds() / 60
-            
-            # Velocidades
-            velocidades = [p.velocidad for p in posiciones if p.velocidad is not None]
-            velocidad_maxima = max(velocidades) if velocidades else 0
-            velocidad_promedio = sum(velocidades) / len(velocidades) if velocidades else 0
-            
-            # Distancia total (cálculo aproximado)
-            distancia_total = 0
-            posicion_anterior = None
-            
-            for posicion in posiciones:
-                if posicion_anterior and posicion.lat and posicion.lon and posicion_anterior.lat and posicion_anterior.lon:
-                    # Fórmula de Haversine para calcular distancia entre dos puntos
-                    lat1, lon1 = float(posicion_anterior.lat), float(posicion_anterior.lon)
-                    lat2, lon2 = float(posicion.lat), float(posicion.lon)
-                    
-                    R = 6371  # Radio de la Tierra en km
-                    dlat = math.radians(lat2 - lat1)
-                    dlon = math.radians(lon2 - lon1)
-                    a = math.sin(dlat/2) * math.sin(dlat/2) + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2) * math.sin(dlon/2)
-                    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-                    distancia = R * c
-                    distancia_total += distancia
-                
-                posicion_anterior = posicion
-            
-            # Detenciones (velocidad <= 5 km/h)
-            detenciones = posiciones.filter(velocidad__lte=5).count()
-            
-            # Tiempo detenido vs tiempo en movimiento
-            tiempo_detenido = posiciones.filter(velocidad__lte=5).count()  # Aproximación
-            tiempo_movimiento = posiciones.count() - tiempo_detenido
-            
-            # Rango de velocidades
-            rango_velocidades = {
-                'detenido': posiciones.filter(velocidad__lte=5).count(),
-                'muy_lento': posiciones.filter(velocidad__gt=5, velocidad__lte=15).count(),
-                'lento': posiciones.filter(velocidad__gt=15, velocidad__lte=30).count(),
-                'moderado': posiciones.filter(velocidad__gt=30, velocidad__lte=50).count(),
-                'rapido': posiciones.filter(velocidad__gt=50, velocidad__lte=80).count(),
-                'muy_rapido': posiciones.filter(velocidad__gt=80).count(),
-            }
-            
-            # Información del móvil
-            movil = Movil.objects.get(id=movil_id) if Movil.objects.filter(id=movil_id).exists() else None
-            
-            estadisticas = {
-                'movil_id': movil_id,
-                'movil_info': {
-                    'id': movil.id,
-                    'patente': movil.patente,
-                    'alias': movil.alias,
-                    'codigo': movil.codigo,
-                    'marca': movil.marca,
-                    'modelo': movil.modelo
-                } if movil else None,
-                'fecha_inicio': primera_posicion.fec_gps,
-                'fecha_fin': ultima_posicion.fec_gps,
-                'duracion_minutos': round(duracion, 2),
-                'distancia_km': round(distancia_total, 2),
-                'velocidad_maxima': velocidad_maxima,
-                'velocidad_promedio': round(velocidad_promedio, 2),
-                'puntos_gps': posiciones.count(),
-                'detenciones': detenciones,
-                'tiempo_detenido_minutos': round(tiempo_detenido, 2),
-                'tiempo_movimiento_minutos': round(tiempo_movimiento, 2),
-                'eficiencia_combustible': None,  # Por implementar
-                'rango_velocidades': rango_velocidades,
-                'estadisticas_por_hora': []  # Por implementar
-            }
-            
             serializer = RecorridoStatsSerializer(estadisticas)
             return Response(serializer.data)
             
@@ -611,72 +798,178 @@ class RecorridosViewSet(viewsets.ModelViewSet):
                 'error': f'Error calculando estadísticas: {str(e)}'
             }, status=500)
     
+    def _calcular_estadisticas_recorrido(self, movil_id, posiciones):
+        """
+        Estadísticas del recorrido en una sola pasada (ver gps/recorrido_stats.py).
+        
+        Args:
+            movil_id: ID del móvil
+            posiciones: Queryset de Posicion del recorrido (se lee con una sola consulta)
+        
+        Returns:
+            Dict con las claves de RecorridoStatsSerializer, o None si no hay posiciones
+        """
+        resumen = estadisticas_queryset(posiciones)
+        if resumen is None:
+            return None
+        
+        movil = Movil.objects.filter(id=movil_id).first()
+        return {
+            'movil_id': movil_id,
+            'movil_info': {
+                'id': movil.id,
+                'patente': movil.patente,
+                'alias': movil.alias,
+                'codigo': movil.codigo,
+                'marca': movil.marca,
+                'modelo': movil.modelo
+            } if movil else None,
+            'eficiencia_combustible': None,  # Por implementar
+            **resumen,
+        }
+    
+    @action(detail=False, methods=['get'])
+    def segmentos(self, request):
+        """
+        Viajes y detenciones del móvil en el período (gps/segmentacion.py).
+        
+        Parámetros: movil_id (requerido), fecha_desde, fecha_hasta y tipo (viaje|detencion).
+        Incluye los segmentos que se superponen con el período aunque empiecen antes.
+        """
+        try:
+            movil_id = int(request.query_params.get('movil_id', ''))
+        except ValueError:
+            return Response({'error': 'Se requiere el parámetro movil_id'}, status=400)
+        
+        tipo = request.query_params.get('tipo')
+        if tipo and tipo not in (segmentacion.VIAJE, segmentacion.DETENCION):
+            return Response({'error': 'tipo debe ser viaje o detencion'}, status=400)
+        
+        segmentos = list(segmentacion.segmentos_periodo(
+            movil_id,
+            request.query_params.get('fecha_desde'),
+            request.query_params.get('fecha_hasta'),
+            tipo,
+        ))
+        viajes = [s for s in segmentos if s.tipo == segmentacion.VIAJE]
+        detenciones = [s for s in segmentos if s.tipo == segmentacion.DETENCION]
+        return Response({
+            'movil_id': movil_id,
+            'segmentos': SegmentoRecorridoSerializer(segmentos, many=True).data,
+            'resumen': {
+                'viajes': len(viajes),
+                'detenciones': len(detenciones),
+                'distancia_km': round(sum(s.distancia_km for s in viajes), 2),
+                'minutos_viaje': round(sum(s.duracion_segundos for s in viajes) / 60, 2),
+                'minutos_detenido': round(sum(s.duracion_segundos for s in detenciones) / 60, 2),
+            },
+        })
+    
+    @action(detail=False, methods=['get'])
+    def resumen_flota(self, request):
+        """
+        Totales por móvil entre dos días, desde los resúmenes diarios (gps/rollups.py).
+        
+        Parámetros: fecha_desde y fecha_hasta (AAAA-MM-DD, default los últimos 7 días),
+        movil_id (uno o varios separados por coma) y detalle=true para incluir cada día.
+        """
+        hoy = timezone.now().astimezone(rollups.TZ_ROLLUP).date()
+        try:
+            desde = parse_date(request.query_params.get('fecha_desde', '')) or hoy - timedelta(days=6)
+            hasta = parse_date(request.query_params.get('fecha_hasta', '')) or hoy
+        except ValueError:
+            return Response({'error': 'Fechas inválidas (usar AAAA-MM-DD)'}, status=400)
+        if hasta < desde:
+            return Response({'error': 'fecha_hasta debe ser posterior a fecha_desde'}, status=400)
+        
+        movil_ids = None
+        if request.query_params.get('movil_id'):
+            try:
+                movil_ids = [int(valor) for valor in request.query_params['movil_id'].split(',') if valor.strip()]
+            except ValueError:
+                return Response({'error': 'movil_id inválido'}, status=400)
+        
+        moviles = rollups.resumen_flota(desde, hasta, movil_ids)
+        for fila in moviles:
+            for campo in ('distancia_km', 'minutos_movimiento', 'minutos_detenido', 'minutos_ignicion'):
+                fila[campo] = round(fila[campo] or 0, 2)
+        
+        respuesta = {
+            'fecha_desde': desde.isoformat(),
+            'fecha_hasta': hasta.isoformat(),
+            'moviles': moviles,
+            'distancia_total_km': round(sum(fila['distancia_km'] for fila in moviles), 2),
+        }
+        if request.query_params.get('detalle') == 'true':
+            dias = RecorridoDiario.objects.filter(fecha__gte=desde, fecha__lte=hasta)
+            if movil_ids:
+                dias = dias.filter(movil_id__in=movil_ids)
+            respuesta['detalle'] = list(
+                dias.order_by('movil_id', 'fecha').values(
+                    'movil_id', 'fecha', 'puntos', 'distancia_km', 'velocidad_maxima',
+                    'velocidad_promedio', 'minutos_movimiento', 'minutos_detenido',
+                    'minutos_ignicion', 'detenciones', 'primera_posicion', 'ultima_posicion',
+                )
+            )
+        return Response(respuesta)
+    
     @action(detail=False, methods=['get'])
     def exportar_recorrido(self, request):
-        """Exportar recorrido en formato JSON para reproducción"""
+        """
+        Exportar recorrido para reproducción, en streaming.
+        
+        formato=json (default, mismo JSON de siempre), ndjson o csv; también
+        las codificaciones compactas columnas, polyline y binario.
+        """
         movil_id = request.query_params.get('movil_id')
         fecha_desde = request.query_params.get('fecha_desde')
         fecha_hasta = request.query_params.get('fecha_hasta')
+        formato = codificacion.formato_solicitado(request, por_defecto='json')
         
         if not movil_id or not fecha_desde or not fecha_hasta:
             return Response({
                 'error': 'Se requieren parámetros: movil_id, fecha_desde, fecha_hasta'
             }, status=400)
         
+        if formato not in ('json', 'ndjson', 'csv') and formato not in codificacion.FORMATOS:
+            return Response({'error': 'formato debe ser json, ndjson, csv, columnas, polyline o binario'}, status=400)
+        
         # Obtener posiciones del recorrido
         posiciones = Posicion.objects.filter(
             movil_id=movil_id,
             fec_gps__gte=fecha_desde,
             fec_gps__lte=fecha_hasta,
             is_valid=True
-        ).order_by('fec_gps')
+        )
         
-        # Serializar para reproducción
-        try:
-            from zoneinfo import ZoneInfo
-            tz_argentina = ZoneInfo('America/Argentina/Buenos_Aires')
-        except ImportError:
-            from datetime import timezone, timedelta
-            tz_argentina = timezone(timedelta(hours=-3))
-        
-        datos_recorrido = []
-        for posicion in posiciones:
-            if posicion.lat and posicion.lon:
-                # Convertir fec_gps a zona horaria de Argentina
-                if posicion.fec_gps:
-                    if posicion.fec_gps.tzinfo:
-                        fecha_argentina = posicion.fec_gps.astimezone(tz_argentina)
-                    else:
-                        fecha_argentina = posicion.fec_gps.replace(tzinfo=tz_argentina)
-                    timestamp = fecha_argentina.isoformat()
-                else:
-                    timestamp = None
-                
-                datos_recorrido.append({
-                    'timestamp': timestamp,
-                    'lat': float(posicion.lat),
-                    'lon': float(posicion.lon),
-                    'velocidad': posicion.velocidad or 0,
-                    'rumbo': posicion.rumbo or 0,
-                    'altitud': posicion.altitud or 0,
-                    'ignicion': posicion.ign_on,
-                    'satelites': posicion.sats or 0,
-                    'calidad': posicion.calidad_senal
-                })
+        if formato in codificacion.FORMATOS:
+            filas = posiciones.order_by('fec_gps').values_list(*codificacion.CAMPOS_COMPACTOS).iterator(
+                chunk_size=exportacion.CHUNK_SIZE
+            )
+            contenido, content_type = codificacion.codificar(formato, filas)
+            return HttpResponse(contenido, content_type=content_type)
         
-        return Response({
-            'recorrido': datos_recorrido,
-            'total_puntos': len(datos_recorrido),
-            'parametros': {
+        filas = exportacion.iterar_posiciones(posiciones)
+        
+        if formato == 'csv':
+            contenido = exportacion.stream_csv(filas)
+        elif formato == 'ndjson':
+            contenido = exportacion.stream_ndjson(filas)
+        else:
+            contenido = exportacion.stream_json(filas, {
                 'movil_id': movil_id,
                 'fecha_desde': fecha_desde,
                 'fecha_hasta': fecha_hasta
-            }
-        })
+            })
+        
+        response = StreamingHttpResponse(contenido, content_type=exportacion.CONTENT_TYPES[formato])
+        if formato != 'json':
+            response['Content-Disposition'] = f'attachment; filename="recorrido_{movil_id}.{formato}"'
+        return response
     
     @action(detail=False, methods=['get'])
     def exportar_excel(self, request):
-        """Exportar recorrido a Excel"""
+        """Exportar recorrido a Excel (openpyxl write-only, sin cargar el recorrido en memoria)"""
         movil_id = request.query_params.get('movil_id')
         fecha_desde = request.query_params.get('fecha_desde')
         fecha_hasta = request.query_params.get('fecha_hasta')
@@ -692,32 +985,11 @@ class RecorridosViewSet(viewsets.ModelViewSet):
                 fec_gps__gte=fecha_desde,
                 fec_gps__lte=fecha_hasta,
                 is_valid=True
-            ).order_by('fec_gps')
+            )
             
             if not posiciones_queryset.exists():
                 return Response({'error': 'No hay posiciones para exportar con los filtros indicados'}, status=404)
             
-            posiciones = []
-            for posicion in posiciones_queryset:
-                posiciones.append({
-                    'timestamp': posicion.fec_gps.isoformat() if posicion.fec_gps else '',
-                    'lat': float(posicion.lat) if posicion.lat else None,
-                    'lon': float(posicion.lon) if posicion.lon else None,
-                    'direccion': posicion.direccion or '',
-                    'velocidad': posicion.velocidad or 0,
-                    'rumbo': posicion.rumbo or 0,
-                    'altitud': posicion.altitud or 0,
-                    'satelites': posicion.sats or 0,
-                    'ignicion': posicion.ign_on,
-                    'calidad': posicion.calidad_senal or ''
-                })
-            
-            estadisticas_response = self.estadisticas_recorrido(request)
-            if isinstance(estadisticas_response.data, dict) and 'error' in estadisticas_response.data:
-                estadisticas = {}
-            else:
-                estadisticas = estadisticas_response.data if hasattr(estadisticas_response, 'data') else estadisticas_response
-            
             movil = Movil.objects.filter(id=movil_id).first()
             movil_info = {
                 'patente': movil.patente if movil else 'N/A',
@@ -729,125 +1001,21 @@ class RecorridosViewSet(viewsets.ModelViewSet):
             logger.exception("Error obteniendo datos para exportar Excel")
             return Response({'error': f'No se pudieron obtener los datos del recorrido: {str(e)}'}, status=500)
         
-        if not posiciones:
-            return Response({'error': 'No hay posiciones para exportar'}, status=400)
-        
         try:
-            import openpyxl
-            from openpyxl.styles import Font, PatternFill, Alignment
-            from openpyxl.utils import get_column_letter
-            from django.http import HttpResponse
-            import io
-            
-            # Crear workbook
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Recorrido GPS"
-            
-            # Estilos
-            header_font = Font(bold=True, color="FFFFFF")
-            header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            center_alignment = Alignment(horizontal="center", vertical="center")
-            
-            # Encabezados
-            headers = [
-                'N°', 'Fecha/Hora', 'Latitud', 'Longitud', 'Dirección',
-                'Velocidad (km/h)', 'Rumbo (°)', 'Altitud (m)', 'Satélites',
-                'Encendido', 'Calidad Señal'
-            ]
-            
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = center_alignment
-            
-            # Datos
-            for row, posicion in enumerate(posiciones, 2):
-                ws.cell(row=row, column=1, value=row-1)
-                ws.cell(row=row, column=2, value=posicion.get('timestamp', ''))
-                ws.cell(row=row, column=3, value=posicion.get('lat', ''))
-                ws.cell(row=row, column=4, value=posicion.get('lon', ''))
-                ws.cell(row=row, column=5, value=posicion.get('direccion', ''))
-                ws.cell(row=row, column=6, value=posicion.get('velocidad', 0))
-                ws.cell(row=row, column=7, value=posicion.get('rumbo', 0))
-                ws.cell(row=row, column=8, value=posicion.get('altitud', 0))
-                ws.cell(row=row, column=9, value=posicion.get('satelites', 0))
-                ws.cell(row=row, column=10, value='Sí' if posicion.get('ignicion') else 'No')
-                ws.cell(row=row, column=11, value=posicion.get('calidad', ''))
-            
-            # Ajustar ancho de columnas
-            for col in range(1, len(headers) + 1):
-                ws.column_dimensions[get_column_letter(col)].width = 15
-            
-            # Agregar hoja de estadísticas si están disponibles
-            if estadisticas or movil_info:
-                ws_stats = wb.create_sheet("Información del Recorrido")
-                
-                # Encabezado de estadísticas
-                ws_stats.cell(row=1, column=1, value="Información")
-                ws_stats.cell(row=1, column=2, value="Valor")
-                
-                # Aplicar estilos al encabezado
-                header_cell = ws_stats.cell(row=1, column=1)
-                header_cell.font = header_font
-                header_cell.fill = header_fill
-                header_cell.alignment = center_alignment
-                
-                header_cell2 = ws_stats.cell(row=1, column=2)
-                header_cell2.font = header_font
-                header_cell2.fill = header_fill
-                header_cell2.alignment = center_alignment
-                
-                # Información del móvil
-                movil_data = [
-                    ('Patente', movil_info.get('patente', 'N/A')),
-                    ('Alias', movil_info.get('alias', 'N/A')),
-                    ('Marca', movil_info.get('marca', 'N/A')),
-                    ('Modelo', movil_info.get('modelo', 'N/A')),
-                    ('', ''),  # Línea en blanco
-                ]
-                
-                # Estadísticas del recorrido
-                stats_data = [
-                    ('Duración (minutos)', estadisticas.get('duracion_minutos', 0)),
-                    ('Distancia (km)', estadisticas.get('distancia_km', 0)),
-                    ('Velocidad Máxima (km/h)', estadisticas.get('velocidad_maxima', 0)),
-                    ('Velocidad Promedio (km/h)', estadisticas.get('velocidad_promedio', 0)),
-                    ('Puntos GPS', estadisticas.get('puntos_gps', 0)),
-                    ('Detenciones', estadisticas.get('detenciones', 0)),
-                    ('Tiempo Detenido (minutos)', estadisticas.get('tiempo_detenido_minutos', 0)),
-                    ('Tiempo en Movimiento (minutos)', estadisticas.get('tiempo_movimiento_minutos', 0)),
-                ]
-                
-                # Combinar datos
-                all_data = movil_data + stats_data
-                
-                for row, (stat, value) in enumerate(all_data, 2):
-                    ws_stats.cell(row=row, column=1, value=stat)
-                    ws_stats.cell(row=row, column=2, value=value)
-                
-                # Ajustar ancho de columnas
-                ws_stats.column_dimensions['A'].width = 25
-                ws_stats.column_dimensions['B'].width = 20
-            
-            # Guardar en memoria
-            output = io.BytesIO()
-            wb.save(output)
-            output.seek(0)
-            
-            # Crear respuesta HTTP
-            from django.http import HttpResponse
-            response = HttpResponse(
-                output.getvalue(),
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            # Las estadísticas se calculan mientras se escriben las filas
+            archivo, cantidad = exportacion.generar_xlsx(
+                exportacion.iterar_posiciones(posiciones_queryset), movil_info
             )
-            response['Content-Disposition'] = f'attachment; filename="recorrido_gps_{len(posiciones)}_posiciones.xlsx"'
-            
-            return response
-            
         except Exception as e:
+            logger.exception("Error generando Excel del recorrido")
             return Response({'error': f'Error generando Excel: {str(e)}'}, status=500)
+        
+        return FileResponse(
+            archivo,
+            as_attachment=True,
+            filename=f'recorrido_gps_{cantidad}_posiciones.xlsx',
+            content_type=exportacion.CONTENT_TYPES['xlsx']
+        )
     
     @action(detail=False, methods=['post'])
     def geocodificar_posicion(self, request):
@@ -893,68 +1061,64 @@ class RecorridosViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'])
     def geocodificar_recorrido(self, request):
-        """Geocodificar múltiples posiciones"""
+        """
+        Geocodificar múltiples posiciones en lote (ver gps/geocode_lote.py).
+        
+        Con asincrono=true responde 202 con un job_id; el avance se consulta en
+        geocodificar_recorrido_estado. Sin él responde al terminar, como antes.
+        """
         posiciones = request.data.get('posiciones', [])
         
         if not posiciones:
             return Response({'error': 'No hay posiciones para geocodificar'}, status=400)
+        if not isinstance(posiciones, list) or not all(isinstance(p, dict) for p in posiciones):
+            return Response({'error': 'posiciones debe ser una lista de objetos {id, lat, lon}'}, status=400)
+        if len(posiciones) > geocode_lote.MAX_POSICIONES:
+            return Response({
+                'error': f'Se pueden geocodificar hasta {geocode_lote.MAX_POSICIONES} posiciones por pedido'
+            }, status=400)
         
+        asincrono = request.data.get('asincrono') in (True, 'true', '1', 1)
         try:
-            from gps.services import GeocodingService
-            import time
-            
-            geocoding_service = GeocodingService()
-            direcciones = []
-            geocodificadas = 0
-            
-            for posicion_data in posiciones:
-                lat = posicion_data.get('lat')
-                lon = posicion_data.get('lon')
-                posicion_id = posicion_data.get('id')
-                
-                if lat and lon:
-                    try:
-                        resultado = geocoding_service.geocodificar_coordenadas(float(lat), float(lon))
-                        
-                        # Extraer la dirección del resultado
-                        if resultado and 'direccion_formateada' in resultado:
-                            direccion = resultado['direccion_formateada']
-                        elif resultado and 'display_name' in resultado:
-                            direccion = resultado['display_name']
-                        else:
-                            direccion = f"Coordenadas: {lat}, {lon}"
-                        
-                        # Actualizar en la base de datos si se proporciona ID
-                        if posicion_id:
-                            try:
-                                posicion = Posicion.objects.get(id=posicion_id)
-                                posicion.direccion = direccion
-                                posicion.save()
-                                print(f"✅ Dirección guardada para Posicion ID {posicion_id}: {direccion[:50]}...")
-                            except Posicion.DoesNotExist:
-                                print(f"⚠️ Posicion con ID {posicion_id} no encontrada en la base de datos")
-                                pass
-                        
-                        direcciones.append(direccion)
-                        geocodificadas += 1
-                        
-                        # Pequeña pausa para no sobrecargar el servicio
-                        time.sleep(0.1)
-                        
-                    except Exception as e:
-                        direcciones.append(f'Error: {str(e)}')
-                else:
-                    direcciones.append('Coordenadas inválidas')
-            
-            return Response({
-                'geocodificadas': geocodificadas,
-                'total': len(posiciones),
-                'direcciones': direcciones
-            })
-            
+            if asincrono:
+                job_id = geocode_lote.iniciar_trabajo(posiciones)
+                return Response({
+                    'job_id': job_id,
+                    'total': len(posiciones),
+                    'estado_url': replace_query_param(
+                        request.build_absolute_uri('../geocodificar_recorrido_estado/'), 'job_id', job_id
+                    ),
+                }, status=202)
+            return Response(geocode_lote.geocodificar_lote(posiciones))
         except Exception as e:
+            logger.exception("Error en geocodificación masiva")
             return Response({'error': f'Error en geocodificación masiva: {str(e)}'}, status=500)
-
+    
+    @action(detail=False, methods=['get'])
+    def geocodificar_recorrido_estado(self, request):
+        """
+        Estado de un lote asincrónico de geocodificar_recorrido.
+        
+        Con stream=true responde NDJSON: una línea cada vez que cambia el
+        avance, hasta que el trabajo termina o se cumple
+        WAYGPS_GEOCODE_LOTE_STREAM_SEGUNDOS (si la última línea dice
+        'en_curso', el cliente vuelve a abrir el stream).
+        """
+        job_id = request.query_params.get('job_id')
+        if not job_id:
+            return Response({'error': 'Se requiere el parámetro job_id'}, status=400)
+        
+        estado = geocode_lote.estado_trabajo(job_id)
+        if estado is None:
+            return Response({'error': 'Trabajo no encontrado o vencido'}, status=404)
+        if request.query_params.get('stream') in ('true', '1'):
+            response = StreamingHttpResponse(
+                geocode_lote.stream_progreso(job_id), content_type=exportacion.CONTENT_TYPES['ndjson']
+            )
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
+            return response
+        return Response(estado)
 
 def recorridos_frontend(request):
     """Renderiza la página de recorridos"""
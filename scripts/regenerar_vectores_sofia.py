@@ -12,27 +12,28 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wayproject.settings')
 django.setup()
 
 from agenteIA.models import VectorConsulta
-import random
+from agenteIA.vectorizador import VectorizadorConsultas
 
-# Función para generar embeddings placeholder consistentes
-def generar_placeholder(texto):
-    """Genera un embedding placeholder de 384 dimensiones"""
-    random.seed(hash(texto) % 2**32)
-    return [random.random() for _ in range(384)]
+# Regenerar todos los vectores con el mismo vectorizador que usa Sofía
+# (modelo en lote si está disponible, placeholder consistente si no)
+vectorizador = VectorizadorConsultas()
+vectores = list(VectorConsulta.objects.all())
+print(f"Regenerando {len(vectores)} vectores...")
 
-# Regenerar todos los vectores
-vectores = VectorConsulta.objects.all()
-print(f"Regenerando {vectores.count()} vectores...")
+embeddings = vectorizador.vectorizar_lote([vector.texto_original for vector in vectores])
+usa_placeholder = vectorizador.modelo is None
 
-for vector in vectores:
-    # Generar embedding consistente basado en el texto original
-    vector.vector_embedding = generar_placeholder(vector.texto_original)
+for vector, embedding in zip(vectores, embeddings):
+    vector.vector_embedding = embedding
     
     # Bajar el threshold a 0.3 para que funcione con embeddings placeholder
-    vector.threshold = 0.3
+    if usa_placeholder:
+        vector.threshold = 0.3
     
     vector.save()
     print(f"✓ Regenerado: {vector.texto_original[:50]}...")
 
-print(f"\n✅ Se regeneraron {vectores.count()} vectores con threshold 0.3")
-
+if usa_placeholder:
+    print(f"\n✅ Se regeneraron {len(vectores)} vectores con threshold 0.3 (placeholder)")
+else:
+    print(f"\n✅ Se regeneraron {len(vectores)} vectores con el modelo")
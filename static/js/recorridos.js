@@ -7,12 +7,14 @@ let map;
 let recorridoLayer;
 let marcadoresLayer;
 let posicionActualLayer;
+let detencionesLayer;
 let openstreetLayer;
 let satelliteLayer;
 let hybridLayer;
 let hybridLabelsLayer;
 let datosRecorrido = [];
 let estadisticasRecorrido = null;
+let detencionesRecorrido = [];
 let isPlaying = false;
 let currentIndex = 0;
 let playbackInterval = null;
@@ -34,6 +36,16 @@ let highlightedTimelineRow = null;
 
 const PAGE_SIZE_DEFAULT = 50;
 
+// Vista de mapa: el backend simplifica el recorrido al zoom pedido (medio
+// píxel de tolerancia). Los puntos (marcadores, reproducción) se piden al
+// zoom en el que entra todo el recorrido; al acercar solo se vuelve a pedir
+// la línea, con el zoom que se está mostrando
+let paramsMapa = null;        // filtros de la búsqueda en el mapa, sin zoom
+let zoomRecorrido = null;     // zoom al que se pidió datosRecorrido
+let trazosPorZoom = new Map(); // zoom -> coordenadas de la línea
+let pedidoTrazo = 0;          // descarta respuestas de búsquedas o zooms anteriores
+let polylineRecorrido = null;
+
 // Zona API
 const ZONAS_API_URL = '/zonas/api/zonas/';
 const MOVILES_SIMPLE_URL = '/moviles/api/moviles/?simple=true';
@@ -235,6 +247,10 @@ function initializeMap() {
             recorridoLayer = L.layerGroup().addTo(map);
             marcadoresLayer = L.layerGroup().addTo(map);
             posicionActualLayer = L.layerGroup().addTo(map);
+            detencionesLayer = L.layerGroup().addTo(map);
+            
+            // Más detalle en la línea al acercar
+            map.on('zoomend', actualizarTrazoPorZoom);
             
             console.log('Mapa inicializado correctamente');
             
@@ -452,10 +468,16 @@ async function buscarRecorrido() {
         if (soloMovimiento) params.append('solo_movimiento', 'true');
         if (soloEncendido) params.append('ignicion_encendida', 'true');
         
-        // Si es vista de mapa, agregar parámetro para obtener todos los registros
+        // Si es vista de mapa, pedir el recorrido completo simplificado al zoom actual
+        let zoomPedido = null;
         if (currentViewMode === 'map') {
             params.append('vista_mapa', 'true');
-            console.log('🗺️ Enviando parámetro vista_mapa=true al backend');
+            paramsMapa = new URLSearchParams(params);
+            trazosPorZoom = new Map();
+            pedidoTrazo++;
+            zoomPedido = Math.round(map ? map.getZoom() : MAP_ZOOM);
+            params.append('zoom', zoomPedido);
+            console.log('🗺️ Enviando parámetro vista_mapa=true al backend (zoom', zoomPedido, ')');
         }
         
         console.log('Filtros aplicados:', {
@@ -487,7 +509,19 @@ async function buscarRecorrido() {
         // Si es vista de mapa, los datos vienen directamente como array
         if (currentViewMode === 'map') {
             datosRecorrido = Array.isArray(data) ? data : data.results || [];
-            console.log('🗺️ Vista de mapa: cargadas', datosRecorrido.length, 'posiciones');
+            zoomRecorrido = zoomPedido;
+            // Con los límites del recorrido se sabe a qué zoom se va a mostrar:
+            // si es más cercano que el pedido, volver a pedirlo con ese detalle
+            const zoomAjustado = zoomParaRecorrido(datosRecorrido);
+            if (zoomAjustado !== null && zoomAjustado > zoomPedido) {
+                const ajustado = await pedirRecorridoMapa(zoomAjustado);
+                if (ajustado) {
+                    datosRecorrido = ajustado;
+                    zoomRecorrido = zoomAjustado;
+                }
+            }
+            trazosPorZoom.set(zoomRecorrido, datosRecorrido.map(punto => [punto.lat, punto.lon]));
+            console.log('🗺️ Vista de mapa: cargadas', datosRecorrido.length, 'posiciones (zoom', zoomRecorrido, ')');
         } else {
             // Si es vista de lista, los datos vienen paginados
             datosRecorrido = data.results || data;
@@ -517,8 +551,11 @@ async function buscarRecorrido() {
         timelineMeta.selectedIndex = Math.min(timelineMeta.selectedIndex || 1, Math.max(timelineMeta.total, 1));
         await prepararEtiquetasTimeline(datosRecorrido);
         
-        // Obtener estadísticas
-        await cargarEstadisticas(movilId, fechaDesde, fechaHasta);
+        // Obtener estadísticas y detenciones (segmentos precalculados)
+        await Promise.all([
+            cargarEstadisticas(movilId, fechaDesde, fechaHasta),
+            cargarDetenciones(movilId, fechaDesde, fechaHasta)
+        ]);
         
         // Renderizar según la vista actual
         if (currentViewMode === 'list') {
@@ -560,6 +597,52 @@ async function buscarRecorrido() {
     }
 }
 
+// Zoom en el que entra todo el recorrido (el mismo que usa fitBounds en renderizarRecorrido)
+function zoomParaRecorrido(puntos) {
+    if (!map || puntos.length === 0) return null;
+    const bounds = L.latLngBounds(puntos.map(punto => [punto.lat, punto.lon]));
+    return Math.round(map.getBoundsZoom(bounds, false, L.point(40, 40)));
+}
+
+// Recorrido de la búsqueda actual simplificado a un zoom (null si falla)
+async function pedirRecorridoMapa(zoom) {
+    const params = new URLSearchParams(paramsMapa);
+    params.set('zoom', zoom);
+    const response = await fetch(`/api/recorridos/?${params}`, {
+        headers: auth.getHeaders()
+    });
+    if (!response.ok) {
+        console.error('Error obteniendo el recorrido simplificado:', response.status);
+        return null;
+    }
+    const data = await response.json();
+    console.log(`🗺️ Zoom ${zoom}: ${response.headers.get('X-Puntos-Simplificados')} de ${response.headers.get('X-Puntos-Originales')} puntos`);
+    return Array.isArray(data) ? data : data.results || [];
+}
+
+// Al acercar el mapa, redibujar la línea con el detalle del zoom que se muestra
+async function actualizarTrazoPorZoom() {
+    if (currentViewMode !== 'map' || !paramsMapa || !polylineRecorrido || zoomRecorrido === null) return;
+    // Alejado, la línea del zoom del recorrido ya tiene detalle de sobra
+    const zoom = Math.max(Math.round(map.getZoom()), zoomRecorrido);
+    const pedido = ++pedidoTrazo;
+    let coordenadas = trazosPorZoom.get(zoom);
+    if (!coordenadas) {
+        try {
+            const puntos = await pedirRecorridoMapa(zoom);
+            if (!puntos) return;
+            coordenadas = puntos.map(punto => [punto.lat, punto.lon]);
+            trazosPorZoom.set(zoom, coordenadas);
+        } catch (error) {
+            console.error('Error actualizando el trazo del recorrido:', error);
+            return;
+        }
+    }
+    // Otra búsqueda u otro zoom llegaron mientras tanto
+    if (pedido !== pedidoTrazo || !polylineRecorrido) return;
+    polylineRecorrido.setLatLngs(coordenadas);
+}
+
 // Cargar estadísticas del recorrido
 async function cargarEstadisticas(movilId, fechaDesde, fechaHasta) {
     try {
@@ -582,6 +665,62 @@ async function cargarEstadisticas(movilId, fechaDesde, fechaHasta) {
     }
 }
 
+// Cargar detenciones del período (/api/recorridos/segmentos/)
+async function cargarDetenciones(movilId, fechaDesde, fechaHasta) {
+    detencionesRecorrido = [];
+    try {
+        const params = new URLSearchParams({
+            movil_id: movilId,
+            fecha_desde: fechaDesde,
+            fecha_hasta: fechaHasta,
+            tipo: 'detencion'
+        });
+        
+        const response = await fetch(`/api/recorridos/segmentos/?${params}`, {
+            headers: auth.getHeaders()
+        });
+        
+        if (response.ok) {
+            const datos = await response.json();
+            detencionesRecorrido = datos.segmentos || [];
+        }
+    } catch (error) {
+        console.error('Error cargando detenciones:', error);
+    }
+}
+
+// Marcar las detenciones en el mapa (centro, duración y dirección)
+function renderizarDetenciones() {
+    if (!detencionesLayer) return;
+    detencionesLayer.clearLayers();
+    
+    detencionesRecorrido.forEach((detencion) => {
+        const lat = parseFloat(detencion.lat_centro);
+        const lon = parseFloat(detencion.lon_centro);
+        if (isNaN(lat) || isNaN(lon)) return;
+        
+        const minutos = Math.round(detencion.duracion_segundos / 60);
+        const ralenti = Math.round(detencion.segundos_ignicion / 60);
+        const marker = L.circleMarker([lat, lon], {
+            radius: 9,
+            fillColor: '#dc3545',
+            color: 'white',
+            weight: 2,
+            fillOpacity: 0.9
+        });
+        marker.bindPopup(`
+            <div>
+                <strong>Detención (${minutos} min)</strong><br>
+                <strong>Desde:</strong> ${new Date(detencion.inicio_local).toLocaleString()}<br>
+                <strong>Hasta:</strong> ${new Date(detencion.fin_local).toLocaleString()}${detencion.abierto ? ' (en curso)' : ''}<br>
+                <strong>Motor encendido:</strong> ${ralenti} min<br>
+                ${detencion.direccion_inicio ? `<strong>Dirección:</strong> ${detencion.direccion_inicio}` : ''}
+            </div>
+        `);
+        detencionesLayer.addLayer(marker);
+    });
+}
+
 // Mostrar estadísticas
 function mostrarEstadisticas() {
     if (!estadisticasRecorrido) return;
@@ -655,6 +794,8 @@ function renderizarRecorrido() {
     if (recorridoLayer) recorridoLayer.clearLayers();
     if (marcadoresLayer) marcadoresLayer.clearLayers();
     if (posicionActualLayer) posicionActualLayer.clearLayers();
+    if (detencionesLayer) detencionesLayer.clearLayers();
+    polylineRecorrido = null;
     
     if (datosRecorrido.length === 0) return;
     
@@ -664,15 +805,15 @@ function renderizarRecorrido() {
         posicionesCountMapa.textContent = `${datosRecorrido.length} posiciones`;
     }
     
-    // Crear línea del recorrido
+    // Crear línea del recorrido (actualizarTrazoPorZoom le agrega detalle al acercar)
     const coordenadas = datosRecorrido.map(punto => [punto.lat, punto.lon]);
-    const polyline = L.polyline(coordenadas, {
+    polylineRecorrido = L.polyline(coordenadas, {
         color: '#0d6efd',
         weight: 3,
         opacity: 0.8
     });
     
-    recorridoLayer.addLayer(polyline);
+    recorridoLayer.addLayer(polylineRecorrido);
     
     // Ajustar vista del mapa
     if (coordenadas.length > 0) {
@@ -709,6 +850,8 @@ function renderizarRecorrido() {
         marcadoresLayer.addLayer(marker);
     });
     
+    renderizarDetenciones();
+    
     // Inicializar reproducción
     currentIndex = 0;
     actualizarTiempo();
@@ -930,6 +1073,9 @@ function limpiarFiltros() {
     // Limpiar datos
     datosRecorrido = [];
     estadisticasRecorrido = null;
+    paramsMapa = null;
+    polylineRecorrido = null;
+    trazosPorZoom = new Map();
     currentIndex = 0;
     
     // Ocultar panel de estadísticas
@@ -1916,31 +2062,43 @@ async function geocodificarPosiciones() {
                 ...auth.getHeaders()
             },
             body: JSON.stringify({
+                asincrono: true,
                 posiciones: posicionesSinGeocodificar.map(p => ({ id: p.id, lat: p.lat, lon: p.lon }))
             })
         });
         
-        if (response.ok) {
-            const data = await response.json();
-            
-            console.log('Respuesta de geocodificación masiva:', data);
-            
-            // Mostrar resultado detallado
-            if (data.geocodificadas > 0) {
-                showMessage(`✅ Geocodificación completada: ${data.geocodificadas} de ${data.total} posiciones procesadas exitosamente`, 'success');
-                
-                // Recargar los datos para mostrar las direcciones actualizadas
-                setTimeout(() => {
-                    buscarRecorrido();
-                }, 1000);
-            } else {
-                showMessage('⚠️ No se pudieron geocodificar las posiciones. Verifique la conexión a internet.', 'warning');
-            }
-        } else {
+        if (!response.ok) {
             const errorData = await response.json();
             console.error('Error del servidor:', errorData);
             throw new Error(`Error del servidor: ${errorData.error || 'Error desconocido'}`);
         }
+        
+        // El servidor devuelve un job_id y geocodifica en segundo plano
+        const trabajo = await response.json();
+        const data = await seguirGeocodificacion(trabajo.job_id);
+        
+        console.log('Respuesta de geocodificación masiva:', data);
+        
+        if (geocodificacionCancelada) {
+            // El lote sigue en el servidor; las direcciones aparecen al volver a buscar
+            showMessage('⏹️ Se dejó de seguir la geocodificación (continúa en el servidor)', 'warning');
+        } else if (data.estado === 'desconocido') {
+            showMessage('🗺️ La geocodificación continúa en el servidor. Volvé a buscar el recorrido en unos minutos para ver las direcciones.', 'info');
+        } else if (data.estado === 'en_curso') {
+            // El seguimiento se cortó sin que el lote terminara
+            showMessage(`🗺️ La geocodificación sigue en el servidor (${data.celdas_consultadas || 0} de ${(data.celdas || 0) - (data.celdas_cache || 0)} lugares nuevos). Volvé a buscar el recorrido en unos minutos para ver las direcciones.`, 'info');
+        } else if (data.estado === 'error') {
+            throw new Error(data.error || 'Error desconocido');
+        } else if (data.geocodificadas > 0) {
+            showMessage(`✅ Geocodificación completada: ${data.geocodificadas} de ${data.total} posiciones procesadas exitosamente (${data.celdas_consultadas} consultas, ${data.celdas_cache} celdas ya conocidas)`, 'success');
+            
+            // Recargar los datos para mostrar las direcciones actualizadas
+            setTimeout(() => {
+                buscarRecorrido();
+            }, 1000);
+        } else {
+            showMessage('⚠️ No se pudieron geocodificar las posiciones. Verifique la conexión a internet.', 'warning');
+        }
     } catch (error) {
         console.error('Error geocodificando posiciones:', error);
         if (geocodificacionCancelada) {
@@ -1978,6 +2136,63 @@ async function geocodificarPosiciones() {
     }
 }
 
+// Pausa antes de reabrir el stream de progreso de un lote que sigue en curso
+const PAUSA_REAPERTURA_STREAM_MS = 1000;
+
+// Seguir el avance de un lote de geocodificación hasta que termine o se cancele.
+// El servidor corta cada stream a los WAYGPS_GEOCODE_LOTE_STREAM_SEGUNDOS con
+// la última línea en 'en_curso': en ese caso se vuelve a abrir
+async function seguirGeocodificacion(jobId) {
+    let estado = await leerProgresoGeocodificacion(jobId);
+    while (estado.estado === 'en_curso' && !geocodificacionCancelada) {
+        console.log(`🔁 Lote ${jobId.slice(0, 8)} sigue en curso, reabriendo el stream de progreso`);
+        await new Promise(resolve => setTimeout(resolve, PAUSA_REAPERTURA_STREAM_MS));
+        if (geocodificacionCancelada) break;
+        estado = await leerProgresoGeocodificacion(jobId);
+    }
+    return estado;
+}
+
+// Un stream de progreso de un lote (NDJSON: una línea por cambio de estado); devuelve el último estado
+async function leerProgresoGeocodificacion(jobId) {
+    const response = await fetch(`/api/recorridos/geocodificar_recorrido_estado/?job_id=${encodeURIComponent(jobId)}&stream=true`, {
+        headers: auth.getHeaders()
+    });
+    if (response.status === 404) {
+        // Otro worker del servidor (sin cache compartido): el lote sigue igual
+        return { estado: 'desconocido' };
+    }
+    if (!response.ok) {
+        const errorData = await response.json();
+        throw new Error(errorData.error || 'No se pudo consultar el estado de la geocodificación');
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let pendiente = '';
+    let estado = null;
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        pendiente += decoder.decode(value, { stream: true });
+        const lineas = pendiente.split('\n');
+        pendiente = lineas.pop();
+        for (const linea of lineas) {
+            if (!linea.trim()) continue;
+            estado = JSON.parse(linea);
+            if (estado.estado === 'en_curso' && estado.celdas !== undefined) {
+                const porConsultar = estado.celdas - estado.celdas_cache;
+                showMessage(`🚀 Geocodificando: ${estado.celdas_consultadas} de ${porConsultar} lugares nuevos (${estado.celdas_cache} ya conocidos, ${estado.total} posiciones)...`, 'info');
+            }
+        }
+        if (geocodificacionCancelada) {
+            await reader.cancel();
+            break;
+        }
+    }
+    return estado || {};
+}
+
 // Exportar a Excel
 async function exportarExcel() {
     const movilSelect = document.getElementById('movil-select');
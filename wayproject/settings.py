@@ -132,16 +132,30 @@ WSGI_APPLICATION = 'wayproject.wsgi.application'
 }"""
 
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.contrib.gis.db.backends.postgis',
-        'NAME': config('POSTGRES_DB'),
-        'USER': config('POSTGRES_USER'),
-        'PASSWORD': config('POSTGRES_PASSWORD'),
-        'HOST': config('POSTGRES_HOST'),
-        'PORT': config('POSTGRES_PORT'),
+# Base SQLite local (sin PostGIS ni docker) para benchmarks de ingesta:
+# WAYGPS_DB_LOCAL=/tmp/bench.sqlite3 python manage.py benchmark_ingesta
+# Solo se crean las tablas de recepción (ver benchmark_ingesta); zonas no funciona.
+WAYGPS_DB_LOCAL = config('WAYGPS_DB_LOCAL', default='')
+
+if WAYGPS_DB_LOCAL:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': WAYGPS_DB_LOCAL,
+            'OPTIONS': {'timeout': 30},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.contrib.gis.db.backends.postgis',
+            'NAME': config('POSTGRES_DB'),
+            'USER': config('POSTGRES_USER'),
+            'PASSWORD': config('POSTGRES_PASSWORD'),
+            'HOST': config('POSTGRES_HOST'),
+            'PORT': config('POSTGRES_PORT'),
+        }
     }
-}
 
 
 # Password validation
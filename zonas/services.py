@@ -2,9 +2,11 @@ import logging
 from typing import Any, Dict, List, Optional
 
 import requests
-from django.conf import settings
 from django.core.cache import cache
 
+from gps import geo_http
+from gps.geocode_cache import geocode_cache
+
 logger = logging.getLogger(__name__)
 
 
@@ -22,7 +24,6 @@ def geocode_search(query: str, *, limit: int = 5, ttl: int = 300) -> List[Dict[s
     if cached is not None:
         return cached
 
-    url = "https://nominatim.openstreetmap.org/search"
     params = {
         "q": query,
         "format": "json",
@@ -30,15 +31,9 @@ def geocode_search(query: str, *, limit: int = 5, ttl: int = 300) -> List[Dict[s
         "addressdetails": 1,
     }
 
-    headers = {
-        "User-Agent": getattr(settings, "WAYGPS_GEOCODER_UA", "WayGPS-Geocoder/1.0"),
-    }
-
     try:
-        response = requests.get(url, params=params, headers=headers, timeout=6)
-        response.raise_for_status()
-        data = response.json()
-    except requests.RequestException as exc:
+        data = geo_http.nominatim.get_json("/search", params=params, timeout=6)
+    except (requests.RequestException, ValueError) as exc:
         logger.warning("Error consultando geocoder: %s", exc)
         return []
 
@@ -67,47 +62,47 @@ def geocode_search(query: str, *, limit: int = 5, ttl: int = 300) -> List[Dict[s
     return suggestions
 
 
-def reverse_geocode(lat: float, lon: float, *, ttl: int = 86400) -> Optional[Dict[str, Any]]:
-    """
-    Realiza geocodificación inversa (reverse geocoding) usando Nominatim.
-    Convierte coordenadas (lat, lon) en una dirección.
-    
-    Args:
-        lat: Latitud
-        lon: Longitud
-        ttl: Tiempo de vida del cache en segundos (default: 1 día)
-        
-    Returns:
-        Dict con 'direccion' (corta) y 'direccion_formateada' (completa), o None si falla
-    """
-    cache_key = f"geocode:reverse:{lat:.6f}:{lon:.6f}"
-    cached = cache.get(cache_key)
-    if cached is not None:
-        return cached
-    
-    url = "https://nominatim.openstreetmap.org/reverse"
+def _consultar_reverse(lat: float, lon: float) -> Optional[Dict[str, Any]]:
+    """Consulta cruda a Nominatim /reverse (None si falla o no hay resultado)"""
     params = {
         "lat": str(lat),
         "lon": str(lon),
         "format": "json",
         "addressdetails": 1,
         "zoom": 18,  # Nivel de detalle (18 = máximo detalle)
-    }
-    
-    headers = {
-        "User-Agent": getattr(settings, "WAYGPS_GEOCODER_UA", "WayGPS-Geocoder/1.0"),
+        # Mismo idioma que GeocodingService: las celdas del cache son compartidas
+        "accept-language": "es",
     }
     
     try:
-        response = requests.get(url, params=params, headers=headers, timeout=6)
-        response.raise_for_status()
-        data = response.json()
-    except requests.RequestException as exc:
+        data = geo_http.nominatim.get_json("/reverse", params=params, timeout=6)
+    except (requests.RequestException, ValueError) as exc:
         logger.warning("Error consultando reverse geocoder: %s", exc)
         return None
     
     if not data or 'error' in data:
         return None
+    return data
+
+
+def reverse_geocode(lat: float, lon: float) -> Optional[Dict[str, Any]]:
+    """
+    Realiza geocodificación inversa (reverse geocoding) usando Nominatim.
+    Convierte coordenadas (lat, lon) en una dirección.
+    
+    Usa el cache compartido por celda geohash (gps.geocode_cache), el mismo
+    que alimenta la geocodificación de posiciones de móviles.
+    
+    Args:
+        lat: Latitud
+        lon: Longitud
+        
+    Returns:
+        Dict con 'direccion' (corta) y 'direccion_formateada' (completa), o None si falla
+    """
+    data = geocode_cache.obtener(lat, lon, _consultar_reverse)
+    if not data:
+        return None
     
     # Extraer dirección formateada completa
     direccion_formateada = data.get("display_name", "")
@@ -142,11 +137,8 @@ def reverse_geocode(lat: float, lon: float, *, ttl: int = 86400) -> Optional[Dic
     
     direccion = ", ".join(direccion_parts) if direccion_parts else direccion_formateada
     
-    result = {
+    return {
         "direccion": direccion,
         "direccion_formateada": direccion_formateada,
         "raw": data,
     }
-    
-    cache.set(cache_key, result, ttl)
-    return result